@@ -9,9 +9,10 @@ from django.contrib.admin.helpers import ActionForm
 from django.contrib import messages
 from django.http import HttpResponseRedirect
 from django.utils.crypto import get_random_string
+from django.utils import timezone
 
 from .models import (
-    FeeStructure, Parent, Session, SchoolClass, ClassSection, StudentClassHistory, Subject, Student,
+    BackgroundTask, FeeStructure, GradeBand, GradeScale, Parent, Session, SchoolClass, ClassSection, StudentClassHistory, Subject, Student,
     Teacher, StudentSubject, Result, Payment, Notification, TermConfiguration
 )
 
@@ -247,6 +248,33 @@ class StudentSubjectAdmin(SchoolAdminMixin, admin.ModelAdmin):
             obj.assigned_by = request.user.teacher if hasattr(request.user, 'teacher') else None
         super().save_model(request, obj, form, change)
       
+class GradeBandInline(admin.TabularInline):
+    model = GradeBand
+    extra = 0
+    fields = ('min_score', 'grade', 'grade_point', 'description')
+
+@admin.register(GradeScale)
+class GradeScaleAdmin(admin.ModelAdmin):
+    list_display = ('section', 'session', 'band_count', 'updated_at')
+    list_filter = ('section', 'session')
+    inlines = [GradeBandInline]
+
+    def band_count(self, obj):
+        return obj.bands.count()
+    band_count.short_description = 'Bands'
+
+@admin.register(BackgroundTask)
+class BackgroundTaskAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'progress', 'attempts', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_by')
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='Running').update(status='Pending', attempts=0, run_after=timezone.now(), error='')
+        self.message_user(request, f"Requeued {updated} task(s).")
+    requeue.short_description = 'Requeue selected tasks'
+
 @admin.register(Result)
 class ResultAdmin(admin.ModelAdmin):
     
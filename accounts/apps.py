@@ -6,4 +6,5 @@ class AccountsConfig(AppConfig):
     name = 'accounts'
 
     def ready(self):
-        import accounts.signals 
\ No newline at end of file
+        import accounts.signals
+        import accounts.tasks
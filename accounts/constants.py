@@ -17,6 +17,12 @@ PAYMENT_STATUS_CHOICES = (
     ('Failed', 'Failed'),
 )
 
+BALANCE_STATUS_CHOICES = (
+    ('Pending', 'Pending'),
+    ('Partial', 'Partial'),
+    ('Completed', 'Completed'),
+)
+
 PRE_NURSERY_SUBJECTS = [
     {'name': 'English Language', 'section': 'Nursery', 'compulsory': True},
     {'name': 'Mathematics', 'section': 'Nursery', 'compulsory': True},
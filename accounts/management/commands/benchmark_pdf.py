@@ -0,0 +1,161 @@
+import json
+import platform
+import resource
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from accounts.utils.pdf_benchmark import (
+    PAYMENT_REPORT_FAMILIES, REPORT_CARD_SUBJECTS, benchmark_cases, report_table_html, run_case, time_renderer,
+    weasyprint_available,
+)
+from accounts.utils.pdf_renderer import (
+    DEFAULT_MAX_JOBS, DEFAULT_MEMORY_MB, DEFAULT_TIMEOUT_SECONDS, RendererPool, render_pdf_in_process,
+    renderer_peak_rss_kb,
+)
+
+
+def _int_list(value):
+    return [int(n) for n in value.split(',') if n]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Benchmark PDF rendering on synthetic data, without touching the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=30,
+            help='Renders per report card and receipt measurement (default: 30)',
+        )
+        parser.add_argument(
+            '--report-iterations',
+            type=int,
+            default=3,
+            help='Renders per payment report measurement (default: 3)',
+        )
+        parser.add_argument(
+            '--subjects',
+            default=','.join(map(str, REPORT_CARD_SUBJECTS)),
+            help='Comma separated subject counts for report cards (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--families',
+            default=','.join(map(str, PAYMENT_REPORT_FAMILIES)),
+            help='Comma separated family counts for payment reports (default: %(default)s)',
+        )
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=200,
+            help='Table rows on the renderer pool comparison page (default: 200)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results to this JSON file',
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON file from an earlier run to compare median time and peak memory against',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            subject_counts = _int_list(options['subjects'])
+            family_counts = _int_list(options['families'])
+        except ValueError:
+            raise CommandError('--subjects and --families take comma separated numbers')
+        baseline = self.load_baseline(options['compare']) if options['compare'] else {}
+
+        weasyprint = weasyprint_available()
+        if not weasyprint:
+            self.stdout.write(self.style.WARNING('WeasyPrint unavailable, running the ReportLab renderers only'))
+
+        results = []
+        for case in benchmark_cases(
+            subject_counts, family_counts, options['iterations'], options['report_iterations'], weasyprint
+        ):
+            result = run_case(case)
+            results.append(result)
+            self.write_result(result, baseline.get((result['name'], result['renderer'], result['size'])))
+        if weasyprint:
+            results += self.benchmark_renderer_pool(options)
+
+        if options['output']:
+            run = {
+                'commit': _git_commit(),
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'results': results,
+            }
+            with open(options['output'], 'w') as f:
+                json.dump(run, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} results to {options['output']}"))
+
+    def load_baseline(self, path):
+        try:
+            with open(path) as f:
+                run = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+        self.stdout.write(f"Comparing with {path} (commit {run.get('commit') or 'unknown'})")
+        return {(r['name'], r['renderer'], r['size']): r for r in run['results']}
+
+    def write_result(self, result, previous=None):
+        label = f"{result['name']} {result['size']}, {result['renderer']}"
+        line = (
+            f"{label:<38} median {result['median_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+            f"peak {result['peak_memory_kb']:8d} KiB  {result['bytes']:9d} bytes"
+        )
+        if previous:
+            time_change = (result['median_ms'] - previous['median_ms']) / previous['median_ms'] * 100
+            memory_change = result['peak_memory_kb'] - previous['peak_memory_kb']
+            line += f"  ({time_change:+.1f}% time, {memory_change:+d} KiB)"
+        self.stdout.write(line)
+
+    def benchmark_renderer_pool(self, options):
+        """Compare the WeasyPrint renderer pool with rendering in this process, including peak RSS of each."""
+        html = report_table_html(options['rows'])
+        # The pool runs first so this process's peak RSS before the in-process run reflects the web worker alone.
+        pool = RendererPool(
+            processes=1,
+            max_jobs=getattr(settings, 'PDF_RENDERER_MAX_JOBS', DEFAULT_MAX_JOBS),
+            timeout=getattr(settings, 'PDF_RENDERER_TIMEOUT', DEFAULT_TIMEOUT_SECONDS),
+            memory_mb=getattr(settings, 'PDF_RENDERER_MEMORY_MB', DEFAULT_MEMORY_MB),
+        )
+        try:
+            pool.start()
+            pooled = time_renderer(lambda: pool.render(html), options['iterations'])
+            renderer_rss = pool.apply(renderer_peak_rss_kb)
+            web_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        finally:
+            pool.close()
+        in_process = time_renderer(lambda: render_pdf_in_process(html), options['iterations'])
+        in_process_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        self.stdout.write(
+            f"renderer pool: median {pooled['median_ms']:.2f} ms, p95 {pooled['p95_ms']:.2f} ms; "
+            f"in process: median {in_process['median_ms']:.2f} ms, p95 {in_process['p95_ms']:.2f} ms"
+        )
+        self.stdout.write(
+            f"peak RSS: web process with pool {web_rss / 1024:.1f} MB, renderer {renderer_rss / 1024:.1f} MB, "
+            f"web process rendering itself {in_process_rss / 1024:.1f} MB"
+        )
+        return [
+            {'name': 'weasyprint_table', 'renderer': 'pool', 'size': options['rows'],
+             'iterations': options['iterations'], **pooled, 'peak_rss_kb': renderer_rss, 'web_peak_rss_kb': web_rss},
+            {'name': 'weasyprint_table', 'renderer': 'in_process', 'size': options['rows'],
+             'iterations': options['iterations'], **in_process, 'peak_rss_kb': in_process_rss},
+        ]
@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import ClassSection, SchoolClass, Session
+from accounts.utils.index import get_current_session_term
+from accounts.utils.report_cards import REPORT_CARD_FORMATS, default_workers, render_report_cards, report_card_students
+
+
+class Command(BaseCommand):
+    help = 'Render the report cards of a section or class level into one merged PDF or a ZIP of per-student PDFs'
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group(required=True)
+        target.add_argument(
+            '--section',
+            type=int,
+            help='ID of the class section',
+        )
+        target.add_argument(
+            '--class',
+            dest='class_level',
+            type=str,
+            help='Class level, e.g. "JSS 2"; covers every section of the level in the session',
+        )
+        parser.add_argument(
+            '--session',
+            type=str,
+            help='Session name (default: the current session)',
+        )
+        parser.add_argument(
+            '--term',
+            type=str,
+            choices=[t[0] for t in TERM_CHOICES],
+            help='Term (default: the current term)',
+        )
+        parser.add_argument(
+            '--format',
+            type=str,
+            choices=REPORT_CARD_FORMATS,
+            default='pdf',
+            help='pdf for one merged file in print order, zip for one file per student (default: pdf)',
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            required=True,
+            help='Path of the file to write',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=default_workers(),
+            help=f'Number of rendering processes (default: {default_workers()})',
+        )
+
+    def handle(self, *args, **options):
+        current_session, current_term = get_current_session_term()
+        session = current_session
+        if options['session']:
+            session = Session.objects.filter(name=options['session']).first()
+            if not session:
+                self.stdout.write(self.style.ERROR(f"Session {options['session']} not found."))
+                return
+        term = options['term'] or current_term
+
+        if options['section']:
+            section = ClassSection.objects.filter(id=options['section']).select_related('school_class').first()
+            if not section:
+                self.stdout.write(self.style.ERROR(f"Section {options['section']} not found."))
+                return
+            students = report_card_students(session, term, section=section)
+            label = str(section)
+        else:
+            school_class = SchoolClass.objects.filter(level=options['class_level']).first()
+            if not school_class:
+                self.stdout.write(self.style.ERROR(f"Class {options['class_level']} not found."))
+                return
+            students = report_card_students(session, term, school_class=school_class)
+            label = school_class.level
+
+        if not students.exists():
+            self.stdout.write(self.style.WARNING(f'No results for {label} in {session.name} term {term}.'))
+            return
+
+        def progress(done, total):
+            self.stdout.write(f'\rRendered {done}/{total}', ending='')
+            if done == total:
+                self.stdout.write('')
+
+        rendered = render_report_cards(
+            students,
+            session,
+            term,
+            options['output'],
+            output_format=options['format'],
+            workers=options['workers'],
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {rendered} report card(s) for {label} ({session.name} term {term}) to {options['output']}"
+        ))
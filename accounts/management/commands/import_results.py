@@ -0,0 +1,102 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import Session
+from accounts.utils.index import get_current_session_term
+from accounts.utils.result_import import DEFAULT_BATCH_SIZE, ImportFormatError, import_results, iter_result_rows
+
+ERROR_REPORT_FIELDS = ['line', 'admission_number', 'subject_id', 'field', 'error']
+
+
+class Command(BaseCommand):
+    help = 'Import result scores from a .csv or .xlsx sheet and re-rank the affected sections'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file',
+            type=str,
+            help='Path to the .csv or .xlsx file containing scores',
+        )
+        parser.add_argument(
+            '--session',
+            type=str,
+            help='Session name (default: the current session)',
+        )
+        parser.add_argument(
+            '--term',
+            type=str,
+            choices=[t[0] for t in TERM_CHOICES],
+            help='Term (default: the current term)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of rows upserted per batch (default: {DEFAULT_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the sheet and report errors without writing anything',
+        )
+        parser.add_argument(
+            '--error-report',
+            type=str,
+            help='Write rejected rows and cells to this CSV file',
+        )
+
+    def handle(self, *args, **options):
+        path = options['file']
+        if not os.path.exists(path):
+            self.stdout.write(self.style.ERROR(f'File not found: {path}'))
+            return
+
+        current_session, current_term = get_current_session_term()
+        session = current_session
+        if options['session']:
+            session = Session.objects.filter(name=options['session']).first()
+            if not session:
+                self.stdout.write(self.style.ERROR(f"Session {options['session']} not found."))
+                return
+        term = options['term'] or current_term
+
+        report_file = open(options['error_report'], 'w', newline='') if options['error_report'] else None
+        report = csv.DictWriter(report_file, fieldnames=ERROR_REPORT_FIELDS) if report_file else None
+        if report:
+            report.writeheader()
+
+        def on_error(error):
+            if report:
+                report.writerow(error)
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f"Line {error['line']} ({error['admission_number']}, {error['subject_id']}): {error['error']}"
+                ))
+
+        try:
+            with open(path, 'rb') as stream:
+                counts = import_results(
+                    iter_result_rows(stream, path),
+                    session,
+                    term,
+                    batch_size=options['batch_size'],
+                    dry_run=options['dry_run'],
+                    on_error=on_error,
+                )
+        except ImportFormatError as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            return
+        finally:
+            if report_file:
+                report_file.close()
+
+        prefix = 'Dry run: would import' if counts['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {counts['rows']} row(s) for {session.name} term {term}: "
+            f"{counts['created']} created, {counts['updated']} updated, {counts['errors']} error(s)"
+        ))
+        if counts['errors'] and report_file:
+            self.stdout.write(self.style.WARNING(f"Error report written to {options['error_report']}"))
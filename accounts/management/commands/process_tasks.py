@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections, connection
+from django.utils import timezone
+
+from accounts.models import BackgroundTask
+
+from accounts.utils.positions import DEFAULT_DEBOUNCE_SECONDS, recompute_dirty_positions
+from accounts.utils.tasks import delete_expired_task_files, requeue_stale_tasks, run_next_task, worker_id
+
+logger = logging.getLogger(__name__)
+
+CLEANUP_INTERVAL_SECONDS = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (and the stale-position sweep when POSITION_RECOMPUTE is "worker")'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of tasks run at the same time (default: 1)',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait before polling again when the queue is empty (default: 2)',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=3600,
+            help='Requeue tasks left running longer than this many seconds at startup (default: 3600)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of waiting for more tasks',
+        )
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'TASK_FILE_STORAGE_SHARED', False):
+            raise CommandError(
+                'Task files would be written where the web service cannot read them. Configure Cloudinary, '
+                'or set TASK_FILE_STORAGE_SHARED=true if the worker and web service share MEDIA_ROOT.'
+            )
+        requeued = requeue_stale_tasks(options['stale_after'])
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'Requeued {requeued} task(s) left running by a stopped worker'))
+
+        stop = threading.Event()
+        worker = worker_id()
+
+        def start(i):
+            thread = threading.Thread(
+                target=self.work, args=(f'{worker}-{i}', stop, options), name=f'task-worker-{i}', daemon=True
+            )
+            thread.start()
+            return thread
+
+        threads = [start(i) for i in range(max(options['concurrency'], 1))]
+        self.stdout.write(self.style.SUCCESS(f'Processing tasks with {len(threads)} thread(s)'))
+
+        sweep_positions = getattr(settings, 'POSITION_RECOMPUTE', 'coalescer') == 'worker'
+        settle = getattr(settings, 'POSITION_RECOMPUTE_DEBOUNCE', DEFAULT_DEBOUNCE_SECONDS)
+        next_cleanup = time.monotonic()
+        try:
+            while True:
+                if time.monotonic() >= next_cleanup:
+                    close_old_connections()
+                    deleted = delete_expired_task_files()
+                    if deleted:
+                        self.stdout.write(f'Deleted {deleted} expired task file(s)')
+                    next_cleanup = time.monotonic() + CLEANUP_INTERVAL_SECONDS
+                if not options['once']:
+                    # Threads only return early with --once; anything else that ends one is replaced.
+                    for i, thread in enumerate(threads):
+                        if not thread.is_alive():
+                            logger.error(f'Task worker thread {thread.name} stopped; starting a new one')
+                            threads[i] = start(i)
+                working = any(thread.is_alive() for thread in threads)
+                if sweep_positions:
+                    close_old_connections()
+                    ranked = recompute_dirty_positions(settle_seconds=0 if options['once'] else settle)
+                    if ranked:
+                        self.stdout.write(f'Ranked {ranked} stale section(s)')
+                if not working:
+                    break
+                stop.wait(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the running tasks finish...')
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, worker, stop, options):
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                try:
+                    if run_next_task(worker):
+                        continue
+                    if options['once'] and not BackgroundTask.objects.filter(
+                        status='Pending', run_after__lte=timezone.now()
+                    ).exists():
+                        return
+                except DatabaseError as e:
+                    # Lost a race for the database (e.g. SQLite busy); try again after a pause.
+                    logger.warning(f'Task worker {worker} could not claim a task: {e}')
+                except Exception:
+                    logger.exception(f'Task worker {worker} hit an unexpected error; carrying on')
+                stop.wait(options['sleep'])
+        finally:
+            connection.close()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Session
+from accounts.utils.balances import rebuild_all_balances
+
+
+class Command(BaseCommand):
+    help = 'Rebuild family term balances from payments, refunds and fees'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--session',
+            type=str,
+            help='Only rebuild balances for this session name (e.g. 2024/2025)',
+        )
+
+    def handle(self, *args, **options):
+        session = None
+        if options['session']:
+            session = Session.objects.filter(name=options['session']).first()
+            if not session:
+                self.stdout.write(self.style.ERROR(f"Session {options['session']} not found."))
+                return
+
+        written = rebuild_all_balances(session=session)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} parent term balances.'))
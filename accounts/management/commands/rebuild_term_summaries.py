@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import Session
+from accounts.utils.summaries import rebuild_all_summaries
+
+
+class Command(BaseCommand):
+    help = 'Rebuild student term summaries from Result rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--session',
+            type=str,
+            help='Only rebuild summaries for this session name (e.g. 2024/2025)',
+        )
+
+    def handle(self, *args, **options):
+        session = None
+        if options['session']:
+            session = Session.objects.filter(name=options['session']).first()
+            if not session:
+                self.stdout.write(self.style.ERROR(f"Session {options['session']} not found."))
+                return
+
+        written = rebuild_all_summaries(session=session)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} student term summaries.'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import ClassSection
+from accounts.utils.index import get_current_session_term
+from accounts.utils.positions import recompute_dirty_positions
+from accounts.utils.ranking import rank_section
+
+
+class Command(BaseCommand):
+    help = 'Recompute subject and class positions for sections marked as stale'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--settle',
+            type=int,
+            default=0,
+            help='Only rank sections with no score changes in the last N seconds (default: 0)',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Rank every active section of the current session and term, stale or not',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            session, term = get_current_session_term()
+            sections = ClassSection.objects.filter(session=session, is_active=True).select_related('school_class')
+            for section in sections:
+                rank_section(section, session, term)
+            self.stdout.write(self.style.SUCCESS(f'Ranked {len(sections)} section(s) for {session.name} term {term}'))
+            return
+
+        ranked = recompute_dirty_positions(settle_seconds=options['settle'])
+        self.stdout.write(self.style.SUCCESS(f'Ranked {ranked} stale section(s)'))
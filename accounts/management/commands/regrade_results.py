@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import Result, Session
+from accounts.utils.grading import regrade_results
+
+
+class Command(BaseCommand):
+    help = 'Recompute totals, grades and grade points for a term after a grading policy change'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'session',
+            type=str,
+            help='Session name (e.g. 2024/2025)',
+        )
+        parser.add_argument(
+            '--term',
+            type=str,
+            choices=[t[0] for t in TERM_CHOICES],
+            help='Only regrade this term (default: every term of the session)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of results written per bulk update (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        session = Session.objects.filter(name=options['session']).first()
+        if not session:
+            self.stdout.write(self.style.ERROR(f"Session {options['session']} not found."))
+            return
+
+        results = Result.objects.filter(session=session)
+        if options['term']:
+            results = results.filter(term=options['term'])
+
+        written = regrade_results(results, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Regraded {written} results for {session.name}.'))
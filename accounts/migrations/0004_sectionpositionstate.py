@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-16 19:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_student_token_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='token',
+            field=models.CharField(default='1nYn96tkh9', max_length=10, unique=True),
+        ),
+        migrations.CreateModel(
+            name='SectionPositionState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(choices=[('1', 'First Term'), ('2', 'Second Term'), ('3', 'Third Term')], max_length=1)),
+                ('is_dirty', models.BooleanField(default=True)),
+                ('version', models.PositiveIntegerField(default=0)),
+                ('marked_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ranked_at', models.DateTimeField(blank=True, null=True)),
+                ('section', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='position_states', to='accounts.classsection')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.session')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['is_dirty', 'marked_at'], name='accounts_se_is_dirt_027f2c_idx')],
+                'unique_together': {('section', 'session', 'term')},
+            },
+        ),
+    ]
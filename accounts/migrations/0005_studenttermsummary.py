@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-16 19:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_sectionpositionstate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='token',
+            field=models.CharField(default='gd4WrdAakQ', max_length=10, unique=True),
+        ),
+        migrations.CreateModel(
+            name='StudentTermSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(choices=[('1', 'First Term'), ('2', 'Second Term'), ('3', 'Third Term')], max_length=1)),
+                ('subject_count', models.PositiveIntegerField(default=0)),
+                ('assigned_count', models.PositiveIntegerField(default=0)),
+                ('scored_count', models.PositiveIntegerField(default=0)),
+                ('total_score', models.FloatField(default=0.0)),
+                ('average_score', models.FloatField(default=0.0)),
+                ('average_grade_point', models.FloatField(default=0.0)),
+                ('is_complete', models.BooleanField(default=False)),
+                ('class_position', models.CharField(blank=True, max_length=10)),
+                ('class_position_gp', models.CharField(blank=True, max_length=10)),
+                ('section_size', models.PositiveIntegerField(default=0)),
+                ('last_upload', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('section', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='term_summaries', to='accounts.classsection')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.session')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_summaries', to='accounts.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['section', 'session', 'term'], name='accounts_st_section_ed9883_idx'), models.Index(fields=['session', 'term'], name='accounts_st_session_c1a6ed_idx')],
+                'unique_together': {('student', 'session', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.7 on 2026-10-16 19:44
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_studenttermsummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='token',
+            field=models.CharField(default='9lJRiv2kNQ', max_length=10, unique=True),
+        ),
+        migrations.CreateModel(
+            name='GradeScale',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('Nursery', 'Nursery'), ('Primary', 'Primary'), ('Junior', 'Junior'), ('Senior', 'Senior')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('session', models.ForeignKey(blank=True, help_text='Leave empty for the default scale used by every session.', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='grade_scales', to='accounts.session')),
+            ],
+            options={
+                'unique_together': {('section', 'session')},
+            },
+        ),
+        migrations.CreateModel(
+            name='GradeBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('min_score', models.FloatField(validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('grade', models.CharField(max_length=5)),
+                ('grade_point', models.FloatField(blank=True, null=True)),
+                ('description', models.CharField(blank=True, max_length=50)),
+                ('scale', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bands', to='accounts.gradescale')),
+            ],
+            options={
+                'ordering': ['scale', '-min_score'],
+                'unique_together': {('scale', 'min_score')},
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:25
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_backgroundtask'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='student',
+            name='token',
+            field=models.CharField(default='THcQY2EJVW', max_length=10, unique=True),
+        ),
+        migrations.CreateModel(
+            name='ParentTermBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(choices=[('1', 'First Term'), ('2', 'Second Term'), ('3', 'Third Term')], max_length=1)),
+                ('total_fees', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('total_paid', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('total_refunded', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('amount_due', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=12)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Partial', 'Partial'), ('Completed', 'Completed')], default='Pending', max_length=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('parent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='term_balances', to='accounts.parent')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.session')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['session', 'term', 'status'], name='accounts_pa_session_f895e9_idx')],
+                'unique_together': {('parent', 'session', 'term')},
+            },
+        ),
+    ]
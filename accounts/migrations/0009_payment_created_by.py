@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-16 20:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0008_parenttermbalance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='created_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='recorded_payments', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='student',
+            name='token',
+            field=models.CharField(default='AEiN9LyTTf', max_length=10, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['session', 'term', 'created_at'], name='accounts_pa_session_5610dd_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_payment_created_by'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='receipt_details',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
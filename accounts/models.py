@@ -7,7 +7,7 @@ from django.utils.crypto import get_random_string
 import random
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
-from accounts.constants import CLASS_LEVELS, TERM_CHOICES, PAYMENT_STATUS_CHOICES
+from accounts.constants import BALANCE_STATUS_CHOICES, CLASS_LEVELS, TERM_CHOICES, PAYMENT_STATUS_CHOICES
 from django.db.models import Avg, Sum
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
@@ -158,51 +158,14 @@ class Parent(models.Model):
         return self.full_name or self.phone_number
 
     def get_total_fees_for_term(self, session, term):
-        """Calculate total fees for all students under this parent for a session and term."""
-        students = self.students.filter(is_active=True).select_related('current_class')
-        total = Decimal(0)
-        for student in students:
-            if not student.current_class or not student.current_class.section:
-                continue
-            # Check for student-specific fee override
-            override = StudentFeeOverride.objects.filter(student=student, session=session, term=term).first()
-            if override:
-                total += override.amount
-                continue
-            fee = FeeStructure.objects.filter(
-                session=session,
-                term=term,
-                class_level=student.current_class
-            ).first()
-            total += fee.amount if fee else Decimal(0)
-        if term == '1':
-            pta_dues = PTADues.objects.filter(session=session, term=term).first()
-            total += pta_dues.amount if pta_dues else Decimal('2000.00')
-        return total
+        """Total fees for all students under this parent for a session and term, from the balance ledger."""
+        from accounts.utils.balances import term_balance
+        return term_balance(self, session, term).total_fees
 
     def get_payment_status_for_term(self, session, term):
-        """Check payment status for a session and term, including refunds."""
-        total_fees = self.get_total_fees_for_term(session, term)
-        payments = self.payments.filter(
-            session=session,
-            term=term,
-            status='Completed'
-        ).aggregate(total_paid=Sum('amount'))
-        refunds = Refund.objects.filter(
-            parent=self,
-            session=session,
-            term=term
-        ).aggregate(total_refunded=Sum('amount'))['total_refunded'] or Decimal(0)
-        amount_paid = (payments['total_paid'] or Decimal(0)) - refunds
-        if amount_paid < 0:
-            amount_paid = Decimal(0)
-        amount_due = max(total_fees - amount_paid, Decimal(0))
-        return {
-            'status': 'Completed' if amount_due <= 0 else 'Partial' if amount_paid > 0 else 'Pending',
-            'amount_paid': amount_paid,
-            'amount_due': amount_due,
-            'total_fees': total_fees
-        }
+        """Payment status for a session and term, including refunds, from the balance ledger."""
+        from accounts.utils.balances import term_balance
+        return term_balance(self, session, term).payment_status()
 
     def has_completed_previous_term_payments(self, session, term):
         """Check if all previous terms' payments are completed."""
@@ -237,6 +200,7 @@ class Student(models.Model):
     token = models.CharField(max_length=10, unique=True, default=get_random_string(10))
     photo = CloudinaryField('image', folder='riseschools/student_photos/', null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='student', null=True, blank=True)
     parent = models.ForeignKey('Parent', on_delete=models.SET_NULL, null=True, related_name='students')
     is_active = models.BooleanField(default=True)
@@ -417,6 +381,36 @@ class StudentSubject(models.Model):
     def __str__(self):
         return f"{self.student.full_name} - {self.subject.name} ({self.session.name}, Term {self.term})"
 
+class GradeScale(models.Model):
+    """Grade bands for a school section, optionally specific to one session."""
+    section = models.CharField(max_length=20, choices=[
+        ('Nursery', 'Nursery'), ('Primary', 'Primary'), ('Junior', 'Junior'), ('Senior', 'Senior')
+    ])
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, null=True, blank=True, related_name='grade_scales',
+                                help_text='Leave empty for the default scale used by every session.')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('section', 'session')
+
+    def __str__(self):
+        return f"{self.section} grading ({self.session.name if self.session else 'default'})"
+
+class GradeBand(models.Model):
+    scale = models.ForeignKey(GradeScale, on_delete=models.CASCADE, related_name='bands')
+    min_score = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(100)])
+    grade = models.CharField(max_length=5)
+    grade_point = models.FloatField(null=True, blank=True)
+    description = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        unique_together = ('scale', 'min_score')
+        ordering = ['scale', '-min_score']
+
+    def __str__(self):
+        return f"{self.grade} (>= {self.min_score})"
+
 class Result(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='results')
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
@@ -465,85 +459,11 @@ class Result(models.Model):
         ).exists():
             raise ValidationError(f"Subject {self.subject.name} is not assigned to {self.student.full_name} for this term")
         
-    def save(self, *args, **kwargs):
-        section = self.student.current_class.section if self.student.current_class else None
-        
-        if section == 'Nursery':
-            self.total_score = self.total_marks or 0
-            if self.total_score >= 95:
-                self.grade, self.grade_point, self.description = 'A+', None, 'Distinction'
-            elif self.total_score >= 90:
-                self.grade, self.grade_point, self.description = 'A', None, 'Excellent'
-            elif self.total_score >= 85:
-                self.grade, self.grade_point, self.description = 'B+', None, 'Very Good'
-            elif self.total_score >= 80:
-                self.grade, self.grade_point, self.description = 'B', None, 'Good'
-            elif self.total_score >= 70:
-                self.grade, self.grade_point, self.description = 'C+', None, 'Credit'
-            elif self.total_score >= 65:
-                self.grade, self.grade_point, self.description = 'C', None, 'Average'
-            elif self.total_score >= 60:
-                self.grade, self.grade_point, self.description = 'D', None, 'Fair'
-            elif self.total_score >= 50:
-                self.grade, self.grade_point, self.description = 'E', None, 'Pass'
-            else:
-                self.grade, self.grade_point, self.description = 'F9', None, 'Fail'
-        elif section == 'Primary':
-            self.total_score = (self.test or 0) + (self.homework or 0) + (self.classwork or 0) + (self.nursery_primary_exam or 0)
-            if self.total_score >= 95:
-                self.grade, self.grade_point, self.description = 'A+', None, 'Distinction'
-            elif self.total_score >= 90:
-                self.grade, self.grade_point, self.description = 'A', None, 'Excellent'
-            elif self.total_score >= 85:
-                self.grade, self.grade_point, self.description = 'B+', None, 'Very Good'
-            elif self.total_score >= 80:
-                self.grade, self.grade_point, self.description = 'B', None, 'Good'
-            elif self.total_score >= 70:
-                self.grade, self.grade_point, self.description = 'C+', None, 'Credit'
-            elif self.total_score >= 65:
-                self.grade, self.grade_point, self.description = 'C', None, 'Average'
-            elif self.total_score >= 60:
-                self.grade, self.grade_point, self.description = 'D', None, 'Fair'
-            elif self.total_score >= 50:
-                self.grade, self.grade_point, self.description = 'E', None, 'Pass'
-            else:
-                self.grade, self.grade_point, self.description = 'F9', None, 'Fail'
-        elif section == 'Junior':
-            self.total_score = (self.ca or 0) + (self.test_1 or 0) + (self.test_2 or 0) + (self.exam or 0)
-            if self.total_score >= 90:
-                self.grade, self.grade_point, self.description = 'A+', 4.0, 'Distinction'
-            elif self.total_score >= 80:
-                self.grade, self.grade_point, self.description = 'A', 3.5, 'Excellent'
-            elif self.total_score >= 70:
-                self.grade, self.grade_point, self.description = 'B', 3.0, 'Good'
-            elif self.total_score >= 60:
-                self.grade, self.grade_point, self.description = 'C', 2.5, 'Above Average'
-            elif self.total_score >= 50:
-                self.grade, self.grade_point, self.description = 'D', 2.0, 'Average'
-            elif self.total_score >= 40:
-                self.grade, self.grade_point, self.description = 'E', 1.5, 'Average'
-            else:
-                self.grade, self.grade_point, self.description = 'F', 1.0, 'Poor'
-        else:
-            self.total_score = (self.ca or 0) + (self.test_1 or 0) + (self.test_2 or 0) + (self.exam or 0)
-            if self.total_score >= 90:
-                self.grade, self.grade_point, self.description = 'A1', 5.0, 'Distinction'
-            elif self.total_score >= 85:
-                self.grade, self.grade_point, self.description = 'B2', 4.5, 'Excellent'
-            elif self.total_score >= 80:
-                self.grade, self.grade_point, self.description = 'B3', 4.0, 'Very Good'
-            elif self.total_score >= 70:
-                self.grade, self.grade_point, self.description = 'C4', 3.5, 'Good'
-            elif self.total_score >= 60:
-                self.grade, self.grade_point, self.description = 'C5', 3.0, 'Above Avg.'
-            elif self.total_score >= 50:
-                self.grade, self.grade_point, self.description = 'C6', 2.5, 'Average'
-            elif self.total_score >= 45:
-                self.grade, self.grade_point, self.description = 'D7', 2.0, 'Below Avg.'
-            elif self.total_score >= 40:
-                self.grade, self.grade_point, self.description = 'E8', 1.5, 'Fair'
-            else:
-                self.grade, self.grade_point, self.description = 'F9', 1.0, 'Fail'
+    def save(self, *args, section=None, **kwargs):
+        """`section` is the student's school section, when the caller already knows it."""
+        from accounts.utils.grading import apply_grade, result_section
+
+        apply_grade(self, section or result_section(self))
 
         if self.remarks:
             self.remarks = self.remarks.strip()
@@ -562,6 +482,88 @@ class Result(models.Model):
         term_end = timezone.datetime.strptime(term_end_dates.get(self.term), "%Y-%m-%d").date()
         return timezone.now().date() <= term_end
 
+class StudentTermSummary(models.Model):
+    """Per-student, per-term aggregates of Result rows, kept in sync on Result writes."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='term_summaries')
+    session = models.ForeignKey(Session, on_delete=models.CASCADE)
+    term = models.CharField(max_length=1, choices=TERM_CHOICES)
+    section = models.ForeignKey(ClassSection, on_delete=models.SET_NULL, null=True, blank=True, related_name='term_summaries')
+    subject_count = models.PositiveIntegerField(default=0)
+    assigned_count = models.PositiveIntegerField(default=0)
+    scored_count = models.PositiveIntegerField(default=0)
+    total_score = models.FloatField(default=0.0)
+    average_score = models.FloatField(default=0.0)
+    average_grade_point = models.FloatField(default=0.0)
+    is_complete = models.BooleanField(default=False)
+    class_position = models.CharField(max_length=10, blank=True)
+    class_position_gp = models.CharField(max_length=10, blank=True)
+    section_size = models.PositiveIntegerField(default=0)
+    last_upload = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'session', 'term')
+        indexes = [
+            models.Index(fields=['section', 'session', 'term']),
+            models.Index(fields=['session', 'term']),
+        ]
+
+    def __str__(self):
+        return f"{self.student.full_name} - {self.session.name} Term {self.term}"
+
+class SectionPositionState(models.Model):
+    """Tracks whether the stored positions of a section/term are out of date."""
+    section = models.ForeignKey(ClassSection, on_delete=models.CASCADE, related_name='position_states')
+    session = models.ForeignKey(Session, on_delete=models.CASCADE)
+    term = models.CharField(max_length=1, choices=TERM_CHOICES)
+    is_dirty = models.BooleanField(default=True)
+    version = models.PositiveIntegerField(default=0)
+    marked_at = models.DateTimeField(default=timezone.now)
+    ranked_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('section', 'session', 'term')
+        indexes = [
+            models.Index(fields=['is_dirty', 'marked_at']),
+        ]
+
+    def __str__(self):
+        state = 'dirty' if self.is_dirty else 'clean'
+        return f"{self.section} - {self.session.name} Term {self.term} ({state})"
+
+class BackgroundTask(models.Model):
+    """A unit of work queued for the process_tasks worker."""
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    progress = models.PositiveSmallIntegerField(default=0)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='background_tasks')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
 class StudentClassHistory(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='class_history')
     session = models.ForeignKey(Session, on_delete=models.CASCADE)
@@ -690,6 +692,7 @@ class Refund(models.Model):
     )
     reason = models.TextField(default="Fee reduction overpayment")
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
 
     class Meta:
@@ -710,6 +713,11 @@ class Payment(models.Model):
     transaction_id = models.CharField(max_length=36, unique=True, default=uuid.uuid4)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='Pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also touched when the payment's students change, see signals.payment_students_changed.
+    updated_at = models.DateTimeField(auto_now=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='recorded_payments')
+    # Fee total and students' classes as printed on the receipt, fixed when it is first issued.
+    receipt_details = models.JSONField(null=True, blank=True, editable=False)
 
     def __str__(self):
         student_names = ", ".join([student.full_name for student in self.students.all()])
@@ -720,34 +728,53 @@ class Payment(models.Model):
             models.Index(fields=['transaction_id']),
             models.Index(fields=['parent', 'session', 'term']),
             models.Index(fields=['parent', 'session', 'term', 'status']),
+            models.Index(fields=['session', 'term', 'created_at']),
         ]
 
     def calculate_total_fee(self):
-        """Calculate total fee based on students' class levels, including overrides."""
-        total = Decimal('0')
-        for student in self.students.select_related('current_class').all():
-            if not student.current_class:
-                continue
-            override = StudentFeeOverride.objects.filter(student=student, session=self.session, term=self.term).first()
-            if override:
-                total += override.amount
-                continue
-            fee = FeeStructure.objects.filter(
-                session=self.session,
-                term=self.term,
-                class_level=student.current_class
-            ).first()
-            total += fee.amount if fee else Decimal('0')
-        if self.term == '1':
-            pta_dues = PTADues.objects.filter(session=self.session, term=self.term).first()
-            total += pta_dues.amount if pta_dues else Decimal('2000.00')
-        return total
+        """Total fee of the students on this payment, including overrides and PTA dues."""
+        from accounts.utils.fees import FeeResolver
+        return FeeResolver.for_term(self.session_id, self.term).family_fees(self.students.all())
 
     def save(self, *args, **kwargs):
         if not self.transaction_id:
             self.transaction_id = str(uuid.uuid4())
         super().save(*args, **kwargs)
 
+class ParentTermBalance(models.Model):
+    """Per-family, per-term fees, payments and refunds, kept in sync on payment and fee changes."""
+    parent = models.ForeignKey(Parent, on_delete=models.CASCADE, related_name='term_balances')
+    session = models.ForeignKey(Session, on_delete=models.CASCADE)
+    term = models.CharField(max_length=1, choices=TERM_CHOICES)
+    total_fees = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    total_paid = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    total_refunded = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    amount_due = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal('0'))
+    status = models.CharField(max_length=10, choices=BALANCE_STATUS_CHOICES, default='Pending')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('parent', 'session', 'term')
+        indexes = [
+            models.Index(fields=['session', 'term', 'status']),
+        ]
+
+    def __str__(self):
+        return f"{self.parent} - {self.session.name} Term {self.term} ({self.status})"
+
+    @property
+    def amount_paid(self):
+        """Completed payments less refunds, never below zero."""
+        return max(self.total_paid - self.total_refunded, Decimal(0))
+
+    def payment_status(self):
+        return {
+            'status': self.status,
+            'amount_paid': self.amount_paid,
+            'amount_due': self.amount_due,
+            'total_fees': self.total_fees,
+        }
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
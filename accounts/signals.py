@@ -1,9 +1,21 @@
-from django.db.models.signals import pre_save
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth import logout
-from django.contrib.sessions.models import Session
+from django.contrib.sessions.models import Session as AuthSession
 from django.utils import timezone
-from .models import Student
+from .models import (
+    FeeStructure, GradeBand, GradeScale, Parent, Payment, PTADues, Refund, Result, Session, Student,
+    StudentFeeOverride, StudentSubject,
+)
+from .utils.balances import (
+    refresh_class_balances, refresh_family_balances, refresh_parent_balances, refresh_student_balances,
+    refresh_term_balances,
+)
+from .utils.grading import clear_scale_cache
+from .utils.positions import mark_positions_dirty
+from .utils.result_tracking import invalidate_result_tracking
+from .utils.summaries import refresh_student_term_summary
 
 @receiver(pre_save, sender=Student)
 def student_token_changed(sender, instance, **kwargs):
@@ -12,7 +24,7 @@ def student_token_changed(sender, instance, **kwargs):
             old_student = Student.objects.get(pk=instance.pk)
             if old_student.token != instance.token:
                 if instance.user:
-                    sessions = Session.objects.filter(
+                    sessions = AuthSession.objects.filter(
                         expire_date__gte=timezone.now()
                     )
                     for session in sessions:
@@ -23,4 +35,116 @@ def student_token_changed(sender, instance, **kwargs):
                     instance.user.set_password(instance.token)
                     instance.user.save()
         except Student.DoesNotExist:
-            pass
\ No newline at end of file
+            pass
+
+def _current_section_id(instance):
+    if type(instance).student.is_cached(instance):
+        return instance.student.current_section_id
+    return Student.objects.filter(pk=instance.student_id).values_list('current_section_id', flat=True).first()
+
+@receiver([post_save, post_delete], sender=Result)
+@receiver([post_save, post_delete], sender=StudentSubject)
+def result_positions_changed(sender, instance, **kwargs):
+    """The student's summary is refreshed now; only the section's positions wait for the ranking pass."""
+    refresh_student_term_summary(instance.student_id, instance.session_id, instance.term)
+    section_id = _current_section_id(instance)
+    if section_id:
+        mark_positions_dirty(section_id, instance.session_id, instance.term)
+
+@receiver([post_save, post_delete], sender=GradeScale)
+@receiver([post_save, post_delete], sender=GradeBand)
+def grade_scale_changed(sender, instance, **kwargs):
+    if sender is GradeBand:
+        # Other processes notice scale changes through GradeScale.updated_at.
+        GradeScale.objects.filter(pk=instance.scale_id).update(updated_at=timezone.now())
+    clear_scale_cache()
+
+def _deleted_with_owner(origin):
+    """True when a delete cascades from a Parent or Session, whose balances go with it."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in (Parent, Session)
+
+@receiver(m2m_changed, sender=Payment.students.through)
+def payment_students_changed(sender, instance, action, pk_set, **kwargs):
+    # Other processes notice the change through Payment.updated_at, as they do for other payment edits.
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if isinstance(instance, Payment):
+        payments = Payment.objects.filter(pk=instance.pk)
+    elif pk_set is not None:
+        payments = Payment.objects.filter(pk__in=pk_set)
+    else:
+        payments = Payment.objects.filter(students=instance)
+    payments.update(updated_at=timezone.now())
+
+@receiver([post_save, post_delete], sender=Payment)
+@receiver([post_save, post_delete], sender=Refund)
+def parent_balance_changed(sender, instance, origin=None, **kwargs):
+    if origin is not None and _deleted_with_owner(origin):
+        return
+    refresh_parent_balances([instance.parent_id], instance.session_id, instance.term)
+
+FEE_TARGET_FIELDS = {FeeStructure: 'class_level_id', StudentFeeOverride: 'student_id'}
+
+@receiver(pre_save, sender=FeeStructure)
+@receiver(pre_save, sender=StudentFeeOverride)
+def fee_target_loaded(sender, instance, **kwargs):
+    fields = (FEE_TARGET_FIELDS[sender], 'session_id', 'term')
+    instance._fee_target_before = sender.objects.filter(pk=instance.pk).values_list(*fields).first() if instance.pk else None
+
+def _fee_targets(instance):
+    """(class level or student, session_id, term) of the fee now and, if the save moved it, before."""
+    targets = {(getattr(instance, FEE_TARGET_FIELDS[type(instance)]), instance.session_id, instance.term)}
+    before = instance.__dict__.pop('_fee_target_before', None)
+    if before:
+        targets.add(before)
+    return targets
+
+@receiver([post_save, post_delete], sender=StudentFeeOverride)
+def fee_override_changed(sender, instance, origin=None, **kwargs):
+    if origin is not None and _deleted_with_owner(origin):
+        return
+    for student_id, session_id, term in _fee_targets(instance):
+        refresh_student_balances(student_id, session_id, term)
+
+@receiver([post_save, post_delete], sender=FeeStructure)
+def fee_structure_changed(sender, instance, origin=None, **kwargs):
+    if origin is not None and _deleted_with_owner(origin):
+        return
+    for class_level_id, session_id, term in _fee_targets(instance):
+        refresh_class_balances(class_level_id, session_id, term)
+
+@receiver([post_save, post_delete], sender=PTADues)
+def pta_dues_changed(sender, instance, origin=None, **kwargs):
+    if origin is not None and _deleted_with_owner(origin):
+        return
+    refresh_term_balances(instance.session_id, instance.term)
+
+ENROLMENT_FIELDS = ('parent_id', 'current_class_id', 'is_active')
+TRACKING_FIELDS = ('current_section_id', 'is_active', 'surname', 'first_name', 'middle_name')
+
+@receiver(pre_save, sender=Student)
+def student_enrolment_loaded(sender, instance, **kwargs):
+    fields = set(ENROLMENT_FIELDS) | set(TRACKING_FIELDS)
+    instance._enrolment_before = Student.objects.filter(pk=instance.pk).values(*fields).first()
+
+@receiver(post_save, sender=Student)
+def student_enrolment_changed(sender, instance, **kwargs):
+    before = getattr(instance, '_enrolment_before', None)
+
+    def changed(fields):
+        return before is None or any(before[field] != getattr(instance, field) for field in fields)
+
+    if changed(TRACKING_FIELDS):
+        invalidate_result_tracking()
+    if not changed(ENROLMENT_FIELDS):
+        return
+    for parent_id in {before['parent_id'] if before else None, instance.parent_id}:
+        if parent_id:
+            refresh_family_balances(parent_id)
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    invalidate_result_tracking()
+    if instance.parent_id:
+        refresh_family_balances(instance.parent_id)
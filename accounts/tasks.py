@@ -0,0 +1,84 @@
+"""
+Background tasks run by the process_tasks worker. See accounts.utils.tasks.
+"""
+import tempfile
+
+from django.core.files import File
+from django.core.files.base import ContentFile
+
+from accounts.models import ClassSection, SchoolClass, Session
+from accounts.utils.positions import recompute_dirty_positions
+from accounts.utils.promotions import promote_students
+from accounts.utils.receipts import bulk_receipt_payments, merge_receipts
+from accounts.utils.report_cards import render_report_cards, report_card_students
+from accounts.utils.report_pdfs import render_report_pdf
+from accounts.utils.tasks import report_progress, task, task_file_storage
+
+
+@task('report_cards')
+def report_cards_task(background_task, session_id, term, section_id=None, class_level_id=None, output_format='pdf'):
+    """Render the report cards of a section or class level and store the merged PDF or ZIP."""
+    session = Session.objects.get(pk=session_id)
+    if section_id:
+        section = ClassSection.objects.select_related('school_class').get(pk=section_id)
+        students = report_card_students(session, term, section=section)
+        label = f"{section.school_class.level}{section.suffix}"
+    else:
+        school_class = SchoolClass.objects.get(pk=class_level_id)
+        students = report_card_students(session, term, school_class=school_class)
+        label = school_class.level
+
+    filename = f"Report_Cards_{label}_{session.name}_Term{term}.{output_format}".replace('/', '-').replace(' ', '_')
+    with tempfile.TemporaryFile() as output:
+        count = render_report_cards(
+            students,
+            session,
+            term,
+            output,
+            output_format=output_format,
+            progress=lambda done, total: report_progress(background_task, done, total),
+        )
+        output.seek(0)
+        name = task_file_storage().save(f"tasks/{background_task.pk}/{filename}", File(output, name=filename))
+    return {'file': name, 'filename': filename, 'count': count}
+
+
+@task('recompute_positions')
+def recompute_positions_task(background_task, settle_seconds=0):
+    return {'ranked': recompute_dirty_positions(settle_seconds=settle_seconds)}
+
+
+@task('report_pdf')
+def report_pdf_task(background_task, report, session_id, term, native=False, **options):
+    """Render a bursary report PDF (see accounts.utils.report_pdfs) and store it."""
+    session = Session.objects.get(pk=session_id)
+    pdf, filename = render_report_pdf(report, session, term, native, **options)
+    name = task_file_storage().save(f"tasks/{background_task.pk}/{filename}", ContentFile(pdf, name=filename))
+    return {'file': name, 'filename': filename}
+
+
+@task('bulk_receipts')
+def bulk_receipts_task(background_task, label, start_date=None, end_date=None, session_id=None, term=None):
+    """Merge the receipts of the completed payments of a date range or term into one stored PDF."""
+    payments = bulk_receipt_payments(start_date, end_date, session_id, term)
+    filename = f"receipts_{label}.pdf"
+    with tempfile.TemporaryFile() as output:
+        count = merge_receipts(
+            payments, output, progress=lambda done, total: report_progress(background_task, done, total)
+        )
+        output.seek(0)
+        name = task_file_storage().save(f"tasks/{background_task.pk}/{filename}", File(output, name=filename))
+    return {'file': name, 'filename': filename, 'count': count}
+
+
+@task('promote_students')
+def promote_students_task(background_task, action, current_session_id, next_session_id, student_ids=None, username=''):
+    moved, warnings = promote_students(
+        action,
+        student_ids,
+        Session.objects.get(pk=current_session_id),
+        Session.objects.get(pk=next_session_id),
+        username,
+        progress=lambda done, total: report_progress(background_task, done, total),
+    )
+    return {'moved': moved, 'warnings': warnings}
@@ -40,3 +40,8 @@ def ordinal_suffix(value):
     except (ValueError, TypeError):
         return ''
         
+
+@register.filter
+def attribute(obj, name):
+    """Return getattr(obj, name), or '' when obj is None or lacks the attribute."""
+    return getattr(obj, name, '') if obj is not None else ''
@@ -1,3 +1,1836 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, User
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session as AuthSession
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook, load_workbook
+from pypdf import PdfReader, PdfWriter
+
+from accounts.models import (
+    BackgroundTask, ClassSection, FeeStructure, GradeBand, GradeScale, Parent, ParentTermBalance, Payment, PTADues, Refund, Result,
+    ResultAccessRequest, SchoolClass, SectionPositionState, Session, Student, StudentClassHistory, StudentFeeOverride, StudentSubject,
+    StudentTermSummary, Subject, Teacher,
+)
+from accounts.utils import balances, daily_payments, fee_statistics, grading, payment_history, pdf_generator, pdf_renderer, positions, promotions, ranking, receipts, report_card_cache, report_cards, table_pdf, tasks, result_access, result_history, result_tracking, summaries
+from accounts.management.commands import process_tasks
+from accounts.tasks import promote_students_task, report_cards_task
+from accounts.utils.broadsheet import build_class_broadsheet
+from accounts.utils.fees import FeeResolver
+from accounts.utils.pdf_benchmark import payment_report_context, peak_memory_kb, receipt_fixture, report_card_fixture
+from accounts.utils.report_cards import render_report_cards, report_card_students
+from accounts.utils.result_import import ImportFormatError, import_results, iter_result_rows
+from accounts.utils.score_entry import ScoreBatchWriter
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests'},
+    'report_cards': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-report-cards'},
+    'receipts': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-receipts'},
+}
+
+
+def ordinal(rank):
+    suffix = 'th' if 10 <= rank % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(rank % 10, 'th')
+    return f"{rank}{suffix}"
+
+
+def hundredths(score):
+    return int(Decimal(repr(score)).scaleb(2).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def python_positions(section, session, term):
+    """Reference implementation: the original in-memory ranking from the teacher views."""
+    students = list(Student.objects.filter(current_section=section))
+    subject_ids = set(StudentSubject.objects.filter(
+        student__in=students, session=session, term=term, subject__is_active=True
+    ).values_list('subject_id', flat=True))
+    results = [
+        r for r in Result.objects.filter(student__in=students, session=session, term=term)
+        if r.subject_id in subject_ids
+    ]
+    positions = {r.pk: {} for r in results}
+
+    by_subject = {}
+    for result in results:
+        by_subject.setdefault(result.subject_id, []).append(result)
+    for subject_results in by_subject.values():
+        prev_score, rank = None, 0
+        for idx, result in enumerate(sorted(subject_results, key=lambda r: r.total_score, reverse=True), 1):
+            if hundredths(result.total_score) != prev_score:
+                rank = idx
+                prev_score = hundredths(result.total_score)
+            positions[result.pk]['subject_position'] = ordinal(rank)
+
+    averages = []
+    for student in students:
+        student_results = [r for r in results if r.student_id == student.pk and r.total_score > 0]
+        if student_results:
+            avg_gp = (
+                sum(r.grade_point for r in student_results if r.grade_point is not None) / len(student_results)
+                if any(r.grade_point is not None for r in student_results)
+                else 0.0
+            )
+            averages.append({
+                # Half up, not Python's round() to even: the rule ranking.py applies in SQL.
+                'avg_marks': (
+                    Decimal(sum(hundredths(r.total_score) for r in student_results)) / len(student_results)
+                ).quantize(Decimal(1), ROUND_HALF_UP),
+                'avg_gp': avg_gp,
+                'results': student_results,
+            })
+    for key, field in (('avg_marks', 'class_position'), ('avg_gp', 'class_position_gp')):
+        if field == 'class_position_gp' and section.school_class.section in ranking.NON_GP_SECTIONS:
+            continue
+        prev, rank = None, 0
+        for idx, entry in enumerate(sorted(averages, key=lambda x: x[key], reverse=True), 1):
+            if entry[key] != prev:
+                rank = idx
+                prev = entry[key]
+            for result in entry['results']:
+                positions[result.pk][field] = ordinal(rank)
+    return positions
+
+
+class SectionFixtureMixin:
+    @classmethod
+    def setUpTestData(cls):
+        cls.session = Session.objects.create(name='2024/2025', start_year=2024, end_year=2025, is_active=True)
+        cls.jss, _ = SchoolClass.objects.get_or_create(level='JSS 2')
+        cls.primary, _ = SchoolClass.objects.get_or_create(level='Primary 3')
+
+    def make_family(self, phone, children=(None,), first_name='Child', surname='Child'):
+        """
+        A parent logging in with `phone` and one active child per class in `children`,
+        named <first_name> <surname><n>. Returns (parent, students).
+        """
+        parent = Parent.objects.create(user=User.objects.create_user(username=phone, password='x'), phone_number=phone)
+        students = [
+            Student.objects.create(
+                first_name=first_name, surname=f"{surname}{i}", date_of_birth=date(2014, 1, 1), address='-', gender='M', enrollment_year='2020',
+                current_class=school_class, parent=parent,
+            )
+            for i, school_class in enumerate(children)
+        ]
+        return parent, students
+
+    def build_section(self, school_class, suffix, seed, size, subject_count):
+        rng = random.Random(seed)
+        section = ClassSection.objects.create(school_class=school_class, suffix=suffix, session=self.session)
+        subjects = [
+            Subject.objects.create(name=f"Subject {seed}-{i}", section=school_class.section, is_active=i != 0)
+            for i in range(subject_count)
+        ]
+        students = Student.objects.bulk_create([
+            Student(
+                admission_number=f"{seed:02d}{suffix}{i:04d}", first_name='Test', surname=f"Student{i}",
+                date_of_birth=date(2012, 1, 1), address='-', gender='M', enrollment_year='2020',
+                current_class=school_class, current_section=section, token=f"{seed:02d}{suffix}tk{i:04d}",
+                is_active=rng.random() > 0.1,
+            )
+            for i in range(size)
+        ])
+        assignments, results = [], []
+        for student in students:
+            for subject in subjects:
+                if rng.random() < 0.15:
+                    continue
+                assignments.append(StudentSubject(student=student, subject=subject, session=self.session, term='1'))
+                # Any two-decimal score, so averages regularly land on a half hundredth.
+                score = rng.choice([0.0, 0.0] + [rng.randint(1000, 10000) / 100 for _ in range(6)])
+                results.append(Result(
+                    student=student, subject=subject, session=self.session, term='1',
+                    total_score=score, grade_point=rng.choice([None, 1.0, 2.0, 2.5, 3.0, 3.5, 4.0]),
+                ))
+        StudentSubject.objects.bulk_create(assignments)
+        Result.objects.bulk_create(results)
+        return section
+
+
+class RankingEngineTests(SectionFixtureMixin, TestCase):
+    def assert_matches_reference(self, section):
+        expected = python_positions(section, self.session, '1')
+        ranking.rank_section(section, self.session, '1')
+        actual = {
+            r['pk']: r for r in Result.objects.filter(pk__in=expected).values(
+                'pk', 'subject_position', 'class_position', 'class_position_gp'
+            )
+        }
+        for pk, fields in expected.items():
+            for field in ('subject_position', 'class_position', 'class_position_gp'):
+                self.assertEqual(actual[pk][field], fields.get(field, ''), f"result {pk} {field}")
+
+    def test_matches_python_ranking_on_random_sections(self):
+        for seed in range(12):
+            school_class = self.jss if seed % 3 else self.primary
+            section = self.build_section(school_class, 'ABC'[seed % 3], seed, size=5 + seed * 3, subject_count=6)
+            with self.subTest(seed=seed):
+                self.assert_matches_reference(section)
+            section.delete()
+
+    def test_averages_on_a_half_hundredth_round_up(self):
+        # 1.005 sits just below the half as a double, so Python's round() would go down.
+        section = ClassSection.objects.create(school_class=self.jss, suffix='H', session=self.session)
+        subjects = [Subject.objects.create(name=f"Half {i}", section=self.jss.section) for i in range(2)]
+        scores = {'H1': [80.01, 80.02], 'H2': [80.02, 80.02], 'H3': [1.0, 1.01], 'H4': [1.01, 1.01]}
+        for admission_number, student_scores in scores.items():
+            student = Student.objects.create(
+                admission_number=admission_number, first_name='Half', surname=admission_number,
+                date_of_birth=date(2012, 1, 1), address='-', gender='M', enrollment_year='2020',
+                current_class=self.jss, current_section=section, token=f"half{admission_number}",
+            )
+            StudentSubject.objects.bulk_create([
+                StudentSubject(student=student, subject=subject, session=self.session, term='1') for subject in subjects
+            ])
+            Result.objects.bulk_create([
+                Result(student=student, subject=subject, session=self.session, term='1', total_score=score)
+                for subject, score in zip(subjects, student_scores)
+            ])
+        self.assert_matches_reference(section)
+        positions = dict(Result.objects.filter(subject=subjects[0]).values_list('student_id', 'class_position'))
+        self.assertEqual(positions, {'H1': '1st', 'H2': '1st', 'H3': '3rd', 'H4': '3rd'})
+
+    def test_correlated_fallback_matches_window_functions(self):
+        section = self.build_section(self.jss, 'A', 99, size=25, subject_count=5)
+        ranking.rank_section(section, self.session, '1')
+        windowed = list(Result.objects.order_by('pk').values_list(
+            'subject_position', 'class_position', 'class_position_gp'))
+        Result.objects.update(subject_position='', class_position='', class_position_gp='')
+        # Old SQLite builds have neither window functions nor UPDATE ... FROM.
+        with mock.patch.object(ranking, '_supports_window_functions', return_value=False), \
+                mock.patch.object(ranking, '_supports_update_from', return_value=False):
+            ranking.rank_section(section, self.session, '1')
+        fallback = list(Result.objects.order_by('pk').values_list(
+            'subject_position', 'class_position', 'class_position_gp'))
+        self.assertEqual(windowed, fallback)
+
+    def test_ranking_is_two_statements(self):
+        section = self.build_section(self.jss, 'B', 7, size=30, subject_count=8)
+        section = ClassSection.objects.select_related('school_class').get(pk=section.pk)
+        with self.assertNumQueries(2):
+            ranking.rank_subject_positions(section.pk, self.session.pk, '1')
+            ranking.rank_class_positions(section.pk, self.session.pk, '1')
+
+
+class StalePositionTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        self.section = self.build_section(self.jss, 'C', 42, size=10, subject_count=4)
+        self.result = Result.objects.filter(student__current_section=self.section).select_related('student').first()
+
+    def state(self):
+        return SectionPositionState.objects.get(section=self.section, session=self.session, term='1')
+
+    def test_result_writes_mark_section_dirty(self):
+        self.assertFalse(positions.positions_are_stale(self.section, self.session, '1'))
+        for score in range(10):
+            self.result.total_marks = score
+            self.result.save()
+        self.assertTrue(positions.positions_are_stale(self.section, self.session, '1'))
+        self.assertEqual(SectionPositionState.objects.count(), 1)
+        self.assertEqual(self.state().version, 10)
+
+    def test_burst_of_writes_is_ranked_once(self):
+        for _ in range(10):
+            self.result.save()
+        with mock.patch.object(positions, 'rank_section', wraps=ranking.rank_section) as rank:
+            self.assertEqual(positions.recompute_dirty_positions(), 1)
+            self.assertEqual(positions.recompute_dirty_positions(), 0)
+        self.assertEqual(rank.call_count, 1)
+        self.assertFalse(self.state().is_dirty)
+
+    def test_write_during_ranking_leaves_section_dirty(self):
+        self.result.save()
+
+        def rank_and_write(*args):
+            ranking.rank_section(*args)
+            positions.mark_positions_dirty(self.section.pk, self.session.pk, '1')
+
+        with mock.patch.object(positions, 'rank_section', side_effect=rank_and_write):
+            positions.recompute_dirty_positions()
+        self.assertTrue(self.state().is_dirty)
+
+    def test_settle_window_defers_recent_marks(self):
+        self.result.save()
+        self.assertEqual(positions.recompute_dirty_positions(settle_seconds=60), 0)
+        self.assertTrue(self.state().is_dirty)
+
+
+class BroadsheetTests(SectionFixtureMixin, TestCase):
+    def test_query_count_does_not_grow_with_section_size(self):
+        small = self.build_section(self.jss, 'A', 1, size=3, subject_count=2)
+        large = self.build_section(self.jss, 'B', 2, size=40, subject_count=15)
+        for section in (small, large):
+            with self.subTest(size=section.students.count()), self.assertNumQueries(5):
+                build_class_broadsheet(section, self.session, '1')
+
+    def test_rows_and_averages(self):
+        section = self.build_section(self.jss, 'C', 3, size=12, subject_count=5)
+        broadsheet = build_class_broadsheet(section, self.session, '1')
+        active = Student.objects.filter(current_section=section, is_active=True)
+        self.assertEqual(broadsheet['total_students'], active.count())
+        self.assertEqual(len(broadsheet['rows']), active.count())
+        averages = [row['average_score'] for row in broadsheet['rows']]
+        self.assertEqual(averages, sorted(averages, reverse=True))
+        for subject in broadsheet['subjects']:
+            scores = list(Result.objects.filter(
+                student__in=active, session=self.session, term='1', subject=subject, total_score__gt=0
+            ).values_list('total_score', flat=True))
+            self.assertEqual(broadsheet['class_averages'][subject.id]['count'], len(scores))
+        for row in broadsheet['rows']:
+            for subject_id, cell in row['results'].items():
+                if cell['result_obj'] is not None:
+                    self.assertTrue(cell['is_assigned'])
+                    self.assertEqual(cell['result_obj'].student_id, row['student'].pk)
+
+
+class StudentTermSummaryTests(SectionFixtureMixin, TestCase):
+    def assert_summary_matches_results(self, student):
+        summary = StudentTermSummary.objects.get(student=student, session=self.session, term='1')
+        results = Result.objects.filter(student=student, session=self.session, term='1')
+        scored = [r for r in results if r.total_score > 0]
+        self.assertEqual(summary.subject_count, len(results))
+        self.assertEqual(summary.scored_count, len(scored))
+        self.assertAlmostEqual(summary.total_score, sum(r.total_score for r in scored))
+        if scored:
+            self.assertAlmostEqual(summary.average_score, sum(r.total_score for r in scored) / len(scored))
+            self.assertAlmostEqual(
+                summary.average_grade_point, sum(r.grade_point or 0 for r in scored) / len(scored)
+            )
+            positions_seen = {r.class_position for r in scored if r.class_position}
+            self.assertLessEqual(len(positions_seen), 1)
+            self.assertEqual(summary.class_position, positions_seen.pop() if positions_seen else '')
+        return summary
+
+    def test_rebuild_and_ranking_fill_summaries(self):
+        section = self.build_section(self.jss, 'A', 5, size=15, subject_count=4)
+        ranking.rank_section(section, self.session, '1')
+        rebuilt = summaries.rebuild_all_summaries()
+        students = Student.objects.filter(current_section=section, results__isnull=False).distinct()
+        self.assertEqual(rebuilt, students.count())
+        ranked = StudentTermSummary.objects.filter(section=section, scored_count__gt=0).count()
+        for student in students:
+            summary = self.assert_summary_matches_results(student)
+            self.assertEqual(summary.section_id, section.pk)
+            self.assertEqual(summary.section_size, ranked)
+
+    def test_result_save_refreshes_summary(self):
+        section = self.build_section(self.jss, 'B', 6, size=4, subject_count=3)
+        result = Result.objects.filter(student__current_section=section).select_related('student').first()
+        result.total_marks = 0
+        result.ca, result.test_1, result.test_2, result.exam = 10, 10, 10, 60
+        result.save()
+        positions.recompute_dirty_positions()
+        summary = self.assert_summary_matches_results(result.student)
+        self.assertGreater(summary.average_score, 0)
+        result.delete()
+        positions.recompute_dirty_positions()
+        self.assert_summary_matches_results(result.student)
+
+    def test_result_writes_refresh_summaries_before_the_ranking_pass(self):
+        section = self.build_section(self.jss, 'C', 7, size=4, subject_count=3)
+        results = list(Result.objects.filter(student__current_section=section).select_related('student__current_class'))
+        with mock.patch.object(summaries, '_aggregate', wraps=summaries._aggregate) as aggregate:
+            for result in results:
+                result.exam = 50
+                result.save()
+                self.assert_summary_matches_results(result.student)
+            self.assertEqual(aggregate.call_count, len(results))
+            self.assertTrue(SectionPositionState.objects.get(section=section, session=self.session, term='1').is_dirty)
+            positions.recompute_dirty_positions()
+        self.assertEqual(aggregate.call_count, len(results) + 1)
+        for result in results:
+            self.assert_summary_matches_results(result.student)
+
+    def test_average_agrees_with_class_position(self):
+        section = self.build_section(self.jss, 'D', 8, size=2, subject_count=4)
+        subjects = list(Subject.objects.filter(is_active=True, name__startswith='Subject 8-'))
+        partial, full = Student.objects.filter(current_section=section).order_by('pk')
+        StudentSubject.objects.filter(student__current_section=section).delete()
+        Result.objects.filter(student__current_section=section).delete()
+        StudentSubject.objects.bulk_create([
+            StudentSubject(student=student, subject=subject, session=self.session, term='1')
+            for student in (partial, full) for subject in subjects
+        ])
+        Result.objects.bulk_create(
+            [Result(student=partial, subject=s, session=self.session, term='1', total_score=90) for s in subjects[:2]]
+            + [Result(student=full, subject=s, session=self.session, term='1', total_score=80) for s in subjects]
+        )
+        ranking.rank_section(section, self.session, '1')
+        ranked = {
+            s.student_id: s for s in StudentTermSummary.objects.filter(section=section, session=self.session, term='1')
+        }
+        self.assertEqual((ranked[partial.pk].average_score, ranked[partial.pk].class_position), (90, '1st'))
+        self.assertEqual((ranked[full.pk].average_score, ranked[full.pk].class_position), (80, '2nd'))
+        self.assertFalse(ranked[partial.pk].is_complete)
+        self.assertTrue(ranked[full.pk].is_complete)
+
+
+def legacy_grade(section, score):
+    """The if/elif ladders formerly hard-coded in Result.save."""
+    if section in ('Nursery', 'Primary'):
+        for bound, grade, description in (
+            (95, 'A+', 'Distinction'), (90, 'A', 'Excellent'), (85, 'B+', 'Very Good'), (80, 'B', 'Good'),
+            (70, 'C+', 'Credit'), (65, 'C', 'Average'), (60, 'D', 'Fair'), (50, 'E', 'Pass'),
+        ):
+            if score >= bound:
+                return grade, None, description
+        return 'F9', None, 'Fail'
+    if section == 'Junior':
+        for bound, grade, gp, description in (
+            (90, 'A+', 4.0, 'Distinction'), (80, 'A', 3.5, 'Excellent'), (70, 'B', 3.0, 'Good'),
+            (60, 'C', 2.5, 'Above Average'), (50, 'D', 2.0, 'Average'), (40, 'E', 1.5, 'Average'),
+        ):
+            if score >= bound:
+                return grade, gp, description
+        return 'F', 1.0, 'Poor'
+    for bound, grade, gp, description in (
+        (90, 'A1', 5.0, 'Distinction'), (85, 'B2', 4.5, 'Excellent'), (80, 'B3', 4.0, 'Very Good'),
+        (70, 'C4', 3.5, 'Good'), (60, 'C5', 3.0, 'Above Avg.'), (50, 'C6', 2.5, 'Average'),
+        (45, 'D7', 2.0, 'Below Avg.'), (40, 'E8', 1.5, 'Fair'),
+    ):
+        if score >= bound:
+            return grade, gp, description
+    return 'F9', 1.0, 'Fail'
+
+
+class GradingTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        grading.clear_scale_cache()
+
+    def test_default_scales_match_legacy_ladders(self):
+        for section in ('Nursery', 'Primary', 'Junior', 'Senior', None):
+            scale = grading.get_scale(section, self.session.pk)
+            for step in range(0, 401):
+                score = step / 4
+                with self.subTest(section=section, score=score):
+                    self.assertEqual(scale.lookup(score), legacy_grade(section, score))
+
+    def test_session_scale_overrides_default(self):
+        scale = GradeScale.objects.create(section='Junior', session=self.session)
+        GradeBand.objects.bulk_create([
+            GradeBand(scale=scale, min_score=75, grade='A', grade_point=4.0, description='Excellent'),
+            GradeBand(scale=scale, min_score=0, grade='F', grade_point=0.0, description='Fail'),
+        ])
+        grading.clear_scale_cache()
+        self.assertEqual(grading.get_scale('Junior', self.session.pk).lookup(80), ('A', 4.0, 'Excellent'))
+        self.assertEqual(grading.get_scale('Junior', None).lookup(80), ('A', 3.5, 'Excellent'))
+
+    def test_scale_change_in_another_process_is_picked_up(self):
+        self.assertEqual(grading.get_scale('Junior', self.session.pk).lookup(80), ('A', 3.5, 'Excellent'))
+        # Written without signals, as another process would; this one sees it at its next stamp check.
+        scale, = GradeScale.objects.bulk_create([GradeScale(section='Junior', session=self.session)])
+        GradeBand.objects.bulk_create([
+            GradeBand(scale=scale, min_score=75, grade='A', grade_point=4.0, description='Excellent'),
+            GradeBand(scale=scale, min_score=0, grade='F', grade_point=0.0, description='Fail'),
+        ])
+        with self.assertNumQueries(0):
+            self.assertEqual(grading.get_scale('Junior', self.session.pk).lookup(80), ('A', 3.5, 'Excellent'))
+        later = time.monotonic() + grading.SCALE_CHECK_SECONDS
+        with mock.patch.object(grading.time, 'monotonic', return_value=later):
+            self.assertEqual(grading.get_scale('Junior', self.session.pk).lookup(80), ('A', 4.0, 'Excellent'))
+
+    def test_band_change_moves_the_scale_stamp(self):
+        scale = GradeScale.objects.create(section='Junior', session=self.session)
+        band = GradeBand.objects.create(scale=scale, min_score=0, grade='F', grade_point=0.0, description='Fail')
+        GradeScale.objects.filter(pk=scale.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        band.grade = 'F9'
+        band.save()
+        scale.refresh_from_db()
+        self.assertGreater(scale.updated_at, timezone.now() - timedelta(minutes=1))
+
+    def test_result_section_uses_loaded_student_and_class(self):
+        self.build_section(self.jss, 'A', 12, size=2, subject_count=1)
+        result = Result.objects.select_related('student__current_class').first()
+        with self.assertNumQueries(0):
+            self.assertEqual(grading.result_section(result), self.jss.section)
+        result = Result.objects.get(pk=result.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(grading.result_section(result), self.jss.section)
+
+    def test_regrade_results_uses_bulk_updates(self):
+        section = self.build_section(self.jss, 'A', 11, size=30, subject_count=5)
+        Result.objects.update(ca=5, test_1=5, test_2=5, exam=40, grade='', total_score=0)
+        results = Result.objects.filter(student__current_section=section)
+        pks = list(results.values_list('pk', flat=True))
+        self.assertGreater(len(pks), 100)
+        positions.mark_positions_dirty(section.pk, self.session.pk, '1')
+        query_counts = []
+        for subset in (pks[:10], pks):
+            grading.clear_scale_cache()
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(grading.regrade_results(Result.objects.filter(pk__in=subset)), len(subset))
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        self.assertFalse(results.exclude(total_score=55, grade='D', grade_point=2.0).exists())
+
+
+    def test_regrade_refreshes_summaries_of_students_without_a_section(self):
+        section = self.build_section(self.jss, 'B', 12, size=3, subject_count=3)
+        student = Student.objects.filter(current_section=section, results__isnull=False).distinct().first()
+        Student.objects.filter(pk=student.pk).update(current_section=None)
+        Result.objects.filter(student=student).update(ca=5, test_1=5, test_2=5, exam=40, total_score=0)
+        summaries.refresh_student_term_summary(student.pk, self.session.pk, '1')
+        grading.regrade_results(Result.objects.filter(student=student))
+        summary = StudentTermSummary.objects.get(student=student, session=self.session, term='1')
+        self.assertEqual((summary.section_id, summary.average_score), (None, 55))
+
+class ScoreBatchWriterTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        grading.clear_scale_cache()
+        self.section = self.build_section(self.jss, 'E', 61, size=12, subject_count=4)
+        self.students = Student.objects.filter(current_section=self.section, is_active=True)
+        self.assigned = list(StudentSubject.objects.filter(
+            student__in=self.students, subject__is_active=True
+        ).values_list('student_id', 'subject_id'))
+
+    def test_upserts_valid_cells_and_reports_invalid_ones(self):
+        deleted = self.assigned[:3]
+        for student_id, subject_id in deleted:
+            Result.objects.filter(student_id=student_id, subject_id=subject_id).delete()
+        rows = [
+            {'admission_number': student_id, 'subject_id': str(subject_id), 'ca': '8', 'test_1': '7', 'test_2': '6', 'exam': '50'}
+            for student_id, subject_id in self.assigned
+        ]
+        rows[3]['exam'] = '90'
+        rows[4]['ca'] = 'abc'
+        rows.append({'admission_number': 'missing', 'subject_id': str(self.assigned[0][1]), 'exam': '10'})
+        rows.append({'admission_number': self.assigned[0][0], 'subject_id': '999999', 'exam': '10'})
+
+        writer = ScoreBatchWriter(self.session, '1', self.students)
+        writer.write(rows)
+        writer.finish()
+
+        self.assertEqual(writer.created, 3)
+        self.assertEqual(writer.updated, len(self.assigned) - 3)
+        self.assertEqual([e['field'] for e in writer.errors], ['exam', 'ca', None, None])
+        # The rejected field is skipped; the rest of that cell is still written.
+        rejected = Result.objects.get(student_id=rows[3]['admission_number'], subject_id=rows[3]['subject_id'])
+        self.assertEqual((rejected.ca, rejected.exam), (8, 0.0))
+        full = Result.objects.get(student_id=rows[0]['admission_number'], subject_id=rows[0]['subject_id'])
+        self.assertEqual((full.total_score, full.grade, full.grade_point), (71, 'B', 3.0))
+
+        expected = python_positions(self.section, self.session, '1')
+        for result in Result.objects.filter(pk__in=expected):
+            for field, value in expected[result.pk].items():
+                self.assertEqual(getattr(result, field), value)
+        self.assertEqual(
+            StudentTermSummary.objects.filter(student__in=self.students, session=self.session, term='1').count(),
+            self.students.count(),
+        )
+
+    def test_malformed_rows_are_row_errors(self):
+        student_id, subject_id = self.assigned[0]
+        writer = ScoreBatchWriter(self.session, '1', self.students)
+        writer.write([
+            'not a row', ['a', 'list'], None,
+            {'admission_number': student_id, 'subject_id': subject_id, 'exam': '65', 'remarks': 12},
+        ])
+        writer.finish()
+        self.assertEqual(len(writer.errors), 3)
+        self.assertTrue(all(e['admission_number'] is None for e in writer.errors))
+        self.assertEqual(writer.updated, 1)
+        self.assertEqual(Result.objects.get(student_id=student_id, subject_id=subject_id).remarks, '12')
+
+    def test_grid_post_reports_malformed_cells_and_json_rejects_non_objects(self):
+        teacher = Teacher.objects.create(
+            user=User.objects.create_user(username='grid', password='x'), first_name='Grid', surname='Teacher',
+            school_email='grid@example.com', gender='F',
+        )
+        self.section.teachers.add(teacher)
+        self.client.force_login(teacher.user)
+        student_id, subject_id = self.assigned[0]
+        url = reverse('teacher_section_score_entry')
+        with mock.patch('accounts.views.teacher.get_current_session_term', return_value=(self.session, '1')), \
+                mock.patch('accounts.views.teacher.get_term_end_date', return_value=date(2999, 12, 31)):
+            response = self.client.post(url, {
+                'section': self.section.pk, 'cell__broken': '5', f'cell__{student_id}__{subject_id}__exam': '64',
+            })
+            self.assertEqual(response.status_code, 302)
+            self.assertEqual(Result.objects.get(student_id=student_id, subject_id=subject_id).exam, 64)
+            self.assertIn('Unrecognised score cell cell__broken', [str(m) for m in get_messages(response.wsgi_request)])
+
+            response = self.client.post(
+                f"{url}?section={self.section.pk}", json.dumps({'scores': [1]}), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+
+    def test_dry_run_writes_nothing(self):
+        student_id, subject_id = self.assigned[0]
+        before = list(Result.objects.values_list('pk', 'total_score', 'subject_position'))
+        writer = ScoreBatchWriter(self.session, '1', self.students, dry_run=True)
+        writer.write([{'admission_number': student_id, 'subject_id': subject_id, 'exam': '65'}])
+        writer.finish()
+        self.assertEqual(writer.updated, 1)
+        self.assertEqual(list(Result.objects.values_list('pk', 'total_score', 'subject_position')), before)
+
+
+class ResultImportTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        grading.clear_scale_cache()
+        self.section = self.build_section(self.jss, 'F', 71, size=15, subject_count=4)
+        assigned = StudentSubject.objects.filter(
+            student__current_section=self.section, student__is_active=True, subject__is_active=True
+        ).select_related('subject')
+        self.header = ['Admission Number', 'Subject', 'CA', 'Test 1', 'Test 2', 'Exam', 'Remarks']
+        self.rows = [[a.student_id, a.subject.name, 9, 8, 7, 60, 'Good'] for a in assigned]
+        self.rows[2][5] = 75
+        self.rows.append(['nobody', self.rows[0][1], 1, 1, 1, 1, ''])
+
+    def run_import(self, stream, filename, **kwargs):
+        errors = []
+        with mock.patch('accounts.utils.score_entry.rank_section', wraps=ranking.rank_section) as rank:
+            counts = import_results(
+                iter_result_rows(stream, filename), self.session, '1',
+                batch_size=7, on_error=errors.append, **kwargs
+            )
+        return counts, errors, rank.call_count
+
+    def assert_imported(self, counts, errors, rank_calls):
+        self.assertEqual(counts['rows'], len(self.rows))
+        # The out-of-range exam is dropped but the rest of its row is still written.
+        self.assertEqual(counts['created'] + counts['updated'], len(self.rows) - 1)
+        self.assertEqual([(e['line'], e['field']) for e in errors], [(4, 'exam'), (len(self.rows) + 1, None)])
+        self.assertEqual(rank_calls, 1)
+        admission_number, subject_name = self.rows[0][:2]
+        result = Result.objects.get(student_id=admission_number, subject__name=subject_name)
+        self.assertEqual((result.total_score, result.remarks), (84, 'Good'))
+        self.assertTrue(result.subject_position)
+
+    def test_csv_import(self):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([self.header] + self.rows)
+        self.assert_imported(*self.run_import(io.BytesIO(buffer.getvalue().encode('utf-8-sig')), 'scores.csv'))
+
+    def test_xlsx_import(self):
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        for row in [self.header] + self.rows:
+            sheet.append(row)
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        self.assert_imported(*self.run_import(buffer, 'scores.xlsx'))
+
+    def test_dry_run_and_bad_header(self):
+        buffer = io.BytesIO(b'Admission Number,Exam\n01F0000,50\n')
+        with self.assertRaises(ImportFormatError):
+            self.run_import(buffer, 'scores.csv')
+        before = list(Result.objects.values_list('pk', 'total_score'))
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows([self.header] + self.rows)
+        counts, errors, rank_calls = self.run_import(io.BytesIO(buffer.getvalue().encode()), 'scores.csv', dry_run=True)
+        self.assertEqual(counts['updated'] + counts['created'], len(self.rows) - 1)
+        self.assertEqual(rank_calls, 0)
+        self.assertEqual(list(Result.objects.values_list('pk', 'total_score')), before)
+
+
+class ResultTrackingTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.sections = [
+            self.build_section(self.jss, suffix, 80 + i, size=8, subject_count=3)
+            for i, suffix in enumerate('ABCD')
+        ]
+        summaries.rebuild_all_summaries()
+        cache.clear()
+
+    def expected_stats(self, section):
+        students = Student.objects.filter(current_section=section, is_active=True)
+        section_summaries = StudentTermSummary.objects.filter(student__in=students, session=self.session, term='1')
+        top = sorted(
+            (s for s in section_summaries if s.scored_count),
+            key=lambda s: (-s.average_score, s.student_id),
+        )[:3]
+        return (
+            students.count(),
+            sum(1 for s in section_summaries if s.is_complete),
+            [s.average_score for s in top],
+        )
+
+    def test_stats_match_summaries_and_are_cached(self):
+        page = ClassSection.objects.filter(
+            pk__in=[s.pk for s in self.sections]
+        ).order_by('suffix').prefetch_related('teachers')
+        # Sections and their teachers, the summary stamp, then three grouped queries however many sections are shown.
+        with self.assertNumQueries(2 + 1 + 3):
+            sections = list(page)
+            stats = result_tracking.section_result_stats(sections, self.session, '1')
+        for section, stat in zip(sections, stats):
+            self.assertEqual(
+                (stat['student_count'], stat['complete_students'], [t['avg_score'] for t in stat['top_students']]),
+                self.expected_stats(section),
+            )
+
+        with self.assertNumQueries(2 + 1):
+            result_tracking.section_result_stats(list(page.all()), self.session, '1')
+
+    def cached_sections(self):
+        version = cache.get(result_tracking._version_key(self.session.pk, '1'))
+        version = f"{version}_{result_tracking._summary_stamp(self.session.pk, '1')}"
+        return {
+            section.pk for section in self.sections
+            if cache.get(result_tracking._cache_key(version, section.pk)) is not None
+        }
+
+    def test_result_write_invalidates_cache(self):
+        section = self.sections[0]
+        result_tracking.section_result_stats([section], self.session, '1')
+        self.assertEqual(self.cached_sections(), {section.pk})
+        result = Result.objects.filter(student__current_section=section, student__is_active=True).select_related(
+            'student__current_class'
+        ).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            result.exam = 70
+            result.save()
+            positions.recompute_dirty_positions()
+        self.assertEqual(self.cached_sections(), set())
+
+    def test_late_write_of_stale_stats_is_never_read(self):
+        section = self.sections[0]
+        # A request reads the version, then results change before it writes its stats back.
+        version = cache.get_or_set(result_tracking._version_key(self.session.pk, '1'), 'before', None)
+        version = f"{version}_{result_tracking._summary_stamp(self.session.pk, '1')}"
+        stale = dict(result_tracking._compute([section.pk], self.session, '1')[section.pk], student_count=-1)
+        result_tracking.invalidate_result_tracking(self.session.pk, '1')
+        cache.set(result_tracking._cache_key(version, section.pk), stale)
+        stats = result_tracking.section_result_stats([section], self.session, '1')
+        self.assertEqual(stats[0]['student_count'], self.expected_stats(section)[0])
+
+    def test_result_write_in_another_process_retires_cached_stats(self):
+        section = self.sections[0]
+        before = result_tracking.section_result_stats([section], self.session, '1')[0]
+        student = Student.objects.filter(current_section=section, is_active=True).first()
+        # Written as the worker's ranking pass would; this process's cache version is left as it was.
+        summary = StudentTermSummary.objects.get(student=student, session=self.session, term='1')
+        StudentTermSummary.objects.filter(pk=summary.pk).update(
+            is_complete=not summary.is_complete, updated_at=summary.updated_at + timedelta(seconds=1)
+        )
+        after = result_tracking.section_result_stats([section], self.session, '1')[0]
+        self.assertNotEqual(after['complete_students'], before['complete_students'])
+        self.assertEqual(after['complete_students'], self.expected_stats(section)[1])
+
+    def test_student_moves_and_deactivations_update_counts(self):
+        first, second = self.sections[:2]
+        result_tracking.section_result_stats([first, second], self.session, '1')
+        student = Student.objects.filter(current_section=first, is_active=True).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            student.current_section = second
+            student.save()
+        counts = [stat['student_count'] for stat in result_tracking.section_result_stats([first, second], self.session, '1')]
+        self.assertEqual(counts, [self.expected_stats(first)[0], self.expected_stats(second)[0]])
+        moved_count = counts[1]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            student.is_active = False
+            student.save()
+        stats = result_tracking.section_result_stats([second], self.session, '1')
+        self.assertEqual(stats[0]['student_count'], moved_count - 1)
+
+
+class ResultHistoryTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent = Parent.objects.create(
+            user=User.objects.create_user(username='08012345678', password='x'), phone_number='08012345678'
+        )
+        self.subject = Subject.objects.create(name='History Maths', section='Junior')
+        self.student, self.sibling = Student.objects.bulk_create([
+            Student(
+                admission_number=f"2020H0{i}", first_name='Hist', surname=f"Student{i}", date_of_birth=date(2012, 1, 1),
+                address='-', gender='F', enrollment_year='2020', current_class=self.jss, parent=self.parent,
+                token=f"histtok{i}",
+            )
+            for i in range(2)
+        ])
+
+    def add_terms(self, sessions):
+        for session in sessions:
+            for term in ('1', '2', '3'):
+                Result.objects.bulk_create([Result(
+                    student=self.student, subject=self.subject, session=session, term=term, total_score=60,
+                )])
+                StudentClassHistory.objects.create(student=self.student, session=session, term=term, class_level=self.jss)
+                ResultAccessRequest.objects.create(student=self.student, session=session, term=term, status='Approved')
+
+    def test_query_count_is_constant(self):
+        older = Session.objects.create(name='2022/2023', start_year=2022, end_year=2023)
+        self.add_terms([older])
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(len(result_history.load_result_history(self.student)), 3)
+        oldest = Session.objects.create(name='2021/2022', start_year=2021, end_year=2022)
+        self.add_terms([self.session, oldest])
+        with CaptureQueriesContext(connection) as many:
+            history = result_history.load_result_history(self.student)
+        self.assertEqual(len(history), 9)
+        self.assertEqual(len(few), len(many))
+        self.assertEqual([(g['session'].start_year, g['term']) for g in history[:4]], [(2024, '1'), (2024, '2'), (2024, '3'), (2022, '1')])
+        self.assertTrue(all(g['has_access'] and g['class_level'] == 'JSS 2' for g in history))
+
+    def test_history_uses_access_resolver(self):
+        self.add_terms([self.session])
+        ResultAccessRequest.objects.filter(term='2').update(status='Pending')
+        Payment.objects.create(parent=self.parent, session=self.session, term='3', amount=Decimal('1'), status='Completed')
+        history = {g['term']: g for g in result_history.load_result_history(self.student)}
+        self.assertEqual(
+            [(history[t]['fees_paid'], history[t]['has_access']) for t in '123'],
+            [(False, True), (False, False), (True, True)],
+        )
+
+
+class ResultAccessResolverTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent = Parent.objects.create(
+            user=User.objects.create_user(username='08087654321', password='x'), phone_number='08087654321'
+        )
+        self.students = Student.objects.bulk_create([
+            Student(
+                admission_number=f"2020A0{i}", first_name='Acc', surname=f"Student{i}", date_of_birth=date(2012, 1, 1),
+                address='-', gender='M', enrollment_year='2020', current_class=self.jss,
+                parent=self.parent if i < 3 else None, token=f"acctok{i}",
+            )
+            for i in range(4)
+        ])
+        Payment.objects.create(parent=self.parent, session=self.session, term='1', amount=Decimal('10'), status='Completed')
+        Payment.objects.create(parent=self.parent, session=self.session, term='2', amount=Decimal('10'), status='Pending')
+        ResultAccessRequest.objects.create(student=self.students[3], session=self.session, term='1', status='Approved')
+        ResultAccessRequest.objects.create(student=self.students[0], session=self.session, term='2', status='Denied')
+
+    def test_resolves_many_terms_in_three_queries_and_memoizes(self):
+        keys = [(student, self.session.pk, term) for student in self.students for term in '123']
+        resolver = result_access.ResultAccessResolver()
+        with self.assertNumQueries(3):
+            access = resolver.resolve(keys)
+        expected = {
+            (s.pk, self.session.pk, t): s.parent_id is not None and t == '1' or (s.pk == self.students[3].pk and t == '1')
+            for s in self.students for t in '123'
+        }
+        self.assertEqual({key: value.has_access for key, value in access.items()}, expected)
+        self.assertEqual(access[(self.students[0].pk, self.session.pk, '2')].access_request.status, 'Denied')
+        with self.assertNumQueries(0):
+            resolver.resolve(keys)
+        with self.assertNumQueries(1):
+            result_access.ResultAccessResolver().resolve(keys)
+
+    def test_writes_change_cached_answers(self):
+        student = self.students[0]
+        self.assertFalse(result_access.ResultAccessResolver().has_access(student, self.session, '2'))
+        # Queryset updates send no signal, like a write in another process.
+        Payment.objects.filter(term='2').update(status='Completed', updated_at=timezone.now())
+        self.assertTrue(result_access.ResultAccessResolver().has_access(student, self.session, '2'))
+
+        self.assertFalse(result_access.ResultAccessResolver().has_access(student, self.session, '3'))
+        ResultAccessRequest.objects.bulk_create([
+            ResultAccessRequest(student=student, session=self.session, term='3', status='Approved')
+        ])
+        self.assertTrue(result_access.ResultAccessResolver().has_access(student, self.session, '3'))
+
+    def test_moving_to_another_family_drops_the_old_familys_access(self):
+        student = Student.objects.get(pk=self.students[1].pk)
+        self.assertTrue(result_access.ResultAccessResolver().has_access(student, self.session, '1'))
+        student.parent = Parent.objects.create(
+            user=User.objects.create_user(username='08011110000', password='x'), phone_number='08011110000'
+        )
+        student.save()
+        self.assertFalse(result_access.ResultAccessResolver().has_access(student, self.session, '1'))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReportCardTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        self.section_a = self.build_section(self.jss, 'A', 61, 4, 3)
+        self.section_b = self.build_section(self.jss, 'B', 62, 3, 3)
+
+    def test_class_level_students_are_in_print_order(self):
+        students = list(report_card_students(self.session, '1', school_class=self.jss))
+        self.assertEqual(students, sorted(students, key=lambda s: (s.current_section.suffix, s.surname)))
+        self.assertEqual({s.current_section_id for s in students}, {self.section_a.pk, self.section_b.pk})
+        self.assertTrue(all(s.results.filter(term='1', total_score__gt=0).exists() for s in students))
+
+    def test_merged_pdf_and_zip(self):
+        students = report_card_students(self.session, '1', section=self.section_a)
+        expected = list(students.values_list('admission_number', flat=True))
+        progress = []
+
+        merged = io.BytesIO()
+        rendered = render_report_cards(students, self.session, '1', merged, workers=1, progress=lambda *p: progress.append(p))
+        self.assertEqual(rendered, len(expected))
+        self.assertEqual(progress[-1], (len(expected), len(expected)))
+        merged.seek(0)
+        self.assertGreaterEqual(len(PdfReader(merged).pages), len(expected))
+
+        archive = io.BytesIO()
+        render_report_cards(students, self.session, '1', archive, output_format='zip', workers=1)
+        names = zipfile.ZipFile(archive).namelist()
+        self.assertEqual([name.split('_')[1] for name in names], expected)
+
+    def test_merged_pdf_memory_does_not_grow_with_students(self):
+        student, results, session, term, summary = report_card_fixture(12)
+        card = pdf_generator.generate_result_pdf(student, results, session, term, summary=summary).getvalue()
+
+        def merge(directory, count):
+            path = os.path.join(directory, 'card.pdf')
+            output_path = os.path.join(directory, f"merged_{count}.pdf")
+
+            def run():
+                with open(output_path, 'wb') as output:
+                    merged = report_cards._MergedPdf(output)
+                    for _ in range(count):
+                        with open(path, 'wb') as f:
+                            f.write(card)
+                        merged.append(path)
+                    merged.close()
+            return peak_memory_kb(run), output_path
+
+        with tempfile.TemporaryDirectory() as directory:
+            few, _ = merge(directory, 5)
+            many, output_path = merge(directory, 50)
+            reader = PdfReader(output_path)
+            self.assertEqual(len(reader.pages), 50 * len(PdfReader(io.BytesIO(card)).pages))
+            self.assertEqual(reader.pages[-1].extract_text(), PdfReader(io.BytesIO(card)).pages[-1].extract_text())
+        # 45 more report cards cost less than two report cards' worth of memory.
+        self.assertLess(many - few, 2 * len(card) // 1024)
+
+
+class ReportCardStylesTests(TestCase):
+    def tearDown(self):
+        pdf_generator.reset_report_card_styles()
+
+    def test_styles_are_built_once_per_process(self):
+        pdf_generator.reset_report_card_styles()
+        student, results, session, term, summary = report_card_fixture(8)
+        with mock.patch.object(pdf_generator, '_register_fonts', wraps=pdf_generator._register_fonts) as register:
+            first = pdf_generator.generate_result_pdf(student, results, session, term, summary=summary)
+            second = pdf_generator.generate_result_pdf(student, results, session, term, summary=summary)
+        register.assert_called_once()
+        self.assertEqual(len(PdfReader(first).pages), len(PdfReader(second).pages))
+
+    def test_excellent_and_poor_grades_are_coloured(self):
+        student, results, session, term, summary = report_card_fixture(5)
+        with mock.patch.object(pdf_generator, 'Table', wraps=pdf_generator.Table) as table:
+            pdf_generator.generate_result_pdf(student, results, session, term, summary=summary)
+        rows = next(call.args[0] for call in table.call_args_list if call.args[0][0][0] == 'Subject')[1:]
+        styles = pdf_generator.get_report_card_styles().paragraphs
+        expected = {'A': 'CellExcellent', 'B': 'Cell', 'C': 'Cell', 'D': 'CellPoor', 'F': 'CellPoor'}
+        for result, row in zip(results, rows):
+            self.assertEqual({cell.style.textColor for cell in row}, {styles[expected[result.grade]].textColor})
+
+    def test_missing_fonts_fall_back_to_helvetica(self):
+        pdf_generator.reset_report_card_styles()
+        with mock.patch.object(pdf_generator, '_static_path', return_value=None):
+            styles = pdf_generator.get_report_card_styles()
+        self.assertFalse(styles.custom_fonts_loaded)
+        self.assertIsNone(styles.logo)
+        self.assertEqual(styles.paragraphs['Cell'].fontName, 'Helvetica')
+        student, results, session, term, summary = report_card_fixture(8)
+        self.assertTrue(pdf_generator.generate_result_pdf(student, results, session, term, summary=summary).getvalue().startswith(b'%PDF'))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReportCardCacheTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        self.section = self.build_section(self.jss, 'A', 71, 3, 3)
+        summaries.refresh_section_summaries(self.section.pk, self.session.pk, '1')
+        self.student = report_card_students(self.session, '1', section=self.section).select_related(
+            'current_class', 'current_section'
+        ).first()
+
+    def render(self):
+        with mock.patch.object(report_card_cache, 'generate_result_pdf', wraps=report_card_cache.generate_result_pdf) as render:
+            pdf = report_card_cache.report_card_pdf(self.student, self.session, '1')
+        return pdf, render.call_count
+
+    def test_rendered_once_until_an_input_changes(self):
+        first, rendered = self.render()
+        self.assertEqual(rendered, 1)
+        with self.assertNumQueries(1):
+            cached = report_card_cache.report_card_pdf(self.student, self.session, '1')
+        self.assertEqual(cached, first)
+
+        result = Result.objects.filter(student=self.student, session=self.session, term='1').first()
+        result.total_score = 99
+        result.save()
+        positions.recompute_dirty_positions()
+        self.assertEqual(self.render()[1], 1)
+        self.assertEqual(self.render()[1], 0)
+
+        with mock.patch.object(report_card_cache, 'REPORT_CARD_TEMPLATE_VERSION', 'next'):
+            self.assertEqual(self.render()[1], 1)
+
+
+@tasks.task('test_echo')
+def echo_task(background_task, value, fail_times=0):
+    if background_task.attempts <= fail_times:
+        raise RuntimeError('boom')
+    return {'value': value, 'attempt': background_task.attempts}
+
+
+class BackgroundTaskTests(SectionFixtureMixin, TestCase):
+    def test_runs_task_and_stores_result(self):
+        queued = tasks.enqueue('test_echo', {'value': 7})
+        self.assertTrue(tasks.run_next_task('test'))
+        self.assertFalse(tasks.run_next_task('test'))
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.progress, queued.result), ('Completed', 100, {'value': 7, 'attempt': 1}))
+        self.assertEqual(queued.locked_by, 'test')
+
+    def test_failures_are_retried_with_backoff_then_failed(self):
+        queued = tasks.enqueue('test_echo', {'value': 1, 'fail_times': 5}, max_attempts=2)
+        tasks.run_next_task('test')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('Pending', 1))
+        self.assertIn('boom', queued.error)
+        self.assertFalse(tasks.run_next_task('test'), 'a retry waits for its backoff')
+
+        BackgroundTask.objects.filter(pk=queued.pk).update(run_after=queued.created_at)
+        tasks.run_next_task('test')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('Failed', 2))
+
+    def test_a_result_that_cannot_be_stored_fails_the_task(self):
+        queued = tasks.enqueue('test_echo', {'value': 1}, max_attempts=1)
+        with mock.patch.dict(tasks.TASKS, {'test_echo': lambda background_task, value: {'when': object()}}), \
+                self.assertLogs('accounts.utils.tasks', 'ERROR'):
+            self.assertTrue(tasks.run_next_task('test'))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'Failed')
+        self.assertIn('JSON serializable', queued.error)
+
+    def test_worker_thread_survives_unexpected_errors(self):
+        options = {'once': True, 'sleep': 0}
+        with mock.patch.object(process_tasks, 'run_next_task', side_effect=[RuntimeError('lost'), True, False]) as run, \
+                mock.patch.object(process_tasks, 'connection'), mock.patch.object(process_tasks, 'close_old_connections'), \
+                self.assertLogs(process_tasks.logger, 'ERROR') as logs:
+            process_tasks.Command().work('test', threading.Event(), options)
+        self.assertEqual(run.call_count, 3)
+        self.assertIn('lost', logs.output[0])
+
+    def test_a_claimed_task_is_not_claimed_again(self):
+        queued = tasks.enqueue('test_echo', {'value': 1})
+        self.assertEqual(tasks.claim_next_task('first').pk, queued.pk)
+        self.assertIsNone(tasks.claim_next_task('second'))
+
+        BackgroundTask.objects.filter(pk=queued.pk).update(started_at=queued.created_at - timedelta(hours=2))
+        self.assertEqual(tasks.requeue_stale_tasks(3600), 1)
+        self.assertEqual(tasks.claim_next_task('second').pk, queued.pk)
+
+    @override_settings(BACKGROUND_TASKS='immediate')
+    def test_immediate_mode_runs_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            queued = tasks.enqueue('test_echo', {'value': 3})
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'Completed')
+
+    def test_report_cards_task_stores_file(self):
+        section = self.build_section(self.jss, 'A', 81, 3, 3)
+        # Worker processes would not see this test's transaction.
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            CACHES=TEST_CACHES, MEDIA_ROOT=media, TASK_FILE_STORAGE='django.core.files.storage.FileSystemStorage'
+        ), mock.patch('accounts.utils.report_cards.default_workers', return_value=1):
+            queued = tasks.enqueue(report_cards_task.task_name, {
+                'session_id': self.session.pk, 'term': '1', 'section_id': section.pk, 'output_format': 'zip',
+            })
+            tasks.run_next_task('test')
+            queued.refresh_from_db()
+            self.assertEqual(queued.status, 'Completed', queued.error)
+            with tasks.task_file_storage().open(queued.result['file']) as f:
+                self.assertEqual(len(zipfile.ZipFile(f).namelist()), queued.result['count'])
+
+
+    def test_expired_task_files_are_deleted(self):
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media, TASK_FILE_STORAGE='django.core.files.storage.FileSystemStorage'
+        ):
+            storage = tasks.task_file_storage()
+            finished = {}
+            for age in (1, 10):
+                name = storage.save(f"tasks/{age}/report.pdf", io.BytesIO(b'%PDF'))
+                finished[age] = BackgroundTask.objects.create(
+                    name='test_echo', status='Completed', result={'file': name, 'count': 1},
+                    finished_at=timezone.now() - timedelta(days=age),
+                )
+            self.assertEqual(tasks.delete_expired_task_files(3 * 24 * 60 * 60), 1)
+            for background_task in finished.values():
+                background_task.refresh_from_db()
+            self.assertEqual(finished[10].result, {'count': 1, 'expired': True})
+            self.assertFalse(storage.exists('tasks/10/report.pdf'))
+            self.assertTrue(storage.exists(finished[1].result['file']))
+
+    @override_settings(TASK_FILE_STORAGE_SHARED=False)
+    def test_worker_requires_shared_task_storage(self):
+        with self.assertRaises(CommandError):
+            call_command('process_tasks', once=True)
+
+    def test_promotion_task_moves_students_and_reports_skipped_ones(self):
+        section = self.build_section(self.jss, 'P', 82, 3, 1)
+        next_class, _ = SchoolClass.objects.get_or_create(level='JSS 3')
+        for school_class in (self.jss, next_class):
+            school_class.save()  # Migrated classes have no level_order until saved.
+        next_session = Session.objects.create(name='2025/2026', start_year=2025, end_year=2026)
+        ClassSection.objects.create(school_class=next_class, suffix='P', session=next_session)
+        students = list(Student.objects.filter(current_section=section))
+        Student.objects.filter(pk=students[0].pk).update(current_class=None)
+        queued = tasks.enqueue(promote_students_task.task_name, {
+            'action': 'promote', 'student_ids': [s.pk for s in students],
+            'current_session_id': self.session.pk, 'next_session_id': next_session.pk,
+        }, max_attempts=1)
+        tasks.run_next_task('test')
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, 'Completed', queued.error)
+        self.assertEqual(queued.result['moved'], 2)
+        self.assertEqual(len(queued.result['warnings']), 1)
+        moved = Student.objects.filter(pk__in=[s.pk for s in students[1:]])
+        self.assertEqual({s.current_class_id for s in moved}, {next_class.pk})
+        self.assertEqual({s.current_section.session_id for s in moved}, {next_session.pk})
+
+
+class PdfRendererTests(TestCase):
+    @override_settings(PDF_RENDERER_PROCESSES=0)
+    def test_disabled_pool_renders_in_process(self):
+        with mock.patch.object(pdf_renderer, 'render_pdf_in_process', return_value=b'%PDF') as render, \
+                mock.patch.object(pdf_renderer, 'get_renderer_pool') as get_pool:
+            self.assertEqual(pdf_renderer.render_pdf('<p></p>'), b'%PDF')
+        render.assert_called_once_with('<p></p>')
+        get_pool.assert_not_called()
+
+    @override_settings(PDF_RENDERER_PROCESSES=1)
+    def test_pool_that_cannot_start_falls_back_to_in_process(self):
+        pool = mock.Mock()
+        pool.start.side_effect = OSError('no processes')
+        with mock.patch.object(pdf_renderer, 'get_renderer_pool', return_value=pool), \
+                mock.patch.object(pdf_renderer, '_pool_unavailable', False), \
+                mock.patch.object(pdf_renderer, 'render_pdf_in_process', return_value=b'%PDF') as render:
+            self.assertEqual(pdf_renderer.render_pdf('<p></p>'), b'%PDF')
+            self.assertTrue(pdf_renderer._pool_unavailable)
+        render.assert_called_once_with('<p></p>')
+        pool.render.assert_not_called()
+
+    def test_renderers_are_recycled_and_killed_on_timeout(self):
+        pool = pdf_renderer.RendererPool(processes=1, max_jobs=2, timeout=2, memory_mb=0)
+        try:
+            # The startup health check is the renderer's first job, so it is replaced after this one.
+            first = pool.apply(os.getpid)
+            second = pool.apply(os.getpid)
+            self.assertNotIn(os.getpid(), (first, second))
+            self.assertNotEqual(first, second)
+
+            with self.assertRaises(pdf_renderer.PdfRenderTimeout):
+                pool.apply(time.sleep, 10)
+            self.assertIsNone(pool._pool)
+            self.assertNotEqual(pool.apply(os.getpid), second)
+        finally:
+            pool.close()
+
+
+def blank_pdf(*args):
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReceiptTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        receipts._cache().clear()
+        self.parent = Parent.objects.create(
+            user=User.objects.create_user(username='08011112222', password='x'), phone_number='08011112222'
+        )
+        self.completed = Payment.objects.create(
+            parent=self.parent, session=self.session, term='1', amount=Decimal('10'), status='Completed'
+        )
+        self.pending = Payment.objects.create(
+            parent=self.parent, session=self.session, term='2', amount=Decimal('10'), status='Pending'
+        )
+
+    def test_completed_receipts_render_once_until_invalidated(self):
+        with mock.patch.object(receipts, 'render_pdf', side_effect=blank_pdf) as render:
+            first = receipts.receipt_pdf(self.completed)
+            self.assertEqual(receipts.receipt_pdf(self.completed), first)
+            self.assertEqual(render.call_count, 1)
+
+            # Another process, with its own copy of the stored receipt, sees the edit through updated_at.
+            elsewhere = receipts.receipt_key(self.completed)
+            receipts.invalidate_receipt(self.completed.transaction_id)
+            edited = Payment.objects.get(pk=self.completed.pk)
+            self.assertNotEqual(receipts.receipt_key(edited), elsewhere)
+            receipts.receipt_pdf(edited)
+            self.assertEqual(render.call_count, 2)
+
+            receipts.receipt_pdf(self.pending)
+            receipts.receipt_pdf(self.pending)
+            self.assertEqual(render.call_count, 4)
+
+    def test_receipt_keeps_the_details_it_was_issued_with(self):
+        section = self.build_section(self.jss, 'R', 91, 1, 1)
+        student = Student.objects.get(current_section=section)
+        self.completed.students.add(student)
+        self.completed.refresh_from_db()
+        with mock.patch.object(receipts, 'render_pdf', side_effect=blank_pdf) as render, \
+                mock.patch.object(Payment, 'calculate_total_fee', return_value=Decimal('100')):
+            receipts.receipt_pdf(self.completed)
+        issued = render.call_args[0][0]
+        self.assertIn('JSS 2', issued)
+        self.assertIn('100.00 XOF', issued)
+
+        # Promoted and re-billed, then the stored PDF is evicted: the rebuilt receipt is unchanged.
+        Student.objects.filter(pk=student.pk).update(current_class=self.primary)
+        receipts._cache().clear()
+        payment = Payment.objects.get(pk=self.completed.pk)
+        with mock.patch.object(receipts, 'render_pdf', side_effect=blank_pdf) as render, \
+                mock.patch.object(Payment, 'calculate_total_fee', return_value=Decimal('250')):
+            receipts.receipt_pdf(payment)
+            self.assertEqual(render.call_args[0][0], issued)
+
+            receipts.invalidate_receipt(payment.transaction_id)
+            receipts.receipt_pdf(Payment.objects.get(pk=payment.pk))
+            self.assertIn('Primary 3', render.call_args[0][0])
+            self.assertIn('250.00 XOF', render.call_args[0][0])
+
+    def test_merge_uses_stored_receipts(self):
+        second = Payment.objects.create(
+            parent=self.parent, session=self.session, term='1', amount=Decimal('5'), status='Completed'
+        )
+        with mock.patch.object(receipts, 'render_pdf', side_effect=blank_pdf) as render:
+            receipts.receipt_pdf(self.completed)
+            output = io.BytesIO()
+            self.assertEqual(receipts.merge_receipts([self.completed, second], output), 2)
+        self.assertEqual(render.call_count, 2)
+        output.seek(0)
+        self.assertEqual(len(PdfReader(output).pages), 2)
+
+
+    def test_bulk_printing_is_queued_and_stores_the_merged_pdf(self):
+        user = User.objects.create_user(username='bursar', password='x')
+        user.groups.add(Group.objects.get_or_create(name='Secretary')[0])
+        self.client.force_login(user)
+        params = {'session_id': self.session.pk, 'term': '1'}
+        with mock.patch.object(receipts, 'render_pdf', side_effect=blank_pdf), \
+                override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'), \
+                tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            with self.captureOnCommitCallbacks(execute=True):
+                progress = self.client.get(reverse('admin_bulk_receipts'), params)
+            queued = BackgroundTask.objects.get(pk=progress.context['task'].pk)
+            self.assertEqual((queued.name, queued.status), ('bulk_receipts', 'Completed'), queued.error)
+            self.assertEqual(queued.result['count'], 1)
+            with tasks.task_file_storage().open(queued.result['file']) as f:
+                self.assertEqual(len(PdfReader(f).pages), 1)
+
+        empty = self.client.get(reverse('admin_bulk_receipts'), dict(params, term='3'))
+        self.assertRedirects(empty, reverse('admin_daily_payment_report'), fetch_redirect_response=False)
+
+class TablePdfTests(SectionFixtureMixin, TestCase):
+    def test_rows_flow_across_pages_with_repeated_headers(self):
+        context = payment_report_context(300)
+        reader = PdfReader(io.BytesIO(table_pdf.payment_report_pdf(context)))
+        self.assertGreater(len(reader.pages), 3)
+        texts = [page.extract_text() for page in reader.pages]
+        self.assertTrue(all('Phone' in text for text in texts))
+        self.assertEqual(sum(text.count('+228') for text in texts), 300)
+
+    def test_a_row_taller_than_a_page_continues_on_the_next(self):
+        context = payment_report_context(3)
+        context['report_data'][1]['students'] = ', '.join(f"Child {i} (Primary 4)" for i in range(1200))
+        reader = PdfReader(io.BytesIO(table_pdf.payment_report_pdf(context)))
+        self.assertGreater(len(reader.pages), 2)
+        text = ''.join(page.extract_text() for page in reader.pages)
+        self.assertIn('Child 0 ', text)
+        self.assertIn('Child 1199 ', text)
+        self.assertEqual(text.count('+228'), 3)
+
+    def test_empty_sections_print_their_empty_text(self):
+        context = payment_report_context(2)
+        context['sort_type'] = 'all'
+        reader = PdfReader(io.BytesIO(table_pdf.payment_report_pdf(context)))
+        text = reader.pages[0].extract_text()
+        self.assertIn('No full paid families', text)
+        self.assertIn('No unpaid families', text)
+
+    def test_broadsheet(self):
+        section = self.build_section(self.jss, 'A', 91, 4, 3)
+        broadsheet = build_class_broadsheet(section, self.session, '1')
+        reader = PdfReader(io.BytesIO(table_pdf.broadsheet_pdf(section, self.session, '1', broadsheet)))
+        text = reader.pages[0].extract_text()
+        for row in broadsheet['rows']:
+            self.assertIn(row['student'].full_name, text)
+        self.assertIn('Class average', text)
+
+    @override_settings(NATIVE_PDF_REPORTS=['payment_report'])
+    def test_renderer_is_chosen_per_report_and_request(self):
+        factory = RequestFactory()
+        self.assertTrue(table_pdf.use_native_pdf(factory.get('/'), 'payment_report'))
+        self.assertFalse(table_pdf.use_native_pdf(factory.get('/'), 'fee_statistics'))
+        self.assertTrue(table_pdf.use_native_pdf(factory.get('/', {'renderer': 'native'}), 'fee_statistics'))
+        self.assertFalse(table_pdf.use_native_pdf(factory.get('/', {'renderer': 'weasyprint'}), 'payment_report'))
+
+
+class PdfBenchmarkTests(TestCase):
+    def test_receipt_fixture_renders_the_receipt_template(self):
+        html = receipts.receipt_html(receipt_fixture(children=2))
+        self.assertIn('Benchmark Child1', html)
+        self.assertIn('200000.00 XOF', html)
+        self.assertIn('Benchmark Parent', html)
+
+    def test_results_are_written_as_json(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('accounts.management.commands.benchmark_pdf.weasyprint_available', return_value=False):
+            path = f"{directory}/run.json"
+            call_command(
+                'benchmark_pdf', iterations=2, report_iterations=1, subjects='8', families='10', output=path,
+                stdout=io.StringIO(),
+            )
+            call_command(
+                'benchmark_pdf', iterations=2, report_iterations=1, subjects='8', families='10', compare=path,
+                stdout=io.StringIO(),
+            )
+            with open(path) as f:
+                run = json.load(f)
+        cases = {(r['name'], r['renderer'], r['size']) for r in run['results']}
+        self.assertEqual(cases, {
+            ('report_card', 'reportlab', 8), ('report_card_cold_styles', 'reportlab', 12), ('payment_report', 'native', 10),
+        })
+        for result in run['results']:
+            self.assertGreater(result['median_ms'], 0)
+            self.assertGreater(result['peak_memory_kb'], 0)
+            self.assertGreater(result['bytes'], 0)
+
+
+class ReportExportTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='bursar', password='x')
+        user.groups.add(Group.objects.get_or_create(name='Secretary')[0])
+        self.client.force_login(user)
+        FeeStructure.objects.create(session=self.session, term='2', class_level=self.jss, amount=Decimal('100'))
+        self.parents = []
+        for i, paid in enumerate(['100', '40', None]):
+            parent, _ = self.make_family(f"0809000000{i}", [self.jss], first_name='Export')
+            if paid:
+                Payment.objects.create(parent=parent, session=self.session, term='2', amount=Decimal(paid), status='Completed')
+            self.parents.append(parent)
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_payment_report_csv_streams_filtered_rows(self):
+        response, content = self.export(
+            'admin_payment_report_export', session_id=self.session.pk, term='2', sort_type='partial', format='csv'
+        )
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(rows[0][:3], ['Students', 'Phone', 'Category'])
+        self.assertEqual([row[1:3] for row in rows[1:]], [['08090000001', 'Partial Paid']])
+        self.assertEqual(float(rows[1][4]), 40.0)
+
+    def test_payment_report_xlsx_has_every_family(self):
+        _, content = self.export('admin_payment_report_export', session_id=self.session.pk, term='2', format='xlsx')
+        sheet = load_workbook(io.BytesIO(content)).active
+        categories = sorted(row[2] for row in sheet.iter_rows(min_row=2, values_only=True))
+        self.assertEqual(categories, ['Full Paid', 'Not Paid', 'Partial Paid'])
+
+    def test_fee_statistics_export_ends_with_totals(self):
+        _, content = self.export('admin_fee_statistics_export', session_id=self.session.pk, term='2', format='xlsx')
+        rows = list(load_workbook(io.BytesIO(content)).active.iter_rows(values_only=True))
+        junior = next(row for row in rows if row[0] == 'Junior')
+        self.assertEqual(junior[1:3], (3, 300.0))
+        self.assertEqual(rows[-1][0], 'Total')
+        self.assertEqual(rows[-1][3], 140.0)
+
+    def test_daily_payments_csv(self):
+        with mock.patch('accounts.views.admin.get_current_session_term', return_value=(self.session, '2')):
+            _, content = self.export('admin_daily_payment_report_export', format='csv')
+        rows = list(csv.reader(io.StringIO(content.decode('utf-8-sig'))))
+        self.assertEqual(len(rows), 3)
+
+
+class BroadsheetExportTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='principal', password='x')
+        user.groups.add(Group.objects.get_or_create(name='Principal')[0])
+        self.client.force_login(user)
+
+    def test_class_level_workbook_has_a_sheet_per_section_and_a_summary(self):
+        first = self.build_section(self.jss, 'A', 101, 5, 3)
+        second = self.build_section(self.jss, 'B', 102, 4, 3)
+        self.build_section(self.primary, 'A', 103, 3, 2)
+        ranking.rank_section(first, self.session, '1')
+        response = self.client.get(
+            reverse('admin_broadsheet_export', args=[self.session.pk, '1']), {'class_level': self.jss.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['JSS 2A', 'JSS 2B', 'Summary'])
+
+        broadsheet = build_class_broadsheet(first, self.session, '1')
+        rows = list(workbook['JSS 2A'].iter_rows(values_only=True))
+        header = rows[0]
+        self.assertEqual(header[:4], ('Position', 'Admission No.', 'Student', f"{broadsheet['subjects'][0].name} CA"))
+        self.assertEqual(len(rows), len(broadsheet['rows']) + 2)
+        self.assertEqual(rows[-1][2], 'Class average')
+        for row, values in zip(broadsheet['rows'], rows[1:]):
+            self.assertEqual(values[1], row['student'].admission_number)
+            self.assertEqual(values[header.index('Total')], row['total_score'])
+
+        summary = list(workbook['Summary'].iter_rows(values_only=True))
+        self.assertEqual([row[0] for row in summary[1:]], ['JSS 2A', 'JSS 2B'])
+        self.assertEqual(summary[2][1], build_class_broadsheet(second, self.session, '1')['total_students'])
+
+    def test_non_numeric_section_or_class_level_redirects(self):
+        for name in ('admin_broadsheet_export', 'admin_report_cards'):
+            for params in ({'section': 'abc'}, {'class_level': '1x'}):
+                with self.subTest(view=name, params=params):
+                    response = self.client.get(reverse(name, args=[self.session.pk, '1']), params)
+                    self.assertRedirects(response, reverse('admin_result_tracking'), fetch_redirect_response=False)
+
+
+class ParentBalanceTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        self.parent, self.children = self.make_family('08033334444', [self.jss, self.primary], surname='Family')
+        FeeStructure.objects.create(session=self.session, term='2', class_level=self.jss, amount=Decimal('50000'))
+        FeeStructure.objects.create(session=self.session, term='2', class_level=self.primary, amount=Decimal('40000'))
+
+    def reference_status(self, session, term):
+        """The original per-child computation the ledger replaces."""
+        total = Decimal(0)
+        for student in self.parent.students.filter(is_active=True):
+            override = StudentFeeOverride.objects.filter(student=student, session=session, term=term).first()
+            if override:
+                total += override.amount
+                continue
+            fee = FeeStructure.objects.filter(session=session, term=term, class_level=student.current_class).first()
+            total += fee.amount if fee else Decimal(0)
+        if term == '1':
+            pta = PTADues.objects.filter(session=session, term=term).first()
+            total += pta.amount if pta else Decimal('2000.00')
+        paid = Payment.objects.filter(
+            parent=self.parent, session=session, term=term, status='Completed'
+        ).aggregate(total=Sum('amount'))['total'] or Decimal(0)
+        refunded = Refund.objects.filter(
+            parent=self.parent, session=session, term=term
+        ).aggregate(total=Sum('amount'))['total'] or Decimal(0)
+        amount_paid = max(paid - refunded, Decimal(0))
+        amount_due = max(total - amount_paid, Decimal(0))
+        return {
+            'status': 'Completed' if amount_due <= 0 else 'Partial' if amount_paid > 0 else 'Pending',
+            'amount_paid': amount_paid,
+            'amount_due': amount_due,
+            'total_fees': total,
+        }
+
+    def assertLedgerMatches(self, term):
+        stored = ParentTermBalance.objects.get(parent=self.parent, session=self.session, term=term)
+        self.assertEqual(stored.payment_status(), self.reference_status(self.session, term))
+
+    def test_stored_balance_is_one_query(self):
+        expected = self.reference_status(self.session, '2')
+        self.assertEqual(self.parent.get_payment_status_for_term(self.session, '2'), expected)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.parent.get_payment_status_for_term(self.session, '2'), expected)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.parent.get_total_fees_for_term(self.session, '2'), Decimal('90000'))
+
+    def test_payment_and_fee_changes_update_the_ledger(self):
+        self.parent.get_payment_status_for_term(self.session, '1')
+        self.parent.get_payment_status_for_term(self.session, '2')
+
+        payment = Payment.objects.create(
+            parent=self.parent, session=self.session, term='2', amount=Decimal('30000'), status='Completed'
+        )
+        self.assertLedgerMatches('2')
+        self.assertEqual(self.parent.get_payment_status_for_term(self.session, '2')['status'], 'Partial')
+        Payment.objects.create(parent=self.parent, session=self.session, term='2', amount=Decimal('5'), status='Pending')
+        Refund.objects.create(parent=self.parent, session=self.session, term='2', amount=Decimal('1000'))
+        self.assertLedgerMatches('2')
+
+        override = StudentFeeOverride.objects.create(
+            student=self.children[0], session=self.session, term='2', amount=Decimal('10000')
+        )
+        self.assertLedgerMatches('2')
+        self.assertEqual(self.parent.get_payment_status_for_term(self.session, '2')['amount_due'], Decimal('21000'))
+        override.delete()
+        FeeStructure.objects.filter(class_level=self.primary, term='2').get().delete()
+        self.assertLedgerMatches('2')
+
+        PTADues.objects.create(session=self.session, term='1', amount=Decimal('3500'))
+        self.assertLedgerMatches('1')
+
+        self.children[1].is_active = False
+        self.children[1].save()
+        self.assertLedgerMatches('2')
+        self.children[0].current_class = self.primary
+        self.children[0].save()
+        self.assertLedgerMatches('2')
+
+        payment.delete()
+        self.assertLedgerMatches('2')
+
+    def test_moving_a_fee_refreshes_the_families_it_left(self):
+        other, (child,) = self.make_family('08033335555', [self.primary])
+        self.assertEqual(other.get_total_fees_for_term(self.session, '2'), Decimal('40000'))
+        FeeStructure.objects.get(class_level=self.jss, term='2').delete()
+        fee = FeeStructure.objects.get(class_level=self.primary, term='2')
+        fee.class_level = self.jss
+        fee.save()
+        self.assertEqual(other.get_total_fees_for_term(self.session, '2'), Decimal('0'))
+
+        override = StudentFeeOverride.objects.create(student=child, session=self.session, term='2', amount=Decimal('100'))
+        self.assertEqual(other.get_total_fees_for_term(self.session, '2'), Decimal('100'))
+        override.student = self.children[1]
+        override.save()
+        self.assertEqual(other.get_total_fees_for_term(self.session, '2'), Decimal('0'))
+        self.assertLedgerMatches('2')
+
+    def test_promotion_refreshes_each_term_once(self):
+        self.parent.get_payment_status_for_term(self.session, '1')
+        self.parent.get_payment_status_for_term(self.session, '2')
+        next_class, _ = SchoolClass.objects.get_or_create(level='JSS 3')
+        for school_class in (self.jss, self.primary, next_class):
+            school_class.save()  # Migrated classes have no level_order until saved.
+        next_session = Session.objects.create(name='2025/2026', start_year=2025, end_year=2026)
+        with mock.patch.object(balances, '_refresh', wraps=balances._refresh) as refresh:
+            moved, _ = promotions.promote_students(
+                'promote', [c.pk for c in self.children], self.session, next_session, 'admin'
+            )
+        self.assertEqual(moved, 2)
+        self.assertEqual(refresh.call_count, 2)
+        self.assertLedgerMatches('1')
+        self.assertLedgerMatches('2')
+
+    def test_token_change_logs_the_student_out(self):
+        student = self.children[0]
+        student.user = User.objects.create_user(username='family0', password='x')
+        student.save()
+        self.client.force_login(student.user)
+        student.regenerate_token()
+        student.user.refresh_from_db()
+        self.assertTrue(student.user.check_password(student.token))
+        self.assertFalse(AuthSession.objects.exists())
+
+    def test_deleting_a_family_or_session_takes_its_balances(self):
+        Payment.objects.create(parent=self.parent, session=self.session, term='2', amount=Decimal('10'), status='Completed')
+        self.parent.delete()
+        self.assertFalse(ParentTermBalance.objects.exists())
+
+    def test_rebuild_command(self):
+        other = Session.objects.create(name='2023/2024', start_year=2023, end_year=2024)
+        Payment.objects.create(parent=self.parent, session=other, term='3', amount=Decimal('10'), status='Completed')
+        ParentTermBalance.objects.all().delete()
+        call_command('rebuild_parent_balances', stdout=io.StringIO())
+        self.assertEqual(ParentTermBalance.objects.count(), Session.objects.count() * 3)
+        self.assertEqual(
+            ParentTermBalance.objects.get(session=other, term='3').payment_status(), self.reference_status(other, '3')
+        )
+        for term in ('1', '2', '3'):
+            self.assertLedgerMatches(term)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FeeResolverTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent, self.children = self.make_family('08055556666', [self.jss, self.primary, None], first_name='Fee')
+        FeeStructure.objects.create(session=self.session, term='1', class_level=self.jss, amount=Decimal('50000'))
+        FeeStructure.objects.create(session=self.session, term='1', class_level=self.primary, amount=Decimal('40000'))
+        StudentFeeOverride.objects.create(student=self.children[2], session=self.session, term='1', amount=Decimal('7000'))
+
+    def test_resolves_overrides_class_fees_and_pta_dues_in_three_queries(self):
+        with self.assertNumQueries(3):
+            fees = FeeResolver.load(self.session, '1')
+        with self.assertNumQueries(0):
+            self.assertEqual([fees.student_fee(s) for s in self.children], [Decimal('50000'), Decimal('40000'), Decimal('7000')])
+            self.assertEqual(fees.pta_dues, Decimal('2000.00'))
+            self.assertEqual(fees.family_fees(self.children), Decimal('99000'))
+        self.assertEqual(FeeResolver.load(self.session, '2').pta_dues, Decimal(0))
+
+    def test_cached_per_term_until_fees_change(self):
+        other = Session.objects.create(name='2025/2026', start_year=2025, end_year=2026)
+        FeeResolver.for_terms([(self.session, '1'), (other, '1')])
+        with self.assertNumQueries(1):
+            FeeResolver.for_terms([(self.session.pk, '1'), (other.pk, '1')])
+        # Writes that send no signal, as from another process, are noticed through the stamp.
+        PTADues.objects.bulk_create([PTADues(session=self.session, term='1', amount=Decimal('3000'))])
+        self.assertEqual(FeeResolver.for_term(self.session, '1').pta_dues, Decimal('3000'))
+        StudentFeeOverride.objects.create(student=self.children[0], session=self.session, term='1', amount=Decimal('1'))
+        self.assertEqual(FeeResolver.for_term(self.session, '1').student_fee(self.children[0]), Decimal('1'))
+        FeeStructure.objects.filter(class_level=self.primary).update(amount=Decimal('45000'), updated_at=timezone.now())
+        self.assertEqual(FeeResolver.for_term(self.session, '1').student_fee(self.children[1]), Decimal('45000'))
+        with self.assertNumQueries(1):
+            self.assertEqual(FeeResolver.for_term(other, '1').pta_dues, Decimal('2000.00'))
+
+    def test_call_sites_agree(self):
+        payment = Payment.objects.create(
+            parent=self.parent, session=self.session, term='1', amount=Decimal('10000'), status='Completed'
+        )
+        payment.students.set(self.children)
+        ledger_total = self.parent.get_total_fees_for_term(self.session, '1')
+        self.assertEqual(ledger_total, Decimal('99000'))
+        self.assertEqual(payment.calculate_total_fee(), ledger_total)
+
+        user = User.objects.create_user(username='secretary', password='x')
+        user.groups.add(Group.objects.get_or_create(name='Secretary')[0])
+        self.client.force_login(user)
+        family = self.client.get(reverse('search_family_by_student_name'), {
+            'query': 'Child0', 'session_id': self.session.pk, 'term': '1',
+        }).json()['family']
+        self.assertEqual(Decimal(family['total_fees']), ledger_total)
+        self.assertEqual(
+            sum(Decimal(s['fee_amount']) for s in family['students']) + Decimal(family['pta_dues']), ledger_total
+        )
+        self.assertEqual(Decimal(family['amount_due']), Decimal('89000'))
+
+        response = self.client.post(reverse('admin_edit_student_fee'), {
+            'student_id': self.children[1].pk, 'session_id': self.session.pk, 'term': '1', 'new_amount': '30000',
+        }).json()
+        self.assertEqual(Decimal(response['total_fees']), Decimal('89000'))
+        self.assertEqual(Decimal(response['amount_due']), Decimal('79000'))
+        self.assertEqual(self.parent.get_total_fees_for_term(self.session, '1'), Decimal('89000'))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PaymentHistoryTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.parent, _ = self.make_family('08077778888', [self.jss, self.primary, self.primary], first_name='History')
+        self.past = Session.objects.create(name='2022/2023', start_year=2022, end_year=2023)
+        for session in (self.session, self.past):
+            for term in ('1', '2', '3'):
+                FeeStructure.objects.create(session=session, term=term, class_level=self.jss, amount=Decimal('50000'))
+                FeeStructure.objects.create(session=session, term=term, class_level=self.primary, amount=Decimal('40000'))
+                Payment.objects.create(parent=self.parent, session=session, term=term, amount=Decimal('60000'), status='Completed')
+        Payment.objects.create(parent=self.parent, session=self.past, term='2', amount=Decimal('70000'), status='Completed')
+        Refund.objects.create(parent=self.parent, session=self.past, term='2', amount=Decimal('5000'))
+        cache.clear()
+
+    def test_history_matches_the_ledger_with_constant_queries(self):
+        sessions = [self.session, self.past]
+        with self.assertNumQueries(8):
+            rows = payment_history.load_payment_history(self.parent, sessions)
+        self.assertEqual(len(rows), 6)
+        for row in rows:
+            status = self.parent.get_payment_status_for_term(row['session'], row['term'])
+            self.assertEqual(
+                (row['total_fees'], row['amount_paid'], row['amount_due'], row['payment_status']),
+                (status['total_fees'], status['amount_paid'], status['amount_due'], status['status']),
+            )
+        self.assertEqual(rows[4]['payment_status'], 'Partial')
+        with self.assertNumQueries(3):
+            payment_history.load_payment_history(self.parent, sessions)
+
+    def test_new_payments_and_fees_show_straight_away(self):
+        payment_history.load_payment_history(self.parent, [self.session])
+        Payment.objects.create(parent=self.parent, session=self.session, term='2', amount=Decimal('70000'), status='Completed')
+        StudentFeeOverride.objects.create(
+            student=self.parent.students.get(current_class=self.jss), session=self.session, term='3', amount=Decimal('0')
+        )
+        rows = payment_history.load_payment_history(self.parent, [self.session])
+        self.assertEqual([row['payment_status'] for row in rows], ['Partial', 'Completed', 'Partial'])
+        self.assertEqual(rows[2]['total_fees'], Decimal('80000'))
+
+        # A write that sends no signal, like one made in another process, shows too.
+        Payment.objects.filter(term='3', session=self.session).update(status='Cancelled', updated_at=timezone.now())
+        rows = payment_history.load_payment_history(self.parent, [self.session])
+        self.assertEqual(rows[2]['payment_status'], 'Pending')
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_page(self):
+        self.client.force_login(self.parent.user)
+        with mock.patch('accounts.views.parent.get_current_session_term', return_value=(self.session, '2')):
+            response = self.client.get(reverse('parent_payments'))
+        self.assertEqual(response.status_code, 200)
+        current = [row for row in response.context['active_payment_data'] if row['is_current']]
+        self.assertEqual([(row['session'], row['term']) for row in current], [(self.session, '2')])
+        self.assertEqual(len(response.context['past_payment_data']), 6)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class FeeStatisticsTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        FeeStructure.objects.create(session=self.session, term='1', class_level=self.jss, amount=Decimal('50000'))
+        FeeStructure.objects.create(session=self.session, term='1', class_level=self.primary, amount=Decimal('40000'))
+        self.families = []
+        for f in range(4):
+            self.families.append(self.make_family(
+                f"0809000000{f}", [self.jss, self.primary][:1 + f % 2], first_name='Stats', surname=f"Child{f}"
+            ))
+
+    def pay(self, family, amount):
+        parent, children = self.families[family]
+        payment = Payment.objects.create(parent=parent, session=self.session, term='1', amount=Decimal(amount), status='Completed')
+        payment.students.set(children)
+        return payment
+
+    def test_payments_are_spread_by_fee_share_including_pta_dues(self):
+        self.pay(1, '46000')
+        Refund.objects.create(parent=self.families[1][0], session=self.session, term='1', amount=Decimal('4600'))
+        StudentFeeOverride.objects.create(student=self.families[0][1][0], session=self.session, term='1', amount=Decimal('30000'))
+        data = fee_statistics.fee_statistics(self.session, '1')
+
+        by_class = {row['class_level']: row for row in data['class_data']}
+        self.assertEqual(by_class['JSS 2']['expected'], 30000 + 50000 * 3)
+        self.assertEqual(by_class['Primary 3']['expected'], 40000 * 2)
+        self.assertAlmostEqual(by_class['JSS 2']['paid'], 41400 * 50000 / 92000)
+        self.assertAlmostEqual(by_class['Primary 3']['paid'], 41400 * 40000 / 92000)
+        sections = {row['section']: row for row in data['stats_data']}
+        self.assertEqual(sections['Junior']['student_count'], 4)
+        self.assertEqual(sections['PTA Dues']['expected'], 2000 * 4)
+        self.assertAlmostEqual(sections['PTA Dues']['paid'], 41400 * 2000 / 92000)
+        self.assertAlmostEqual(sum(row['paid'] for row in data['stats_data']), 41400)
+        self.assertEqual(data['total_paid'], 41400)
+        self.assertEqual(data['total_expected'], 180000 + 80000 + 8000)
+
+    def test_queries_do_not_grow_with_payments(self):
+        self.pay(0, '1000')
+        with CaptureQueriesContext(connection) as few:
+            fee_statistics.compute_fee_statistics(self.session, '1')
+        for family in range(4):
+            for _ in range(5):
+                self.pay(family, '1000')
+        with CaptureQueriesContext(connection) as many:
+            fee_statistics.compute_fee_statistics(self.session, '1')
+        self.assertLessEqual(len(many), len(few))
+
+    def test_cached_under_a_stamp_of_the_rows_it_was_computed_from(self):
+        fee_statistics.fee_statistics(self.session, '1')
+        with self.assertNumQueries(1):
+            fee_statistics.fee_statistics(self.session, '1')
+        payment = self.pay(2, '5000')
+        self.assertEqual(fee_statistics.fee_statistics(self.session, '1')['total_paid'], 5000)
+
+        def paid_classes():
+            return {row['class_level'] for row in fee_statistics.fee_statistics(self.session, '1')['class_data'] if row['paid']}
+
+        self.assertEqual(paid_classes(), {'JSS 2'})
+        # Changing only the payment's students, or a child's class, still changes the stamp.
+        payment.students.clear()
+        self.assertEqual(paid_classes(), set())
+        payment.students.set(self.families[2][1])
+        child = self.families[2][1][0]
+        child.current_class = self.primary
+        child.save()
+        self.assertEqual(paid_classes(), {'Primary 3'})
+
+    def test_page_and_pdf_show_the_same_figures(self):
+        self.pay(3, '20000')
+        user = User.objects.create_user(username='bursar', password='x')
+        user.groups.add(Group.objects.get_or_create(name='Secretary')[0])
+        self.client.force_login(user)
+        params = {'session_id': self.session.pk, 'term': '1'}
+        with mock.patch('accounts.views.admin.get_current_session_term', return_value=(self.session, '1')), \
+                override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'), \
+                tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            page = self.client.get(reverse('admin_fee_statistics'), params)
+            with mock.patch.object(table_pdf, 'fee_statistics_pdf', return_value=b'%PDF-1.4') as render, \
+                    self.captureOnCommitCallbacks(execute=True):
+                progress = self.client.get(reverse('admin_fee_statistics_pdf'), dict(params, renderer='native'))
+            queued = BackgroundTask.objects.get(pk=progress.context['task'].pk)
+            self.assertEqual((queued.name, queued.status), ('report_pdf', 'Completed'))
+            with tasks.task_file_storage().open(queued.result['file']) as f:
+                self.assertEqual(f.read(), b'%PDF-1.4')
+        pdf_context = render.call_args[0][0]
+        for key in ('stats_data', 'class_data', 'total_expected', 'total_paid', 'total_outstanding'):
+            self.assertEqual(pdf_context[key], page.context[key])
+        self.assertEqual(page.context['total_paid'], 20000)
+
+
+class DailyPaymentReportTests(SectionFixtureMixin, TestCase):
+    def setUp(self):
+        FeeStructure.objects.create(session=self.session, term='2', class_level=self.jss, amount=Decimal('50000'))
+        self.cashiers = []
+        for username, first_name in [('bursar', 'Ada'), ('clerk', '')]:
+            user = User.objects.create_user(username=username, password='x', first_name=first_name)
+            user.groups.add(Group.objects.get_or_create(name='Secretary')[0])
+            self.cashiers.append(user)
+        self.parents = []
+        for f in range(3):
+            parent, _ = self.make_family(f"0807000000{f}", [self.jss], first_name='Daily')
+            self.parents.append(parent)
+
+    def pay(self, family, amount, day, cashier=None, term='2'):
+        payment = Payment.objects.create(
+            parent=self.parents[family], session=self.session, term=term, amount=Decimal(amount),
+            status='Completed', created_by=cashier,
+        )
+        payment.students.set(self.parents[family].students.all())
+        created_at = timezone.make_aware(datetime(2025, 1, day, 10, 30))
+        Payment.objects.filter(pk=payment.pk).update(created_at=created_at)
+        return payment
+
+    def rows(self, start, end):
+        payments = daily_payments.get_daily_payments(date(2025, 1, start), date(2025, 1, end), self.session, '2')
+        return list(daily_payments.iter_daily_payment_rows(payments, self.session, '2'))
+
+    def test_amounts_due_match_the_ledger_with_constant_queries(self):
+        self.pay(0, '10000', 6)
+        with CaptureQueriesContext(connection) as few:
+            self.rows(1, 31)
+        for day in range(6, 16):
+            for family in range(3):
+                self.pay(family, '1000', day)
+        with CaptureQueriesContext(connection) as many:
+            rows = self.rows(1, 31)
+        self.assertEqual(len(rows), 31)
+        self.assertLessEqual(len(many), len(few))
+        due = {
+            parent.full_name or parent.phone_number: float(parent.get_payment_status_for_term(self.session, '2')['amount_due'])
+            for parent in self.parents
+        }
+        for row in rows:
+            self.assertEqual(row['amount_due'], due[row['parent_name']])
+        self.assertEqual(due['08070000000'], 50000 - 20000)
+
+    def test_range_and_subtotals_per_day_and_cashier(self):
+        self.pay(0, '5000', 6, self.cashiers[0])
+        self.pay(1, '7000', 6, self.cashiers[1])
+        self.pay(2, '3000', 7, self.cashiers[0])
+        self.pay(0, '2000', 8)
+        self.pay(1, '9000', 7, self.cashiers[0], term='1')
+        self.client.force_login(self.cashiers[0])
+        with override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+            response = self.client.get(reverse('admin_daily_payment_report'), {
+                'start_date': '2025-01-06', 'end_date': '2025-01-07', 'session_id': self.session.pk, 'term': '2',
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['report_data']), 3)
+        self.assertEqual(response.context['total_paid'], 15000)
+        self.assertEqual(
+            [(row['day'], row['count'], row['total']) for row in response.context['day_totals']],
+            [('2025-01-06', 2, 12000), ('2025-01-07', 1, 3000)],
+        )
+        self.assertEqual(
+            [(row['cashier'], row['count'], row['total']) for row in response.context['cashier_totals']],
+            [('Ada', 2, 8000), ('clerk', 1, 7000)],
+        )
+
+    def test_native_pdf_has_the_subtotals(self):
+        self.pay(0, '5000', 6, self.cashiers[0])
+        payments = daily_payments.get_daily_payments(date(2025, 1, 6), date(2025, 1, 6), self.session, '2')
+        context = {
+            'current_session': self.session,
+            'current_term': '2',
+            'date_label': '2025-01-06',
+            'report_data': list(daily_payments.iter_daily_payment_rows(payments, self.session, '2')),
+            **daily_payments.daily_payment_totals(payments),
+        }
+        text = PdfReader(io.BytesIO(table_pdf.daily_payment_report_pdf(context))).pages[0].extract_text()
+        self.assertIn('By Cashier', text)
+        self.assertIn('Ada', text)
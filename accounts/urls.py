@@ -12,6 +12,8 @@ urlpatterns = [
     path('test-session-term/', test_session_term, name='test_session_term'),
     path('dashboard/', dashboard, name='dashboard'),
     path('profile/', profile, name='profile'),
+    path('tasks/<int:task_id>/status/', task_status, name='task_status'),
+    path('tasks/<int:task_id>/download/', task_download, name='task_download'),
 
     # Admin and Teacher
     path('student/details/<str:admission_number>/', student_detail, name='student_detail'),
@@ -34,6 +36,7 @@ urlpatterns = [
     path('teacher/view-students/', teacher_view_students, name='teacher_view_students'),
     path('teacher/student/<str:admission_number>/update_result/', update_result, name='update_result'),
     path('teacher/class-results/', teacher_view_class_results, name='teacher_view_class_results'),
+    path('teacher/score-entry/', teacher_section_score_entry, name='teacher_section_score_entry'),
     path('teacher/manage-subjects/', teacher_manage_subjects, name='teacher_manage_subjects'),
     path('teacher/assign-student/', assign_student_to_section, name='assign_student_to_section'),
     path('teacher/remove-student/', remove_student_from_section, name='remove_student_from_section'),
@@ -68,13 +71,21 @@ urlpatterns = [
     path('admin/statistics/', admin_statistics, name='admin_statistics'),
     path('admin/student/<str:admission_number>/results/<int:session_id>/<str:term>/', admin_view_student_results, name='admin_view_student_results'),
     path('admin/result-tracking/', admin_result_tracking, name='admin_result_tracking'),
+    path('admin/import-results/', admin_import_results, name='admin_import_results'),
     path('admin/class-results/<int:section_id>/<int:session_id>/<str:term>/', view_class_results, name='view_class_results'),
+    path('admin/class-results/<int:section_id>/<int:session_id>/<str:term>/pdf/', admin_class_broadsheet_pdf, name='admin_class_broadsheet_pdf'),
+    path('admin/report-cards/<int:session_id>/<str:term>/', admin_report_cards, name='admin_report_cards'),
+    path('admin/broadsheets/<int:session_id>/<str:term>/', admin_broadsheet_export, name='admin_broadsheet_export'),
     path('admin/payment-report/', admin_payment_report, name='admin_payment_report'),
     path('admin/payment-report-pdf/', admin_payment_report_pdf, name='admin_payment_report_pdf'),
+    path('admin/payment-report/export/', admin_payment_report_export, name='admin_payment_report_export'),
     path('admin/fee-statistics/', admin_fee_statistics, name='admin_fee_statistics'),
     path('admin/fee-statistics-pdf/', admin_fee_statistics_pdf, name='admin_fee_statistics_pdf'),
+    path('admin/fee-statistics/export/', admin_fee_statistics_export, name='admin_fee_statistics_export'),
     path('admin/daily-payment-report/', admin_daily_payment_report, name='admin_daily_payment_report'),
     path('admin/daily-payment-report-pdf/', admin_daily_payment_report_pdf, name='admin_daily_payment_report_pdf'),
+    path('admin/daily-payment-report/export/', admin_daily_payment_report_export, name='admin_daily_payment_report_export'),
+    path('admin/receipts/', admin_bulk_receipts, name='admin_bulk_receipts'),
     path('admin/payments/create/', admin_create_payment, name='admin_create_payment'),
     path('admin/search-family/', search_family_by_student_name, name='search_family_by_student_name'),
     path('admin/students/search-parents/', search_parents, name='search_parents'),
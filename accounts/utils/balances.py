@@ -0,0 +1,191 @@
+"""
+Maintenance of ParentTermBalance rows.
+
+A balance holds what Parent.get_total_fees_for_term and
+get_payment_status_for_term used to recompute on every call: the family's
+fees for the term as FeeResolver prices its active children, its completed
+payments and refunds, and the resulting amount due and status. Balances are
+refreshed when a Payment, Refund, FeeStructure, StudentFeeOverride, PTADues or
+a child's enrolment changes, computed on first read when missing, and rebuilt
+from scratch by the rebuild_parent_balances command.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import Parent, ParentTermBalance, Payment, Refund, Session, Student
+from accounts.utils.fees import FeeResolver
+
+logger = logging.getLogger(__name__)
+
+BALANCE_FIELDS = ['total_fees', 'total_paid', 'total_refunded', 'amount_due', 'status', 'updated_at']
+
+_deferred = threading.local()
+
+
+def settle(total_fees, total_paid, total_refunded):
+    """(amount_paid, amount_due, status) of a family's term; refunds come off payments and nothing goes below zero."""
+    amount_paid = max(total_paid - total_refunded, Decimal(0))
+    amount_due = max(total_fees - amount_paid, Decimal(0))
+    status = 'Completed' if amount_due <= 0 else 'Partial' if amount_paid > 0 else 'Pending'
+    return amount_paid, amount_due, status
+
+
+def _family_fees(parent_ids, session_id, term):
+    """Fees of each family in `parent_ids` for one term, keyed by parent_id."""
+    resolver = FeeResolver.load(session_id, term)
+    fees = {parent_id: resolver.pta_dues for parent_id in parent_ids}
+    children = Student.objects.filter(
+        parent_id__in=parent_ids, is_active=True
+    ).values_list('admission_number', 'parent_id', 'current_class_id')
+    for student_id, parent_id, class_id in children:
+        fees[parent_id] += resolver.fee(student_id, class_id)
+    return fees
+
+
+def _totals(model, parent_ids, session_id, term, **filters):
+    return dict(model.objects.filter(
+        parent_id__in=parent_ids, session_id=session_id, term=term, **filters
+    ).values('parent_id').annotate(total=Sum('amount')).values_list('parent_id', 'total').order_by())
+
+
+def _refresh(parents, session_id, term):
+    """Recompute and upsert the balances of `parents` (a queryset) for one term. Returns {parent_id: balance}."""
+    now = timezone.now()
+    with transaction.atomic():
+        # Locking the families serializes concurrent refreshes, so the one that commits last saw every payment.
+        parent_ids = list(parents.select_for_update().order_by('pk').values_list('pk', flat=True))
+        if not parent_ids:
+            return {}
+        fees = _family_fees(parent_ids, session_id, term)
+        paid = _totals(Payment, parent_ids, session_id, term, status='Completed')
+        refunded = _totals(Refund, parent_ids, session_id, term)
+
+        balances = {}
+        for parent_id in parent_ids:
+            balance = ParentTermBalance(
+                parent_id=parent_id, session_id=session_id, term=term,
+                total_fees=fees[parent_id],
+                total_paid=paid.get(parent_id) or Decimal(0),
+                total_refunded=refunded.get(parent_id) or Decimal(0),
+                updated_at=now,
+            )
+            _, balance.amount_due, balance.status = settle(
+                balance.total_fees, balance.total_paid, balance.total_refunded
+            )
+            balances[parent_id] = balance
+        ParentTermBalance.objects.bulk_create(
+            balances.values(), batch_size=500, update_conflicts=True,
+            unique_fields=['parent', 'session', 'term'], update_fields=BALANCE_FIELDS,
+        )
+    return balances
+
+
+def refresh_parent_balances(parent_ids, session_id, term):
+    """Recompute the balances of the given parents for one term after a payment, refund or fee change."""
+    return _refresh(Parent.objects.filter(pk__in=parent_ids), session_id, term)
+
+
+def refresh_student_balances(student_id, session_id, term):
+    """Recompute the balance of a student's family for one term after the student's fee override changed."""
+    parent_id = Student.objects.filter(pk=student_id).values_list('parent_id', flat=True).first()
+    if parent_id:
+        refresh_parent_balances([parent_id], session_id, term)
+
+
+def refresh_term_balances(session_id, term, parent_ids=None):
+    """Recompute the stored balances of a term, optionally only those of `parent_ids`."""
+    stored = ParentTermBalance.objects.filter(session_id=session_id, term=term)
+    if parent_ids is not None:
+        stored = stored.filter(parent_id__in=parent_ids)
+    return _refresh(Parent.objects.filter(pk__in=stored.values('parent_id')), session_id, term)
+
+
+def refresh_families_balances(parent_ids):
+    """Recompute every stored balance of the given families, one batched refresh per stored term."""
+    parent_ids = list(parent_ids)
+    terms = ParentTermBalance.objects.filter(
+        parent_id__in=parent_ids
+    ).values_list('session_id', 'term').distinct().order_by()
+    for session_id, term in list(terms):
+        refresh_term_balances(session_id, term, parent_ids=parent_ids)
+
+
+def refresh_family_balances(parent_id):
+    """Recompute every stored balance of a family after one of its children changed class, family or status."""
+    pending = getattr(_deferred, 'parent_ids', None)
+    if pending is not None:
+        pending.add(parent_id)
+        return
+    refresh_families_balances([parent_id])
+
+
+@contextmanager
+def deferred_family_balances():
+    """
+    Collect the families refresh_family_balances() is called for and refresh
+    them together on exit, so moving a whole school of students costs one
+    refresh per term rather than several per student. Nothing is refreshed
+    when the block raises.
+    """
+    if getattr(_deferred, 'parent_ids', None) is not None:
+        yield
+        return
+    _deferred.parent_ids = pending = set()
+    try:
+        yield
+    finally:
+        _deferred.parent_ids = None
+    if pending:
+        refresh_families_balances(pending)
+
+
+def refresh_class_balances(class_level_id, session_id, term):
+    """Recompute the stored balances of families with an active child in a class level after its fee changed."""
+    parent_ids = Student.objects.filter(
+        current_class_id=class_level_id, is_active=True, parent__isnull=False
+    ).values('parent_id')
+    return refresh_term_balances(session_id, term, parent_ids=parent_ids)
+
+
+def term_balances(parent_ids, session, term):
+    """Balances of many families for one term, computing any that are not stored yet. Returns {parent_id: balance}."""
+    session_id = getattr(session, 'pk', session)
+    parent_ids = set(parent_ids)
+    balances = {
+        b.parent_id: b for b in ParentTermBalance.objects.filter(
+            parent_id__in=parent_ids, session_id=session_id, term=term
+        )
+    }
+    missing = parent_ids - set(balances)
+    if missing:
+        balances.update(refresh_parent_balances(missing, session_id, term))
+    return balances
+
+
+def term_balance(parent, session, term):
+    """The balance of one family for one term: one indexed read once the balance is stored."""
+    session_id = getattr(session, 'pk', session)
+    balance = ParentTermBalance.objects.filter(parent=parent, session_id=session_id, term=term).first()
+    if balance is None:
+        balance = refresh_parent_balances([parent.pk], session_id, term)[parent.pk]
+    return balance
+
+
+def rebuild_all_balances(session=None):
+    """Drop and rebuild the balances of every family, optionally for a single session. Returns the rows written."""
+    sessions = [session] if session else list(Session.objects.all())
+    written = 0
+    with transaction.atomic():
+        ParentTermBalance.objects.filter(**({'session': session} if session else {})).delete()
+        for s in sessions:
+            for term, _ in TERM_CHOICES:
+                written += len(_refresh(Parent.objects.all(), s.pk, term))
+    logger.info(f"Rebuilt {written} parent term balances")
+    return written
@@ -0,0 +1,218 @@
+"""
+Class broadsheet: the student x subject result matrix of one section and term.
+
+Shared by the admin and teacher class-results views and the XLSX export.
+Everything is loaded in five queries (students, subjects, assignments,
+results, term summaries) regardless of the section size, then assembled in
+memory.
+"""
+import logging
+
+from accounts.models import Result, Student, StudentSubject, StudentTermSummary, Subject
+
+logger = logging.getLogger(__name__)
+
+# Score components entered per school section; Junior and Senior use SECONDARY_COMPONENTS.
+RESULT_COMPONENTS = {
+    'Nursery': [('total_marks', 'Marks')],
+    'Primary': [('test', 'Test'), ('homework', 'HW'), ('classwork', 'CW'), ('nursery_primary_exam', 'Exam')],
+}
+SECONDARY_COMPONENTS = [('ca', 'CA'), ('test_1', 'Test 1'), ('test_2', 'Test 2'), ('exam', 'Exam')]
+SUMMARY_HEADER = [
+    'Section', 'Students', 'With complete results', 'Class average', 'Highest average', 'Lowest average', 'Subjects',
+]
+
+
+def _position_rank(position):
+    if position and position[:-2].isdigit():
+        return int(position[:-2])
+    return float('inf')
+
+
+def build_class_broadsheet(section, session, term):
+    """
+    Return a dict with `subjects`, `rows` (one per active student, sorted by
+    average then class position), `class_averages` keyed by subject id,
+    `total_students`, `students_with_complete_results` and `class_average_score`.
+    """
+    students = list(Student.objects.filter(
+        current_section=section,
+        is_active=True
+    ).order_by('surname', 'first_name', 'middle_name'))
+    subjects = list(Subject.objects.filter(
+        school_class=section.school_class,
+        is_active=True
+    ).order_by('id'))
+
+    assigned = {}
+    for student_id, subject_id in StudentSubject.objects.filter(
+        student__current_section=section,
+        student__is_active=True,
+        session=session,
+        term=term,
+        subject__is_active=True
+    ).values_list('student_id', 'subject_id'):
+        assigned.setdefault(student_id, []).append(subject_id)
+
+    results_by_student = {}
+    for result in Result.objects.filter(
+        student__current_section=section,
+        student__is_active=True,
+        session=session,
+        term=term
+    ).select_related('subject').order_by('pk'):
+        results_by_student.setdefault(result.student_id, {})[result.subject_id] = result
+
+    summaries = {
+        summary.student_id: summary
+        for summary in StudentTermSummary.objects.filter(
+            student__current_section=section,
+            student__is_active=True,
+            session=session,
+            term=term
+        )
+    }
+
+    rows = []
+    for student in students:
+        student_results = results_by_student.get(student.pk, {})
+        subject_ids = assigned.get(student.pk)
+        if not subject_ids:
+            subject_ids = [sid for sid, r in student_results.items() if r.subject.is_active]
+            logger.warning(
+                f"No StudentSubject records for {student.full_name} in {session.name}, term {term}. "
+                f"Fallback to Result subjects: {subject_ids}"
+            )
+        subject_id_set = set(subject_ids)
+        scoped_results = [r for sid, r in student_results.items() if sid in subject_id_set]
+
+        summary = summaries.get(student.pk)
+        has_complete_results = bool(summary and summary.is_complete)
+        results = {}
+        total_score = 0
+        for subject in subjects:
+            result = student_results.get(subject.id) if subject.id in subject_id_set else None
+            is_assigned = subject.id in subject_id_set
+            is_complete = bool(result and result.total_score > 0)
+            results[subject.id] = {
+                'result_obj': result,
+                'is_complete': is_complete,
+                'is_assigned': is_assigned,
+            }
+            if is_assigned and is_complete:
+                total_score += result.total_score
+
+        first_result = scoped_results[0] if scoped_results else None
+        rows.append({
+            'student': student,
+            'results': results,
+            'total_score': total_score,
+            'subjects_count': len(subject_ids),
+            'has_complete_results': has_complete_results,
+            'average_score': round(summary.average_score, 2) if has_complete_results else 0,
+            'class_position': (summary.class_position or None) if has_complete_results else None,
+            'summary': summary,
+            'assigned_subject_ids': subject_ids,
+            'remarks': first_result.remarks if first_result else '',
+        })
+
+    rows.sort(key=lambda row: (-row['average_score'], _position_rank(row['class_position'])))
+
+    class_averages = {}
+    for subject in subjects:
+        scores = [
+            student_results[subject.id].total_score
+            for student_results in results_by_student.values()
+            if subject.id in student_results and student_results[subject.id].total_score > 0
+        ]
+        class_averages[subject.id] = {
+            'average': sum(scores) / len(scores) if scores else 0,
+            'count': len(scores),
+        }
+
+    complete_rows = [row for row in rows if row['has_complete_results']]
+    return {
+        'subjects': subjects,
+        'rows': rows,
+        'class_averages': class_averages,
+        'total_students': len(students),
+        'students_with_complete_results': len(complete_rows),
+        'class_average_score': (
+            sum(row['average_score'] for row in complete_rows) / len(complete_rows)
+            if complete_rows else 0
+        ),
+    }
+
+
+def result_components(school_class):
+    return RESULT_COMPONENTS.get(school_class.section, SECONDARY_COMPONENTS)
+
+
+def broadsheet_sheet(section, broadsheet):
+    """
+    (title, header, rows) of one section's broadsheet for exports.write_xlsx:
+    every student's component scores, total, grade and subject position per
+    subject, then their totals, averages and class positions, and a final row
+    of per-subject class averages.
+    """
+    components = result_components(section.school_class)
+    subjects = broadsheet['subjects']
+    header = ['Position', 'Admission No.', 'Student']
+    for subject in subjects:
+        header += [f"{subject.name} {label}" for _, label in components]
+        header += [f"{subject.name} Total", f"{subject.name} Grade", f"{subject.name} Position"]
+    header += ['Subjects', 'Total', 'Average', 'Average G.P', 'Class Position', 'Class Position (G.P)']
+
+    def rows():
+        for row in broadsheet['rows']:
+            summary = row['summary']
+            values = [row['class_position'] or '', row['student'].admission_number, row['student'].full_name]
+            for subject in subjects:
+                result = row['results'][subject.id]['result_obj']
+                if result is None:
+                    values += [None] * (len(components) + 3)
+                    continue
+                values += [getattr(result, field) for field, _ in components]
+                values += [result.total_score, result.grade, result.subject_position]
+            values += [
+                row['subjects_count'],
+                row['total_score'],
+                row['average_score'] if row['has_complete_results'] else None,
+                summary.average_grade_point if row['has_complete_results'] else None,
+                row['class_position'] or '',
+                (summary.class_position_gp or '') if row['has_complete_results'] else '',
+            ]
+            yield values
+
+        averages = ['', '', 'Class average']
+        for subject in subjects:
+            averages += [None] * len(components)
+            averages += [round(broadsheet['class_averages'][subject.id]['average'], 2), None, None]
+        averages += [None, None, round(broadsheet['class_average_score'], 2), None, '', '']
+        yield averages
+
+    title = f"{section.school_class.level}{section.suffix}"
+    return title, header, rows()
+
+
+def broadsheet_workbook_sheets(sections, session, term):
+    """
+    Sheets for a workbook of several sections: one broadsheet per section,
+    built one section at a time, then a summary sheet with a row per section.
+    """
+    summary_rows = []
+    for section in sections:
+        broadsheet = build_class_broadsheet(section, session, term)
+        title, header, rows = broadsheet_sheet(section, broadsheet)
+        yield title, header, rows
+        averages = [row['average_score'] for row in broadsheet['rows'] if row['has_complete_results']]
+        summary_rows.append([
+            title,
+            broadsheet['total_students'],
+            broadsheet['students_with_complete_results'],
+            round(broadsheet['class_average_score'], 2),
+            max(averages) if averages else None,
+            min(averages) if averages else None,
+            len(broadsheet['subjects']),
+        ])
+    yield 'Summary', SUMMARY_HEADER, summary_rows
@@ -0,0 +1,86 @@
+"""
+Daily payment report: the payments of a session and term made between two
+dates, with each family's outstanding balance and subtotals per day and per
+cashier.
+
+Balances come from ParentTermBalance for every family on the report at once,
+and subtotals are grouped in the database, so the number of queries does not
+grow with the number of payments, even over a whole term.
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import Payment
+from accounts.utils.balances import term_balances
+
+NO_CASHIER = 'Not recorded'
+
+
+def cashier_name(user):
+    if user is None:
+        return NO_CASHIER
+    return user.get_full_name() or user.username
+
+
+def get_daily_payments(start_date, end_date, session, term):
+    """Payments of a session and term made from `start_date` to `end_date` inclusive, latest first."""
+    return Payment.objects.filter(
+        created_at__date__range=(start_date, end_date),
+        session=session,
+        term=term,
+    ).select_related('parent', 'created_by').prefetch_related('students__current_class').order_by('-created_at')
+
+
+def iter_daily_payment_rows(payments, session, term, chunk_size=500):
+    """Yield one daily payment report row per payment, with the family's amount due for the term."""
+    parent_ids = payments.order_by().prefetch_related(None).values_list('parent_id', flat=True).distinct()
+    balances = term_balances(parent_ids, session, term)
+    for payment in payments.iterator(chunk_size=chunk_size):
+        students = payment.students.all()
+        student_list = [f"{s.full_name} ({s.current_class.level})" for s in students if s.current_class]
+        created_at = timezone.localtime(payment.created_at)
+
+        yield {
+            'parent_name': payment.parent.full_name or payment.parent.phone_number,
+            'students': ', '.join(student_list) or 'No students',
+            'amount_paid': float(payment.amount),
+            'amount_due': float(balances[payment.parent_id].amount_due),
+            'transaction_id': payment.transaction_id,
+            'cashier': cashier_name(payment.created_by),
+            'date': created_at.strftime('%Y-%m-%d'),
+            'time': created_at.strftime('%I:%M %p'),
+        }
+
+
+def daily_payment_totals(payments):
+    """
+    The total of `payments`, and its subtotals per day (`day_totals`, oldest
+    first) and per cashier (`cashier_totals`, largest first), each row with
+    a `count` and a `total`.
+    """
+    payments = payments.order_by().prefetch_related(None)
+    days = list(payments.annotate(day=TruncDate('created_at')).values('day').annotate(
+        count=Count('pk'), total=Sum('amount')
+    ).order_by('day'))
+    cashiers = payments.values(
+        'created_by', 'created_by__username', 'created_by__first_name', 'created_by__last_name'
+    ).annotate(count=Count('pk'), total=Sum('amount')).order_by('-total', 'created_by__username')
+    return {
+        'total_paid': float(sum((row['total'] for row in days), Decimal(0))),
+        'day_totals': [
+            {'day': row['day'].strftime('%Y-%m-%d'), 'count': row['count'], 'total': float(row['total'])}
+            for row in days
+        ],
+        'cashier_totals': [
+            {
+                'cashier': (f"{row['created_by__first_name']} {row['created_by__last_name']}".strip()
+                            or row['created_by__username'] or NO_CASHIER),
+                'count': row['count'],
+                'total': float(row['total']),
+            }
+            for row in cashiers
+        ],
+    }
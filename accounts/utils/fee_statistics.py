@@ -0,0 +1,181 @@
+"""
+Fee statistics: expected, paid and outstanding fees per class and school section.
+
+Expected fees are what FeeResolver charges the active students enrolled by the
+end of the session, plus the first term's PTA dues once per family. Each
+completed payment is spread over the students on it, and each refund over the
+family's students, in proportion to their fees. The PTA dues count as one more
+share of a family's fees in the first term. A payment whose students are all
+free is split equally between them.
+
+Everything comes from a handful of queries grouped in memory. The result is
+cached per session and term under a stamp of the payments, refunds, fees, PTA
+dues and students it was computed from, so a change made in any process (the
+web workers or the process_tasks worker rendering the PDF) is seen by all.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from accounts.models import FeeStructure, Payment, PTADues, Refund, SchoolClass, Student, StudentFeeOverride
+from accounts.utils.fees import FeeResolver
+from accounts.utils.stamps import table_stamp
+
+logger = logging.getLogger(__name__)
+
+FEE_STATISTICS_SECONDS = 15 * 60
+FEE_SECTIONS = {
+    'Creche': ['Creche'],
+    'Nursery_Primary': ['Pre-Nursery', 'Nursery 1', 'Nursery 2', 'Nursery 3', 'Primary 1', 'Primary 2', 'Primary 3', 'Primary 4', 'Primary 5'],
+    'Junior': ['JSS 1', 'JSS 2', 'JSS 3'],
+    'Senior': ['SS 1', 'SS 2', 'SS 3'],
+}
+PTA_SECTION = 'PTA Dues'
+
+
+def _cache_key(session_id, term):
+    term_rows = {'session_id': session_id, 'term': term}
+    stamp = table_stamp(
+        Payment.objects.filter(**term_rows),
+        Refund.objects.filter(**term_rows),
+        FeeStructure.objects.filter(**term_rows),
+        StudentFeeOverride.objects.filter(**term_rows),
+        PTADues.objects.filter(**term_rows),
+        Student.objects.all(),
+    )
+    return f"fee_statistics_{session_id}_{term}_{stamp}"
+
+
+def _row(name, student_count, expected, paid):
+    percentage_paid = (paid / expected * 100) if expected > 0 else 0
+    return {
+        'section': name,
+        'expected': float(expected),
+        'paid': float(paid),
+        'outstanding': float(expected - paid),
+        'percentage_paid': round(percentage_paid, 2),
+        'student_count': student_count,
+    }
+
+
+def _allocate(amount, shares, pta_share, paid_by_class, sign):
+    """Spread `amount` over `shares`, a list of (class_id, fee), and the PTA share. Returns the PTA part."""
+    total = sum(fee for _, fee in shares) + pta_share
+    if total == 0:
+        for class_id, _ in shares:
+            paid_by_class[class_id] += sign * amount / len(shares)
+        return Decimal(0)
+    for class_id, fee in shares:
+        paid_by_class[class_id] += sign * amount * fee / total
+    return sign * amount * pta_share / total
+
+
+def compute_fee_statistics(session, term):
+    """Fee statistics of one term, without the cache. See fee_statistics()."""
+    fees = FeeResolver.for_term(session, term)
+    classes = {c.pk: c for c in SchoolClass.objects.all()}
+
+    # Active students with a class, their fee, and whether they count towards this session's expected fees.
+    students = {}
+    children_by_parent = defaultdict(list)
+    for student_id, class_id, parent_id, enrollment_year in Student.objects.filter(
+        is_active=True, current_class__isnull=False
+    ).values_list('admission_number', 'current_class_id', 'parent_id', 'enrollment_year'):
+        enrolled = enrollment_year <= str(session.end_year)
+        students[student_id] = (class_id, fees.fee(student_id, class_id), enrolled)
+        if parent_id:
+            children_by_parent[parent_id].append(student_id)
+
+    payment_students = defaultdict(list)
+    for payment_id, student_id in Payment.students.through.objects.filter(
+        payment__session=session, payment__term=term, payment__status='Completed'
+    ).values_list('payment_id', 'student_id'):
+        if student_id in students:
+            payment_students[payment_id].append(student_id)
+    payments = Payment.objects.filter(
+        session=session, term=term, status='Completed'
+    ).values_list('pk', 'amount')
+    refunds = Refund.objects.filter(
+        session=session, term=term
+    ).values('parent_id').annotate(total=Sum('amount')).values_list('parent_id', 'total').order_by()
+
+    paid_by_class = defaultdict(Decimal)
+    pta_paid = Decimal(0)
+    total_paid = Decimal(0)
+    for payment_id, amount in payments:
+        total_paid += amount
+        shares = [students[s][:2] for s in payment_students.get(payment_id, ())]
+        if shares:
+            pta_paid += _allocate(amount, shares, fees.pta_dues, paid_by_class, 1)
+    for parent_id, amount in refunds:
+        total_paid -= amount
+        shares = [students[s][:2] for s in children_by_parent.get(parent_id, ())]
+        if shares:
+            pta_paid += _allocate(amount, shares, fees.pta_dues, paid_by_class, -1)
+    total_paid = max(total_paid, Decimal(0))
+
+    expected_by_class = defaultdict(Decimal)
+    count_by_class = defaultdict(int)
+    families = set()
+    for parent_id, children in children_by_parent.items():
+        if any(students[s][2] for s in children):
+            families.add(parent_id)
+    for class_id, fee, enrolled in students.values():
+        if enrolled:
+            expected_by_class[class_id] += fee
+            count_by_class[class_id] += 1
+
+    class_ids_by_level = {c.level: pk for pk, c in classes.items()}
+    class_data, stats_data = [], []
+    total_expected = Decimal(0)
+    for section, levels in FEE_SECTIONS.items():
+        section_expected = section_paid = Decimal(0)
+        section_count = 0
+        for level in levels:
+            class_id = class_ids_by_level.get(level)
+            expected = expected_by_class.get(class_id, Decimal(0))
+            paid = max(paid_by_class.get(class_id, Decimal(0)), Decimal(0))
+            count = count_by_class.get(class_id, 0)
+            class_data.append(dict(_row(level, count, expected, paid), class_level=level, group=section))
+            section_expected += expected
+            section_paid += paid
+            section_count += count
+        stats_data.append(_row(section, section_count, section_expected, section_paid))
+        total_expected += section_expected
+
+    if term == '1':
+        pta_expected = fees.pta_dues * len(families)
+        stats_data.append(_row(PTA_SECTION, len(families), pta_expected, max(pta_paid, Decimal(0))))
+        total_expected += pta_expected
+
+    total_outstanding = total_expected - total_paid
+    total_percentage_paid = (total_paid / total_expected * 100) if total_expected > 0 else 0
+    logger.debug('Fee statistics %s term %s: expected=%s, paid=%s', session.pk, term, total_expected, total_paid)
+    return {
+        'stats_data': stats_data,
+        'class_data': class_data,
+        'total_expected': float(total_expected),
+        'total_paid': float(total_paid),
+        'total_outstanding': float(total_outstanding),
+        'total_percentage_paid': round(total_percentage_paid, 2),
+    }
+
+
+def fee_statistics(session, term):
+    """
+    Expected, paid and outstanding fees of a term. `stats_data` has a row per
+    school section (plus PTA dues in the first term) and `class_data` a row
+    per class level, each with `section`, `student_count`, `expected`, `paid`,
+    `outstanding` and `percentage_paid`. Class rows also carry `class_level`
+    and `group`, the school section they add up to. `total_paid` is every
+    completed payment less refunds, including payments with no students on them.
+    """
+    key = _cache_key(session.pk, term)
+    data = cache.get(key)
+    if data is None:
+        data = compute_fee_statistics(session, term)
+        cache.set(key, data, FEE_STATISTICS_SECONDS)
+    return data
@@ -0,0 +1,116 @@
+"""
+Fee resolution.
+
+A student's fee for a term is their StudentFeeOverride when there is one, else
+the FeeStructure amount of their current class, else nothing. A family also
+owes the term's PTA dues in the first term, 2000 XOF when none are set.
+FeeResolver loads the fee structures, overrides and PTA dues of one or many
+terms with three queries and then answers for any number of students from
+memory. Resolvers are cached per term under a stamp of those rows, so an
+edit made in any process is charged by every process at once.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from accounts.models import FeeStructure, PTADues, StudentFeeOverride
+from accounts.utils.stamps import table_stamps
+
+DEFAULT_PTA_DUES = Decimal('2000.00')
+FEE_CACHE_SECONDS = 10 * 60
+
+
+def _cache_keys(keys):
+    """{(session_id, term): cache key} for `keys`, each stamped with the term's fee rows in one query."""
+    session_ids = {session_id for session_id, _ in keys}
+    terms = {term for _, term in keys}
+    stamps = table_stamps(
+        ('session_id', 'term'),
+        *(model.objects.filter(session_id__in=session_ids, term__in=terms)
+          for model in (FeeStructure, StudentFeeOverride, PTADues)),
+    )
+    return {key: f"fee_resolver_{key[0]}_{key[1]}_{stamps.get(key, '')}" for key in keys}
+
+
+class FeeResolver:
+    """
+    Fees of one session and term. Use FeeResolver.for_term() to share the
+    cached resolver, and FeeResolver.load() where the fees were just written.
+    """
+
+    def __init__(self, session_id, term, class_fees, overrides, pta_dues):
+        self.session_id = session_id
+        self.term = term
+        self.class_fees = class_fees
+        self.overrides = overrides
+        self.pta_dues = pta_dues
+
+    @classmethod
+    def load_many(cls, keys):
+        """Resolvers for an iterable of (session_id, term) pairs, with three queries in all."""
+        keys = set(keys)
+        if not keys:
+            return {}
+        session_ids = {session_id for session_id, _ in keys}
+        terms = {term for _, term in keys}
+        class_fees = {key: {} for key in keys}
+        overrides = {key: {} for key in keys}
+        for session_id, term, class_level_id, amount in FeeStructure.objects.filter(
+            session_id__in=session_ids, term__in=terms
+        ).values_list('session_id', 'term', 'class_level_id', 'amount'):
+            if (session_id, term) in keys:
+                class_fees[(session_id, term)][class_level_id] = amount
+        for session_id, term, student_id, amount in StudentFeeOverride.objects.filter(
+            session_id__in=session_ids, term__in=terms
+        ).values_list('session_id', 'term', 'student_id', 'amount'):
+            if (session_id, term) in keys:
+                overrides[(session_id, term)][student_id] = amount
+        pta_dues = {key: DEFAULT_PTA_DUES if key[1] == '1' else Decimal(0) for key in keys}
+        first_terms = {session_id for session_id, term in keys if term == '1'}
+        if first_terms:
+            for session_id, amount in PTADues.objects.filter(
+                session_id__in=first_terms, term='1'
+            ).values_list('session_id', 'amount'):
+                pta_dues[(session_id, '1')] = amount
+        return {key: cls(key[0], key[1], class_fees[key], overrides[key], pta_dues[key]) for key in keys}
+
+    @classmethod
+    def load(cls, session, term):
+        session_id = getattr(session, 'pk', session)
+        return cls.load_many([(session_id, term)])[(session_id, term)]
+
+    @classmethod
+    def for_terms(cls, keys):
+        """Cached resolvers for an iterable of (session, term) pairs, keyed by (session_id, term)."""
+        keys = {(getattr(session, 'pk', session), term) for session, term in keys}
+        if not keys:
+            return {}
+        cache_keys = _cache_keys(keys)
+        cached = cache.get_many(cache_keys.values())
+        resolvers = {key: cached[cache_key] for key, cache_key in cache_keys.items() if cache_key in cached}
+        loaded = cls.load_many(keys - set(resolvers))
+        if loaded:
+            cache.set_many({cache_keys[key]: resolver for key, resolver in loaded.items()}, FEE_CACHE_SECONDS)
+        resolvers.update(loaded)
+        return resolvers
+
+    @classmethod
+    def for_term(cls, session, term):
+        session_id = getattr(session, 'pk', session)
+        return cls.for_terms([(session_id, term)])[(session_id, term)]
+
+    def fee(self, student_id, class_level_id):
+        if student_id in self.overrides:
+            return self.overrides[student_id]
+        return self.class_fees.get(class_level_id, Decimal(0))
+
+    def student_fee(self, student):
+        return self.fee(student.pk, student.current_class_id)
+
+    def student_fees(self, students):
+        """Total fees of `students`, without PTA dues."""
+        return sum((self.student_fee(student) for student in students), Decimal(0))
+
+    def family_fees(self, students):
+        """Total fees of a family whose billed children are `students`, including PTA dues."""
+        return self.student_fees(students) + self.pta_dues
@@ -0,0 +1,228 @@
+"""
+Table-driven grading.
+
+Each school section has a grading scale: a list of bands (minimum score,
+grade, grade point, description). Scales come from GradeScale/GradeBand rows
+(session-specific first, then the section default) and fall back to the
+built-in scales below. A scale is compiled once into a sorted boundary list
+searched with bisect and kept per process. The compiled scales of a process
+are dropped when the stamp of the GradeScale table (latest updated_at and row
+count; a band change touches its scale) moves. The stamp is read from the
+database at most every SCALE_CHECK_SECONDS, so other processes, such as the
+process_tasks worker, pick up a scale change within that time, and the
+process that made it at once.
+"""
+import logging
+import time
+from bisect import bisect_right
+
+from django.db import transaction
+from django.db.models import Count, Max
+
+from accounts.models import GradeScale, Result, Student
+
+logger = logging.getLogger(__name__)
+
+NURSERY_PRIMARY_BANDS = [
+    (95, 'A+', None, 'Distinction'),
+    (90, 'A', None, 'Excellent'),
+    (85, 'B+', None, 'Very Good'),
+    (80, 'B', None, 'Good'),
+    (70, 'C+', None, 'Credit'),
+    (65, 'C', None, 'Average'),
+    (60, 'D', None, 'Fair'),
+    (50, 'E', None, 'Pass'),
+    (0, 'F9', None, 'Fail'),
+]
+
+DEFAULT_BANDS = {
+    'Nursery': NURSERY_PRIMARY_BANDS,
+    'Primary': NURSERY_PRIMARY_BANDS,
+    'Junior': [
+        (90, 'A+', 4.0, 'Distinction'),
+        (80, 'A', 3.5, 'Excellent'),
+        (70, 'B', 3.0, 'Good'),
+        (60, 'C', 2.5, 'Above Average'),
+        (50, 'D', 2.0, 'Average'),
+        (40, 'E', 1.5, 'Average'),
+        (0, 'F', 1.0, 'Poor'),
+    ],
+    'Senior': [
+        (90, 'A1', 5.0, 'Distinction'),
+        (85, 'B2', 4.5, 'Excellent'),
+        (80, 'B3', 4.0, 'Very Good'),
+        (70, 'C4', 3.5, 'Good'),
+        (60, 'C5', 3.0, 'Above Avg.'),
+        (50, 'C6', 2.5, 'Average'),
+        (45, 'D7', 2.0, 'Below Avg.'),
+        (40, 'E8', 1.5, 'Fair'),
+        (0, 'F9', 1.0, 'Fail'),
+    ],
+}
+
+# Score fields summed into total_score per section; unknown sections grade like Senior.
+SCORE_COMPONENTS = {
+    'Nursery': ('total_marks',),
+    'Primary': ('test', 'homework', 'classwork', 'nursery_primary_exam'),
+    'Junior': ('ca', 'test_1', 'test_2', 'exam'),
+    'Senior': ('ca', 'test_1', 'test_2', 'exam'),
+}
+FALLBACK_SECTION = 'Senior'
+
+GRADED_FIELDS = ['total_score', 'grade', 'grade_point', 'description']
+
+SCALE_CHECK_SECONDS = 10
+
+
+class CompiledScale:
+    """Grade bands sorted by minimum score, searchable with bisect."""
+    __slots__ = ('bounds', 'bands')
+
+    def __init__(self, bands):
+        ordered = sorted(bands, key=lambda band: band[0])
+        self.bounds = [float(band[0]) for band in ordered]
+        self.bands = [tuple(band[1:]) for band in ordered]
+
+    def lookup(self, score):
+        """Return (grade, grade_point, description) for a total score."""
+        index = bisect_right(self.bounds, score) - 1
+        return self.bands[max(index, 0)]
+
+
+_compiled = {}
+_stamp = {'value': None, 'checked_until': 0.0}
+
+
+def _check_stamp():
+    """Drop the compiled scales if the GradeScale table changed; reads the database at most every SCALE_CHECK_SECONDS."""
+    now = time.monotonic()
+    if now < _stamp['checked_until']:
+        return
+    stamp = GradeScale.objects.aggregate(latest=Max('updated_at'), count=Count('id'))
+    if stamp != _stamp['value']:
+        _compiled.clear()
+        _stamp['value'] = stamp
+    _stamp['checked_until'] = now + SCALE_CHECK_SECONDS
+
+
+def clear_scale_cache():
+    """Drop compiled scales in this process now and once the change commits; other processes follow their stamp."""
+    def clear():
+        _compiled.clear()
+        _stamp['checked_until'] = 0.0
+
+    clear()
+    transaction.on_commit(clear)
+
+
+def _load_bands(section, session_id):
+    scales = {
+        scale.session_id: scale
+        for scale in GradeScale.objects.filter(section=section).prefetch_related('bands')
+        if scale.session_id in (session_id, None)
+    }
+    scale = scales.get(session_id) or scales.get(None)
+    if scale:
+        bands = [(b.min_score, b.grade, b.grade_point, b.description) for b in scale.bands.all()]
+        if bands:
+            return bands
+    return DEFAULT_BANDS[section]
+
+
+def get_scale(section, session_id=None):
+    """Compiled scale for a section and session, cached per process until the scales change."""
+    if section not in SCORE_COMPONENTS:
+        section = FALLBACK_SECTION
+    key = (section, session_id)
+    _check_stamp()
+    scale = _compiled.get(key)
+    if scale is None:
+        scale = _compiled[key] = CompiledScale(_load_bands(section, session_id))
+    return scale
+
+
+def compute_total(result, section):
+    fields = SCORE_COMPONENTS.get(section, SCORE_COMPONENTS[FALLBACK_SECTION])
+    return sum(getattr(result, field) or 0 for field in fields)
+
+
+def apply_grade(result, section, scale=None):
+    """Set total_score, grade, grade_point and description on an unsaved Result."""
+    scale = scale or get_scale(section, result.session_id)
+    result.total_score = compute_total(result, section)
+    result.grade, result.grade_point, result.description = scale.lookup(result.total_score)
+    return result
+
+
+def grade_results(results, section_of):
+    """
+    Grade many Result instances in one pass without saving them. `section_of`
+    maps a result to its school section; scales are compiled once per
+    (section, session) for the whole batch.
+    """
+    scales = {}
+    for result in results:
+        section = section_of(result)
+        key = (section, result.session_id)
+        if key not in scales:
+            scales[key] = get_scale(section, result.session_id)
+        apply_grade(result, section, scales[key])
+    return results
+
+
+def regrade_results(queryset, batch_size=1000):
+    """
+    Recompute total, grade, grade point and description for every Result in
+    `queryset` with one bulk_update per batch, which sends no signals. Affected
+    sections are marked for re-ranking, and the summaries of students with no
+    section are refreshed here. Returns the number of results written.
+    """
+    from accounts.utils.positions import mark_positions_dirty
+    from accounts.utils.summaries import refresh_student_term_summary
+
+    queryset = queryset.select_related('student__current_class').order_by('pk')
+    touched = set()
+    unsectioned = set()
+    written = 0
+    batch = []
+
+    def flush():
+        nonlocal written
+        grade_results(batch, _student_section)
+        with transaction.atomic():
+            Result.objects.bulk_update(batch, GRADED_FIELDS, batch_size=batch_size)
+        written += len(batch)
+        batch.clear()
+
+    for result in queryset.iterator(chunk_size=batch_size):
+        batch.append(result)
+        if result.student.current_section_id:
+            touched.add((result.student.current_section_id, result.session_id, result.term))
+        else:
+            unsectioned.add((result.student_id, result.session_id, result.term))
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    for section_id, session_id, term in touched:
+        mark_positions_dirty(section_id, session_id, term)
+    for student_id, session_id, term in unsectioned:
+        refresh_student_term_summary(student_id, session_id, term)
+    logger.info(f"Regraded {written} results across {len(touched)} section terms and {len(unsectioned)} unsectioned student terms")
+    return written
+
+
+def _student_section(result):
+    current_class = result.student.current_class
+    return current_class.section if current_class else None
+
+
+def result_section(result):
+    """
+    School section of a result's student, read from the student and class
+    already loaded on the result when there are any, else with one query.
+    """
+    if type(result).student.is_cached(result) and Student.current_class.is_cached(result.student):
+        return _student_section(result)
+    return Student.objects.filter(pk=result.student_id).values_list('current_class__section', flat=True).first()
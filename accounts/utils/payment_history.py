@@ -0,0 +1,78 @@
+"""
+A family's fees and payments across terms.
+
+The parent payments page lists every term of the active and past sessions with
+its fees, amount paid, amount due and status. They are loaded here with a
+fixed number of queries however many terms and children there are. Completed
+payments and refunds are summed per term with one grouped query each. The
+children are loaded once, and every term is priced by FeeResolver. The summed
+payments are cached per family under a stamp of its payments and refunds, so
+a payment recorded by any process shows straight away in every process. Fees
+are not cached here, so fee and enrolment changes show straight away too.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Sum
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import Payment, Refund
+from accounts.utils.balances import settle
+from accounts.utils.fees import FeeResolver
+from accounts.utils.stamps import table_stamp
+
+HISTORY_CACHE_SECONDS = 60 * 60
+
+
+def _cache_key(parent_id):
+    stamp = table_stamp(Payment.objects.filter(parent_id=parent_id), Refund.objects.filter(parent_id=parent_id))
+    return f"payment_history_{parent_id}_{stamp}"
+
+
+def family_term_totals(parent_id):
+    """{(session_id, term): (total_paid, total_refunded)} over every term the family paid or was refunded in."""
+    key = _cache_key(parent_id)
+    totals = cache.get(key)
+    if totals is None:
+        totals = {}
+        for session_id, term, paid in Payment.objects.filter(
+            parent_id=parent_id, status='Completed'
+        ).values('session_id', 'term').annotate(total=Sum('amount')).values_list('session_id', 'term', 'total').order_by():
+            totals[(session_id, term)] = (paid, Decimal(0))
+        for session_id, term, refunded in Refund.objects.filter(
+            parent_id=parent_id
+        ).values('session_id', 'term').annotate(total=Sum('amount')).values_list('session_id', 'term', 'total').order_by():
+            totals[(session_id, term)] = (totals.get((session_id, term), (Decimal(0),))[0], refunded)
+        cache.set(key, totals, HISTORY_CACHE_SECONDS)
+    return totals
+
+
+def load_payment_history(parent, sessions, current=None):
+    """
+    Return a dict per session in `sessions` and term, with `session`, `term`,
+    `term_name`, `total_fees`, `payment_status`, `amount_paid`, `amount_due`
+    and `is_current`. `current` is the (session, term) pair to flag as current.
+    """
+    sessions = list(sessions)
+    children = list(parent.students.filter(is_active=True).only('admission_number', 'current_class_id', 'parent_id'))
+    totals = family_term_totals(parent.pk)
+    resolvers = FeeResolver.for_terms((session.pk, term) for session in sessions for term, _ in TERM_CHOICES)
+    current_key = (current[0].pk, current[1]) if current and current[0] else None
+
+    rows = []
+    for session in sessions:
+        for term, term_name in TERM_CHOICES:
+            total_fees = resolvers[(session.pk, term)].family_fees(children)
+            paid, refunded = totals.get((session.pk, term), (Decimal(0), Decimal(0)))
+            amount_paid, amount_due, status = settle(total_fees, paid, refunded)
+            rows.append({
+                'session': session,
+                'term': term,
+                'term_name': term_name,
+                'total_fees': total_fees,
+                'payment_status': status,
+                'amount_paid': amount_paid,
+                'amount_due': amount_due,
+                'is_current': (session.pk, term) == current_key,
+            })
+    return rows
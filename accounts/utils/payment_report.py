@@ -0,0 +1,156 @@
+"""
+Payment report data: one row per family with fees due in a term, grouped
+into fully paid, partially paid and unpaid families. The grouped data is
+cached for 15 minutes under the session and term and dropped whenever a
+payment is recorded through admin_create_payment.
+"""
+import logging
+from datetime import date
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from accounts.models import Parent, Payment, Refund, Student
+from accounts.utils.fees import FeeResolver
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_REPORT_CACHE_SECONDS = 900
+
+
+def iter_payment_report_rows(session, term, chunk_size=500):
+    """
+    Yield one payment report row per family with fees due in the term, loading
+    parents `chunk_size` at a time so exports of every family run in constant memory.
+    """
+    
+    parents = Parent.objects.filter(is_active=True).prefetch_related(
+        Prefetch(
+            'students', 
+            queryset=Student.objects.filter(is_active=True).select_related('current_class')
+        ),
+        Prefetch(
+            'payments', 
+            queryset=Payment.objects.filter(
+                session=session, 
+                term=term, 
+                status='Completed'
+            ).only('amount', 'parent_id')
+        )
+    ).only('id', 'phone_number', 'full_name')
+    
+    
+    fees = FeeResolver.for_term(session, term)
+    
+    refunds_dict = {}
+    for refund in Refund.objects.filter(session=session, term=term).values('parent_id', 'amount'):
+        parent_id = refund['parent_id']
+        refunds_dict.setdefault(parent_id, Decimal(0))
+        refunds_dict[parent_id] += refund['amount']
+    
+    for parent in parents.iterator(chunk_size=chunk_size):
+        students = parent.students.all()
+        students_info = [
+            f"{student.full_name} - {student.current_class.level}" for student in students if student.current_class
+        ]
+        total_fees = fees.family_fees(students)
+        
+        total_paid = sum(payment.amount for payment in parent.payments.all())
+        total_refunded = refunds_dict.get(parent.id, Decimal(0))
+        amount_paid = max(total_paid - total_refunded, Decimal(0))
+        amount_due = max(total_fees - amount_paid, Decimal(0))
+        
+        if not students_info or total_fees == 0:
+            continue
+            
+        percentage_paid = (amount_paid / total_fees * 100) if total_fees > 0 else 0
+        payment_category = 'full' if amount_due == 0 else 'partial' if amount_paid > 0 else 'none'
+        
+        yield {
+            'students': ', '.join(students_info),
+            'parent_phone': parent.phone_number,
+            'total_fees': float(total_fees),
+            'amount_paid': float(amount_paid),
+            'amount_due': float(amount_due),
+            'percentage_paid': round(percentage_paid, 2),
+            'category': payment_category
+        }
+
+
+def get_optimized_payment_data(session, term):
+    """
+    Extract the common data fetching logic for both views
+    """
+    report_data = list(iter_payment_report_rows(session, term))
+
+    full_paid = [item for item in report_data if item['category'] == 'full']
+    partial_paid = [item for item in report_data if item['category'] == 'partial']
+    not_paid = [item for item in report_data if item['category'] == 'none']
+    
+    full_paid.sort(key=lambda x: x['amount_paid'], reverse=True)
+    partial_paid.sort(key=lambda x: x['amount_paid'], reverse=True)
+    not_paid.sort(key=lambda x: x['amount_paid'], reverse=True)
+    
+    return {
+        'report_data': report_data,
+        'full_paid': full_paid,
+        'partial_paid': partial_paid,
+        'not_paid': not_paid,
+        'generated_at': timezone.now().isoformat()
+    }
+
+
+def payment_report_key(session, term):
+    return f"payment_report_{session.id}_{term}"
+
+
+def payment_report_data(session, term):
+    """get_optimized_payment_data() for the term, from the cache when it is there."""
+    cache_key = payment_report_key(session, term)
+    cached_data = cache.get(cache_key)
+    if cached_data is None:
+        logger.info(f"Cache miss for {cache_key}, generating fresh data")
+        cached_data = get_optimized_payment_data(session, term)
+        cache.set(cache_key, cached_data, PAYMENT_REPORT_CACHE_SECONDS)
+    return cached_data
+
+
+def payment_report_context(session, term, sort_type='all'):
+    """Template context of the payment report PDF, limited to one category unless `sort_type` is 'all'."""
+    cached_data = payment_report_data(session, term)
+    full_paid = cached_data['full_paid']
+    partial_paid = cached_data['partial_paid']
+    not_paid = cached_data['not_paid']
+    logger.info(f"PDF - Full paid: {len(full_paid)}, Partial paid: {len(partial_paid)}, Not paid: {len(not_paid)}")
+
+    if sort_type == 'full':
+        filtered_data = full_paid
+    elif sort_type == 'partial':
+        filtered_data = partial_paid
+    elif sort_type == 'none':
+        filtered_data = not_paid
+    else:
+        filtered_data = full_paid + partial_paid + not_paid
+
+    return {
+        'report_data': filtered_data,
+        'current_session': session,
+        'current_term': term,
+        'date_generated': date.today(),
+        'sort_type': sort_type,
+        'full_paid': full_paid,
+        'partial_paid': partial_paid,
+        'not_paid': not_paid,
+        'full_paid_count': len(full_paid),
+        'partial_paid_count': len(partial_paid),
+        'not_paid_count': len(not_paid),
+    }
+
+
+def invalidate_payment_report_cache(session, term):
+    """Call this function when new payments are processed"""
+    cache_key = payment_report_key(session, term)
+    cache.delete(cache_key)
+    logger.info(f"Payment report cache invalidated for {cache_key}")
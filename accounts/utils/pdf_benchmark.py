@@ -0,0 +1,215 @@
+"""
+Timing helpers and the benchmark suite for the PDF renderers.
+
+Benchmarks run on unsaved model instances so they need no database rows and
+measure rendering alone. benchmark_cases() lists the suite: report cards with
+8 to 20 subjects, payment reports with 10 to 10,000 families (native and
+WeasyPrint) and payment receipts. run_case() records wall time, the peak of
+Python allocations during one render and the output size. ReportLab is pure
+Python, so its peak is complete; WeasyPrint's cairo and pango buffers are not
+traced, so its figure is a lower bound.
+"""
+import statistics
+import time
+import tracemalloc
+from datetime import date, datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.template.loader import render_to_string
+
+from accounts.models import ClassSection, Parent, Result, SchoolClass, Session, Student, StudentTermSummary, Subject
+
+REPORT_CARD_SUBJECTS = (8, 12, 16, 20)
+PAYMENT_REPORT_FAMILIES = (10, 100, 1000, 10000)
+
+GRADES = [('A', 4.0, 'Excellent'), ('B', 3.0, 'Very Good'), ('C', 2.0, 'Good'), ('D', 1.0, 'Fair'), ('F', 0.0, 'Fail')]
+
+
+def report_card_fixture(subject_count=12):
+    """Unsaved (student, results, session, term, summary) for one JSS report card."""
+    session = Session(name='2024/2025', start_year=2024, end_year=2025)
+    school_class = SchoolClass(level='JSS 2', section='Junior')
+    section = ClassSection(school_class=school_class, suffix='A', session=session)
+    student = Student(
+        admission_number='BENCH01', first_name='Benchmark', surname='Student',
+        current_class=school_class, current_section=section,
+    )
+    results = []
+    for i in range(subject_count):
+        grade, grade_point, description = GRADES[i % len(GRADES)]
+        results.append(Result(
+            student=student, subject=Subject(name=f"Subject {i + 1}"), session=session, term='1',
+            ca=8.0, test_1=9.0, test_2=8.5, exam=40.0 + i, total_score=65.5 + i,
+            grade=grade, grade_point=grade_point, description=description,
+        ))
+    summary = StudentTermSummary(
+        student=student, session=session, term='1', scored_count=subject_count,
+        average_score=70.0, average_grade_point=2.8, class_position='3rd', class_position_gp='2nd',
+    )
+    return student, results, session, '1', summary
+
+
+def payment_report_context(families=1000):
+    """Context of admin_payment_report_pdf for `families` synthetic families, all in one table."""
+    report_data = []
+    for i in range(families):
+        children = [f"Child{i}-{c} Surname{i} ({'JSS 1' if c % 2 else 'Primary 4'})" for c in range(1 + i % 3)]
+        total_fees = 150000.0 * len(children)
+        amount_paid = total_fees * (i % 5) / 4
+        report_data.append({
+            'students': ', '.join(children),
+            'parent_phone': f"+228{90000000 + i}",
+            'total_fees': total_fees,
+            'amount_paid': amount_paid,
+            'amount_due': total_fees - amount_paid,
+            'percentage_paid': round(amount_paid / total_fees * 100, 2),
+        })
+    return {
+        'report_data': report_data,
+        'current_session': Session(name='2024/2025', start_year=2024, end_year=2025),
+        'current_term': '1',
+        'date_generated': date.today(),
+        'sort_type': 'partial',
+        'full_paid': [], 'partial_paid': report_data, 'not_paid': [],
+        'full_paid_count': 0, 'partial_paid_count': families, 'not_paid_count': 0,
+    }
+
+
+def receipt_fixture(children=3):
+    """
+    A stand-in for a saved Payment with everything payment_receipt.html reads.
+    A real unsaved Payment cannot be used: the template lists its students.
+    """
+    session = Session(name='2024/2025', start_year=2024, end_year=2025)
+    school_class = SchoolClass(level='Primary 4', section='Primary')
+    students = [
+        Student(admission_number=f"BENCH{i:02d}", first_name=f"Child{i}", surname='Benchmark', current_class=school_class)
+        for i in range(children)
+    ]
+    return SimpleNamespace(
+        parent=Parent(full_name='Benchmark Parent', phone_number='+22890000000'),
+        session=session,
+        term='1',
+        get_term_display=lambda: 'First Term',
+        id=1,
+        transaction_id='00000000-0000-4000-8000-000000000000',
+        created_at=datetime(2025, 1, 15, 9, 30),
+        students=SimpleNamespace(all=lambda: students),
+        calculate_total_fee=lambda: Decimal('150000.00') * children,
+        amount=Decimal('100000.00'),
+        status='Completed',
+    )
+
+
+def report_table_html(rows=200):
+    """A payment-report-like HTML page with one table of `rows` rows, for the WeasyPrint renderers."""
+    body = ''.join(
+        f"<tr><td>{i + 1}</td><td>Parent {i + 1}</td><td>{(i % 4) + 1}</td>"
+        f"<td>{150000 + i * 25:,}</td><td>{100000 + i * 10:,}</td><td>{'Paid' if i % 3 else 'Partial'}</td></tr>"
+        for i in range(rows)
+    )
+    return (
+        "<html><head><style>table{width:100%;border-collapse:collapse;font-size:9pt}"
+        "td,th{border:1px solid #999;padding:2px 4px}</style></head><body>"
+        "<h1>Payment Report</h1><table><thead><tr><th>#</th><th>Parent</th><th>Children</th>"
+        f"<th>Expected</th><th>Paid</th><th>Status</th></tr></thead><tbody>{body}</tbody></table></body></html>"
+    )
+
+
+def time_renderer(render, iterations, setup=None):
+    """
+    Call `render` `iterations` times, running `setup` untimed before each call.
+    Returns median, mean and 95th percentile milliseconds per call and the size
+    of the last output.
+    """
+    timings = []
+    output = None
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        output = render()
+        timings.append((time.perf_counter() - start) * 1000)
+    size = len(output.getbuffer()) if hasattr(output, 'getbuffer') else len(output or b'')
+    return {
+        'median_ms': statistics.median(timings),
+        'mean_ms': statistics.mean(timings),
+        'p95_ms': statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0],
+        'bytes': size,
+    }
+
+
+def peak_memory_kb(render):
+    """Peak of Python allocations, in KiB, while `render` runs once."""
+    tracemalloc.start()
+    try:
+        render()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak // 1024
+
+
+def weasyprint_available():
+    from accounts.utils.pdf_renderer import render_pdf_in_process
+    try:
+        render_pdf_in_process('<p></p>')
+    except (ImportError, OSError):
+        return False
+    return True
+
+
+def benchmark_cases(subject_counts=REPORT_CARD_SUBJECTS, family_counts=PAYMENT_REPORT_FAMILIES,
+                    iterations=30, report_iterations=3, weasyprint=True):
+    """
+    The benchmark suite as dicts with `name`, `renderer`, `size`, `iterations`,
+    `render` and an optional untimed `setup`. Payment reports use
+    `report_iterations`, as the largest take seconds per render.
+    """
+    from accounts.utils import table_pdf
+    from accounts.utils.pdf_generator import generate_result_pdf, reset_report_card_styles
+    from accounts.utils.pdf_renderer import render_pdf_in_process
+    from accounts.utils.receipts import receipt_html
+
+    def report_card(subjects):
+        student, results, session, term, summary = report_card_fixture(subjects)
+        return lambda: generate_result_pdf(student, results, session, term, summary=summary)
+
+    for subjects in subject_counts:
+        yield {'name': 'report_card', 'renderer': 'reportlab', 'size': subjects, 'iterations': iterations,
+               'render': report_card(subjects)}
+    # Rebuilding the styles before every render reproduces the old per-call font and style setup.
+    yield {'name': 'report_card_cold_styles', 'renderer': 'reportlab', 'size': 12, 'iterations': iterations,
+           'render': report_card(12), 'setup': reset_report_card_styles}
+
+    for families in family_counts:
+        context = payment_report_context(families)
+        yield {'name': 'payment_report', 'renderer': 'native', 'size': families, 'iterations': report_iterations,
+               'render': lambda context=context: table_pdf.payment_report_pdf(context)}
+        if weasyprint:
+            yield {'name': 'payment_report', 'renderer': 'weasyprint', 'size': families,
+                   'iterations': report_iterations,
+                   'render': lambda context=context: render_pdf_in_process(
+                       render_to_string('account/admin/payment_report_pdf.html', context)
+                   )}
+
+    if weasyprint:
+        payment = receipt_fixture()
+        yield {'name': 'receipt', 'renderer': 'weasyprint', 'size': 3, 'iterations': iterations,
+               'render': lambda: render_pdf_in_process(receipt_html(payment))}
+
+
+def run_case(case):
+    """Time one benchmark case, then measure its peak memory in a separate run, as tracing slows rendering."""
+    stats = time_renderer(case['render'], case['iterations'], setup=case.get('setup'))
+    if case.get('setup'):
+        case['setup']()
+    return {
+        'name': case['name'],
+        'renderer': case['renderer'],
+        'size': case['size'],
+        'iterations': case['iterations'],
+        **stats,
+        'peak_memory_kb': peak_memory_kb(case['render']),
+    }
@@ -7,117 +7,193 @@ from reportlab.lib.units import inch
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from django.conf import settings
+from django.contrib.staticfiles import finders
+import logging
 import os
+import threading
 
 from accounts.constants import TERM_CHOICES
+from accounts.models import StudentTermSummary
 
-def generate_result_pdf(student, results, session, term, is_nursery=False, is_primary=False):
-    # Register modern fonts
+logger = logging.getLogger(__name__)
+
+# Part of the report card cache key; bump whenever the layout or wording changes.
+REPORT_CARD_TEMPLATE_VERSION = 3
+
+REPORT_FONTS = {
+    'Montserrat': 'accounts/fonts/Montserrat-Regular.ttf',
+    'Montserrat-Bold': 'accounts/fonts/Montserrat-Bold.ttf',
+    'OpenSans': 'accounts/fonts/OpenSans-Regular.ttf',
+}
+REPORT_LOGO = 'main/images/rise-logo.jpeg'
+COMMENT_LINE = "_________________________________________________________________________________________"
+EXCELLENT_GRADES = ('A', 'A+', 'B+')
+POOR_GRADES = ('D', 'E', 'F')
+
+
+def _static_path(name):
+    """Path of a static file, from STATIC_ROOT when collected, else from the static finders."""
+    path = os.path.join(settings.STATIC_ROOT, name)
+    if os.path.exists(path):
+        return path
+    return finders.find(name)
+
+
+def _register_fonts():
+    """Register the report card fonts with ReportLab. Returns False if any is missing."""
     try:
-        font_dir = os.path.join(settings.STATIC_ROOT, 'accounts/fonts')
-        pdfmetrics.registerFont(TTFont('Montserrat', os.path.join(font_dir, 'Montserrat-Regular.ttf')))
-        pdfmetrics.registerFont(TTFont('Montserrat-Bold', os.path.join(font_dir, 'Montserrat-Bold.ttf')))
-        pdfmetrics.registerFont(TTFont('OpenSans', os.path.join(font_dir, 'OpenSans-Regular.ttf')))
-        custom_fonts_loaded = True
-    except:
+        for name, filename in REPORT_FONTS.items():
+            pdfmetrics.registerFont(TTFont(name, _static_path(filename)))
+        return True
+    except Exception as e:
         # Fallback to standard fonts if custom fonts fail
-        custom_fonts_loaded = False
+        logger.warning(f"Report card fonts unavailable, using Helvetica: {e}")
+        return False
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=letter, 
-        rightMargin=20, 
-        leftMargin=20, 
-        topMargin=20, 
-        bottomMargin=20,
-        title=f"{student.full_name}'s Result - {session.name} Term {term}"
-    )
-    
-    # Get base styles
-    styles = getSampleStyleSheet()
-    
-    # Modify or create styles safely
-    if 'Title' not in styles:
-        styles.add(ParagraphStyle(
-            'Title',
-            parent=styles['Heading1'],
-            fontName='Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold',
-            fontSize=18,
-            alignment=1,
-            spaceAfter=10,
-            textColor=colors.HexColor('#2c3e50'))
-        )
-    else:
-        styles['Title'].fontName = 'Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold'
+
+class ReportCardStyles:
+    """
+    Fonts, paragraph and table styles and the decoded logo shared by every
+    report card rendered in this process. Use get_report_card_styles().
+    """
+
+    def __init__(self):
+        self.custom_fonts_loaded = _register_fonts()
+        regular = 'Montserrat' if self.custom_fonts_loaded else 'Helvetica'
+        bold = 'Montserrat-Bold' if self.custom_fonts_loaded else 'Helvetica-Bold'
+        body = 'OpenSans' if self.custom_fonts_loaded else 'Helvetica'
+
+        styles = getSampleStyleSheet()
+        styles['Title'].fontName = bold
         styles['Title'].fontSize = 18
         styles['Title'].textColor = colors.HexColor('#2c3e50')
         styles['Title'].alignment = 1
         styles['Title'].spaceAfter = 10
-
-    if 'Subtitle' not in styles:
         styles.add(ParagraphStyle(
-            'Subtitle',
-            parent=styles['Heading2'],
-            fontName='Montserrat' if custom_fonts_loaded else 'Helvetica',
-            fontSize=11,
-            alignment=1,
-            spaceAfter=15,
-            textColor=colors.HexColor('#7f8c8d'))
-        )
-    else:
-        styles['Subtitle'].fontName = 'Montserrat' if custom_fonts_loaded else 'Helvetica'
-        styles['Subtitle'].fontSize = 11
-        styles['Subtitle'].textColor = colors.HexColor('#7f8c8d')
-        styles['Subtitle'].alignment = 1
-        styles['Subtitle'].spaceAfter = 15
-
-    # Header style
-    if 'Header' not in styles:
+            'Subtitle', parent=styles['Heading2'], fontName=regular, fontSize=11, alignment=1, spaceAfter=15,
+            textColor=colors.HexColor('#7f8c8d'),
+        ))
         styles.add(ParagraphStyle(
-            'Header',
-            parent=styles['Normal'],
-            fontName='Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold',
-            fontSize=10,
-            textColor=colors.white,
-            alignment=1
+            'Header', parent=styles['Normal'], fontName=bold, fontSize=10, textColor=colors.white, alignment=1
         ))
-
-    # Cell style
-    if 'Cell' not in styles:
+        styles.add(ParagraphStyle('Cell', parent=styles['Normal'], fontName=body, fontSize=9, alignment=1))
+        # Result cells are Paragraphs, which ignore a table's TEXTCOLOR, so grade highlights are styles.
+        styles.add(ParagraphStyle('CellExcellent', parent=styles['Cell'], textColor=colors.HexColor('#27ae60')))
+        styles.add(ParagraphStyle('CellPoor', parent=styles['Cell'], textColor=colors.HexColor('#e74c3c')))
         styles.add(ParagraphStyle(
-            'Cell',
-            parent=styles['Normal'],
-            fontName='OpenSans' if custom_fonts_loaded else 'Helvetica',
-            fontSize=9,
+            'Highlight', parent=styles['Normal'], fontName=bold, fontSize=10, textColor=colors.HexColor('#e74c3c'),
             alignment=1
         ))
-
-    # Highlight style
-    if 'Highlight' not in styles:
         styles.add(ParagraphStyle(
-            'Highlight',
-            parent=styles['Normal'],
-            fontName='Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold',
-            fontSize=10,
-            textColor=colors.HexColor('#e74c3c'),
-            alignment=1
+            'CommentsHeader', parent=styles['Normal'], fontName=bold, fontSize=10,
+            textColor=colors.HexColor('#2c3e50'), spaceAfter=5
         ))
+        self.paragraphs = styles
+
+        self.student_info = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('FONTNAME', (0,0), (-1,0), bold),
+            ('FONTSIZE', (0,0), (-1,0), 10),
+            ('BOTTOMPADDING', (0,0), (-1,0), 8),
+            ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8f9fa')),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e0e0e0')),
+            ('FONTNAME', (0,1), (-1,-1), body),
+            ('FONTSIZE', (0,1), (-1,-1), 9),
+            ('LEFTPADDING', (0,0), (-1,-1), 5),
+            ('RIGHTPADDING', (0,0), (-1,-1), 5),
+        ])
+        self.results = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2c3e50')),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+            ('FONTNAME', (0,0), (-1,0), bold),
+            ('FONTSIZE', (0,0), (-1,0), 9),
+            ('BOTTOMPADDING', (0,0), (-1,0), 8),
+            ('BACKGROUND', (0,1), (-1,-1), colors.white),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e0e0e0')),
+            ('FONTNAME', (0,1), (-1,-1), body),
+            ('FONTSIZE', (0,1), (-1,-1), 8),
+            ('LEFTPADDING', (0,0), (-1,-1), 5),
+            ('RIGHTPADDING', (0,0), (-1,-1), 5),
+        ])
+        self.summary = TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('FONTNAME', (0,0), (-1,0), bold),
+            ('FONTSIZE', (0,0), (-1,0), 10),
+            ('ALIGN', (0,0), (-1,0), 'CENTER'),
+            ('SPAN', (0,0), (1,0)),
+            ('FONTNAME', (0,1), (-1,-1), body),
+            ('FONTSIZE', (0,1), (-1,-1), 9),
+            ('ALIGN', (0,1), (0,-1), 'RIGHT'),
+            ('ALIGN', (1,1), (1,-1), 'LEFT'),
+            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e0e0e0')),
+            ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8f9fa')),
+        ])
+
+        # The logo is read and decoded once; drawing it only embeds the decoded image.
+        self.logo = None
+        logo_path = _static_path(REPORT_LOGO)
+        if logo_path:
+            with open(logo_path, 'rb') as f:
+                self.logo = Image(BytesIO(f.read()), width=1.5*inch, height=1.5*inch)
+
+
+_report_card_styles = None
+_report_card_styles_lock = threading.Lock()
+
+
+def get_report_card_styles():
+    """The process-wide ReportCardStyles, built on first use."""
+    global _report_card_styles
+    if _report_card_styles is None:
+        with _report_card_styles_lock:
+            if _report_card_styles is None:
+                _report_card_styles = ReportCardStyles()
+    return _report_card_styles
+
+
+def reset_report_card_styles():
+    """Drop the shared styles so the next report card rebuilds them, e.g. after fonts change."""
+    global _report_card_styles
+    with _report_card_styles_lock:
+        _report_card_styles = None
+
+
+def _grade_cell_style(styles, grade):
+    if grade in EXCELLENT_GRADES:
+        return styles['CellExcellent']
+    if grade in POOR_GRADES:
+        return styles['CellPoor']
+    return styles['Cell']
+
+
+def generate_result_pdf(student, results, session, term, is_nursery=False, is_primary=False, summary=None):
+    if summary is None:
+        summary = StudentTermSummary.objects.filter(student=student, session=session, term=term).first()
+
+    report_styles = get_report_card_styles()
+    styles = report_styles.paragraphs
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=letter,
+        rightMargin=20,
+        leftMargin=20,
+        topMargin=20,
+        bottomMargin=20,
+        title=f"{student.full_name}'s Result - {session.name} Term {term}"
+    )
 
-    logo_path = os.path.join(settings.STATIC_ROOT, 'main/images/rise-logo.jpeg')
     elements = []
-    
+
     # Header with school info and logo
-    header_table_data = []
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=1.5*inch, height=1.5*inch)
-        header_table_data.append([logo, ""])
-    else:
-        header_table_data.append(["", ""])
-    
-    header_table = Table(header_table_data, colWidths=[2*inch, 5*inch])
+    header_table = Table([[report_styles.logo or "", ""]], colWidths=[2*inch, 5*inch])
     elements.append(header_table)
-    
+
     school_info = [
         Spacer(1, 10),
         Paragraph("<b>REHOBOTH INTERNATIONAL SCHOOL OF EXCELLENCE</b>", styles['Title']),
@@ -126,36 +202,24 @@ def generate_result_pdf(student, results, session, term, is_nursery=False, is_pr
         Spacer(1, 15)
     ]
     elements.extend(school_info)
-    
+
     # Student information with modern card-like design
     student_info_data = [
         ["STUDENT INFORMATION", "", "", ""],
         ["Name:", student.full_name, "Admission No:", student.admission_number],
-        ["Class:", f"{student.current_class.level if student.current_class else 'N/A'}", 
+        ["Class:", f"{student.current_class.level if student.current_class else 'N/A'}",
          "Section:", f"{student.current_section.suffix if student.current_section else 'N/A'}"],
         ["Term:", dict(TERM_CHOICES).get(term, term), "Session:", session.name]
     ]
-    
+
     student_info_table = Table(student_info_data, colWidths=[1.5*inch, 3*inch, 1.5*inch, 2*inch])
-    student_info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('FONTNAME', (0,0), (-1,0), 'Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 10),
-        ('BOTTOMPADDING', (0,0), (-1,0), 8),
-        ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8f9fa')),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e0e0e0')),
-        ('FONTNAME', (0,1), (-1,-1), 'OpenSans' if custom_fonts_loaded else 'Helvetica'),
-        ('FONTSIZE', (0,1), (-1,-1), 9),
-        ('LEFTPADDING', (0,0), (-1,-1), 5),
-        ('RIGHTPADDING', (0,0), (-1,-1), 5),
-    ]))
-    
+    student_info_table.setStyle(report_styles.student_info)
+
     elements.extend([
         student_info_table,
         Spacer(1, 25)
     ])
-    
+
     # Results table with modern styling
     if is_nursery:
         data = [["Subject", "Total Marks", "Grade", "Remark"]]
@@ -184,145 +248,86 @@ def generate_result_pdf(student, results, session, term, is_nursery=False, is_pr
     else:
         data = [["Subject", "CA", "Test 1", "Test 2", "Exam", "Total", "Grade", "G.P", "Remark"]]
         for result in results:
+            # Highlight excellent and poor grades (for non-nursery/primary)
+            cell = _grade_cell_style(styles, result.grade)
             data.append([
-                Paragraph(result.subject.name, styles['Cell']),
-                Paragraph(f"{result.ca:.1f}" if result.ca else "-", styles['Cell']),
-                Paragraph(f"{result.test_1:.1f}" if result.test_1 else "-", styles['Cell']),
-                Paragraph(f"{result.test_2:.1f}" if result.test_2 else "-", styles['Cell']),
-                Paragraph(f"{result.exam:.1f}" if result.exam else "-", styles['Cell']),
-                Paragraph(f"{result.total_score:.1f}", styles['Cell']),
-                Paragraph(result.grade, styles['Cell']),
-                Paragraph(f"{result.grade_point:.1f}" if result.grade_point is not None else "-", styles['Cell']),
-                Paragraph(result.description, styles['Cell'])
+                Paragraph(result.subject.name, cell),
+                Paragraph(f"{result.ca:.1f}" if result.ca else "-", cell),
+                Paragraph(f"{result.test_1:.1f}" if result.test_1 else "-", cell),
+                Paragraph(f"{result.test_2:.1f}" if result.test_2 else "-", cell),
+                Paragraph(f"{result.exam:.1f}" if result.exam else "-", cell),
+                Paragraph(f"{result.total_score:.1f}", cell),
+                Paragraph(result.grade, cell),
+                Paragraph(f"{result.grade_point:.1f}" if result.grade_point is not None else "-", cell),
+                Paragraph(result.description, cell)
             ])
         col_widths = [1.8*inch] + [0.7*inch]*5 + [0.7*inch, 0.7*inch, 1.5*inch]
-    
+
     # Create table with modern styling
     table = Table(data, colWidths=col_widths)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#2c3e50')),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('FONTNAME', (0,0), (-1,0), 'Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 9),
-        ('BOTTOMPADDING', (0,0), (-1,0), 8),
-        ('BACKGROUND', (0,1), (-1,-1), colors.white),
-        ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e0e0e0')),
-        ('FONTNAME', (0,1), (-1,-1), 'OpenSans' if custom_fonts_loaded else 'Helvetica'),
-        ('FONTSIZE', (0,1), (-1,-1), 8),
-        ('LEFTPADDING', (0,0), (-1,-1), 5),
-        ('RIGHTPADDING', (0,0), (-1,-1), 5),
-    ]))
-    
-    # Highlight excellent and poor grades (for non-nursery/primary)
-    if not (is_nursery or is_primary):
-        for i in range(1, len(data)):
-            if data[i][6] in ['A', 'A+', 'B+']:  # Excellent grades
-                table.setStyle(TableStyle([
-                    ('TEXTCOLOR', (0,i), (-1,i), colors.HexColor('#27ae60'))
-                ]))
-            elif data[i][6] in ['D', 'E', 'F']:  # Poor grades
-                table.setStyle(TableStyle([
-                    ('TEXTCOLOR', (0,i), (-1,i), colors.HexColor('#e74c3c'))
-                ]))
-    
+    table.setStyle(report_styles.results)
+
     elements.append(table)
     elements.append(Spacer(1, 25))
-    
+
     # Performance summary with modern design
-    valid_results = [r for r in results if r.total_score > 0]
-    if valid_results:
-        avg_score = sum(r.total_score for r in valid_results) / len(valid_results)
-        if not (is_nursery or is_primary):
-            avg_gp = sum(r.grade_point for r in valid_results if r.grade_point is not None) / len(valid_results)
-        
+    if summary and summary.scored_count:
         summary_data = [
             ["PERFORMANCE SUMMARY", ""],
-            ["Average Score:", f"{avg_score:.2f}%"],
-            ["Class Position:", valid_results[0].class_position if valid_results else "-"]
+            ["Average Score:", f"{summary.average_score:.2f}%"],
+            ["Class Position:", summary.class_position or "-"]
         ]
-        
+
         if not (is_nursery or is_primary):
-            summary_data.append(["Average Grade Point:", f"{avg_gp:.2f}"])
-            summary_data.append(["Class Position (G.P):", valid_results[0].class_position_gp if valid_results else "-"])
-        
+            summary_data.append(["Average Grade Point:", f"{summary.average_grade_point:.2f}"])
+            summary_data.append(["Class Position (G.P):", summary.class_position_gp or "-"])
+
         summary_table = Table(summary_data, colWidths=[2.5*inch, 3*inch])
-        summary_table.setStyle(TableStyle([
-            ('BACKGROUND', (0,0), (-1,0), colors.HexColor('#3498db')),
-            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-            ('FONTNAME', (0,0), (-1,0), 'Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold'),
-            ('FONTSIZE', (0,0), (-1,0), 10),
-            ('ALIGN', (0,0), (-1,0), 'CENTER'),
-            ('SPAN', (0,0), (1,0)),
-            ('FONTNAME', (0,1), (-1,-1), 'OpenSans' if custom_fonts_loaded else 'Helvetica'),
-            ('FONTSIZE', (0,1), (-1,-1), 9),
-            ('ALIGN', (0,1), (0,-1), 'RIGHT'),
-            ('ALIGN', (1,1), (1,-1), 'LEFT'),
-            ('GRID', (0,0), (-1,-1), 0.5, colors.HexColor('#e0e0e0')),
-            ('BACKGROUND', (0,1), (-1,-1), colors.HexColor('#f8f9fa')),
-        ]))
-        
+        summary_table.setStyle(report_styles.summary)
+
         elements.append(summary_table)
         elements.append(Spacer(1, 30))
-    
+
     # Comments section
     comments = [
-        Paragraph("<b>TEACHER'S COMMENTS:</b>", ParagraphStyle(
-            'CommentsHeader',
-            parent=styles['Normal'],
-            fontName='Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold',
-            fontSize=10,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=5
-        )),
-        Paragraph("_________________________________________________________________________________________", styles['Normal']),
-        Paragraph("_________________________________________________________________________________________", styles['Normal']),
+        Paragraph("<b>TEACHER'S COMMENTS:</b>", styles['CommentsHeader']),
+        Paragraph(COMMENT_LINE, styles['Normal']),
+        Paragraph(COMMENT_LINE, styles['Normal']),
         Spacer(1, 15),
-        Paragraph("<b>PRINCIPAL'S COMMENTS:</b>", ParagraphStyle(
-            'CommentsHeader',
-            parent=styles['Normal'],
-            fontName='Montserrat-Bold' if custom_fonts_loaded else 'Helvetica-Bold',
-            fontSize=10,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=5
-        )),
-        Paragraph("_________________________________________________________________________________________", styles['Normal']),
-        Paragraph("_________________________________________________________________________________________", styles['Normal']),
+        Paragraph("<b>PRINCIPAL'S COMMENTS:</b>", styles['CommentsHeader']),
+        Paragraph(COMMENT_LINE, styles['Normal']),
+        Paragraph(COMMENT_LINE, styles['Normal']),
         Spacer(1, 30)
     ]
     elements.extend(comments)
-    
+
     # Footer with signatures
-    footer_data = [
-        ["", "", ""],
-        ["Class Teacher's Signature", "", "Principal's Signature"],
-        ["", "", ""],
-        ["Date: _________________", "", "Date: _________________"]
-    ]
-    
-    footer_table = Table(footer_data, colWidths=[3*inch, 1*inch, 3*inch])
-    footer_table.setStyle(TableStyle([
-        ('FONTNAME', (0,1), (-1,1), 'Montserrat' if custom_fonts_loaded else 'Helvetica'),
-        ('FONTSIZE', (0,1), (-1,1), 9),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('LINEABOVE', (0,2), (0,2), 0.5, colors.black),
-        ('LINEABOVE', (2,2), (2,2), 0.5, colors.black),
-    ]))
-    
+    # footer_table = Table([
+    #     ["", "", ""],
+    #     ["Class Teacher's Signature", "", "Principal's Signature"],
+    #     ["", "", ""],
+    #     ["Date: _________________", "", "Date: _________________"]
+    # ], colWidths=[3*inch, 1*inch, 3*inch])
+    # footer_table.setStyle(TableStyle([
+    #     ('FONTNAME', (0,1), (-1,1), 'Montserrat' if report_styles.custom_fonts_loaded else 'Helvetica'),
+    #     ('FONTSIZE', (0,1), (-1,1), 9),
+    #     ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    #     ('LINEABOVE', (0,2), (0,2), 0.5, colors.black),
+    #     ('LINEABOVE', (2,2), (2,2), 0.5, colors.black),
+    # ]))
     # elements.extend([
     #     footer_table,
     #     Spacer(1, 10),
     #     Paragraph("<i>This is a computer generated report. No signature is required.</i>", ParagraphStyle(
     #         'Footer',
     #         parent=styles['Normal'],
-    #         fontName='OpenSans-Italic' if custom_fonts_loaded else 'Helvetica-Oblique',
+    #         fontName='OpenSans-Italic' if report_styles.custom_fonts_loaded else 'Helvetica-Oblique',
     #         fontSize=8,
     #         alignment=1,
     #         textColor=colors.HexColor('#7f8c8d')
     #     ))
     # ])
-    
+
     doc.build(elements)
     buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return buffer
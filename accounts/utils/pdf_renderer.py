@@ -0,0 +1,133 @@
+"""
+HTML to PDF rendering with WeasyPrint, outside the web worker.
+
+WeasyPrint is heavy to import and can use a lot of memory on large reports,
+so web processes hand rendered HTML to a small pool of long-lived renderer
+processes and get PDF bytes back. Renderers preload WeasyPrint and fonts at
+start, run with an address-space cap, are recycled after a number of jobs
+and are killed when a job runs past the timeout. If the pool cannot be
+started, or PDF_RENDERER_PROCESSES is 0, rendering falls back to the calling
+process. This module must not import Django models: renderers are spawned
+without Django set up.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROCESSES = 1
+DEFAULT_MAX_JOBS = 50
+DEFAULT_TIMEOUT_SECONDS = 120
+DEFAULT_MEMORY_MB = 1024
+STARTUP_TIMEOUT_SECONDS = 60
+
+
+class PdfRenderTimeout(Exception):
+    pass
+
+
+def render_pdf_in_process(html):
+    from weasyprint import HTML
+    return HTML(string=html).write_pdf()
+
+
+def _init_renderer(memory_mb):
+    if memory_mb:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # Load WeasyPrint, Pango and the font configuration before the first real job.
+    try:
+        render_pdf_in_process('<p></p>')
+    except Exception:
+        # A failing initializer would make the pool respawn renderers forever; let jobs report the error.
+        logger.exception("PDF renderer could not preload WeasyPrint")
+
+
+def renderer_peak_rss_kb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RendererPool:
+    def __init__(self, processes, max_jobs, timeout, memory_mb):
+        self.processes = processes
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawned, not forked, so renderers do not inherit the web worker's memory or connections.
+                context = multiprocessing.get_context('spawn')
+                pool = context.Pool(
+                    self.processes,
+                    initializer=_init_renderer,
+                    initargs=(self.memory_mb,),
+                    maxtasksperchild=self.max_jobs,
+                )
+                try:
+                    pool.apply_async(os.getpid).get(STARTUP_TIMEOUT_SECONDS)
+                except Exception:
+                    pool.terminate()
+                    raise
+                self._pool = pool
+            return self._pool
+
+    def apply(self, func, *args):
+        job = self.start().apply_async(func, args)
+        try:
+            return job.get(self.timeout)
+        except multiprocessing.TimeoutError:
+            # The only way to stop a runaway renderer is to replace the pool.
+            self.close()
+            raise PdfRenderTimeout(f"PDF rendering took longer than {self.timeout} seconds")
+
+    def render(self, html):
+        return self.apply(render_pdf_in_process, html)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.terminate()
+                self._pool = None
+
+
+_pool = None
+_pool_unavailable = False
+_pool_lock = threading.Lock()
+
+
+def get_renderer_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RendererPool(
+                processes=getattr(settings, 'PDF_RENDERER_PROCESSES', DEFAULT_PROCESSES),
+                max_jobs=getattr(settings, 'PDF_RENDERER_MAX_JOBS', DEFAULT_MAX_JOBS),
+                timeout=getattr(settings, 'PDF_RENDERER_TIMEOUT', DEFAULT_TIMEOUT_SECONDS),
+                memory_mb=getattr(settings, 'PDF_RENDERER_MEMORY_MB', DEFAULT_MEMORY_MB),
+            )
+        return _pool
+
+
+def render_pdf(html):
+    """Render an HTML string to PDF bytes, in the renderer pool when it is available."""
+    global _pool_unavailable
+    if getattr(settings, 'PDF_RENDERER_PROCESSES', DEFAULT_PROCESSES) <= 0 or _pool_unavailable:
+        return render_pdf_in_process(html)
+    pool = get_renderer_pool()
+    try:
+        pool.start()
+    except Exception:
+        _pool_unavailable = True
+        logger.exception("PDF renderer pool could not be started; rendering in process from now on")
+        return render_pdf_in_process(html)
+    return pool.render(html)
@@ -0,0 +1,138 @@
+"""
+Stale-position tracking.
+
+Result writes only mark their (section, session, term) as dirty; positions are
+recomputed later by a single pass per dirty section. By default each process
+runs one background coalescer thread that waits for a quiet period before
+ranking, so a burst of score saves ends in one pass. Set
+POSITION_RECOMPUTE = 'worker' to leave the sweep to the task worker, or
+'immediate' to rank as soon as the write commits.
+"""
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from accounts.models import SectionPositionState
+from accounts.utils.ranking import rank_section
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE_SECONDS = 20
+DEFAULT_MAX_DELAY_SECONDS = 120
+
+
+def mark_positions_dirty(section_id, session_id, term):
+    """Flag the positions of a section/term as stale and schedule a recompute."""
+    if not section_id or not session_id or not term:
+        return
+    lookup = {'section_id': section_id, 'session_id': session_id, 'term': term}
+    changes = {'is_dirty': True, 'version': F('version') + 1, 'marked_at': timezone.now()}
+    if not SectionPositionState.objects.filter(**lookup).update(**changes):
+        try:
+            with transaction.atomic():
+                SectionPositionState.objects.create(version=1, **lookup)
+        except IntegrityError:
+            SectionPositionState.objects.filter(**lookup).update(**changes)
+    transaction.on_commit(schedule_position_recompute)
+
+
+def positions_are_stale(section, session, term):
+    return SectionPositionState.objects.filter(
+        section=section, session=session, term=term, is_dirty=True
+    ).exists()
+
+
+def recompute_dirty_positions(settle_seconds=0):
+    """
+    Rank every dirty section whose last mark is at least `settle_seconds` old.
+
+    A marker is claimed by clearing its flag only if its version is unchanged,
+    so concurrent sweepers never rank the same generation twice and a write that
+    lands during ranking leaves the marker dirty for the next pass.
+    Returns the number of sections ranked.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+    pending = SectionPositionState.objects.filter(
+        is_dirty=True, marked_at__lte=cutoff
+    ).select_related('section__school_class', 'session')
+
+    ranked = 0
+    for state in pending:
+        claimed = SectionPositionState.objects.filter(
+            pk=state.pk, version=state.version, is_dirty=True
+        ).update(is_dirty=False, ranked_at=timezone.now())
+        if not claimed:
+            continue
+        try:
+            rank_section(state.section, state.session, state.term)
+        except Exception:
+            SectionPositionState.objects.filter(pk=state.pk).update(is_dirty=True)
+            logger.exception(f"Failed to recompute positions for {state}")
+            continue
+        ranked += 1
+    return ranked
+
+
+class PositionCoalescer:
+    """One background thread per process folding bursts of dirty marks into one pass."""
+
+    def __init__(self, debounce, max_delay):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def notify(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='position-coalescer', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            started = time.monotonic()
+            # Keep waiting while marks keep arriving, bounded by max_delay.
+            while time.monotonic() - started < self.max_delay:
+                self._wakeup.clear()
+                if not self._wakeup.wait(self.debounce):
+                    break
+            self._wakeup.clear()
+            try:
+                ranked = recompute_dirty_positions()
+                logger.debug(f"Position coalescer ranked {ranked} section(s)")
+            except Exception:
+                logger.exception("Position coalescer pass failed")
+            finally:
+                connection.close()
+
+
+_coalescer = None
+_coalescer_lock = threading.Lock()
+
+
+def get_coalescer():
+    global _coalescer
+    with _coalescer_lock:
+        if _coalescer is None:
+            _coalescer = PositionCoalescer(
+                debounce=getattr(settings, 'POSITION_RECOMPUTE_DEBOUNCE', DEFAULT_DEBOUNCE_SECONDS),
+                max_delay=getattr(settings, 'POSITION_RECOMPUTE_MAX_DELAY', DEFAULT_MAX_DELAY_SECONDS),
+            )
+        return _coalescer
+
+
+def schedule_position_recompute():
+    mode = getattr(settings, 'POSITION_RECOMPUTE', 'coalescer')
+    if mode == 'immediate':
+        recompute_dirty_positions()
+    elif mode == 'coalescer':
+        get_coalescer().notify()
@@ -0,0 +1,118 @@
+"""
+End-of-session promotion and demotion of students.
+
+promote_students() moves each student to the next (or previous) class level
+and the matching section of the next session, records their class history
+and notifies them, then graduates the SS 3 students. The families' balances
+are refreshed once per term at the end rather than on every save. It runs
+as the promote_students background task, so promoting the whole school does
+not tie up a web worker.
+"""
+import logging
+
+from django.db import transaction
+
+from accounts.models import ClassSection, Notification, SchoolClass, Student, StudentClassHistory
+from accounts.utils.balances import deferred_family_balances
+
+logger = logging.getLogger(__name__)
+
+PROMOTION_ACTIONS = ('promote', 'demote')
+
+
+def promotable_students():
+    """Students promoted by 'Promote all': every active student with a class, except SS 3."""
+    return Student.objects.filter(is_active=True, current_class__isnull=False).exclude(current_class__level='SS 3')
+
+
+def _record_history(student, session, class_level, section):
+    history, created = StudentClassHistory.objects.get_or_create(
+        student=student,
+        session=session,
+        term='1',
+        defaults={'class_level': class_level, 'section': section}
+    )
+    if not created:
+        history.class_level = class_level
+        history.section = section
+        history.save()
+
+
+def promote_students(action, student_ids, current_session, next_session, username, progress=None):
+    """
+    Promote or demote the students in `student_ids` (all promotable students
+    when None) into `next_session` and graduate SS 3, in one transaction.
+    Returns (students moved, warnings about students that were skipped).
+    """
+    if action not in PROMOTION_ACTIONS:
+        raise ValueError(f"Invalid promotion action {action!r}")
+    students = promotable_students() if student_ids is None else Student.objects.filter(admission_number__in=student_ids)
+    students = list(students.select_related('current_class', 'current_section', 'user'))
+    warnings = []
+    moved = 0
+
+    with transaction.atomic(), deferred_family_balances():
+        for done, student in enumerate(students, 1):
+            if progress:
+                progress(done, len(students))
+            current_class = student.current_class
+            if not current_class:
+                logger.warning(f"Student {student.full_name} has no current class, skipping.")
+                warnings.append(f"Student {student.full_name} has no current class and was skipped.")
+                continue
+
+            if action == 'promote':
+                next_class = SchoolClass.objects.filter(
+                    level_order__gt=current_class.level_order
+                ).order_by('level_order').first()
+            else:
+                next_class = SchoolClass.objects.filter(
+                    level_order__lt=current_class.level_order
+                ).order_by('-level_order').first()
+
+            if not next_class:
+                logger.warning(f"No {'next' if action == 'promote' else 'previous'} class for {student.full_name} in {current_class.level}")
+                warnings.append(f"No {'next' if action == 'promote' else 'previous'} class available for {student.full_name} in {current_class.level}")
+                continue
+
+            new_section = None
+            if student.current_section and student.current_section.suffix != 'N/A':
+                new_section = ClassSection.objects.filter(
+                    school_class=next_class,
+                    suffix=student.current_section.suffix,
+                    session=next_session
+                ).first()
+                if not new_section:
+                    logger.warning(
+                        f'No matching section for {next_class.level} {student.current_section.suffix} '
+                        f'in session {next_session.name} for student {student.full_name}'
+                    )
+                    warnings.append(f"No section {student.current_section.suffix} found for {next_class.level} in {next_session.name} for {student.full_name}")
+
+            student.current_class = next_class
+            student.current_section = new_section
+            student.save()
+            _record_history(student, next_session, next_class, new_section)
+
+            Notification.objects.create(
+                user=student.user,
+                message=f"You have been {action}d to {next_class.level} "
+                        f"{' ' + new_section.suffix if new_section else ''} for {next_session.name}."
+            )
+            logger.info(
+                f"Student {student.full_name} {action}d to {next_class.level} "
+                f"{' ' + new_section.suffix if new_section else ''} by {username}"
+            )
+            moved += 1
+
+        for student in Student.objects.filter(current_class__level='SS 3', is_active=True).select_related('current_class', 'current_section', 'user'):
+            student.is_active = False
+            student.save()
+            _record_history(student, next_session, student.current_class, student.current_section)
+            Notification.objects.create(
+                user=student.user,
+                message=f"You have graduated from {student.current_class.level} in {current_session.name}."
+            )
+            logger.info(f"Student {student.full_name} marked as graduated by {username}")
+
+    return moved, warnings
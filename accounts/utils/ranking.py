@@ -0,0 +1,206 @@
+"""
+Set-based ranking of subject and class positions.
+
+Positions are computed inside the database with competition ("1224") tie
+handling: subject positions rank every result of a subject by its total score
+rounded to two places, class positions rank students by the mean of their
+positive scores rounded to two places and by their mean grade point. Scores
+are compared as whole hundredths and the mean is rounded half up in integer
+arithmetic, so PostgreSQL and SQLite agree on ties wherever a binary float
+average would land just either side of a half. PostgreSQL and SQLite
+>= 3.25 use RANK() window functions; older SQLite builds fall back to an
+equivalent correlated count. Each pass is a single UPDATE statement.
+"""
+import logging
+
+from django.db import connection, transaction
+
+from accounts.models import Result, Student, StudentSubject, Subject
+from accounts.utils.summaries import refresh_section_summaries
+
+logger = logging.getLogger(__name__)
+
+NON_GP_SECTIONS = ('Nursery', 'Primary')
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def _ordinal_sql(column):
+    """SQL expression rendering an integer rank column as '1st', '2nd', '11th'..."""
+    return (
+        f"CAST({column} AS TEXT) || CASE"
+        f" WHEN {column} %% 100 BETWEEN 10 AND 20 THEN 'th'"
+        f" WHEN {column} %% 10 = 1 THEN 'st'"
+        f" WHEN {column} %% 10 = 2 THEN 'nd'"
+        f" WHEN {column} %% 10 = 3 THEN 'rd'"
+        f" ELSE 'th' END"
+    )
+
+
+def _cents_sql(expression):
+    """`expression` in whole hundredths, rounded half away from zero."""
+    # PostgreSQL's ROUND() of a double rounds half to even, of a numeric half away; SQLite ignores the cast.
+    return f"CAST(ROUND(CAST({expression} * 100 AS NUMERIC)) AS INTEGER)"
+
+
+def _mean_cents_sql(cents):
+    """Mean of a positive hundredths column, rounded half up with integer division only."""
+    return f"(2 * SUM({cents}) + COUNT(*)) / (2 * COUNT(*))"
+
+
+def _supports_window_functions():
+    return connection.features.supports_over_clause
+
+
+def _supports_update_from():
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return connection.Database.sqlite_version_info >= (3, 33, 0)
+    return False
+
+
+def _scope_cte():
+    """
+    CTE selecting the results that take part in ranking: every result of a
+    student currently in the section for the session/term, restricted to the
+    active subjects assigned to the section's students.
+    """
+    result = _table(Result)
+    student = _table(Student)
+    student_subject = _table(StudentSubject)
+    subject = _table(Subject)
+    sql = f"""
+        scope AS (
+            SELECT r.id AS id, r.student_id AS student_id, r.subject_id AS subject_id,
+                   r.total_score AS total_score, r.grade_point AS grade_point
+            FROM {result} r
+            INNER JOIN {student} st ON st.admission_number = r.student_id
+            WHERE st.current_section_id = %s AND r.session_id = %s AND r.term = %s
+              AND r.subject_id IN (
+                  SELECT ss.subject_id
+                  FROM {student_subject} ss
+                  INNER JOIN {student} s2 ON s2.admission_number = ss.student_id
+                  INNER JOIN {subject} sj ON sj.id = ss.subject_id
+                  WHERE s2.current_section_id = %s AND ss.session_id = %s
+                    AND ss.term = %s AND sj.is_active
+              )
+        )"""
+    return sql
+
+
+def _scope_params(section_id, session_id, term):
+    return [section_id, session_id, term, section_id, session_id, term]
+
+
+def _execute_update(ctes, ranked_select, assignments, params):
+    """
+    Write ranked rows back to the result table. `ranked_select` must produce
+    an `id` column plus the columns used by `assignments`
+    (a list of (result_column, ranked_column) pairs).
+    """
+    result = _table(Result)
+    with_clause = "WITH " + ",".join(ctes)
+    if _supports_update_from():
+        set_clause = ", ".join(f"{column} = ranked.{source}" for column, source in assignments)
+        sql = f"""
+            {with_clause}
+            UPDATE {result} SET {set_clause}
+            FROM ({ranked_select}) AS ranked
+            WHERE {result}.id = ranked.id"""
+    else:
+        set_clause = ", ".join(
+            f"{column} = (SELECT ranked.{source} FROM ({ranked_select}) AS ranked"
+            f" WHERE ranked.id = {result}.id)"
+            for column, source in assignments
+        )
+        sql = f"""
+            {with_clause}
+            UPDATE {result} SET {set_clause}
+            WHERE {result}.id IN (SELECT ranked.id FROM ({ranked_select}) AS ranked)"""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+def rank_subject_positions(section_id, session_id, term):
+    """Rank every result of the section per subject. Returns the rows written."""
+    if _supports_window_functions():
+        rank = (
+            f"RANK() OVER (PARTITION BY s.subject_id "
+            f"ORDER BY {_cents_sql('s.total_score')} DESC)"
+        )
+    else:
+        rank = (
+            f"1 + (SELECT COUNT(*) FROM scope s2 WHERE s2.subject_id = s.subject_id "
+            f"AND {_cents_sql('s2.total_score')} > {_cents_sql('s.total_score')})"
+        )
+    ranked_select = f"""
+        SELECT id, {_ordinal_sql('pos')} AS subject_position
+        FROM (SELECT s.id AS id, {rank} AS pos FROM scope s) AS positions"""
+    return _execute_update(
+        [_scope_cte()],
+        ranked_select,
+        [('subject_position', 'subject_position')],
+        _scope_params(section_id, session_id, term),
+    )
+
+
+def rank_class_positions(section_id, session_id, term, with_gp=True):
+    """
+    Rank the students of a section by average marks and, unless `with_gp` is
+    False (Nursery and Primary), by average grade point. Only results with a
+    positive total score take part and receive a class position.
+    """
+    averages = f"""
+        averages AS (
+            SELECT student_id,
+                   {_mean_cents_sql(_cents_sql('total_score'))} AS avg_marks,
+                   COALESCE(SUM(grade_point), 0.0) * 1.0 / COUNT(*) AS avg_gp
+            FROM scope
+            WHERE total_score > 0
+            GROUP BY student_id
+        )"""
+    if _supports_window_functions():
+        marks_rank = "RANK() OVER (ORDER BY a.avg_marks DESC)"
+        gp_rank = "RANK() OVER (ORDER BY a.avg_gp DESC)"
+    else:
+        marks_rank = "1 + (SELECT COUNT(*) FROM averages a2 WHERE a2.avg_marks > a.avg_marks)"
+        gp_rank = "1 + (SELECT COUNT(*) FROM averages a2 WHERE a2.avg_gp > a.avg_gp)"
+    ranked_select = f"""
+        SELECT s.id AS id,
+               {_ordinal_sql('p.marks_pos')} AS class_position,
+               {_ordinal_sql('p.gp_pos')} AS class_position_gp
+        FROM scope s
+        INNER JOIN (
+            SELECT a.student_id AS student_id, {marks_rank} AS marks_pos, {gp_rank} AS gp_pos
+            FROM averages a
+        ) AS p ON p.student_id = s.student_id
+        WHERE s.total_score > 0"""
+    assignments = [('class_position', 'class_position')]
+    if with_gp:
+        assignments.append(('class_position_gp', 'class_position_gp'))
+    return _execute_update(
+        [_scope_cte(), averages],
+        ranked_select,
+        assignments,
+        _scope_params(section_id, session_id, term),
+    )
+
+
+def rank_section(section, session, term):
+    """
+    Recompute subject and class positions for a section in one transaction and
+    copy the new class positions into the section's term summaries.
+    """
+    with_gp = section.school_class.section not in NON_GP_SECTIONS
+    with transaction.atomic():
+        subject_rows = rank_subject_positions(section.pk, session.pk, term)
+        class_rows = rank_class_positions(section.pk, session.pk, term, with_gp=with_gp)
+        refresh_section_summaries(section.pk, session.pk, term)
+    logger.debug(
+        f"Ranked section {section} ({session}, term {term}): "
+        f"{subject_rows} subject rows, {class_rows} class rows"
+    )
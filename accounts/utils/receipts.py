@@ -0,0 +1,134 @@
+"""
+Payment receipt PDFs.
+
+A completed payment's receipt does not change, so it is rendered once and
+stored for good under its transaction ID and the payment's updated_at. Each
+instance keeps the store on its own disk, so keying on updated_at, rather
+than deleting the file on an edit, is what stops the web service and the
+process_tasks worker from printing an edited payment's old receipt. The fee
+total and the students' classes printed on it are saved on the payment when
+it is first rendered, so a receipt rendered again later (after a cache
+eviction or a template change) still shows what was issued, even after fee
+edits or promotions. The only way a payment changes afterwards is
+admin_create_payment editing or deleting it, which saves it and calls
+invalidate_receipt(). Receipts of pending or cancelled payments are rendered
+on every request. Bulk printing runs as the bulk_receipts background task and
+merges the stored receipts, rendering only the ones not stored yet.
+"""
+import io
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils import timezone
+from pypdf import PdfWriter
+
+from accounts.models import Payment
+from accounts.utils.pdf_renderer import render_pdf
+
+logger = logging.getLogger(__name__)
+
+RECEIPT_CACHE = 'receipts'
+# Bump when payment_receipt.html changes so stored receipts are rendered again.
+RECEIPT_TEMPLATE_VERSION = 2
+
+SCHOOL_DETAILS = {
+    'school_name': "Rehoboth International School of Excellence",
+    'school_address': "798 Rues Des Cormiers Qt Hedzranawoe, Lome Togo",
+    'school_contact': "+22890165089, +22890016077, +22897412298",
+}
+
+
+def _cache():
+    return caches[RECEIPT_CACHE if RECEIPT_CACHE in settings.CACHES else 'default']
+
+
+def receipt_key(payment):
+    return f"receipt_pdf_v{RECEIPT_TEMPLATE_VERSION}_{payment.transaction_id}_{payment.updated_at.timestamp()}"
+
+
+def receipt_details(payment):
+    """The fee total, amount due and students as of now, in the form stored on Payment.receipt_details."""
+    total_fee = payment.calculate_total_fee()
+    amount_due = total_fee - payment.amount if total_fee and payment.amount else 0
+    return {
+        'total_fee': f"{total_fee or 0:.2f}",
+        'amount_due': f"{amount_due:.2f}",
+        'students': [
+            {
+                'full_name': student.full_name,
+                'admission_number': student.admission_number,
+                'class': student.current_class.level if student.current_class else '',
+            }
+            for student in payment.students.all()
+        ],
+    }
+
+
+def issue_receipt_details(payment):
+    """The details printed on a completed payment's receipt, saved on the payment the first time."""
+    if payment.receipt_details is None:
+        details = receipt_details(payment)
+        if Payment.objects.filter(pk=payment.pk, receipt_details__isnull=True).update(receipt_details=details):
+            payment.receipt_details = details
+        else:
+            # Issued by a concurrent request; print what that one saved.
+            payment.refresh_from_db(fields=['receipt_details'])
+    return payment.receipt_details
+
+
+def receipt_html(payment, details=None):
+    return render_to_string('account/payment_receipt.html', {
+        'payment': payment, 'receipt': details or receipt_details(payment), **SCHOOL_DETAILS,
+    })
+
+
+def render_receipt(payment, details=None):
+    return render_pdf(receipt_html(payment, details))
+
+
+def receipt_pdf(payment):
+    """PDF bytes of a payment's receipt, rendered once per version of a completed payment."""
+    if payment.status != 'Completed':
+        return render_receipt(payment)
+    cache = _cache()
+    key = receipt_key(payment)
+    pdf = cache.get(key)
+    if pdf is None:
+        pdf = render_receipt(payment, issue_receipt_details(payment))
+        cache.set(key, pdf, None)
+        logger.debug(f"Rendered and stored receipt {payment.transaction_id}")
+    return pdf
+
+
+def invalidate_receipt(transaction_id):
+    """Forget a payment's receipt after an edit, so the next one is issued with the current details."""
+    # A new updated_at changes the receipt's key in every process; the old file is culled in time.
+    Payment.objects.filter(transaction_id=transaction_id).update(receipt_details=None, updated_at=timezone.now())
+
+
+def bulk_receipt_payments(start_date=None, end_date=None, session_id=None, term=None):
+    """Completed payments made between two dates (inclusive) or in a session and term, in the order they are printed."""
+    payments = Payment.objects.filter(status='Completed')
+    if start_date:
+        payments = payments.filter(created_at__date__range=(start_date, end_date or start_date))
+    else:
+        payments = payments.filter(session_id=session_id, term=term)
+    return payments.select_related('parent', 'session').prefetch_related(
+        'students__current_class'
+    ).order_by('created_at', 'id')
+
+
+def merge_receipts(payments, output, progress=None):
+    """Write the receipts of `payments` into `output` as one PDF. Returns the number merged."""
+    payments = list(payments)
+    writer = PdfWriter()
+    count = 0
+    for payment in payments:
+        writer.append(io.BytesIO(receipt_pdf(payment)))
+        count += 1
+        if progress:
+            progress(count, len(payments))
+    writer.write(output)
+    return count
@@ -0,0 +1,79 @@
+"""
+Cache of rendered report card PDFs.
+
+A report card is stored under a digest of everything printed on it: the
+student's name, class and section, the session and term, the term summary
+(latest Result upload, positions, section size and the time it was last
+refreshed) and the report card template version. Any change to an input
+produces a new key, so stale PDFs are never served and need no explicit
+invalidation; they simply expire. Summaries are refreshed whenever a Result
+or assignment changes and after every ranking pass, which is what keeps the
+digest current.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+from accounts.models import StudentTermSummary
+from accounts.utils.pdf_generator import REPORT_CARD_TEMPLATE_VERSION, generate_result_pdf
+from accounts.utils.result_history import load_term_results
+
+logger = logging.getLogger(__name__)
+
+REPORT_CARD_CACHE = 'report_cards'
+REPORT_CARD_CACHE_SECONDS = 30 * 24 * 60 * 60
+
+
+def _cache():
+    return caches[REPORT_CARD_CACHE if REPORT_CARD_CACHE in settings.CACHES else 'default']
+
+
+def report_card_key(student, session, term, summary):
+    parts = [
+        REPORT_CARD_TEMPLATE_VERSION,
+        student.pk,
+        student.full_name,
+        student.current_class.level if student.current_class else None,
+        student.current_class.section if student.current_class else None,
+        student.current_section.suffix if student.current_section else None,
+        session.pk,
+        session.name,
+        term,
+    ]
+    if summary:
+        parts += [
+            summary.last_upload,
+            summary.updated_at,
+            summary.class_position,
+            summary.class_position_gp,
+            summary.section_size,
+        ]
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()
+    return f"report_card_pdf_{digest}"
+
+
+def report_card_pdf(student, session, term):
+    """PDF bytes of one student's report card, rendered only when its inputs have changed."""
+    summary = StudentTermSummary.objects.filter(student=student, session=session, term=term).first()
+    key = report_card_key(student, session, term, summary)
+    cache = _cache()
+    pdf = cache.get(key)
+    if pdf is not None:
+        return pdf
+
+    section = student.current_class.section if student.current_class else None
+    results, _ = load_term_results(student, session, term)
+    pdf = generate_result_pdf(
+        student,
+        results,
+        session,
+        term,
+        is_nursery=section == 'Nursery',
+        is_primary=section == 'Primary',
+        summary=summary,
+    ).getvalue()
+    cache.set(key, pdf, REPORT_CARD_CACHE_SECONDS)
+    logger.debug(f"Rendered and cached report card for {student.admission_number}, {session.name} term {term}")
+    return pdf
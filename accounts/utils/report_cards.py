@@ -0,0 +1,226 @@
+"""
+Bulk report card rendering.
+
+Every report card of a section or class level is rendered by a pool of worker
+processes, one student per task. Workers write each PDF to a temporary
+directory and the parent collects them in print order into a single merged
+PDF or a ZIP of per-student files, deleting each file once it is collected.
+Report cards already in the report card cache are not rendered again.
+Only a small window of students is in flight at a time, and the merged PDF is
+written object by object as each report card arrives, keeping only the byte
+offsets needed for the cross-reference table, so memory does not grow with
+the number of students.
+"""
+import logging
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.db.models import Exists, OuterRef
+from pypdf import PdfReader
+from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+from accounts.models import Result, Session, Student
+from accounts.utils.report_card_cache import report_card_pdf
+
+logger = logging.getLogger(__name__)
+
+REPORT_CARD_FORMATS = ('pdf', 'zip')
+# Tasks queued per worker; enough to keep every worker busy without holding the class in memory.
+TASKS_PER_WORKER = 2
+
+
+def report_card_students(session, term, section=None, school_class=None):
+    """Students with results in the term, for one section or a whole class level, in print order."""
+    students = Student.objects.filter(
+        Exists(Result.objects.filter(
+            student_id=OuterRef('pk'), session=session, term=term, total_score__gt=0
+        ))
+    )
+    if section is not None:
+        students = students.filter(current_section=section)
+    else:
+        students = students.filter(current_section__school_class=school_class, current_section__session=session)
+    return students.order_by('current_section__suffix', 'surname', 'first_name', 'admission_number')
+
+
+def report_card_filename(student, session, term):
+    name = f"Results_{student.admission_number}_{student.full_name}_{session.name}_Term{term}.pdf"
+    return name.replace('/', '-').replace(' ', '_')
+
+
+def default_workers():
+    """The cores this process may run on, which in a container can be fewer than the host's."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def render_report_card(admission_number, session_id, term, directory):
+    """Render one report card into `directory` and return the file path."""
+    session = Session.objects.get(pk=session_id)
+    student = Student.objects.select_related('current_class', 'current_section').get(pk=admission_number)
+    pdf = report_card_pdf(student, session, term)
+    path = os.path.join(directory, report_card_filename(student, session, term))
+    with open(path, 'wb') as f:
+        f.write(pdf)
+    return path
+
+
+def _rendered(admission_numbers, session_id, term, directory, workers):
+    """Yield report card paths in the order of `admission_numbers`."""
+    if workers <= 1:
+        for admission_number in admission_numbers:
+            yield render_report_card(admission_number, session_id, term, directory)
+        return
+
+    remaining = iter(admission_numbers)
+    # Spawned, not forked: the process_tasks worker runs several threads, and a fork could copy a lock
+    # another thread holds (logging, the database driver) into a child that then waits on it forever.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        pending = deque(
+            pool.submit(render_report_card, admission_number, session_id, term, directory)
+            for admission_number in islice(remaining, workers * TASKS_PER_WORKER)
+        )
+        while pending:
+            path = pending.popleft().result()
+            for admission_number in islice(remaining, 1):
+                pending.append(pool.submit(render_report_card, admission_number, session_id, term, directory))
+            yield path
+
+
+class _MergedPdf:
+    """
+    A PDF written to `output` one input document at a time. Each input's page
+    objects are renumbered and written straight away; the page tree, catalog
+    and cross-reference table follow in close().
+    """
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self, output):
+        self.output = output
+        self.start = output.tell()
+        self.offsets = {}
+        self.kids = []
+        self.next_number = 3
+        output.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, number, obj):
+        self.offsets[number] = self.output.tell() - self.start
+        self.output.write(f'{number} 0 obj\n'.encode())
+        obj.write_to_stream(self.output)
+        self.output.write(b'\nendobj\n')
+
+    def append(self, path):
+        with PdfReader(path) as reader:
+            self._copy(reader)
+
+    def _copy(self, reader):
+        numbers = {}
+        queue = deque()
+
+        def renumber(reference):
+            key = (reference.idnum, reference.generation)
+            if key not in numbers:
+                numbers[key] = self.next_number
+                self.next_number += 1
+                queue.append(reference)
+            return IndirectObject(numbers[key], 0, None)
+
+        def relink(obj):
+            # References are rewritten in place; the reader is closed once the file is copied.
+            if isinstance(obj, IndirectObject):
+                return renumber(obj)
+            if isinstance(obj, DictionaryObject):
+                for key, value in list(obj.items()):
+                    obj[key] = relink(value)
+            elif isinstance(obj, ArrayObject):
+                for i, value in enumerate(obj):
+                    obj[i] = relink(value)
+            return obj
+
+        page_numbers = set()
+        for page in reader.pages:
+            kid = renumber(page.indirect_reference)
+            self.kids.append(kid)
+            page_numbers.add(kid.idnum)
+        while queue:
+            reference = queue.popleft()
+            number = numbers[(reference.idnum, reference.generation)]
+            obj = reference.get_object()
+            if number in page_numbers:
+                # pypdf has already copied inherited attributes onto each page, so the old page tree is not needed.
+                obj.pop('/Parent', None)
+                relink(obj)
+                obj[NameObject('/Parent')] = IndirectObject(self.PAGES, 0, None)
+            else:
+                relink(obj)
+            self._write(number, obj)
+
+    def close(self):
+        pages = DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(self.kids),
+            NameObject('/Count'): NumberObject(len(self.kids)),
+        })
+        self._write(self.PAGES, pages)
+        self._write(self.CATALOG, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(self.PAGES, 0, None),
+        }))
+        xref = self.output.tell() - self.start
+        self.output.write(f'xref\n0 {self.next_number}\n0000000000 65535 f \n'.encode())
+        for number in range(1, self.next_number):
+            self.output.write(f'{self.offsets[number]:010d} 00000 n \n'.encode())
+        self.output.write(f'trailer\n<< /Size {self.next_number} /Root {self.CATALOG} 0 R >>\n'.encode())
+        self.output.write(f'startxref\n{xref}\n%%EOF\n'.encode())
+
+
+def render_report_cards(students, session, term, output, output_format='pdf', workers=None, progress=None):
+    """
+    Render the report cards of `students` into `output` (a path or binary file)
+    as one merged PDF or a ZIP of per-student PDFs. `progress` is called with
+    (rendered, total) after each report card. Returns the number rendered.
+    """
+    if output_format not in REPORT_CARD_FORMATS:
+        raise ValueError(f"Unknown report card format {output_format!r}")
+    admission_numbers = list(students.values_list('admission_number', flat=True))
+    total = len(admission_numbers)
+    workers = min(workers or default_workers(), max(total, 1))
+
+    with tempfile.TemporaryDirectory(prefix='report_cards_') as directory:
+        paths = _rendered(admission_numbers, session.pk, term, directory, workers)
+        if output_format == 'zip':
+            with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for done, path in enumerate(paths, 1):
+                    archive.write(path, os.path.basename(path))
+                    os.remove(path)
+                    if progress:
+                        progress(done, total)
+        else:
+            with ExitStack() as stack:
+                if isinstance(output, (str, os.PathLike)):
+                    output = stack.enter_context(open(output, 'wb'))
+                merged = _MergedPdf(output)
+                for done, path in enumerate(paths, 1):
+                    merged.append(path)
+                    os.remove(path)
+                    if progress:
+                        progress(done, total)
+                merged.close()
+
+    logger.info(f"Rendered {total} report card(s) for {session.name} term {term} with {workers} worker(s)")
+    return total
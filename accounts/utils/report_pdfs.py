@@ -0,0 +1,75 @@
+"""
+PDF versions of the bursary reports: payment report, fee statistics and
+daily payments.
+
+They are rendered by the report_pdf background task rather than in the
+request, since a whole term of families runs to hundreds of pages. Each
+report is drawn with the native table renderer or with WeasyPrint, as
+chosen by the view with table_pdf.use_native_pdf(). render_report_pdf()
+returns (pdf bytes, filename).
+"""
+from datetime import date
+
+from django.template.loader import render_to_string
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import Session
+from accounts.utils import table_pdf
+from accounts.utils.daily_payments import daily_payment_totals, get_daily_payments, iter_daily_payment_rows
+from accounts.utils.exports import export_filename
+from accounts.utils.fee_statistics import fee_statistics
+from accounts.utils.payment_report import payment_report_context
+from accounts.utils.pdf_renderer import render_pdf
+
+
+def _render(native, native_renderer, template, context):
+    if native:
+        return native_renderer(context)
+    return render_pdf(render_to_string(template, context))
+
+
+def payment_report(session, term, native, sort_type='all'):
+    context = payment_report_context(session, term, sort_type)
+    pdf = _render(native, table_pdf.payment_report_pdf, 'account/admin/payment_report_pdf.html', context)
+    return pdf, f"{export_filename('payment_report', session.name, term)}.pdf"
+
+
+def fee_statistics_report(session, term, native):
+    context = {
+        'sessions': Session.objects.all(),
+        'current_session': session,
+        'current_term': term,
+        'term_choices': TERM_CHOICES,
+        **fee_statistics(session, term),
+        'date_generated': date.today(),
+    }
+    pdf = _render(native, table_pdf.fee_statistics_pdf, 'account/admin/fee_statistics_pdf.html', context)
+    return pdf, f"{export_filename('fee_statistics', session.name, term)}.pdf"
+
+
+def daily_payment_report(session, term, native, start_date, end_date):
+    start_date, end_date = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    payments = get_daily_payments(start_date, end_date, session, term)
+    context = {
+        'current_session': session,
+        'current_term': term,
+        'date_label': str(start_date) if start_date == end_date else f"{start_date} to {end_date}",
+        'report_data': list(iter_daily_payment_rows(payments, session, term)),
+        **daily_payment_totals(payments),
+        'date_generated': date.today(),
+    }
+    pdf = _render(native, table_pdf.daily_payment_report_pdf, 'account/admin/daily_payment_report_pdf.html', context)
+    filename = export_filename('daily_payment_report', start_date, end_date if end_date != start_date else None)
+    return pdf, f"{filename}.pdf"
+
+
+REPORT_PDFS = {
+    'payment_report': payment_report,
+    'fee_statistics': fee_statistics_report,
+    'daily_payments': daily_payment_report,
+}
+
+
+def render_report_pdf(report, session, term, native, **options):
+    """(pdf bytes, filename) of one of REPORT_PDFS."""
+    return REPORT_PDFS[report](session, term, native, **options)
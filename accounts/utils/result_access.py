@@ -0,0 +1,134 @@
+"""
+Result access decisions.
+
+A student may see a term's results when the parent has a completed payment for
+that session and term or the student's ResultAccessRequest for it is approved.
+ResultAccessResolver answers this for many (student, session, term) tuples
+with three queries and memoizes answers for the lifetime of a request. Answers
+are also cached under the student's family and a stamp of the payments and
+access requests they were decided from, read in the first query, so a payment
+or an approval recorded by any process is seen by every process on the next
+request.
+"""
+import logging
+
+from django.core.cache import cache
+
+from accounts.models import Payment, ResultAccessRequest
+from accounts.utils.stamps import table_stamp
+
+logger = logging.getLogger(__name__)
+
+ACCESS_CACHE_SECONDS = 15 * 60
+_MISSING = object()
+
+
+def _cache_key(key, parent_id, stamp):
+    student_id, session_id, term = key
+    return f"result_access_{student_id}_{session_id}_{term}_{parent_id}_{stamp}"
+
+
+class TermAccess:
+    __slots__ = ('fees_paid', 'access_request')
+
+    def __init__(self, fees_paid, access_request):
+        self.fees_paid = fees_paid
+        self.access_request = access_request
+
+    @property
+    def access_approved(self):
+        return bool(self.access_request and self.access_request.status == 'Approved')
+
+    @property
+    def has_access(self):
+        return self.fees_paid or self.access_approved
+
+
+class ResultAccessResolver:
+    """
+    Use ResultAccessResolver.for_request(request) in views so every check made
+    while handling one request shares the same answers.
+    """
+
+    def __init__(self):
+        self._memo = {}
+
+    @classmethod
+    def for_request(cls, request):
+        resolver = getattr(request, '_result_access_resolver', None)
+        if resolver is None:
+            resolver = cls()
+            request._result_access_resolver = resolver
+        return resolver
+
+    def resolve(self, keys):
+        """
+        Load access for an iterable of (student, session_id, term) tuples, where
+        `student` is a Student instance. Returns {(student_id, session_id, term): TermAccess}.
+        """
+        parents = {}
+        wanted = []
+        for student, session_id, term in keys:
+            key = (student.pk, session_id, term)
+            parents[student.pk] = student.parent_id
+            if key not in self._memo:
+                wanted.append(key)
+
+        if wanted:
+            session_ids = {key[1] for key in wanted}
+            stamp = table_stamp(
+                Payment.objects.filter(
+                    parent_id__in={parents[key[0]] for key in wanted if parents[key[0]]}, session_id__in=session_ids
+                ),
+                ResultAccessRequest.objects.filter(student_id__in={key[0] for key in wanted}, session_id__in=session_ids),
+            )
+            cache_keys = {key: _cache_key(key, parents[key[0]], stamp) for key in wanted}
+            cached = cache.get_many(cache_keys.values())
+            missing = []
+            for key in wanted:
+                value = cached.get(cache_keys[key], _MISSING)
+                if value is _MISSING:
+                    missing.append(key)
+                else:
+                    self._memo[key] = value
+            if missing:
+                self._load(missing, parents, cache_keys)
+
+        return {(student.pk, session_id, term): self._memo[(student.pk, session_id, term)] for student, session_id, term in keys}
+
+    def _load(self, keys, parents, cache_keys):
+        student_ids = {key[0] for key in keys}
+        session_ids = {key[1] for key in keys}
+        parent_ids = {parents[student_id] for student_id in student_ids if parents[student_id]}
+
+        paid = set()
+        if parent_ids:
+            paid = set(Payment.objects.filter(
+                parent_id__in=parent_ids,
+                session_id__in=session_ids,
+                status='Completed'
+            ).values_list('parent_id', 'session_id', 'term').distinct())
+        requests = {
+            (r.student_id, r.session_id, r.term): r
+            for r in ResultAccessRequest.objects.filter(student_id__in=student_ids, session_id__in=session_ids)
+        }
+
+        loaded = {}
+        for key in keys:
+            student_id, session_id, term = key
+            parent_id = parents[student_id]
+            access = TermAccess(
+                fees_paid=bool(parent_id) and (parent_id, session_id, term) in paid,
+                access_request=requests.get(key),
+            )
+            self._memo[key] = access
+            loaded[cache_keys[key]] = access
+        cache.set_many(loaded, ACCESS_CACHE_SECONDS)
+
+    def get(self, student, session, term):
+        """TermAccess for one student, session and term."""
+        session_id = getattr(session, 'pk', session)
+        return self.resolve([(student, session_id, term)])[(student.pk, session_id, term)]
+
+    def has_access(self, student, session, term):
+        return self.get(student, session, term).has_access
@@ -0,0 +1,97 @@
+"""
+Loading a student's results across terms.
+
+The grade pages list every past term with its results, class, access status
+and stored summary; report card exports need one term's results and summary.
+Both are loaded here with a fixed number of queries however many terms the
+student has: rows are fetched for all terms at once and grouped in memory.
+"""
+from django.db.models import Exists, OuterRef
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import Result, StudentClassHistory, StudentSubject, StudentTermSummary
+from accounts.utils.result_access import ResultAccessResolver
+
+TERM_ORDER = [t[0] for t in TERM_CHOICES]
+
+
+def load_result_history(student, exclude=None, resolver=None):
+    """
+    Return one dict per term in which the student has a positive result, newest
+    session first. Each dict has `session`, `term`, `term_display`, `results`
+    (ordered by subject name), `summary`, `class_level`, `section_suffix`,
+    `fees_paid`, `access_request`, `has_access`, `average_score`,
+    `average_grade_point`, `class_position`, `class_position_gp` and
+    `total_in_section`. `exclude` is an optional (session, term) pair to skip;
+    pass the request's ResultAccessResolver as `resolver` to share access lookups.
+    """
+    by_term = {}
+    sessions = {}
+    for result in Result.objects.filter(
+        student=student, total_score__gt=0
+    ).select_related('subject', 'session').order_by('subject__name'):
+        key = (result.session_id, result.term)
+        if exclude and key == (exclude[0].pk, exclude[1]):
+            continue
+        by_term.setdefault(key, []).append(result)
+        sessions[result.session_id] = result.session
+    if not by_term:
+        return []
+
+    session_ids = list(sessions)
+    history = {
+        (h.session_id, h.term): h
+        for h in StudentClassHistory.objects.filter(
+            student=student, session_id__in=session_ids
+        ).select_related('class_level', 'section')
+    }
+    summaries = {
+        (s.session_id, s.term): s
+        for s in StudentTermSummary.objects.filter(student=student, session_id__in=session_ids)
+    }
+    access = (resolver or ResultAccessResolver()).resolve(
+        [(student, session_id, term) for session_id, term in by_term]
+    )
+
+    terms = []
+    term_names = dict(TERM_CHOICES)
+    for key in sorted(by_term, key=lambda k: (-sessions[k[0]].start_year, TERM_ORDER.index(k[1]))):
+        class_history = history.get(key)
+        term_access = access[(student.pk,) + key]
+        summary = summaries.get(key)
+        terms.append({
+            'session': sessions[key[0]],
+            'term': key[1],
+            'term_display': term_names.get(key[1], key[1]),
+            'results': by_term[key],
+            'summary': summary,
+            'class_level': class_history.class_level.level if class_history and class_history.class_level else 'N/A',
+            'section_suffix': class_history.section.suffix if class_history and class_history.section else 'N/A',
+            'fees_paid': term_access.fees_paid,
+            'access_request': term_access.access_request,
+            'has_access': term_access.has_access,
+            'average_score': summary.average_score if summary else 0,
+            'average_grade_point': summary.average_grade_point if summary else 0,
+            'class_position': summary.class_position if summary else '',
+            'class_position_gp': summary.class_position_gp if summary else '',
+            'total_in_section': summary.section_size if summary else 0,
+        })
+    return terms
+
+
+def load_term_results(student, session, term):
+    """Results in the student's assigned subjects for one term, ordered by subject name, and the term summary."""
+    results = list(Result.objects.filter(
+        student=student,
+        session=session,
+        term=term,
+    ).filter(
+        Exists(StudentSubject.objects.filter(
+            student_id=OuterRef('student_id'),
+            subject_id=OuterRef('subject_id'),
+            session_id=OuterRef('session_id'),
+            term=OuterRef('term'),
+        ))
+    ).select_related('subject').order_by('subject__name'))
+    summary = StudentTermSummary.objects.filter(student=student, session=session, term=term).first()
+    return results, summary
@@ -0,0 +1,146 @@
+"""
+Spreadsheet result import.
+
+Rows are streamed from a CSV file or an .xlsx workbook opened in openpyxl's
+read-only mode, handed to ScoreBatchWriter in fixed-size batches and ranked
+once per affected section at the end. Errors are passed to a callback as they
+occur instead of being collected, so memory use does not grow with the sheet.
+
+Expected columns (case and spacing are ignored): Admission Number, Subject (or
+Subject ID), the score columns of the student's section (CA, Test 1, Test 2,
+Exam / Test, Homework, Classwork, Nursery Primary Exam / Total Marks) and an
+optional Remarks column.
+"""
+import codecs
+import csv
+import io
+import logging
+import os
+
+from accounts.models import Student
+from accounts.utils.score_entry import ScoreBatchWriter
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('admission_number',)
+SUBJECT_COLUMNS = ('subject', 'subject_id')
+DEFAULT_BATCH_SIZE = 500
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be read as a result sheet."""
+
+
+def _normalise_header(value):
+    return '_'.join(str(value or '').strip().lower().replace('.', ' ').split())
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _check_header(header):
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing or not any(column in header for column in SUBJECT_COLUMNS):
+        raise ImportFormatError(
+            "The sheet needs an 'Admission Number' column and a 'Subject' or 'Subject ID' column."
+        )
+
+
+def _records(header, rows, first_line):
+    for line, values in enumerate(rows, start=first_line):
+        record = {key: _cell(value) for key, value in zip(header, values) if key}
+        if not any(record.values()):
+            continue
+        record['line'] = line
+        yield record
+
+
+def iter_csv_rows(stream):
+    """Yield row dicts from a binary or text CSV stream."""
+    if not isinstance(stream, io.TextIOBase):
+        # Binary files and Django uploads iterate line by line as bytes.
+        stream = codecs.iterdecode(stream, 'utf-8-sig')
+    reader = csv.reader(stream)
+    try:
+        header = [_normalise_header(value) for value in next(reader)]
+    except StopIteration:
+        raise ImportFormatError('The file is empty.')
+    _check_header(header)
+    yield from _records(header, reader, 2)
+
+
+def iter_xlsx_rows(stream):
+    """Yield row dicts from the first worksheet of an .xlsx file, streaming."""
+    from openpyxl import load_workbook
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise ImportFormatError(f'Could not open the workbook: {e}')
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            header = [_normalise_header(value) for value in next(rows)]
+        except StopIteration:
+            raise ImportFormatError('The worksheet is empty.')
+        _check_header(header)
+        yield from _records(header, rows, 2)
+    finally:
+        workbook.close()
+
+
+def iter_result_rows(stream, filename):
+    """Pick the reader from the file extension."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(stream)
+    if extension in ('.xlsx', '.xlsm'):
+        return iter_xlsx_rows(stream)
+    raise ImportFormatError(f'Unsupported file type {extension or filename}: upload a .csv or .xlsx file.')
+
+
+def import_results(rows, session, term, students=None, teacher=None,
+                   batch_size=DEFAULT_BATCH_SIZE, dry_run=False, on_error=None):
+    """
+    Upsert `rows` for a session and term. `students` limits who may be scored
+    (default: every active student). Each rejected cell or row is passed to
+    `on_error` as a dict with line, admission_number, subject_id, field and error.
+    Returns a dict of counts.
+    """
+    if students is None:
+        students = Student.objects.filter(is_active=True)
+    writer = ScoreBatchWriter(session, term, students, teacher=teacher, dry_run=dry_run)
+    counts = {'rows': 0, 'errors': 0}
+
+    def flush(batch):
+        writer.write(batch)
+        counts['errors'] += len(writer.errors)
+        if on_error:
+            for error in writer.errors:
+                on_error(error)
+        writer.errors.clear()
+        batch.clear()
+
+    batch = []
+    for row in rows:
+        batch.append(row)
+        counts['rows'] += 1
+        if len(batch) >= batch_size:
+            flush(batch)
+    if batch:
+        flush(batch)
+    writer.finish()
+
+    counts.update(
+        created=writer.created,
+        updated=writer.updated,
+        students=len(writer.changed_students),
+        dry_run=dry_run,
+    )
+    logger.info(f"Imported results for {session.name} term {term}: {counts}")
+    return counts
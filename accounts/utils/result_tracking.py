@@ -0,0 +1,138 @@
+"""
+Per-section result upload statistics for the admin result tracking page.
+
+Student counts, completeness counts and the top three students are computed
+with grouped queries for just the sections being displayed. The figures are
+cached per section under a key made of the term's summary stamp and a
+version. The stamp (latest updated_at and count of the term's summaries) is
+read from the database on every call, so a Result write in any process, the
+process_tasks worker included, retires the cached figures. Any change to a
+student's section, status or name replaces the version in the process that
+made it; other processes see such a change once the entries expire after
+RESULT_TRACKING_CACHE_SECONDS. Entries computed before a change are never
+read again, even when a request still holding the old key writes them back
+late.
+"""
+import logging
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Max, Window
+from django.db.models.functions import RowNumber
+
+from accounts.constants import TERM_CHOICES
+from accounts.models import Session, Student, StudentTermSummary
+
+logger = logging.getLogger(__name__)
+
+RESULT_TRACKING_CACHE_SECONDS = 10 * 60
+TOP_STUDENTS = 3
+
+
+def _version_key(session_id, term):
+    return f"result_tracking_version_{session_id}_{term}"
+
+
+def _cache_key(version, section_id):
+    return f"result_tracking_{version}_{section_id}"
+
+
+def _summary_stamp(session_id, term):
+    """Changes whenever a summary of the term is written or deleted, by any process."""
+    stamp = StudentTermSummary.objects.filter(session_id=session_id, term=term).aggregate(
+        latest=Max('updated_at'), count=Count('id')
+    )
+    latest = stamp['latest'].timestamp() if stamp['latest'] else 0
+    return f"{latest}_{stamp['count']}"
+
+
+def invalidate_result_tracking(session_id=None, term=None):
+    """Replace the cache version of one term, or of every term when none is given, now and again on commit."""
+    if session_id is None:
+        keys = [_version_key(pk, t) for pk in Session.objects.values_list('pk', flat=True) for t, _ in TERM_CHOICES]
+    else:
+        keys = [_version_key(session_id, term)]
+
+    def bump():
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def _full_name(surname, first_name, middle_name):
+    middle = f" {middle_name}" if middle_name else ""
+    return f"{surname} {first_name}{middle}"
+
+
+def _compute(section_ids, session, term):
+    student_counts = dict(
+        Student.objects.filter(current_section_id__in=section_ids, is_active=True)
+        .values('current_section').annotate(count=Count('admission_number'))
+        .values_list('current_section', 'count').order_by()
+    )
+    summaries = StudentTermSummary.objects.filter(
+        student__current_section_id__in=section_ids,
+        student__is_active=True,
+        session=session,
+        term=term,
+    )
+    complete_counts = dict(
+        summaries.filter(is_complete=True)
+        .values('student__current_section').annotate(count=Count('id'))
+        .values_list('student__current_section', 'count').order_by()
+    )
+    top_students = {}
+    for row in summaries.filter(scored_count__gt=0).annotate(
+        row_number=Window(
+            RowNumber(),
+            partition_by=F('student__current_section_id'),
+            order_by=[F('average_score').desc(), F('student_id').asc()],
+        )
+    ).filter(row_number__lte=TOP_STUDENTS).values(
+        'student__current_section_id', 'student_id', 'student__surname',
+        'student__first_name', 'student__middle_name', 'average_score', 'row_number',
+    ).order_by('student__current_section_id', 'row_number'):
+        top_students.setdefault(row['student__current_section_id'], []).append({
+            'student': {
+                'admission_number': row['student_id'],
+                'full_name': _full_name(row['student__surname'], row['student__first_name'], row['student__middle_name']),
+            },
+            'avg_score': row['average_score'],
+        })
+
+    stats = {}
+    for section_id in section_ids:
+        student_count = student_counts.get(section_id, 0)
+        complete_students = complete_counts.get(section_id, 0)
+        stats[section_id] = {
+            'student_count': student_count,
+            'complete_students': complete_students,
+            'upload_percentage': round(complete_students / student_count * 100, 2) if student_count else 0,
+            'top_students': top_students.get(section_id, []),
+        }
+    return stats
+
+
+def section_result_stats(sections, session, term):
+    """
+    Return one stats dict per section (in the given order) with `section`,
+    `student_count`, `complete_students`, `upload_percentage`, `teachers` and
+    `top_students`. Only sections missing from the cache are queried.
+    """
+    version = cache.get_or_set(_version_key(session.pk, term), uuid.uuid4().hex, None)
+    version = f"{version}_{_summary_stamp(session.pk, term)}"
+    keys = {section.pk: _cache_key(version, section.pk) for section in sections}
+    found = cache.get_many(keys.values())
+    cached = {section_id: found[key] for section_id, key in keys.items() if key in found}
+    missing = [section_id for section_id in keys if section_id not in cached]
+    if missing:
+        computed = _compute(missing, session, term)
+        cache.set_many({keys[section_id]: stats for section_id, stats in computed.items()}, RESULT_TRACKING_CACHE_SECONDS)
+        cached.update(computed)
+
+    return [
+        dict(cached[section.pk], section=section, teachers=section.teachers.all())
+        for section in sections
+    ]
@@ -0,0 +1,226 @@
+"""
+Batch score entry.
+
+ScoreBatchWriter validates and upserts many (student, subject) score rows at
+once: lookups are preloaded into dictionaries, each batch is one SELECT of the
+existing results plus one bulk insert/update, and every affected section is
+re-ranked once when the writer is finished. Invalid cells are reported and
+skipped; the rest of the batch is still written.
+"""
+import logging
+import math
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Result, StudentSubject, Subject
+from accounts.utils.grading import FALLBACK_SECTION, GRADED_FIELDS, SCORE_COMPONENTS, grade_results
+from accounts.utils.ranking import rank_section
+from accounts.utils.summaries import refresh_student_term_summary
+
+logger = logging.getLogger(__name__)
+
+RESULT_UNIQUE_FIELDS = ['student', 'subject', 'session', 'term']
+
+
+def _field_limits(field_name):
+    low, high = 0, None
+    for validator in Result._meta.get_field(field_name).validators:
+        if isinstance(validator, MinValueValidator):
+            low = validator.limit_value
+        elif isinstance(validator, MaxValueValidator):
+            high = validator.limit_value
+    return low, high
+
+
+def score_limits(section):
+    """{field: (min, max)} for the score fields entered in a school section."""
+    fields = SCORE_COMPONENTS.get(section, SCORE_COMPONENTS[FALLBACK_SECTION])
+    return {field: _field_limits(field) for field in fields}
+
+
+def parse_score(value, limits):
+    """Return a float within `limits`, None for a blank cell, or raise ValueError."""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('is not a number')
+    if not math.isfinite(score):
+        raise ValueError('is not a number')
+    low, high = limits
+    if score < low or (high is not None and score > high):
+        raise ValueError(f'must be between {low:g} and {high:g}')
+    return score
+
+
+class ScoreBatchWriter:
+    """
+    Upserts score rows for one session and term.
+
+    `students` is the queryset of students that may receive scores. Each row is a
+    dict with `admission_number`, `subject_id` (or a `subject` name), any score
+    fields and optionally `remarks` and `line` (reported back with errors).
+    """
+
+    def __init__(self, session, term, students, teacher=None, dry_run=False):
+        self.session = session
+        self.term = term
+        self.teacher = teacher
+        self.dry_run = dry_run
+        self.students = {s.pk: s for s in students.select_related('current_class', 'current_section__school_class')}
+        self.subjects = {s.id: s for s in Subject.objects.filter(is_active=True)}
+        self.assignments = set()
+        self.subject_names = {}
+        for student_id, subject_id, name in StudentSubject.objects.filter(
+            student__in=students.values('pk'),
+            session=session,
+            term=term,
+            subject__is_active=True
+        ).values_list('student_id', 'subject_id', 'subject__name'):
+            self.assignments.add((student_id, subject_id))
+            self.subject_names[(student_id, name.strip().lower())] = subject_id
+        self.limits = {}
+        self.errors = []
+        self.created = 0
+        self.updated = 0
+        self.changed_students = set()
+        self._touched = {}
+
+    def _error(self, row, message, field=None):
+        self.errors.append({
+            'line': row.get('line'),
+            'admission_number': row.get('admission_number'),
+            'subject_id': row.get('subject_id') or row.get('subject'),
+            'field': field,
+            'error': message,
+        })
+
+    def _section_of(self, result):
+        current_class = self.students[result.student_id].current_class
+        return current_class.section if current_class else None
+
+    def _validate(self, row):
+        """Return (student, subject, {field: value}, remarks) or None if the row is rejected."""
+        if not isinstance(row, dict):
+            self._error({}, f'Row must be an object with admission_number and subject_id, not {type(row).__name__}')
+            return None
+        student = self.students.get(row.get('admission_number'))
+        if student is None:
+            self._error(row, 'Student not found in this class')
+            return None
+        subject_id = row.get('subject_id')
+        if subject_id in (None, '') and row.get('subject'):
+            # Subject names are only unique within a section, so resolve them through the student's assignments.
+            subject_id = self.subject_names.get((student.pk, str(row['subject']).strip().lower()))
+        try:
+            subject = self.subjects.get(int(subject_id))
+        except (TypeError, ValueError):
+            subject = None
+        if subject is None:
+            self._error(row, 'Unknown or inactive subject')
+            return None
+        if (student.pk, subject.id) not in self.assignments:
+            self._error(row, f'{subject.name} is not assigned to {student.full_name} for this term')
+            return None
+
+        section = student.current_class.section if student.current_class else None
+        if section not in self.limits:
+            self.limits[section] = score_limits(section)
+        values = {}
+        for field, limits in self.limits[section].items():
+            try:
+                score = parse_score(row.get(field), limits)
+            except ValueError as e:
+                self._error(row, f'{field}: {e}', field=field)
+                continue
+            if score is not None:
+                values[field] = score
+        remarks = str(row.get('remarks') or '').strip() or None
+        return student, subject, values, remarks
+
+    def write(self, rows):
+        """Validate and upsert one batch of rows."""
+        parsed = {}
+        for row in rows:
+            validated = self._validate(row)
+            if validated:
+                student, subject, values, remarks = validated
+                if values or remarks:
+                    # Later rows for the same cell win, as they would in a spreadsheet.
+                    previous = parsed.get((student.pk, subject.id), ({}, None))
+                    parsed[(student.pk, subject.id)] = ({**previous[0], **values}, remarks or previous[1])
+        if not parsed:
+            return
+
+        existing = {
+            (r.student_id, r.subject_id): r
+            for r in Result.objects.filter(
+                session=self.session,
+                term=self.term,
+                student_id__in={key[0] for key in parsed},
+                subject_id__in={key[1] for key in parsed},
+            )
+        }
+        now = timezone.now()
+        to_create, to_update = [], []
+        for key, (values, remarks) in parsed.items():
+            result = existing.get(key)
+            if result is None:
+                result = Result(student_id=key[0], subject_id=key[1], session=self.session, term=self.term)
+                to_create.append(result)
+            elif any(getattr(result, f) != v for f, v in values.items()) or (remarks and remarks != result.remarks):
+                to_update.append(result)
+            else:
+                continue
+            for field, value in values.items():
+                setattr(result, field, value)
+            if remarks:
+                result.remarks = remarks
+            result.upload_date = now
+            result.uploaded_by = self.teacher
+
+        changed = to_create + to_update
+        grade_results(changed, self._section_of)
+        for result in changed:
+            student = self.students[result.student_id]
+            self.changed_students.add(student.pk)
+            self._touched.setdefault(student.current_section_id, set()).add(student.pk)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        if self.dry_run or not changed:
+            return
+
+        update_fields = sorted({
+            field for limits in self.limits.values() for field in limits
+        } | set(GRADED_FIELDS) | {'remarks', 'upload_date', 'uploaded_by'})
+        with transaction.atomic():
+            if to_create:
+                Result.objects.bulk_create(
+                    to_create,
+                    update_conflicts=True,
+                    unique_fields=RESULT_UNIQUE_FIELDS,
+                    update_fields=update_fields,
+                )
+            if to_update:
+                Result.objects.bulk_update(to_update, update_fields)
+
+    def finish(self):
+        """Re-rank every section touched by the written rows, once each."""
+        if self.dry_run:
+            return
+        for section_id, student_ids in self._touched.items():
+            if section_id is None:
+                for student_id in student_ids:
+                    refresh_student_term_summary(student_id, self.session.pk, self.term)
+                continue
+            section = next(
+                self.students[pk].current_section for pk in student_ids
+            )
+            rank_section(section, self.session, self.term)
+        logger.info(
+            f"Score entry for {self.session.name} term {self.term}: {self.created} created, "
+            f"{self.updated} updated, {len(self.errors)} errors, {len(self._touched)} sections ranked"
+        )
@@ -0,0 +1,47 @@
+"""
+Database stamps for cache keys.
+
+The default cache is local to each process, so deleting a key when a row is
+written only clears the process that wrote it: the other web workers and the
+process_tasks worker keep their copies until they expire. Values that several
+processes cache put a stamp of the rows they were computed from in their key
+instead. A stamp is the latest updated_at and the row count of each queryset,
+read in one query, so a row saved or deleted by any process changes it and
+the next read computes the value again.
+"""
+from collections import defaultdict
+
+from django.db.models import Count, IntegerField, Max, Value
+
+
+def _stamp_rows(querysets, fields):
+    parts = [
+        queryset.order_by().annotate(_stamp=Value(i, output_field=IntegerField())).values('_stamp', *fields).annotate(
+            latest=Max('updated_at'), count=Count('pk')
+        ).values_list('_stamp', *fields, 'latest', 'count')
+        for i, queryset in enumerate(querysets)
+    ]
+    return parts[0].union(*parts[1:], all=True) if len(parts) > 1 else parts[0]
+
+
+def _format(found, size):
+    return '_'.join(
+        f"{latest.timestamp() if latest else 0}_{count}" for latest, count in (found.get(i, (None, 0)) for i in range(size))
+    )
+
+
+def table_stamp(*querysets):
+    """A string that changes whenever a row of one of `querysets` is saved or deleted. Each model needs updated_at."""
+    return _format({i: (latest, count) for i, latest, count in _stamp_rows(querysets, ())}, len(querysets))
+
+
+def table_stamps(fields, *querysets):
+    """
+    Stamps of the rows of `querysets` grouped by `fields`, keyed by the tuple
+    of their values, in one query. A group with no rows has no entry: use ''.
+    """
+    found = defaultdict(dict)
+    for i, *group, latest, count in _stamp_rows(querysets, fields):
+        found[tuple(group)][i] = (latest, count)
+    return {group: _format(parts, len(querysets)) for group, parts in found.items()}
+
@@ -0,0 +1,189 @@
+"""
+Maintenance of StudentTermSummary rows.
+
+A summary holds what the grade pages, result tracking, class broadsheets and
+report cards used to recompute from raw Result rows: totals and averages,
+subject counts, completeness and class positions. Totals and averages are
+taken over the positively scored results, the same mean that ranking.py
+ranks class positions on, so a printed average always agrees with the
+position next to it.
+
+A Result or StudentSubject write refreshes the student's summary at once and
+marks the section's positions dirty; the ranking pass that follows a burst
+of writes then refreshes the whole section with the new positions. The
+rebuild_term_summaries command rebuilds everything from scratch.
+"""
+import logging
+
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Q, Sum
+from django.utils import timezone
+
+from accounts.models import Result, StudentClassHistory, StudentSubject, StudentTermSummary
+from accounts.utils.result_tracking import invalidate_result_tracking
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = [
+    'section', 'subject_count', 'assigned_count', 'scored_count', 'total_score', 'average_score',
+    'average_grade_point', 'is_complete', 'class_position', 'class_position_gp', 'last_upload', 'updated_at',
+]
+
+
+def _aggregate(result_filters, assignment_filters):
+    """Compute summary values keyed by (student_id, session_id, term)."""
+    positive = Q(total_score__gt=0)
+    assignment = StudentSubject.objects.filter(
+        student_id=OuterRef('student_id'),
+        subject_id=OuterRef('subject_id'),
+        session_id=OuterRef('session_id'),
+        term=OuterRef('term'),
+        subject__is_active=True,
+    )
+    rows = Result.objects.filter(**result_filters).annotate(
+        is_assigned=Exists(assignment)
+    ).values(
+        'student_id', 'session_id', 'term', 'student__current_section_id', 'student__current_section__session_id'
+    ).annotate(
+        subject_count=Count('id'),
+        scored_count=Count('id', filter=positive),
+        scored_assigned=Count('id', filter=positive & Q(is_assigned=True)),
+        score_sum=Sum('total_score', filter=positive),
+        gp_sum=Sum('grade_point', filter=positive),
+        position=Max('class_position', filter=positive),
+        position_gp=Max('class_position_gp', filter=positive),
+        last_upload=Max('upload_date'),
+    ).order_by()
+
+    assigned_counts = {
+        (row['student_id'], row['session_id'], row['term']): row['count']
+        for row in StudentSubject.objects.filter(**assignment_filters, subject__is_active=True).values(
+            'student_id', 'session_id', 'term'
+        ).annotate(count=Count('id')).order_by()
+    }
+
+    values = {}
+    for row in rows:
+        key = (row['student_id'], row['session_id'], row['term'])
+        scored = row['scored_count']
+        assigned = assigned_counts.get(key, 0)
+        if assigned:
+            is_complete = row['scored_assigned'] == assigned
+        else:
+            is_complete = row['subject_count'] > 0 and scored == row['subject_count']
+        current_section_matches = row['student__current_section__session_id'] == row['session_id']
+        values[key] = {
+            'section_id': row['student__current_section_id'] if current_section_matches else None,
+            'subject_count': row['subject_count'],
+            'assigned_count': assigned,
+            'scored_count': scored,
+            'total_score': row['score_sum'] or 0.0,
+            'average_score': (row['score_sum'] or 0.0) / scored if scored else 0.0,
+            'average_grade_point': (row['gp_sum'] or 0.0) / scored if scored else 0.0,
+            'is_complete': is_complete,
+            'class_position': row['position'] or '',
+            'class_position_gp': row['position_gp'] or '',
+            'last_upload': row['last_upload'],
+        }
+    return values
+
+
+def _apply_class_history(values):
+    """Prefer the section recorded in class history over the student's current section."""
+    if not values:
+        return
+    student_ids = {key[0] for key in values}
+    history = StudentClassHistory.objects.filter(
+        student_id__in=student_ids, section__isnull=False
+    ).values_list('student_id', 'session_id', 'term', 'section_id')
+    for student_id, session_id, term, section_id in history:
+        if (student_id, session_id, term) in values:
+            values[(student_id, session_id, term)]['section_id'] = section_id
+
+
+def _store(values, stale_scope=None):
+    """Upsert summaries from `values`; delete summaries in `stale_scope` that no longer have results."""
+    now = timezone.now()
+    existing = {}
+    if values:
+        existing = {
+            (s.student_id, s.session_id, s.term): s
+            for s in StudentTermSummary.objects.filter(
+                student_id__in={key[0] for key in values},
+                session_id__in={key[1] for key in values},
+                term__in={key[2] for key in values},
+            )
+        }
+    to_create, to_update = [], []
+    for key, fields in values.items():
+        summary = existing.get(key)
+        if summary is None:
+            summary = StudentTermSummary(student_id=key[0], session_id=key[1], term=key[2])
+            to_create.append(summary)
+        else:
+            to_update.append(summary)
+        for name, value in fields.items():
+            setattr(summary, name, value)
+        summary.updated_at = now
+
+    with transaction.atomic():
+        if stale_scope is not None:
+            stale = StudentTermSummary.objects.filter(**stale_scope)
+            for key in values:
+                stale = stale.exclude(student_id=key[0], session_id=key[1], term=key[2])
+            stale.delete()
+        if to_create:
+            StudentTermSummary.objects.bulk_create(to_create, batch_size=500)
+        if to_update:
+            StudentTermSummary.objects.bulk_update(to_update, SUMMARY_FIELDS, batch_size=500)
+
+    terms = {key[1:] for key in values}
+    if stale_scope is not None:
+        terms.add((stale_scope['session_id'], stale_scope['term']))
+    for session_id, term in terms:
+        invalidate_result_tracking(session_id, term)
+    return len(to_create) + len(to_update)
+
+
+def refresh_student_term_summary(student_id, session_id, term):
+    """Recompute the summary of one student for one term after a Result or assignment change."""
+    scope = {'student_id': student_id, 'session_id': session_id, 'term': term}
+    values = _aggregate(scope, scope)
+    _apply_class_history(values)
+    _store(values, stale_scope=scope)
+
+
+def _update_section_sizes(**filters):
+    sizes = StudentTermSummary.objects.filter(
+        section__isnull=False, **filters
+    ).values('section_id', 'session_id', 'term').annotate(
+        size=Count('id', filter=Q(scored_count__gt=0))
+    ).order_by()
+    for row in sizes:
+        StudentTermSummary.objects.filter(
+            section_id=row['section_id'], session_id=row['session_id'], term=row['term']
+        ).update(section_size=row['size'])
+
+
+def refresh_section_summaries(section_id, session_id, term):
+    """Recompute the summaries of every student in a section, including class positions."""
+    scope = {'student__current_section_id': section_id, 'session_id': session_id, 'term': term}
+    values = _aggregate(scope, scope)
+    _apply_class_history(values)
+    _store(values, stale_scope=scope)
+    _update_section_sizes(section_id=section_id, session_id=session_id, term=term)
+
+
+def rebuild_all_summaries(session=None):
+    """Drop and rebuild summaries, optionally for a single session. Returns the rows written."""
+    scope = {'session': session} if session else {}
+    written = 0
+    with transaction.atomic():
+        StudentTermSummary.objects.filter(**scope).delete()
+        for term in Result.objects.filter(**scope).values_list('term', flat=True).distinct().order_by():
+            values = _aggregate(dict(scope, term=term), dict(scope, term=term))
+            _apply_class_history(values)
+            written += _store(values)
+        _update_section_sizes(**scope)
+    logger.info(f"Rebuilt {written} student term summaries")
+    return written
@@ -0,0 +1,405 @@
+"""
+Native PDF renderer for large tabular admin reports.
+
+WeasyPrint lays out an HTML table as a whole, which gets slow and memory
+hungry once a report runs to hundreds of pages. This renderer draws the same
+reports with ReportLab platypus instead. Column widths are fixed up front
+from relative weights and every row's height is computed once with plain
+string wrapping, so no cell is measured twice. Rows are consumed from an
+iterable one page at a time: each page becomes its own small Table with the
+header row repeated on top, so layout cost grows linearly with the row count.
+A row too tall for a whole page has its lines continued on the next page.
+
+Which reports use it is chosen per report with NATIVE_PDF_REPORTS, or per
+request with ?renderer=native / ?renderer=weasyprint (see use_native_pdf()).
+"""
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import CondPageBreak, Flowable, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from accounts.constants import TERM_CHOICES
+
+SCHOOL_NAME = "Rehoboth International School of Excellence"
+TABLE_REPORTS = ('payment_report', 'fee_statistics', 'daily_payments', 'broadsheet')
+RENDERERS = ('native', 'weasyprint')
+
+FONT = 'Helvetica'
+BOLD_FONT = 'Helvetica-Bold'
+FONT_SIZE = 8
+LEADING = 10
+PADDING = 3
+HEADER_BACKGROUND = colors.HexColor('#f2f2f2')
+GRID_COLOR = colors.HexColor('#999999')
+PAID_COLOR = colors.HexColor('#2e7d32')
+DUE_COLOR = colors.HexColor('#d32f2f')
+
+
+def use_native_pdf(request, report):
+    """Whether `report` should be drawn with this renderer instead of WeasyPrint for this request."""
+    renderer = request.GET.get('renderer')
+    if renderer in RENDERERS:
+        return renderer == 'native'
+    return report in getattr(settings, 'NATIVE_PDF_REPORTS', ())
+
+
+class TableColumn:
+    """A report column. `width` is relative to the other columns of its table."""
+
+    def __init__(self, header, width=1, align='LEFT', color=None):
+        self.header = header
+        self.width = width
+        self.align = align
+        self.color = color
+
+
+class TableSection:
+    """A titled table of the report. `rows` may be any iterable of cell lists, e.g. a generator."""
+
+    def __init__(self, title, columns, rows, empty_text='No data available', footer=None):
+        self.title = title
+        self.columns = columns
+        self.rows = rows
+        self.empty_text = empty_text
+        self.footer = footer
+
+
+class _TableLayout:
+    """Column widths, wrapping and the shared table style of one section."""
+
+    def __init__(self, columns, width):
+        total = sum(column.width for column in columns)
+        self.columns = columns
+        self.widths = [width * column.width / total for column in columns]
+        self.width = width
+        self.header = self.row([column.header for column in columns], BOLD_FONT)
+        commands = [
+            ('FONTNAME', (0, 0), (-1, -1), FONT),
+            ('FONTNAME', (0, 0), (-1, 0), BOLD_FONT),
+            ('FONTSIZE', (0, 0), (-1, -1), FONT_SIZE),
+            ('LEADING', (0, 0), (-1, -1), LEADING),
+            ('BACKGROUND', (0, 0), (-1, 0), HEADER_BACKGROUND),
+            ('GRID', (0, 0), (-1, -1), 0.5, GRID_COLOR),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('LEFTPADDING', (0, 0), (-1, -1), PADDING),
+            ('RIGHTPADDING', (0, 0), (-1, -1), PADDING),
+            ('TOPPADDING', (0, 0), (-1, -1), PADDING),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), PADDING),
+        ]
+        for i, column in enumerate(columns):
+            commands.append(('ALIGN', (i, 0), (i, -1), column.align))
+            if column.color:
+                commands.append(('TEXTCOLOR', (i, 1), (i, -1), column.color))
+        self.style = TableStyle(commands)
+
+    def row(self, values, font=FONT):
+        """Wrap a row's values to the column widths. Returns (cells, height)."""
+        cells = []
+        lines = 1
+        for value, width in zip(values, self.widths):
+            text = '' if value is None else str(value)
+            available = width - 2 * PADDING
+            if stringWidth(text, font, FONT_SIZE) > available:
+                wrapped = simpleSplit(text, font, FONT_SIZE, available)
+                lines = max(lines, len(wrapped))
+                text = '\n'.join(wrapped)
+            cells.append(text)
+        return cells, lines * LEADING + 2 * PADDING
+
+    def split_row(self, row, height):
+        """
+        Split a wrapped row taller than a page into a first part at most
+        `height` tall and the rest. Returns None when not even one line fits.
+        """
+        lines = int((height - 2 * PADDING) // LEADING)
+        if lines < 1:
+            return None
+        cell_lines = [cell.split('\n') for cell in row[0]]
+        rest = max(len(text) for text in cell_lines) - lines
+        return (
+            (['\n'.join(text[:lines]) for text in cell_lines], lines * LEADING + 2 * PADDING),
+            (['\n'.join(text[lines:]) for text in cell_lines], rest * LEADING + 2 * PADDING),
+        )
+
+    def table(self, rows, footer=False):
+        data = [self.header[0]] + [cells for cells, _ in rows]
+        heights = [self.header[1]] + [height for _, height in rows]
+        table = Table(data, colWidths=self.widths, rowHeights=heights)
+        table.setStyle(self.style)
+        if footer:
+            table.setStyle(TableStyle([
+                ('FONTNAME', (0, -1), (-1, -1), BOLD_FONT),
+                ('BACKGROUND', (0, -1), (-1, -1), HEADER_BACKGROUND),
+            ]))
+        return table
+
+
+class _StreamingTable(Flowable):
+    """
+    A table of unknown length that lays out one page at a time. Rows are pulled
+    from the iterator only as far as the current page needs; when they do not
+    all fit, split() returns a Table for this page and a _StreamingTable for
+    the rest.
+    """
+
+    def __init__(self, layout, rows, footer=None, buffered=None):
+        super().__init__()
+        self.layout = layout
+        self.rows = rows
+        self.footer = footer
+        self.buffered = buffered or []
+        self.exhausted = False
+        self._table = None
+
+    def _fill(self, available_height):
+        """Buffer rows until they overflow `available_height` or run out."""
+        height = self.layout.header[1] + sum(row_height for _, row_height in self.buffered)
+        while height <= available_height and not self.exhausted:
+            try:
+                values = next(self.rows)
+            except StopIteration:
+                self.exhausted = True
+                if self.footer is not None:
+                    self.buffered.append(self.layout.row(self.footer, BOLD_FONT))
+                    height += self.buffered[-1][1]
+                break
+            self.buffered.append(self.layout.row(values))
+            height += self.buffered[-1][1]
+        return height
+
+    def _fitting(self, available_height):
+        height = self.layout.header[1]
+        for count, (_, row_height) in enumerate(self.buffered):
+            height += row_height
+            if height > available_height:
+                return count
+        return len(self.buffered)
+
+    def wrap(self, available_width, available_height):
+        height = self._fill(available_height)
+        if self.exhausted and height <= available_height:
+            self._table = self.layout.table(self.buffered, footer=self.footer is not None)
+            return self._table.wrap(available_width, available_height)
+        self._table = None
+        return self.layout.width, height
+
+    def split(self, available_width, available_height):
+        self._fill(available_height)
+        count = self._fitting(available_height)
+        if count == 0:
+            frame = getattr(self, '_frame', None)
+            if not self.buffered or (frame is not None and not frame._atTop):
+                # Try the row on a fresh page first.
+                return []
+            # Taller than a whole page: carry the rest of its lines over to the next one.
+            parts = self.layout.split_row(self.buffered[0], available_height - self.layout.header[1])
+            if parts is None:
+                return []
+            self.buffered[:1] = parts
+            count = 1
+        rest = _StreamingTable(self.layout, self.rows, self.footer, self.buffered[count:])
+        rest.exhausted = self.exhausted
+        ends_with_footer = self.exhausted and self.footer is not None and count == len(self.buffered)
+        return [self.layout.table(self.buffered[:count], footer=ends_with_footer), rest]
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self._table.drawOn(canvas, x, y, _sW)
+
+
+def render_table_report(title, sections, subtitles=(), wide=False):
+    """Render titled tables to PDF bytes. `wide` uses landscape A4 for tables with many columns."""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=landscape(A4) if wide else A4,
+        leftMargin=12 * mm, rightMargin=12 * mm, topMargin=12 * mm, bottomMargin=15 * mm,
+        title=title,
+    )
+    styles = getSampleStyleSheet()
+    story = [Paragraph(title, styles['Title'])]
+    story += [Paragraph(subtitle, styles['Normal']) for subtitle in subtitles]
+    story.append(Spacer(1, 4 * mm))
+    for section in sections:
+        if section.title:
+            # Keep a heading with the start of its table; keepWithNext would hold the whole table.
+            story.append(CondPageBreak(30 * mm))
+            story.append(Paragraph(section.title, styles['Heading4']))
+        layout = _TableLayout(section.columns, doc.width)
+        rows = iter(section.rows)
+        try:
+            first = next(rows)
+        except StopIteration:
+            story.append(layout.table([layout.row([section.empty_text] + [''] * (len(section.columns) - 1))]))
+        else:
+            story.append(_StreamingTable(layout, _chain(first, rows), section.footer))
+        story.append(Spacer(1, 4 * mm))
+
+    def number_page(canvas, doc):
+        canvas.saveState()
+        canvas.setFont(FONT, 7)
+        canvas.drawString(doc.leftMargin, 8 * mm, f"{title} - {SCHOOL_NAME}")
+        canvas.drawRightString(doc.leftMargin + doc.width, 8 * mm, f"Page {doc.page}")
+        canvas.restoreState()
+
+    doc.build(story, onFirstPage=number_page, onLaterPages=number_page)
+    return buffer.getvalue()
+
+
+def _chain(first, rows):
+    yield first
+    yield from rows
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+PAYMENT_COLUMNS = [
+    TableColumn('Students', 5),
+    TableColumn('Phone', 2),
+    TableColumn('Total Fees (XOF)', 2, 'RIGHT'),
+    TableColumn('Amount Paid (XOF)', 2, 'RIGHT'),
+    TableColumn('Amount Due (XOF)', 2, 'RIGHT'),
+    TableColumn('Paid (%)', 1, 'RIGHT'),
+]
+
+
+def _payment_rows(items):
+    for item in items:
+        yield [
+            item['students'], item['parent_phone'], _money(item['total_fees']), _money(item['amount_paid']),
+            _money(item['amount_due']), f"{item['percentage_paid']:.2f}%",
+        ]
+
+
+def payment_report_pdf(context):
+    """The admin payment report, from the context of admin_payment_report_pdf."""
+    if context['sort_type'] == 'all':
+        sections = [
+            TableSection(f"Full Paid ({context['full_paid_count']})", PAYMENT_COLUMNS,
+                         _payment_rows(context['full_paid']), 'No full paid families'),
+            TableSection(f"Partial Paid ({context['partial_paid_count']})", PAYMENT_COLUMNS,
+                         _payment_rows(context['partial_paid']), 'No partial paid families'),
+            TableSection(f"Not Paid ({context['not_paid_count']})", PAYMENT_COLUMNS,
+                         _payment_rows(context['not_paid']), 'No unpaid families'),
+        ]
+    else:
+        sections = [TableSection(None, PAYMENT_COLUMNS, _payment_rows(context['report_data']))]
+    return render_table_report(
+        f"Payment Report - {context['current_session'].name} Term {context['current_term']}",
+        sections,
+        subtitles=[f"Generated on {context['date_generated']:%d %b %Y}"],
+    )
+
+
+def fee_statistics_pdf(context):
+    """The fee statistics report, from the context of admin_fee_statistics_pdf."""
+    columns = [
+        TableColumn('Section', 3),
+        TableColumn('Students', 1, 'RIGHT'),
+        TableColumn('Expected (XOF)', 2, 'RIGHT'),
+        TableColumn('Paid (XOF)', 2, 'RIGHT', PAID_COLOR),
+        TableColumn('Outstanding (XOF)', 2, 'RIGHT', DUE_COLOR),
+        TableColumn('Paid (%)', 1, 'RIGHT'),
+    ]
+
+    def rows(items):
+        return (
+            [item['section'], item['student_count'], _money(item['expected']), _money(item['paid']),
+             _money(item['outstanding']), f"{item['percentage_paid']:.2f}%"]
+            for item in items
+        )
+
+    footer = [
+        'Total', sum(item['student_count'] for item in context['stats_data']), _money(context['total_expected']),
+        _money(context['total_paid']), _money(context['total_outstanding']), f"{context['total_percentage_paid']:.2f}%",
+    ]
+    class_columns = [TableColumn('Class', 3)] + columns[1:]
+    return render_table_report(
+        f"Fee Statistics - {context['current_session'].name} Term {context['current_term']}",
+        [
+            TableSection(None, columns, rows(context['stats_data']), footer=footer),
+            TableSection('By Class', class_columns, rows(context.get('class_data', []))),
+        ],
+        subtitles=[SCHOOL_NAME, f"Generated on {context['date_generated']:%d %b %Y}"],
+    )
+
+
+def daily_payment_report_pdf(context):
+    """The daily payment report, from the context of admin_daily_payment_report_pdf."""
+    columns = [
+        TableColumn('Date', 2),
+        TableColumn('Time', 1),
+        TableColumn('Students', 5),
+        TableColumn('Amount Paid (XOF)', 2, 'RIGHT', PAID_COLOR),
+        TableColumn('Amount Due (XOF)', 2, 'RIGHT', DUE_COLOR),
+        TableColumn('Cashier', 2),
+        TableColumn('Transaction ID', 2),
+    ]
+    rows = (
+        [item['date'], item['time'], item['students'], _money(item['amount_paid']), _money(item['amount_due']),
+         item['cashier'], f"{str(item['transaction_id'])[:8]}..."]
+        for item in context['report_data']
+    )
+    total_columns = [
+        TableColumn('Payments', 1, 'RIGHT'),
+        TableColumn('Amount Paid (XOF)', 2, 'RIGHT', PAID_COLOR),
+    ]
+    day_rows = ([row['day'], row['count'], _money(row['total'])] for row in context['day_totals'])
+    cashier_rows = ([row['cashier'], row['count'], _money(row['total'])] for row in context['cashier_totals'])
+    return render_table_report(
+        f"Daily Payment Report - {context['date_label']}",
+        [
+            TableSection(None, columns, rows, 'No payments recorded for these dates',
+                         footer=['', '', 'Total:', _money(context['total_paid']), '', '', '']),
+            TableSection('By Day', [TableColumn('Date', 2)] + total_columns, day_rows, 'No payments'),
+            TableSection('By Cashier', [TableColumn('Cashier', 2)] + total_columns, cashier_rows, 'No payments'),
+        ],
+        subtitles=[
+            SCHOOL_NAME,
+            f"{context['current_session'].name} Term {context['current_term']}",
+            f"Total paid: {_money(context['total_paid'])} XOF",
+        ],
+    )
+
+
+def broadsheet_pdf(section, session, term, broadsheet):
+    """A class broadsheet, from build_class_broadsheet()."""
+    subjects = broadsheet['subjects']
+    columns = (
+        [TableColumn('Pos.', 1), TableColumn('Student', 4)]
+        + [TableColumn(subject.name, 1.5, 'CENTER') for subject in subjects]
+        + [TableColumn('Total', 1.5, 'RIGHT'), TableColumn('Average', 1.5, 'RIGHT')]
+    )
+
+    def score(cell):
+        if not cell['is_assigned']:
+            return '-'
+        return f"{cell['result_obj'].total_score:g}" if cell['is_complete'] else ''
+
+    rows = (
+        [row['class_position'] or '', row['student'].full_name]
+        + [score(row['results'][subject.id]) for subject in subjects]
+        + [f"{row['total_score']:g}", f"{row['average_score']:.2f}" if row['has_complete_results'] else '']
+        for row in broadsheet['rows']
+    )
+    footer = (
+        ['', 'Class average']
+        + [f"{broadsheet['class_averages'][subject.id]['average']:.1f}" for subject in subjects]
+        + ['', f"{broadsheet['class_average_score']:.2f}"]
+    )
+    return render_table_report(
+        f"Broadsheet - {section.school_class.level}{section.suffix}, {session.name} {dict(TERM_CHOICES).get(term, term)}",
+        [TableSection(None, columns, rows, 'No students in this section', footer=footer)],
+        subtitles=[
+            SCHOOL_NAME,
+            f"{broadsheet['students_with_complete_results']} of {broadsheet['total_students']} students with complete results",
+        ],
+        wide=True,
+    )
@@ -0,0 +1,200 @@
+"""
+A small database-backed task queue.
+
+Functions registered with @task are queued as BackgroundTask rows with
+enqueue() and run by the process_tasks worker. A worker claims the oldest due
+task with SELECT ... FOR UPDATE SKIP LOCKED where the database supports it
+(PostgreSQL); elsewhere (SQLite) it relies on a conditional UPDATE from
+Pending to Running, so two workers never run the same task. Failed tasks are
+retried with exponential backoff until max_attempts, and whatever the task
+function returns is stored as the task's JSON result.
+
+With BACKGROUND_TASKS = 'immediate', the default for deployments without a
+worker, tasks run in the enqueuing process once its transaction commits.
+
+Files written by tasks go to TASK_FILE_STORAGE, which must be shared with
+the web service when a separate worker runs them, and are deleted
+TASK_FILE_RETENTION seconds after their task finishes.
+"""
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from accounts.models import BackgroundTask
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+RETRY_DELAY_SECONDS = 30
+
+
+def task(name):
+    """Register a function as a background task. It is called as fn(task, **payload)."""
+    def register(func):
+        TASKS[name] = func
+        func.task_name = name
+        return func
+    return register
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def task_file_storage():
+    return import_string(settings.TASK_FILE_STORAGE)()
+
+
+def enqueue(name, payload=None, user=None, max_attempts=3, run_after=None):
+    """Queue a registered task and return its BackgroundTask."""
+    if name not in TASKS:
+        raise ValueError(f"Unknown background task {name!r}")
+    background_task = BackgroundTask.objects.create(
+        name=name,
+        payload=payload or {},
+        created_by=user,
+        max_attempts=max_attempts,
+        run_after=run_after or timezone.now(),
+    )
+    if getattr(settings, 'BACKGROUND_TASKS', 'immediate') == 'immediate':
+        def run():
+            run_next_task(worker_id(), pk=background_task.pk)
+            delete_expired_task_files()
+        transaction.on_commit(run)
+    return background_task
+
+
+def claim_next_task(worker, pk=None):
+    """Mark the oldest due Pending task as Running for `worker` and return it, or None."""
+    now = timezone.now()
+    due = BackgroundTask.objects.filter(status='Pending', run_after__lte=now).order_by('run_after', 'pk')
+    if pk is not None:
+        due = due.filter(pk=pk)
+
+    def claim(candidate):
+        return BackgroundTask.objects.filter(pk=candidate.pk, status='Pending').update(
+            status='Running',
+            locked_by=worker,
+            started_at=now,
+            attempts=F('attempts') + 1,
+        )
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            candidate = due.select_for_update(skip_locked=True).first()
+            claimed = candidate is not None and claim(candidate)
+    else:
+        # No row locks: read outside a transaction, so SQLite never has to upgrade a
+        # read lock, and let the conditional UPDATE decide which worker wins.
+        candidate = due.first()
+        claimed = candidate is not None and claim(candidate)
+    if not claimed:
+        return None
+    return BackgroundTask.objects.get(pk=candidate.pk)
+
+
+def report_progress(background_task, done, total):
+    """Store the completed percentage of a running task, writing only when it changes."""
+    percent = min(100, int(done * 100 / total)) if total else 100
+    if percent != background_task.progress:
+        background_task.progress = percent
+        BackgroundTask.objects.filter(pk=background_task.pk).update(progress=percent)
+
+
+def _failure(background_task, error, retry=True):
+    """Fields recording a failed attempt: back to Pending with exponential backoff, or Failed when out of attempts."""
+    if retry and background_task.attempts < background_task.max_attempts:
+        delay = RETRY_DELAY_SECONDS * 2 ** (background_task.attempts - 1)
+        return {'status': 'Pending', 'error': error, 'run_after': timezone.now() + timedelta(seconds=delay)}
+    return {'status': 'Failed', 'error': error, 'finished_at': timezone.now()}
+
+
+def run_task(background_task):
+    """Run a claimed task and record its result or failure. Returns True on success."""
+    func = TASKS.get(background_task.name)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown background task {background_task.name!r}")
+        result = func(background_task, **background_task.payload)
+    except Exception:
+        for field, value in _failure(background_task, traceback.format_exc(), retry=func is not None).items():
+            setattr(background_task, field, value)
+        background_task.save(update_fields=['status', 'error', 'run_after', 'finished_at'])
+        logger.exception(f"Background task {background_task} failed on attempt {background_task.attempts}")
+        return False
+
+    background_task.status = 'Completed'
+    background_task.progress = 100
+    background_task.result = result
+    background_task.finished_at = timezone.now()
+    with transaction.atomic():
+        # A savepoint, so a result that cannot be stored leaves the connection usable for recording that.
+        background_task.save(update_fields=['status', 'progress', 'result', 'finished_at'])
+    logger.info(f"Background task {background_task} completed")
+    return True
+
+
+def run_next_task(worker, pk=None):
+    """Claim and run one due task. Returns False when there was nothing to run."""
+    background_task = claim_next_task(worker, pk=pk)
+    if background_task is None:
+        return False
+    try:
+        run_task(background_task)
+    except Exception:
+        # Storing the outcome failed, e.g. on a result that is not JSON; don't leave the task Running.
+        logger.exception(f"Could not record the outcome of background task {background_task}")
+        BackgroundTask.objects.filter(pk=background_task.pk, status='Running').update(
+            **_failure(background_task, traceback.format_exc())
+        )
+    return True
+
+
+def requeue_stale_tasks(timeout_seconds):
+    """
+    Return tasks left Running longer than `timeout_seconds`, e.g. by a worker
+    that died, to the queue, or fail them if they are out of attempts.
+    Returns the number requeued.
+    """
+    now = timezone.now()
+    stale = BackgroundTask.objects.filter(status='Running', started_at__lt=now - timedelta(seconds=timeout_seconds))
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status='Failed', error='Worker stopped before the task finished.', finished_at=now
+    )
+    return stale.update(status='Pending', locked_by='', run_after=now)
+
+
+def delete_expired_task_files(max_age_seconds=None):
+    """
+    Delete the files of tasks that finished more than `max_age_seconds`
+    (default TASK_FILE_RETENTION) ago. Their results keep every other field and
+    are marked 'expired'. Returns the number of files deleted.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = getattr(settings, 'TASK_FILE_RETENTION', 7 * 24 * 60 * 60)
+    expired = BackgroundTask.objects.filter(
+        status='Completed',
+        finished_at__lt=timezone.now() - timedelta(seconds=max_age_seconds),
+        result__has_key='file',
+    )
+    storage = task_file_storage()
+    deleted = 0
+    for background_task in expired.iterator():
+        result = dict(background_task.result)
+        try:
+            storage.delete(result.pop('file'))
+        except Exception:
+            logger.exception(f"Could not delete the file of background task {background_task}")
+            continue
+        result['expired'] = True
+        BackgroundTask.objects.filter(pk=background_task.pk).update(result=result)
+        deleted += 1
+    return deleted
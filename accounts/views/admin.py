@@ -3,10 +3,9 @@ import re
 from datetime import date, datetime
 from urllib.parse import urlencode
 from decimal import Decimal
-from weasyprint import HTML
-from collections import defaultdict
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
@@ -24,10 +23,26 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.core.cache import cache
 
 from accounts.decorators import group_required
-from accounts.models import FeeStructure, PTADues, Refund, ResultAccessRequest, Student, StudentFeeOverride, Teacher, Result, Payment, SchoolClass, Subject, Notification, Session, ClassSection, TERM_CHOICES, StudentSubject, Parent
+from accounts.models import Refund, ResultAccessRequest, Student, StudentFeeOverride, Teacher, Result, Payment, SchoolClass, Subject, Notification, Session, ClassSection, TERM_CHOICES, StudentSubject, Parent
+from accounts.tasks import bulk_receipts_task, promote_students_task, report_cards_task, report_pdf_task
+from accounts.utils import table_pdf
+from accounts.utils.pdf_renderer import render_pdf
+
+from accounts.utils.broadsheet import broadsheet_workbook_sheets, build_class_broadsheet
+from accounts.utils.daily_payments import daily_payment_totals, get_daily_payments, iter_daily_payment_rows
+from accounts.utils.exports import EXPORT_FORMATS, export_filename, export_response, xlsx_response
+from accounts.utils.fee_statistics import fee_statistics
+from accounts.utils.fees import FeeResolver
+from accounts.utils.payment_report import get_optimized_payment_data, invalidate_payment_report_cache, iter_payment_report_rows
+from accounts.utils.positions import positions_are_stale
+from accounts.utils.promotions import PROMOTION_ACTIONS
+from accounts.utils.receipts import bulk_receipt_payments, invalidate_receipt
+from accounts.utils.report_cards import REPORT_CARD_FORMATS, report_card_students
+from accounts.utils.result_import import ImportFormatError, import_results, iter_result_rows
+from accounts.utils.result_tracking import section_result_stats
+from accounts.utils.tasks import enqueue
 
 from .base import get_user_context, get_current_session_term, logger
-from .teacher import update_class_positions, update_subject_positions
 
 @login_required
 @group_required('Secretary', 'Director')
@@ -596,124 +611,33 @@ def promote_students(request):
         )
 
     if request.method == 'POST':
-        try:
-            with transaction.atomic():
-                action = request.POST.get('action')  
-                if action == 'promote_all':
-                    selected_student_ids = Student.objects.filter(
-                        is_active=True,
-                        current_class__isnull=False
-                    ).exclude(current_class__level='SS 3').values_list('admission_number', flat=True)
-                    action = 'promote'  
-                else:
-                    selected_student_ids = request.POST.getlist('students')
-
-                students_to_process = Student.objects.filter(admission_number__in=selected_student_ids)
-
-                for student in students_to_process:
-                    current_class = student.current_class
-                    if not current_class:
-                        logger.warning(f"Student {student.full_name} has no current class, skipping.")
-                        messages.warning(request, f"Student {student.full_name} has no current class and was skipped.")
-                        continue
-
-                    
-                    if action == 'promote':
-                        next_class = SchoolClass.objects.filter(
-                            level_order__gt=current_class.level_order
-                        ).order_by('level_order').first()
-                    elif action == 'demote':
-                        next_class = SchoolClass.objects.filter(
-                            level_order__lt=current_class.level_order
-                        ).order_by('-level_order').first()
-                    else:
-                        messages.error(request, 'Invalid action specified.')
-                        return redirect('promote_students')
-
-                    if not next_class:
-                        logger.warning(f"No {'next' if action == 'promote' else 'previous'} class for {student.full_name} in {current_class.level}")
-                        messages.warning(request, f"No {'next' if action == 'promote' else 'previous'} class available for {student.full_name} in {current_class.level}")
-                        continue
-
-                    
-                    new_section = None
-                    if student.current_section and student.current_section.suffix != 'N/A':
-                        new_section = ClassSection.objects.filter(
-                            school_class=next_class,
-                            suffix=student.current_section.suffix,
-                            session=next_session
-                        ).first()
-                        if not new_section:
-                            logger.warning(
-                                f'No matching section for {next_class.level} {student.current_section.suffix} '
-                                f'in session {next_session.name} for student {student.full_name}'
-                            )
-                            messages.warning(request, f"No section {student.current_section.suffix} found for {next_class.level} in {next_session.name} for {student.full_name}")
-
-                    
-                    student.current_class = next_class
-                    student.current_section = new_section
-                    student.save()
-
-                    
-                    history, created = StudentClassHistory.objects.get_or_create(
-                        student=student,
-                        session=next_session,
-                        term='1',  
-                        defaults={
-                            'class_level': next_class,
-                            'section': new_section
-                        }
-                    )
-                    if not created:
-                        history.class_level = next_class
-                        history.section = new_section
-                        history.save()
-
-                    Notification.objects.create(
-                        user=student.user,
-                        message=f"You have been {action}d to {next_class.level} "
-                                f"{' ' + new_section.suffix if new_section else ''} for {next_session.name}."
-                    )
-                    logger.info(
-                        f"Student {student.full_name} {action}d to {next_class.level} "
-                        f"{' ' + new_section.suffix if new_section else ''} by {request.user.username}"
-                    )
-
-                
-                ss3_students = Student.objects.filter(
-                    current_class__level='SS 3', is_active=True
-                )
-                for student in ss3_students:
-                    student.is_active = False
-                    student.save()
-                    history, created = StudentClassHistory.objects.get_or_create(
-                        student=student,
-                        session=next_session,
-                        term='1',
-                        defaults={
-                            'class_level': student.current_class,
-                            'section': student.current_section
-                        }
-                    )
-                    if not created:
-                        history.class_level = student.current_class
-                        history.section = student.current_section
-                        history.save()
-                    Notification.objects.create(
-                        user=student.user,
-                        message=f"You have graduated from {student.current_class.level} in {current_session.name}."
-                    )
-                    logger.info(f"Student {student.full_name} marked as graduated by {request.user.username}")
-
-                messages.success(request, f'Student {action} completed successfully.')
-                return redirect('admin_student_management')
-
-        except Exception as e:
-            messages.error(request, f'Error during {action}: {str(e)}')
-            logger.error(f"Error during {action}: {str(e)}")
+        action = request.POST.get('action')
+        student_ids = None
+        if action == 'promote_all':
+            action = 'promote'
+        else:
+            student_ids = request.POST.getlist('students')
+        if action not in PROMOTION_ACTIONS:
+            messages.error(request, 'Invalid action specified.')
             return redirect('promote_students')
 
+        # Not retried: a promotion that is run twice moves its students two classes.
+        task = enqueue(promote_students_task.task_name, {
+            'action': action,
+            'student_ids': student_ids,
+            'current_session_id': current_session.id,
+            'next_session_id': next_session.id,
+            'username': request.user.username,
+        }, user=request.user, max_attempts=1)
+        logger.info(f"Queued student {action} as task {task.id} for {request.user.username}")
+        context.update({
+            'task': task,
+            'title': f"Student {action.capitalize()}",
+            'subtitle': f"{current_session.name} to {next_session.name}",
+            'back_url': reverse('admin_student_management'),
+        })
+        return render(request, 'account/task_progress.html', context)
+
     
     classes = SchoolClass.objects.all().order_by('level_order')
     class_data = []
@@ -1251,93 +1175,10 @@ def admin_result_tracking(request):
         **({'suffix': section_filter} if section_filter else {})
     ).select_related('school_class').order_by('school_class__level_order', 'suffix')
 
-    result_stats = []
-    for section in sections:
-        students = Student.objects.filter(
-            current_section=section,
-            is_active=True
-        )
-        student_count = students.count()
-
-        
-        student_subjects = StudentSubject.objects.filter(
-            student__in=students,
-            session=selected_session,
-            term=term,
-            subject__is_active=True
-        ).select_related('subject')
-        subject_ids = student_subjects.values_list('subject__id', flat=True).distinct()
-
-        
-        if not subject_ids:
-            result_subjects = Result.objects.filter(
-                student__in=students,
-                session=selected_session,
-                term=term,
-                subject__is_active=True
-            ).values_list('subject__id', flat=True).distinct()
-            subject_ids = list(result_subjects)
-            logger.warning(
-                f"No StudentSubject records for section {section} in {selected_session.name}, term {term}. "
-                f"Fallback to Result subjects: {subject_ids}"
-            )
-
-        
-        results = Result.objects.filter(
-            student__in=students,
-            session=selected_session,
-            term=term,
-            subject__id__in=subject_ids
-        ).select_related('student', 'subject', 'uploaded_by')
-
-        
-        complete_students = 0
-        student_subject_counts = {
-            ss['student__admission_number']: ss['count']
-            for ss in student_subjects.values('student__admission_number').annotate(count=Count('subject'))
-        }
-        student_result_counts = {
-            r['student__admission_number']: r['count']
-            for r in results.filter(total_score__gt=0).values('student__admission_number').annotate(count=Count('subject'))
-        }
-
-        for student in students:
-            expected_results = student_subject_counts.get(student.admission_number, 0)
-            actual_results = student_result_counts.get(student.admission_number, 0)
-            
-            if expected_results == 0:
-                student_results = results.filter(student=student)
-                expected_results = student_results.values('subject__id').distinct().count()
-            if expected_results > 0 and actual_results == expected_results:
-                complete_students += 1
-
-        upload_percentage = (complete_students / student_count * 100) if student_count > 0 else 0
-
-        teachers = section.teachers.filter(is_active=True)
-
-        
-        student_averages = []
-        for student in students:
-            student_results = results.filter(student=student, total_score__gt=0)
-            if student_results.exists():
-                avg_score = student_results.aggregate(Avg('total_score'))['total_score__avg']
-                student_averages.append({
-                    'student': student,
-                    'avg_score': avg_score
-                })
-
-        top_students = sorted(student_averages, key=lambda x: x['avg_score'], reverse=True)[:3]
-
-        result_stats.append({
-            'section': section,
-            'student_count': student_count,
-            'complete_students': complete_students,
-            'upload_percentage': round(upload_percentage, 2),
-            'teachers': teachers,
-            'top_students': top_students
-        })
-
-    paginator = Paginator(result_stats, 10)
+    sections = sections.prefetch_related(
+        Prefetch('teachers', queryset=Teacher.objects.filter(is_active=True))
+    )
+    paginator = Paginator(sections, 10)
     page_number = request.GET.get('page', 1)
     try:
         page_obj = paginator.page(page_number)
@@ -1345,6 +1186,8 @@ def admin_result_tracking(request):
         page_obj = paginator.page(1)
         page_number = 1
 
+    result_stats = section_result_stats(list(page_obj.object_list), selected_session, term)
+
     query_params = {
         'session': session_id,
         'term': term,
@@ -1368,7 +1211,7 @@ def admin_result_tracking(request):
         ).values_list('suffix', flat=True).distinct().order_by('suffix'),
         'class_filter': class_filter,
         'section_filter': section_filter,
-        'result_stats': page_obj.object_list,
+        'result_stats': result_stats,
         'page_obj': page_obj,
         'query_string': query_string
     })
@@ -1376,6 +1219,73 @@ def admin_result_tracking(request):
     logger.debug(f"Rendering admin_result_tracking for {request.user.username}")
     return render(request, 'account/admin/result_tracking.html', context)
 
+IMPORT_ERRORS_SHOWN = 200
+
+@login_required
+@group_required('Principal', 'Director')
+def admin_import_results(request):
+    context = get_user_context(request)
+    if not context:
+        return redirect('login')
+
+    current_session, current_term = get_current_session_term()
+    sessions = Session.objects.all().order_by('-start_year')
+    selected_session = current_session
+    selected_term = current_term
+
+    if request.method == 'POST':
+        selected_session = sessions.filter(id=request.POST.get('session')).first() or current_session
+        selected_term = request.POST.get('term', current_term)
+        if selected_term not in [t[0] for t in TERM_CHOICES]:
+            selected_term = current_term
+        upload = request.FILES.get('file')
+        dry_run = bool(request.POST.get('dry_run'))
+
+        if not upload:
+            messages.error(request, 'Choose a .csv or .xlsx file to import.')
+            return redirect('admin_import_results')
+
+        errors = []
+
+        def on_error(error):
+            if len(errors) < IMPORT_ERRORS_SHOWN:
+                errors.append(error)
+
+        try:
+            counts = import_results(
+                iter_result_rows(upload, upload.name),
+                selected_session,
+                selected_term,
+                dry_run=dry_run,
+                on_error=on_error,
+            )
+        except ImportFormatError as e:
+            messages.error(request, str(e))
+            return redirect('admin_import_results')
+
+        if dry_run:
+            messages.info(request, f"Dry run complete: {counts['rows']} row(s) checked, nothing was saved.")
+        else:
+            messages.success(
+                request,
+                f"Imported {counts['rows']} row(s): {counts['created']} created, {counts['updated']} updated."
+            )
+        if counts['errors']:
+            messages.warning(request, f"{counts['errors']} row(s) or cell(s) were rejected.")
+        context.update({
+            'import_counts': counts,
+            'import_errors': errors,
+            'errors_truncated': counts['errors'] > len(errors),
+        })
+
+    context.update({
+        'sessions': sessions,
+        'terms': TERM_CHOICES,
+        'selected_session': selected_session,
+        'selected_term': selected_term,
+    })
+    return render(request, 'account/admin/import_results.html', context)
+
 @login_required
 @group_required('Principal', 'Director')
 def view_class_results(request, section_id, session_id, term):
@@ -1397,123 +1307,10 @@ def view_class_results(request, section_id, session_id, term):
         messages.error(request, "Invalid term selected")
         return redirect('admin_result_tracking')
 
-    
-    update_class_positions(section, session, term)
-    first_student = Student.objects.filter(current_section=section).first()
-    if first_student:
-        update_subject_positions(first_student, session, term)
-
-    students = Student.objects.filter(
-        current_section=section,
-        is_active=True
-    ).order_by('surname', 'first_name', 'middle_name')
-
-    all_subjects = Subject.objects.filter(
-        school_class=section.school_class,
-        is_active=True
-    ).order_by('id')
-
-    detailed_student_results = []
-    for student in students:
-        student_subjects = StudentSubject.objects.filter(
-            student=student,
-            session=session,
-            term=term,
-            subject__is_active=True
-        ).select_related('subject')
-        student_subject_ids = list(student_subjects.values_list('subject__id', flat=True))
-        
-        if not student_subject_ids:
-            result_subjects = Result.objects.filter(
-                student=student,
-                session=session,
-                term=term,
-                subject__is_active=True
-            ).values_list('subject__id', flat=True).distinct()
-            student_subject_ids = list(result_subjects)
-            logger.warning(
-                f"No StudentSubject records for {student.full_name} in {session.name}, term {term}. "
-                f"Fallback to Result subjects: {student_subject_ids}"
-            )
-        
-        student_results = Result.objects.filter(
-            student=student,
-            session=session,
-            term=term,
-            subject__id__in=student_subject_ids
-        ).select_related('subject')
-
-        results_dict = {}
-        total_score = 0
-        subjects_count = len(student_subject_ids)
-        has_complete_results = True
-
-        for subject in all_subjects:
-            result = student_results.filter(subject=subject).first()
-            is_assigned = subject.id in student_subject_ids
-            is_complete = result and result.total_score > 0
-
-            results_dict[subject.id] = {
-                'result_obj': result,
-                'is_complete': is_complete,
-                'is_assigned': is_assigned
-            }
-
-            if is_assigned and is_complete:
-                total_score += result.total_score
-            elif is_assigned and not is_complete:
-                has_complete_results = False
-        
-        average_score = round(total_score / subjects_count, 2) if subjects_count > 0 and has_complete_results else 0
-        class_position = student_results.first().class_position if student_results.exists() and has_complete_results else None
-
-        student_data = {
-            'student': student,
-            'results': results_dict,
-            'total_score': total_score,
-            'subjects_count': subjects_count,
-            'has_complete_results': has_complete_results,
-            'average_score': average_score,
-            'class_position': class_position,
-            'assigned_subject_ids': student_subject_ids,
-            'remarks': student_results.first().remarks if student_results.exists() else ''
-        }
-        detailed_student_results.append(student_data)
 
-    
-    def get_position_rank(position):
-        if not position:
-            return float('inf')  
-        
-        try:
-            return int(position[:-2]) if position[:-2].isdigit() else float('inf')
-        except:
-            return float('inf')
-
-    detailed_student_results.sort(key=lambda x: (-x['average_score'], get_position_rank(x['class_position'])))
-
-    class_averages = {}
-    for subject in all_subjects:
-        subject_results = Result.objects.filter(
-            student__in=students,
-            session=session,
-            term=term,
-            subject=subject,
-            total_score__gt=0
-        )
-        count = subject_results.count()
-        class_averages[subject.id] = {
-            'average': sum(r.total_score for r in subject_results) / count if count > 0 else 0,
-            'count': count
-        }
+    broadsheet = build_class_broadsheet(section, session, term)
 
-    complete_students = [s for s in detailed_student_results if s['has_complete_results']]
-    class_average_score = (
-        sum(s['average_score'] for s in complete_students) / len(complete_students)
-        if complete_students else 0
-    )
-    
-    paginator = Paginator(detailed_student_results, 10)
+    paginator = Paginator(broadsheet['rows'], 10)
     page_number = request.GET.get('page', 1)
     try:
         page_obj = paginator.page(page_number)
@@ -1525,20 +1322,148 @@ def view_class_results(request, section_id, session_id, term):
         'session': session,
         'term': term,
         'term_display': dict(TERM_CHOICES).get(term, term),
-        'subjects': all_subjects,
+        'subjects': broadsheet['subjects'],
         'student_results': page_obj,
         'page_obj': page_obj,
-        'class_averages': class_averages,
+        'class_averages': broadsheet['class_averages'],
         'is_nursery': section.school_class.section == 'Nursery',
         'is_primary': section.school_class.section == 'Primary',
-        'total_students': students.count(),
-        'students_with_complete_results': len(complete_students),
-        'class_average_score': class_average_score,
+        'total_students': broadsheet['total_students'],
+        'students_with_complete_results': broadsheet['students_with_complete_results'],
+        'class_average_score': broadsheet['class_average_score'],
+        'positions_pending': positions_are_stale(section, session, term),
     })
 
     logger.debug(f"Rendering view_class_results for section {section}, session {session.name}, term {term}")
     return render(request, 'account/admin/view_class_results.html', context)
 
+@login_required
+@group_required('Principal', 'Director')
+def admin_class_broadsheet_pdf(request, section_id, session_id, term):
+    section = ClassSection.objects.filter(id=section_id, is_active=True).select_related('school_class').first()
+    session = Session.objects.filter(id=session_id).first()
+    if not section or not session or term not in [t[0] for t in TERM_CHOICES]:
+        messages.error(request, "Invalid class section, session or term")
+        return redirect('admin_result_tracking')
+
+    broadsheet = build_class_broadsheet(section, session, term)
+    if table_pdf.use_native_pdf(request, 'broadsheet'):
+        result = table_pdf.broadsheet_pdf(section, session, term, broadsheet)
+    else:
+        html_string = render_to_string('account/admin/class_broadsheet_pdf.html', {
+            'section': section,
+            'session': session,
+            'term_display': dict(TERM_CHOICES).get(term, term),
+            'subjects': broadsheet['subjects'],
+            'rows': broadsheet['rows'],
+            'class_averages': broadsheet['class_averages'],
+            'total_students': broadsheet['total_students'],
+            'students_with_complete_results': broadsheet['students_with_complete_results'],
+            'class_average_score': broadsheet['class_average_score'],
+            'date_generated': date.today(),
+        })
+        result = render_pdf(html_string)
+
+    filename = f"broadsheet_{section.school_class.level}{section.suffix}_{session.name}_Term{term}".replace('/', '-').replace(' ', '_')
+    response = HttpResponse(result, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{filename}.pdf"'
+    return response
+
+def query_id(request, name):
+    """The query parameter `name` as an id, or None when it is missing or not a number."""
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
+
+@login_required
+@group_required('Principal', 'Director')
+def admin_broadsheet_export(request, session_id, term):
+    """
+    Broadsheets as one XLSX workbook: a section (?section=<id>), every section
+    of a class level (?class_level=<id>) or, with neither, the whole school.
+    """
+    session = Session.objects.filter(id=session_id).first()
+    if not session or term not in [t[0] for t in TERM_CHOICES]:
+        messages.error(request, "Invalid session or term")
+        return redirect('admin_result_tracking')
+
+    sections = ClassSection.objects.filter(session=session, is_active=True).select_related('school_class')
+    if request.GET.get('section'):
+        section_id = query_id(request, 'section')
+        if section_id is None:
+            messages.error(request, "Invalid class section")
+            return redirect('admin_result_tracking')
+        sections = sections.filter(id=section_id)
+        label = None
+    elif request.GET.get('class_level'):
+        school_class = SchoolClass.objects.filter(id=query_id(request, 'class_level')).first()
+        if not school_class:
+            messages.error(request, "Invalid class level")
+            return redirect('admin_result_tracking')
+        sections = sections.filter(school_class=school_class)
+        label = school_class.level
+    else:
+        label = 'School'
+    sections = list(sections.order_by('school_class__level_order', 'suffix'))
+    if not sections:
+        messages.error(request, "No class sections to export")
+        return redirect('admin_result_tracking')
+    if label is None:
+        label = f"{sections[0].school_class.level}{sections[0].suffix}"
+
+    logger.info(f"Exporting {len(sections)} broadsheet(s) for {label}, {session.name} term {term}")
+    filename = export_filename('Broadsheet', label, session.name, f"Term{term}")
+    return xlsx_response(filename, broadsheet_workbook_sheets(sections, session, term))
+
+@login_required
+@group_required('Principal', 'Director')
+def admin_report_cards(request, session_id, term):
+    context = get_user_context(request)
+    if not context:
+        return redirect('login')
+
+    session = Session.objects.filter(id=session_id).first()
+    if not session or term not in [t[0] for t in TERM_CHOICES]:
+        messages.error(request, "Invalid session or term")
+        return redirect('admin_result_tracking')
+
+    output_format = request.GET.get('format', 'pdf')
+    if output_format not in REPORT_CARD_FORMATS:
+        output_format = 'pdf'
+
+    payload = {'session_id': session.id, 'term': term, 'output_format': output_format}
+    if request.GET.get('section'):
+        section = ClassSection.objects.filter(id=query_id(request, 'section')).select_related('school_class').first()
+        if not section:
+            messages.error(request, "Invalid class section")
+            return redirect('admin_result_tracking')
+        students = report_card_students(session, term, section=section)
+        label = f"{section.school_class.level}{section.suffix}"
+        payload['section_id'] = section.id
+    else:
+        school_class = SchoolClass.objects.filter(id=query_id(request, 'class_level')).first()
+        if not school_class:
+            messages.error(request, "Choose a class section or class level")
+            return redirect('admin_result_tracking')
+        students = report_card_students(session, term, school_class=school_class)
+        label = school_class.level
+        payload['class_level_id'] = school_class.id
+
+    if not students.exists():
+        messages.warning(request, f"No results for {label} in {session.name} term {term}.")
+        return redirect(f"{reverse('admin_result_tracking')}?session={session.id}&term={term}")
+
+    task = enqueue(report_cards_task.task_name, payload, user=request.user)
+    logger.info(f"Queued report cards for {label}, {session.name} term {term} as task {task.id}")
+    context.update({
+        'task': task,
+        'title': f"Report Cards: {label}",
+        'subtitle': f"Session: {session.name} | Term: {dict(TERM_CHOICES).get(term, term)} | {output_format.upper()}",
+        'back_url': f"{reverse('admin_result_tracking')}?session={session.id}&term={term}",
+    })
+    return render(request, 'account/task_progress.html', context)
+
 @login_required
 @group_required('Director')
 def admin_manage_subjects(request):
@@ -1802,6 +1727,18 @@ def admin_statistics(request):
 
     return render(request, 'account/admin/statistics.html', context)
 
+def family_fee_lines(fees, students):
+    """Per-child fee lines of the payment desk, priced by the FeeResolver `fees`."""
+    return [
+        {
+            'student_id': student.admission_number,
+            'full_name': student.full_name,
+            'class_level': student.current_class.level if student.current_class else 'N/A',
+            'fee_amount': str(fees.student_fee(student)),
+        }
+        for student in students
+    ]
+
 @login_required
 @group_required('Secretary', 'Director')
 def search_family_by_student_name(request):
@@ -1877,34 +1814,13 @@ def search_family_by_student_name(request):
             'refunds': []
         }
 
+        fees = FeeResolver.for_term(session, term)
         parent_students = Student.objects.filter(parent=parent, is_active=True).select_related('current_class')
-        total_student_fees = Decimal('0')
-        for student in parent_students:
-            override = StudentFeeOverride.objects.filter(student=student, session=session, term=term).first()
-            if override:
-                fee_amount = override.amount
-            else:
-                fee = FeeStructure.objects.filter(
-                    session=session,
-                    term=term,
-                    class_level=student.current_class
-                ).first()
-                fee_amount = fee.amount if fee else Decimal('0')
-            total_student_fees += fee_amount
-            family['students'].append({
-                'student_id': student.admission_number,
-                'full_name': student.full_name,
-                'class_level': student.current_class.level if student.current_class else 'N/A',
-                'fee_amount': str(fee_amount)
-            })
-
+        family['students'] = family_fee_lines(fees, parent_students)
+        total_student_fees = fees.student_fees(parent_students)
         family['total_student_fees'] = str(total_student_fees)
-        pta_dues = Decimal('0')
-        if term == '1':
-            pta_dues_record = PTADues.objects.filter(session=session, term=term).first()
-            pta_dues = pta_dues_record.amount if pta_dues_record else Decimal('2000.00')
-        family['pta_dues'] = str(pta_dues)
-        family['total_fees'] = str(total_student_fees + pta_dues)
+        family['pta_dues'] = str(fees.pta_dues)
+        family['total_fees'] = str(total_student_fees + fees.pta_dues)
         payment_status = parent.get_payment_status_for_term(session, term)
         family['amount_paid'] = str(payment_status['amount_paid'])
         family['amount_due'] = str(payment_status['amount_due'])
@@ -1988,7 +1904,8 @@ def admin_create_payment(request):
                 session=session,
                 term=term,
                 amount=amount,
-                status='Completed'
+                status='Completed',
+                created_by=request.user,
             )
             payment.students.set(parent.students.filter(is_active=True))
             message = f'Payment of {amount} XOF recorded for {parent.full_name or parent.phone_number}'
@@ -2021,6 +1938,7 @@ def admin_create_payment(request):
             payment.amount = amount
             payment.status = 'Completed' if amount > 0 else 'Cancelled'
             payment.save()
+            invalidate_receipt(payment.transaction_id)
             message = f'Payment of {amount} XOF updated for {parent.full_name or parent.phone_number}'
             
             
@@ -2035,6 +1953,7 @@ def admin_create_payment(request):
             payment = Payment.objects.get(id=payment_id, parent=parent, session=session, term=term)
             transaction_id = payment.transaction_id
             payment.delete()
+            invalidate_receipt(transaction_id)
             message = f'Payment {transaction_id} deleted for {parent.full_name or parent.phone_number}'
             should_invalidate_cache = True
             
@@ -2045,35 +1964,17 @@ def admin_create_payment(request):
             invalidate_payment_report_cache(session, term)
             logger.info(f"Cache invalidated due to payment {action} for parent {parent.phone_number}")
         
-        pta_dues = Decimal('0')
-        if term == '1':
-            pta_dues_record = PTADues.objects.filter(session=session, term=term).first()
-            pta_dues = pta_dues_record.amount if pta_dues_record else Decimal('2000.00')
-
-        total_fees = parent.get_total_fees_for_term(session, term)
+        fees = FeeResolver.for_term(session, term)
+        parent_students = parent.students.filter(is_active=True).select_related('current_class')
+        total_student_fees = fees.student_fees(parent_students)
         payment_status = parent.get_payment_status_for_term(session, term)
         
         family = {
             'parent_id': parent.id,
-            'students': [
-                {
-                    'student_id': student.admission_number,
-                    'full_name': student.full_name,
-                    'class_level': student.current_class.level if student.current_class else 'N/A',
-                    'fee_amount': str(
-                        StudentFeeOverride.objects.filter(student=student, session=session, term=term).first().amount
-                        if StudentFeeOverride.objects.filter(student=student, session=session, term=term).exists()
-                        else FeeStructure.objects.filter(
-                            session=session,
-                            term=term,
-                            class_level=student.current_class
-                        ).first().amount if student.current_class else Decimal('0')
-                    )
-                } for student in parent.students.filter(is_active=True)
-            ],
-            'total_student_fees': str(total_fees - pta_dues),
-            'pta_dues': str(pta_dues),
-            'total_fees': str(total_fees),
+            'students': family_fee_lines(fees, parent_students),
+            'total_student_fees': str(total_student_fees),
+            'pta_dues': str(fees.pta_dues),
+            'total_fees': str(total_student_fees + fees.pta_dues),
             'amount_paid': str(payment_status['amount_paid']),
             'amount_due': str(payment_status['amount_due']),
             'previous_payments': [
@@ -2168,28 +2069,15 @@ def admin_edit_student_fee(request):
             logger.info(f"Student fee {action} for {student.full_name}, session {session.name}, term {term}, amount {new_amount}")
 
         
-        parent = student.parent
-        parent_students = Student.objects.filter(parent=parent, is_active=True).select_related('current_class')
-        total_student_fees = Decimal('0')
-        for s in parent_students:
-            override = s.fee_overrides.filter(session=session, term=term).first()
-            fee_amount = override.amount if override else (
-                FeeStructure.objects.filter(session=session, term=term, class_level=s.current_class).first().amount
-                if s.current_class and FeeStructure.objects.filter(session=session, term=term, class_level=s.current_class).exists()
-                else Decimal('0')
-            )
-            total_student_fees += fee_amount
-
-        pta_dues = Decimal('0')
-        if term == '1':
-            pta = PTADues.objects.filter(session=session, term=term).first()
-            pta_dues = pta.amount if pta else Decimal('2000.00')
-
+        fees = FeeResolver.for_term(session, term)
+        parent_students = Student.objects.filter(parent=student.parent, is_active=True)
+        total_student_fees = fees.student_fees(parent_students)
+        pta_dues = fees.pta_dues
         total_fees = total_student_fees + pta_dues
-        payments = Payment.objects.filter(parent=parent, session=session, term=term).aggregate(total_paid=Sum('amount'))
-        refunds = Refund.objects.filter(parent=parent, session=session, term=term).aggregate(total_refunded=Sum('amount'))
-        amount_paid = (payments['total_paid'] or Decimal('0')) - (refunds['total_refunded'] or Decimal('0'))
-        amount_due = max(total_fees - amount_paid, Decimal('0'))
+        amount_paid, amount_due = Decimal('0'), total_fees
+        if student.parent:
+            payment_status = student.parent.get_payment_status_for_term(session, term)
+            amount_paid, amount_due = payment_status['amount_paid'], payment_status['amount_due']
 
         return JsonResponse({
             'success': True,
@@ -2209,110 +2097,6 @@ def admin_edit_student_fee(request):
         logger.exception(f"Error editing student fee: {str(e)}")
         return JsonResponse({'error': f'Internal server error: {str(e)}'}, status=500)
 
-def get_optimized_payment_data(session, term):
-    """
-    Extract the common data fetching logic for both views
-    """
-    
-    parents = Parent.objects.filter(is_active=True).prefetch_related(
-        Prefetch(
-            'students', 
-            queryset=Student.objects.filter(is_active=True).select_related('current_class')
-        ),
-        Prefetch(
-            'payments', 
-            queryset=Payment.objects.filter(
-                session=session, 
-                term=term, 
-                status='Completed'
-            ).only('amount', 'parent_id')
-        )
-    ).only('id', 'phone_number', 'full_name')
-    
-    
-    fee_structures = {}
-    for fs in FeeStructure.objects.filter(session=session, term=term).select_related('class_level'):
-        fee_structures[(fs.class_level_id, fs.session_id, fs.term)] = fs.amount
-    
-    student_fee_overrides = {}
-    for sfo in StudentFeeOverride.objects.filter(session=session, term=term):
-        
-        student_fee_overrides[(sfo.student_id, sfo.session_id, sfo.term)] = sfo.amount
-    
-    
-    pta_dues_amount = Decimal('2000.00')  
-    if term == '1':
-        pta_dues = PTADues.objects.filter(session=session, term=term).first()
-        if pta_dues:
-            pta_dues_amount = pta_dues.amount
-    
-    refunds_dict = {}
-    for refund in Refund.objects.filter(session=session, term=term).values('parent_id', 'amount'):
-        parent_id = refund['parent_id']
-        refunds_dict.setdefault(parent_id, Decimal(0))
-        refunds_dict[parent_id] += refund['amount']
-    
-    report_data = []
-    
-    for parent in parents:
-        total_fees = Decimal(0)
-        students_info = []
-        
-        for student in parent.students.all():
-            if not student.current_class:
-                continue
-                
-            students_info.append(f"{student.full_name} - {student.current_class.level}")
-            
-            override_key = (student.admission_number, session.id, term)
-            if override_key in student_fee_overrides:
-                total_fees += student_fee_overrides[override_key]
-                continue
-            
-            fee_key = (student.current_class_id, session.id, term)
-            if fee_key in fee_structures:
-                total_fees += fee_structures[fee_key]
-        
-        if term == '1' and students_info:
-            total_fees += pta_dues_amount
-        
-        total_paid = sum(payment.amount for payment in parent.payments.all())
-        total_refunded = refunds_dict.get(parent.id, Decimal(0))
-        amount_paid = max(total_paid - total_refunded, Decimal(0))
-        amount_due = max(total_fees - amount_paid, Decimal(0))
-        
-        if not students_info or total_fees == 0:
-            continue
-            
-        percentage_paid = (amount_paid / total_fees * 100) if total_fees > 0 else 0
-        payment_category = 'full' if amount_due == 0 else 'partial' if amount_paid > 0 else 'none'
-        
-        report_data.append({
-            'students': ', '.join(students_info),
-            'parent_phone': parent.phone_number,
-            'total_fees': float(total_fees),
-            'amount_paid': float(amount_paid),
-            'amount_due': float(amount_due),
-            'percentage_paid': round(percentage_paid, 2),
-            'category': payment_category
-        })
-    
-    full_paid = [item for item in report_data if item['category'] == 'full']
-    partial_paid = [item for item in report_data if item['category'] == 'partial']
-    not_paid = [item for item in report_data if item['category'] == 'none']
-    
-    full_paid.sort(key=lambda x: x['amount_paid'], reverse=True)
-    partial_paid.sort(key=lambda x: x['amount_paid'], reverse=True)
-    not_paid.sort(key=lambda x: x['amount_paid'], reverse=True)
-    
-    return {
-        'report_data': report_data,
-        'full_paid': full_paid,
-        'partial_paid': partial_paid,
-        'not_paid': not_paid,
-        'generated_at': timezone.now().isoformat()
-    }
-
 @login_required
 @group_required('Secretary', 'Director')
 def admin_payment_report(request):
@@ -2391,6 +2175,19 @@ def admin_payment_report(request):
     
     return render(request, 'account/admin/payment_report.html', context)
 
+def report_pdf_progress(request, payload, title, session, term, back_url):
+    """Queue a report_pdf task and show its progress page, which offers the PDF once it is rendered."""
+    task = enqueue(report_pdf_task.task_name, payload, user=request.user)
+    logger.info(f"Queued {payload['report']} PDF for {session.name} term {term} as task {task.id}")
+    context = get_user_context(request) or {}
+    context.update({
+        'task': task,
+        'title': title,
+        'subtitle': f"Session: {session.name} | Term: {dict(TERM_CHOICES).get(term, term)} | PDF",
+        'back_url': back_url,
+    })
+    return render(request, 'account/task_progress.html', context)
+
 @login_required
 @group_required('Secretary', 'Director')
 def admin_payment_report_pdf(request):
@@ -2400,69 +2197,54 @@ def admin_payment_report_pdf(request):
 
     try:
         session = Session.objects.get(id=session_id)
-    except Session.DoesNotExist:
+    except (Session.DoesNotExist, ValueError):
         return HttpResponse("Session not found", status=404)
 
-    
-    cache_key = f"payment_report_{session.id}_{term}"
-    cached_data = cache.get(cache_key)
-    
-    if cached_data is None:
-        logger.info(f"PDF Cache miss for {cache_key}, generating fresh data")
-        cached_data = get_optimized_payment_data(session, term)
-        
-        
-        cache.set(cache_key, cached_data, 900)
-        logger.info(f"PDF Data cached for 15 minutes")
-    else:
-        logger.info(f"PDF Cache hit for {cache_key}")
+    payload = {
+        'report': 'payment_report', 'session_id': session.id, 'term': term,
+        'native': table_pdf.use_native_pdf(request, 'payment_report'), 'sort_type': sort_type,
+    }
+    return report_pdf_progress(
+        request, payload, "Payment Report", session, term, reverse('admin_payment_report') + f"?session_id={session.id}&term={term}"
+    )
 
-    
-    full_paid = cached_data['full_paid']
-    partial_paid = cached_data['partial_paid']
-    not_paid = cached_data['not_paid']
+PAYMENT_CATEGORY_LABELS = {'full': 'Full Paid', 'partial': 'Partial Paid', 'none': 'Not Paid'}
 
-    
-    logger.info(f"PDF - Full paid: {len(full_paid)}, Partial paid: {len(partial_paid)}, Not paid: {len(not_paid)}")
 
-    
-    if sort_type == 'full':
-        filtered_data = full_paid
-    elif sort_type == 'partial':
-        filtered_data = partial_paid
-    elif sort_type == 'none':
-        filtered_data = not_paid
-    else:
-        filtered_data = full_paid + partial_paid + not_paid
+@login_required
+@group_required('Secretary', 'Director')
+def admin_payment_report_export(request):
+    current_session, current_term = get_current_session_term()
+    session_id = request.GET.get('session_id', current_session.id if current_session else '')
+    term = request.GET.get('term', current_term if current_term else '1')
+    sort_type = request.GET.get('sort_type', 'all')
+    output_format = request.GET.get('format', 'csv')
+    if output_format not in EXPORT_FORMATS:
+        output_format = 'csv'
 
-    context = {
-        'report_data': filtered_data,
-        'current_session': session,
-        'current_term': term,
-        'date_generated': date.today(),
-        'sort_type': sort_type,
-        'full_paid': full_paid,
-        'partial_paid': partial_paid,
-        'not_paid': not_paid,
-        'full_paid_count': len(full_paid),
-        'partial_paid_count': len(partial_paid),
-        'not_paid_count': len(not_paid),
-    }
+    try:
+        session = Session.objects.get(id=session_id) if session_id else current_session
+        if term not in dict(TERM_CHOICES):
+            term = current_term or '1'
+    except Session.DoesNotExist:
+        return HttpResponse("Session not found", status=404)
 
-    html_string = render_to_string('account/admin/payment_report_pdf.html', context)
-    html = HTML(string=html_string)
-    result = html.write_pdf()
+    def rows():
+        for item in iter_payment_report_rows(session, term):
+            if sort_type in PAYMENT_CATEGORY_LABELS and item['category'] != sort_type:
+                continue
+            yield [
+                item['students'], item['parent_phone'], PAYMENT_CATEGORY_LABELS[item['category']], item['total_fees'],
+                item['amount_paid'], item['amount_due'], item['percentage_paid'],
+            ]
 
-    response = HttpResponse(result, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="payment_report_{session.name}_{term}.pdf"'
-    return response
+    header = [
+        'Students', 'Phone', 'Category', 'Total Fees (XOF)', 'Amount Paid (XOF)', 'Amount Due (XOF)', 'Paid (%)',
+    ]
+    filename = export_filename('payment_report', session.name, f"Term{term}", sort_type if sort_type != 'all' else '')
+    logger.info(f"Exporting payment report {filename}.{output_format} for {request.user.username}")
+    return export_response(output_format, filename, 'Payment Report', header, rows())
 
-def invalidate_payment_report_cache(session, term):
-    """Call this function when new payments are processed"""
-    cache_key = f"payment_report_{session.id}_{term}"
-    cache.delete(cache_key)
-    logger.info(f"Payment report cache invalidated for {cache_key}")
-    
 @login_required
 @group_required('Secretary', 'Director')
 def admin_fee_statistics(request):
@@ -2482,176 +2264,12 @@ def admin_fee_statistics(request):
         session = current_session
         term = current_term or '1'
 
-    section_mappings = {
-        'Creche': ['Creche'],
-        'Nursery_Primary': ['Pre-Nursery', 'Nursery 1', 'Nursery 2', 'Nursery 3', 'Primary 1', 'Primary 2', 'Primary 3', 'Primary 4', 'Primary 5'],
-        'Junior': ['JSS 1', 'JSS 2', 'JSS 3'],
-        'Senior': ['SS 1', 'SS 2', 'SS 3'],
-    }
-
-    stats_data = []
-    total_expected = Decimal(0)
-
-    fee_structures = FeeStructure.objects.filter(
-        session=session, term=term
-    ).select_related('class_level')
-    student_counts = Student.objects.filter(
-        is_active=True,
-        current_class__isnull=False,
-        enrollment_year__lte=session.end_year
-    ).values('current_class__level', 'current_class__section').annotate(
-        count=Count('pk')
-    )
-
-    student_count_by_class = {item['current_class__level']: item['count'] for item in student_counts}
-
-    total_paid = Payment.objects.filter(
-        session=session,
-        term=term,
-        status='Completed'
-    ).aggregate(total=Sum('amount'))['total'] or Decimal(0)
-    total_refunds = Refund.objects.filter(
-        session=session,
-        term=term
-    ).aggregate(total=Sum('amount'))['total'] or Decimal(0)
-    total_paid -= total_refunds
-    if total_paid < 0:
-        total_paid = Decimal(0)
-
-    payment_by_class = defaultdict(Decimal)
-    payments = Payment.objects.filter(
-        session=session, term=term, status='Completed'
-    ).prefetch_related(
-        Prefetch('students', queryset=Student.objects.filter(is_active=True, current_class__isnull=False).select_related('current_class'))
-    )
-
-    for payment in payments:
-        students = payment.students.all()
-        num_students = students.count()
-        if num_students == 0:
-            continue
-        student_fees = {}
-        total_student_fees = Decimal(0)
-        for student in students:
-            override = student.fee_overrides.filter(session=session, term=term).first()
-            fee_amount = override.amount if override else (
-                fee_structures.filter(class_level=student.current_class).first().amount
-                if fee_structures.filter(class_level=student.current_class).exists()
-                else Decimal(0)
-            )
-            student_fees[student.admission_number] = fee_amount
-            total_student_fees += fee_amount
-        if total_student_fees == 0:
-            amount_per_student = payment.amount / num_students
-            for student in students:
-                payment_by_class[student.current_class.level] += amount_per_student
-        else:
-            for student in students:
-                proportion = student_fees[student.admission_number] / total_student_fees
-                payment_by_class[student.current_class.level] += payment.amount * proportion
-
-    refunds = Refund.objects.filter(
-        session=session, term=term
-    ).select_related('parent').prefetch_related(
-        Prefetch('parent__students', queryset=Student.objects.filter(is_active=True, current_class__isnull=False).select_related('current_class'))
-    )
-
-    for refund in refunds:
-        students = refund.parent.students.all()
-        num_students = students.count()
-        if num_students == 0:
-            continue
-        student_fees = {}
-        total_student_fees = Decimal(0)
-        for student in students:
-            override = student.fee_overrides.filter(session=session, term=term).first()
-            fee_amount = override.amount if override else (
-                fee_structures.filter(class_level=student.current_class).first().amount
-                if fee_structures.filter(class_level=student.current_class).exists()
-                else Decimal(0)
-            )
-            student_fees[student.admission_number] = fee_amount
-            total_student_fees += fee_amount
-        if total_student_fees == 0:
-            amount_per_student = refund.amount / num_students
-            for student in students:
-                payment_by_class[student.current_class.level] -= amount_per_student
-        else:
-            for student in students:
-                proportion = student_fees[student.admission_number] / total_student_fees
-                payment_by_class[student.current_class.level] -= refund.amount * proportion
-
-    for section, class_levels in section_mappings.items():
-        section_expected = Decimal(0)
-        section_paid = Decimal(0)
-        student_count = 0
-
-        for class_level in class_levels:
-            fee_structure = fee_structures.filter(class_level__level=class_level).first()
-            fee_amount = fee_structure.amount if fee_structure else Decimal(0)
-            logger.debug('Class: %s, Fee Amount: %s', class_level, fee_amount)
-
-            class_student_count = student_count_by_class.get(class_level, 0)
-            student_count += class_student_count
-
-            class_expected = fee_amount * class_student_count
-            section_expected += class_expected
-
-            class_paid = max(payment_by_class.get(class_level, Decimal(0)), Decimal(0))
-            section_paid += class_paid
-
-            logger.debug('Class: %s, Students: %s, Expected: %s, Paid: %s', 
-                         class_level, class_student_count, class_expected, class_paid)
-
-        percentage_paid = (section_paid / section_expected * 100) if section_expected > 0 else 0
-        stats_data.append({
-            'section': section,
-            'expected': float(section_expected),
-            'paid': float(section_paid),
-            'outstanding': float(section_expected - section_paid),
-            'percentage_paid': round(percentage_paid, 2),
-            'student_count': student_count
-        })
-
-        total_expected += section_expected
-
-    
-    if term == '1':
-        pta_dues = PTADues.objects.filter(session=session, term=term).first()
-        pta_amount = pta_dues.amount if pta_dues else Decimal('2000.00')
-        num_parents = Parent.objects.filter(
-            students__is_active=True,
-            students__current_class__isnull=False,
-            students__enrollment_year__lte=session.end_year
-        ).distinct().count()
-        pta_expected = pta_amount * num_parents
-        total_expected += pta_expected
-        logger.debug('PTA Expected: %s (for %s parents)', pta_expected, num_parents)
-
-        stats_data.append({
-            'section': 'PTA Dues',
-            'expected': float(pta_expected),
-            'paid': 0.0,
-            'outstanding': float(pta_expected),
-            'percentage_paid': 0,
-            'student_count': num_parents
-        })
-
-    total_outstanding = total_expected - total_paid
-    total_percentage_paid = (total_paid / total_expected * 100) if total_expected > 0 else 0
-    logger.debug('Totals: Expected=%s, Paid=%s, Outstanding=%s, Percentage=%s', 
-                 total_expected, total_paid, total_outstanding, total_percentage_paid)
-
     context = {
         'sessions': sessions,
         'current_session': session,
         'current_term': term,
         'term_choices': TERM_CHOICES,
-        'stats_data': stats_data,
-        'total_expected': float(total_expected),
-        'total_paid': float(total_paid),
-        'total_outstanding': float(total_outstanding),
-        'total_percentage_paid': round(total_percentage_paid, 2),
+        **fee_statistics(session, term),
         'role': 'admin'
     }
 
@@ -2660,10 +2278,7 @@ def admin_fee_statistics(request):
 @login_required
 @group_required('Secretary', 'Director')
 def admin_fee_statistics_pdf(request):
-    sessions = Session.objects.all()
     current_session, current_term = get_current_session_term()
-    logger.debug('Admin Fee Statistics PDF: current_session=%s, current_term=%s', 
-                 current_session.name if current_session else None, current_term)
     session_id = request.GET.get('session_id', current_session.id if current_session else '')
     term = request.GET.get('term', current_term if current_term else '1')
 
@@ -2676,215 +2291,189 @@ def admin_fee_statistics_pdf(request):
         session = current_session
         term = current_term or '1'
 
-    section_mappings = {
-        'Creche': ['Creche'],
-        'Nursery_Primary': ['Pre-Nursery', 'Nursery 1', 'Nursery 2', 'Nursery 3', 'Primary 1', 'Primary 2', 'Primary 3', 'Primary 4', 'Primary 5'],
-        'Junior': ['JSS 1', 'JSS 2', 'JSS 3'],
-        'Senior': ['SS 1', 'SS 2', 'SS 3'],
+    payload = {
+        'report': 'fee_statistics', 'session_id': session.id, 'term': term,
+        'native': table_pdf.use_native_pdf(request, 'fee_statistics'),
     }
-
-    stats_data = []
-    total_expected = Decimal(0)
-    total_paid = Decimal(0)
-
-    fee_structures = FeeStructure.objects.filter(
-        session=session, term=term
-    ).select_related('class_level')
-    student_counts = Student.objects.filter(
-        is_active=True,
-        current_class__isnull=False,
-        enrollment_year__lte=session.end_year
-    ).values('current_class__level', 'current_class__section').annotate(
-        count=Count('pk')
+    return report_pdf_progress(
+        request, payload, "Fee Statistics", session, term, reverse('admin_fee_statistics') + f"?session_id={session.id}&term={term}"
     )
 
-    payment_sums = Payment.objects.filter(
-        session=session, term=term, students__is_active=True
-    ).values('students__current_class__level').annotate(
-        total_paid=Sum('amount')
-    )
+def daily_report_filters(request):
+    """
+    (start_date, end_date, session, term) of a daily payment report from the
+    query string: `start_date` and `end_date` (or a single `date`), defaulting
+    to today, and `session_id` and `term`, defaulting to the current ones.
+    """
+    current_session, current_term = get_current_session_term()
+    today = timezone.localdate()
 
-    student_count_by_class = {item['current_class__level']: item['count'] for item in student_counts}
-    payment_by_class = {item['students__current_class__level']: item['total_paid'] for item in payment_sums}
+    def parse(value, default):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            return default
 
-    for section, class_levels in section_mappings.items():
-        section_expected = Decimal(0)
-        section_paid = Decimal(0)
-        student_count = 0
+    start_date = parse(request.GET.get('start_date') or request.GET.get('date'), today)
+    end_date = parse(request.GET.get('end_date'), start_date)
+    if end_date < start_date:
+        start_date, end_date = end_date, start_date
 
-        for class_level in class_levels:
-            fee_structure = fee_structures.filter(class_level__level=class_level).first()
-            fee_amount = fee_structure.amount if fee_structure else Decimal(0)
-            logger.debug('Class: %s, Fee Amount: %s', class_level, fee_amount)
+    session = current_session
+    session_id = request.GET.get('session_id')
+    if session_id:
+        session = Session.objects.filter(pk=session_id).first() or current_session
+    term = request.GET.get('term')
+    if term not in dict(TERM_CHOICES):
+        term = current_term
+    return start_date, end_date, session, term
 
-            class_student_count = student_count_by_class.get(class_level, 0)
-            student_count += class_student_count
 
-            class_expected = fee_amount * class_student_count
-            section_expected += class_expected
+def daily_report_label(start_date, end_date):
+    return str(start_date) if start_date == end_date else f"{start_date} to {end_date}"
 
-            class_paid = payment_by_class.get(class_level, Decimal(0))
-            class_paid = min(class_paid, class_expected)
-            section_paid += class_paid
 
-            logger.debug('Class: %s, Students: %s, Expected: %s, Paid: %s', 
-                         class_level, class_student_count, class_expected, class_paid)
+@login_required
+@group_required('Secretary', 'Director')
+def admin_fee_statistics_export(request):
+    current_session, current_term = get_current_session_term()
+    session_id = request.GET.get('session_id', current_session.id if current_session else '')
+    term = request.GET.get('term', current_term if current_term else '1')
+    output_format = request.GET.get('format', 'csv')
+    if output_format not in EXPORT_FORMATS:
+        output_format = 'csv'
 
-        if term == '1':
-            pta_dues = PTADues.objects.filter(session=session, term=term).first()
-            pta_amount = pta_dues.amount if pta_dues else Decimal('2000.00')
-            section_expected += pta_amount * student_count
-            logger.debug('Section: %s, PTA Dues: %s', section, pta_amount)
+    try:
+        session = Session.objects.get(pk=session_id) if session_id else current_session
+        if term not in dict(TERM_CHOICES):
+            term = current_term or '1'
+    except Session.DoesNotExist:
+        return HttpResponse("Session not found", status=404)
 
-        percentage_paid = (section_paid / section_expected * 100) if section_expected > 0 else 0
-        stats_data.append({
-            'section': section,
-            'expected': float(section_expected),
-            'paid': float(section_paid),
-            'outstanding': float(section_expected - section_paid),
-            'percentage_paid': round(percentage_paid, 2),
-            'student_count': student_count
-        })
+    data = fee_statistics(session, term)
+    rows = [
+        [item['section'], item['student_count'], item['expected'], item['paid'], item['outstanding'], item['percentage_paid']]
+        for item in data['stats_data']
+    ]
+    rows.append([
+        'Total', '', data['total_expected'], data['total_paid'], data['total_outstanding'], data['total_percentage_paid'],
+    ])
+    header = ['Section', 'Students', 'Expected (XOF)', 'Paid (XOF)', 'Outstanding (XOF)', 'Paid (%)']
+    filename = export_filename('fee_statistics', session.name, f"Term{term}")
+    return export_response(output_format, filename, 'Fee Statistics', header, rows)
 
-        total_expected += section_expected
-        total_paid += section_paid
+@login_required
+@group_required('Secretary', 'Director')
+def admin_daily_payment_report(request):
+    start_date, end_date, session, term = daily_report_filters(request)
+    payments = get_daily_payments(start_date, end_date, session, term)
+    report_data = list(iter_daily_payment_rows(payments, session, term))
+    totals = daily_payment_totals(payments)
 
-    total_outstanding = total_expected - total_paid
-    total_percentage_paid = (total_paid / total_expected * 100) if total_expected > 0 else 0
-    logger.debug('Totals: Expected=%s, Paid=%s, Outstanding=%s, Percentage=%s', 
-                 total_expected, total_paid, total_outstanding, total_percentage_paid)
+    logger.debug('Daily Payment Report: %s to %s, session=%s, term=%s, Payments=%s, Total Paid=%s',
+                 start_date, end_date, session.name if session else None, term, len(report_data), totals['total_paid'])
 
     context = {
-        'sessions': sessions,
+        'sessions': Session.objects.all(),
         'current_session': session,
         'current_term': term,
         'term_choices': TERM_CHOICES,
-        'stats_data': stats_data,
-        'total_expected': float(total_expected),
-        'total_paid': float(total_paid),
-        'total_outstanding': float(total_outstanding),
-        'total_percentage_paid': round(total_percentage_paid, 2),
-        'date_generated': date.today(),
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'date_label': daily_report_label(start_date, end_date),
+        'report_query': urlencode({
+            'start_date': start_date, 'end_date': end_date, 'session_id': session.pk if session else '', 'term': term or '',
+        }),
+        'report_data': report_data,
+        **totals,
+        'role': 'admin'
     }
 
-    html_string = render_to_string('account/admin/fee_statistics_pdf.html', context)
-    html = HTML(string=html_string)
-    result = html.write_pdf()
-
-    response = HttpResponse(result, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="fee_statistics_{session.name}_{term}.pdf"'
-    return response
+    return render(request, 'account/admin/daily_payment_report.html', context)
 
 @login_required
 @group_required('Secretary', 'Director')
-def admin_daily_payment_report(request):
-    sessions = Session.objects.all()
-    current_session, current_term = get_current_session_term()
-    logger.debug('Admin Daily Payment Report: current_session=%s, current_term=%s', 
-                 current_session.name if current_session else None, current_term)
-    date_str = request.GET.get('date', timezone.now().strftime('%Y-%m-%d'))
-    
-    try:
-        selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except ValueError:
-        selected_date = date.today()  
-        date_str = selected_date.strftime('%Y-%m-%d')
-
-    payments = Payment.objects.filter(
-        created_at__date=selected_date,
-        session=current_session,
-        term=current_term
-    ).select_related('parent').prefetch_related('students__current_class').order_by('-created_at')
-    
-    report_data = []
-    total_paid = Decimal(0)
-    
-    for payment in payments:
-        students = payment.students.all()
-        student_list = [f"{s.full_name} ({s.current_class.level})" for s in students if s.current_class]
-        amount_due = payment.parent.get_payment_status_for_term(current_session, current_term)['amount_due']
-        
-        report_data.append({
-            'parent_name': payment.parent.full_name or payment.parent.phone_number,
-            'students': ', '.join(student_list) or 'No students',
-            'amount_paid': float(payment.amount),
-            'amount_due': float(amount_due),
-            'transaction_id': payment.transaction_id,
-            'time': payment.created_at.strftime('%I:%M %p')
-        })
-        total_paid += payment.amount
-    
-    logger.debug('Daily Payment Report: Date=%s, Payments=%s, Total Paid=%s', 
-                 selected_date, len(payments), total_paid)
-
-    context = {
-        'sessions': sessions,
-        'current_session': current_session,
-        'current_term': current_term,
-        'term_choices': TERM_CHOICES,
-        'selected_date': date_str,
-        'report_data': report_data,
-        'total_paid': float(total_paid),
-        'role': 'admin'
+def admin_daily_payment_report_pdf(request):
+    start_date, end_date, session, term = daily_report_filters(request)
+    if not session or not term:
+        messages.error(request, 'Choose a session and term.')
+        return redirect('admin_daily_payment_report')
+
+    payload = {
+        'report': 'daily_payments', 'session_id': session.id, 'term': term,
+        'native': table_pdf.use_native_pdf(request, 'daily_payments'),
+        'start_date': start_date.isoformat(), 'end_date': end_date.isoformat(),
     }
-    
-    return render(request, 'account/admin/daily_payment_report.html', context)
+    query = urlencode({'start_date': start_date, 'end_date': end_date, 'session_id': session.pk, 'term': term})
+    return report_pdf_progress(
+        request, payload, f"Daily Payments: {daily_report_label(start_date, end_date)}", session, term,
+        f"{reverse('admin_daily_payment_report')}?{query}",
+    )
 
 @login_required
 @group_required('Secretary', 'Director')
-def admin_daily_payment_report_pdf(request):
-    sessions = Session.objects.all()
-    current_session, current_term = get_current_session_term()
-    logger.debug('Admin Daily Payment Report PDF: current_session=%s, current_term=%s', 
-                 current_session.name if current_session else None, current_term)
-    date_str = request.GET.get('date', timezone.now().strftime('%Y-%m-%d'))
-    
-    try:
-        selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except ValueError:
-        selected_date = date.today()  
-        date_str = selected_date.strftime('%Y-%m-%d')
-
-    payments = Payment.objects.filter(
-        created_at__date=selected_date,
-        session=current_session,
-        term=current_term
-    ).select_related('parent').prefetch_related('students__current_class').order_by('-created_at')
-    
-    report_data = []
-    total_paid = Decimal(0)
-    
-    for payment in payments:
-        students = payment.students.all()
-        student_list = [f"{s.full_name} ({s.current_class.level})" for s in students if s.current_class]
-        amount_due = payment.parent.get_payment_status_for_term(current_session, current_term)['amount_due']
-        
-        report_data.append({
-            'parent_name': payment.parent.full_name or payment.parent.phone_number,
-            'students': ', '.join(student_list) or 'No students',
-            'amount_paid': float(payment.amount),
-            'amount_due': float(amount_due),
-            'transaction_id': payment.transaction_id,
-            'time': payment.created_at.strftime('%I:%M %p')
-        })
-        total_paid += payment.amount
-    
-    logger.debug('Daily Payment Report PDF: Date=%s, Payments=%s, Total Paid=%s', 
-                 selected_date, len(payments), total_paid)
+def admin_daily_payment_report_export(request):
+    start_date, end_date, session, term = daily_report_filters(request)
+    output_format = request.GET.get('format', 'csv')
+    if output_format not in EXPORT_FORMATS:
+        output_format = 'csv'
+
+    payments = get_daily_payments(start_date, end_date, session, term)
+    rows = (
+        [item['date'], item['time'], item['parent_name'], item['students'], item['amount_paid'], item['amount_due'],
+         item['cashier'], item['transaction_id']]
+        for item in iter_daily_payment_rows(payments, session, term)
+    )
+    header = ['Date', 'Time', 'Parent', 'Students', 'Amount Paid (XOF)', 'Amount Due (XOF)', 'Cashier', 'Transaction ID']
+    filename = export_filename('daily_payments', start_date, end_date if end_date != start_date else None)
+    return export_response(output_format, filename, f"Payments {daily_report_label(start_date, end_date)}", header, rows)
 
-    context = {
-        'current_session': current_session,
-        'current_term': current_term,
-        'selected_date': date_str,
-        'report_data': report_data,
-        'total_paid': float(total_paid),
-        'date_generated': date.today(), 
-    }
+@login_required
+@group_required('Secretary', 'Director')
+def admin_bulk_receipts(request):
+    """
+    Queue one PDF with the receipts of every completed payment made between
+    start_date and end_date (YYYY-MM-DD, inclusive; end_date defaults to
+    start_date), or in a session and term, and show its progress page.
+    """
+    start_str = request.GET.get('start_date')
+    session_id = request.GET.get('session_id')
+    term = request.GET.get('term')
 
-    html_string = render_to_string('account/admin/daily_payment_report_pdf.html', context)
-    html = HTML(string=html_string)
-    result = html.write_pdf()
+    if start_str:
+        end_str = request.GET.get('end_date') or start_str
+        try:
+            start = datetime.strptime(start_str, '%Y-%m-%d').date()
+            end = datetime.strptime(end_str, '%Y-%m-%d').date()
+        except ValueError:
+            messages.error(request, 'Dates must be in YYYY-MM-DD format.')
+            return redirect('admin_daily_payment_report')
+        if end < start:
+            messages.error(request, 'The end date is before the start date.')
+            return redirect('admin_daily_payment_report')
+        payload = {'start_date': start.isoformat(), 'end_date': end.isoformat()}
+        label = start_str if start == end else f"{start_str}_to_{end_str}"
+        subtitle = label.replace('_', ' ')
+    elif session_id and term in [t[0] for t in TERM_CHOICES]:
+        session = get_object_or_404(Session, id=session_id)
+        payload = {'session_id': session.id, 'term': term}
+        label = f"{session.name}_Term{term}".replace('/', '-')
+        subtitle = f"Session: {session.name} | Term: {dict(TERM_CHOICES)[term]}"
+    else:
+        messages.error(request, 'Choose a date range or a session and term.')
+        return redirect('admin_daily_payment_report')
 
-    response = HttpResponse(result, content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="daily_payment_report_{selected_date}.pdf"'
-    return response
\ No newline at end of file
+    if not bulk_receipt_payments(**payload).exists():
+        messages.error(request, 'No completed payments to print.')
+        return redirect('admin_daily_payment_report')
+
+    task = enqueue(bulk_receipts_task.task_name, dict(payload, label=label), user=request.user)
+    logger.info(f"Queued receipts ({label}) for {request.user.username} as task {task.id}")
+    context = get_user_context(request) or {}
+    context.update({
+        'task': task,
+        'title': "Payment Receipts",
+        'subtitle': subtitle,
+        'back_url': reverse('admin_daily_payment_report'),
+    })
+    return render(request, 'account/task_progress.html', context)
@@ -2,9 +2,9 @@ import uuid
 import logging
 import re
 import aiohttp
-from weasyprint import HTML
 
 from django.shortcuts import get_object_or_404, render, redirect
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -12,13 +12,14 @@ from django.contrib.auth.models import User
 from django.template import TemplateDoesNotExist, TemplateSyntaxError
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.template.loader import render_to_string
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
-from accounts.models import Student, Teacher, Payment, Notification, Session, ClassSection
+from accounts.models import BackgroundTask, Student, Teacher, Payment, Notification, Session, ClassSection
 from accounts.utils.index import get_current_session_term
+from accounts.utils.receipts import receipt_pdf
+from accounts.utils.tasks import task_file_storage
 
 logger = logging.getLogger(__name__)
 
@@ -422,17 +423,8 @@ def generate_payment_receipt(request, payment_id):
         return HttpResponse("Unauthorized", status=403)
 
     try:
-        context = {
-            'payment': payment,
-            'school_name': "Rehoboth International School of Excellence",
-            'school_address': "798 Rues Des Cormiers Qt Hedzranawoe, Lome Togo",
-            'school_contact': "+22890165089, +22890016077, +22897412298",
-        }
-
-        html_string = render_to_string('account/payment_receipt.html', context)
-        response = HttpResponse(content_type='application/pdf')
+        response = HttpResponse(receipt_pdf(payment), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="receipt_{payment.transaction_id}.pdf"'
-        HTML(string=html_string).write_pdf(response)
         logger.info('Receipt generated successfully: payment_id=%s, transaction_id=%s', 
                     payment_id, payment.transaction_id)
         return response
@@ -445,6 +437,44 @@ def generate_payment_receipt(request, payment_id):
         return HttpResponse(f"Error generating receipt: {str(e)}", status=500)
 
 
+def _get_visible_task(request, task_id):
+    tasks = BackgroundTask.objects.all()
+    if not request.user.is_superuser:
+        tasks = tasks.filter(created_by=request.user)
+    return get_object_or_404(tasks, id=task_id)
+
+@login_required
+def task_status(request, task_id):
+    task = _get_visible_task(request, task_id)
+    data = {
+        'id': task.id,
+        'name': task.name,
+        'status': task.status,
+        'progress': task.progress,
+        'attempts': task.attempts,
+        'created_at': task.created_at.isoformat(),
+        'finished_at': task.finished_at.isoformat() if task.finished_at else None,
+        'result': task.result,
+        'error': 'The task failed. Please try again or contact the administrator.' if task.status == 'Failed' else None,
+        'download_url': None,
+    }
+    if task.status == 'Completed' and (task.result or {}).get('file'):
+        data['download_url'] = reverse('task_download', args=[task.id])
+    return JsonResponse(data)
+
+@login_required
+def task_download(request, task_id):
+    task = _get_visible_task(request, task_id)
+    result = task.result or {}
+    if task.status != 'Completed' or not result.get('file'):
+        raise Http404("This task has no file to download.")
+    return FileResponse(
+        task_file_storage().open(result['file'], 'rb'),
+        as_attachment=True,
+        filename=result.get('filename'),
+    )
+
+
 def handler400(request, exception):
     logger.error(f"Bad request: {exception}")
     try:
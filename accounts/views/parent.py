@@ -1,18 +1,20 @@
 from datetime import datetime
 from itertools import groupby
-from decimal import Decimal
 
 from django.shortcuts import get_object_or_404, render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import Http404, HttpResponse, JsonResponse
 from django.utils import timezone
-from django.db.models import Sum, Q
 
-from accounts.utils.index import get_next_term_start_date, get_ordinal_suffix
+from accounts.utils.fees import FeeResolver
+from accounts.utils.index import get_next_term_start_date
+from accounts.utils.payment_history import load_payment_history
 from accounts.decorators import parent_required
-from accounts.models import FeeStructure, ResultAccessRequest, Student, Result, Payment, Session, TERM_CHOICES, StudentClassHistory, StudentFeeOverride, StudentSubject, Parent
-from accounts.utils.pdf_generator import generate_result_pdf
+from accounts.models import ResultAccessRequest, Student, Result, Payment, Session, TERM_CHOICES, StudentSubject, StudentTermSummary, Parent
+from accounts.utils.report_card_cache import report_card_pdf
+from accounts.utils.result_access import ResultAccessResolver
+from accounts.utils.result_history import load_result_history
 
 from .base import get_current_session_term, get_user_context, logger
 
@@ -31,40 +33,10 @@ def parent_payments(request):
     current_year = datetime.now().year
     active_sessions = Session.objects.filter(is_active=True).order_by('-start_year')
     past_sessions = Session.objects.filter(start_year__lt=current_year).order_by('-start_year')
-    term_choices = dict(TERM_CHOICES)
     current_session, current_term = get_current_session_term()
 
-    active_payment_data = []
-    for session in active_sessions:
-        for term, term_name in term_choices.items():
-            total_fees = parent.get_total_fees_for_term(session, term)
-            payment_status = parent.get_payment_status_for_term(session, term)
-            active_payment_data.append({
-                'session': session,
-                'term': term,
-                'term_name': term_name,
-                'total_fees': total_fees,
-                'payment_status': payment_status['status'],
-                'amount_paid': payment_status['amount_paid'],
-                'amount_due': payment_status['amount_due'],
-                'is_current': session == current_session and term == current_term,
-            })
-
-    past_payment_data = []
-    for session in past_sessions:
-        for term, term_name in term_choices.items():
-            total_fees = parent.get_total_fees_for_term(session, term)
-            payment_status = parent.get_payment_status_for_term(session, term)
-            past_payment_data.append({
-                'session': session,
-                'term': term,
-                'term_name': term_name,
-                'total_fees': total_fees,
-                'payment_status': payment_status['status'],
-                'amount_paid': payment_status['amount_paid'],
-                'amount_due': payment_status['amount_due'],
-                'is_current': False,
-            })
+    active_payment_data = load_payment_history(parent, active_sessions, current=(current_session, current_term))
+    past_payment_data = load_payment_history(parent, past_sessions)
 
     context = {
         'parent': parent,
@@ -99,42 +71,15 @@ def parent_payment_detail(request, session_id, term):
     total_fees = parent.get_total_fees_for_term(session, term)
     payment_status = parent.get_payment_status_for_term(session, term)
 
-    student_fees = []
-    for student in parent.students.filter(is_active=True).select_related('current_class'):
-        if not student.current_class:
-            logger.debug('Student %s has no current class', student.full_name)
-            student_fees.append({
-                'student': student,
-                'class_level': 'N/A',
-                'fee_amount': 0,
-            })
-            continue
-
-        # Check for student-specific fee override
-        override = StudentFeeOverride.objects.filter(
-            student=student,
-            session=session,
-            term=term
-        ).first()
-        if override:
-            fee_amount = override.amount
-            logger.debug('Using fee override for student %s: %s', student.full_name, fee_amount)
-        else:
-            # Get fee structure for the student's class level
-            fee = FeeStructure.objects.filter(
-                session=session,
-                term=term,
-                class_level=student.current_class
-            ).first()
-            fee_amount = fee.amount if fee else Decimal(0)
-            logger.debug('Using fee structure for student %s, class %s: %s',
-                         student.full_name, student.current_class.level, fee_amount)
-
-        student_fees.append({
+    fees = FeeResolver.for_term(session, term)
+    student_fees = [
+        {
             'student': student,
             'class_level': student.current_class.level if student.current_class else 'N/A',
-            'fee_amount': float(fee_amount),
-        })
+            'fee_amount': float(fees.student_fee(student)),
+        }
+        for student in parent.students.filter(is_active=True).select_related('current_class')
+    ]
 
     payments = Payment.objects.filter(
         parent=parent,
@@ -239,20 +184,11 @@ def parent_view_child_grades(request, admission_number):
         if subject_ids:
             logger.warning(f"No StudentSubject records for student {student.admission_number}, using Result subjects: {list(subject_ids)}")
 
-    try:
-        payment_status = parent.get_payment_status_for_term(selected_session, selected_term)
-        fees_paid = payment_status['status'] == 'Completed' and payment_status['amount_due'] <= 0
-    except Exception as e:
-        logger.error(f"Error fetching payment status for parent {parent.phone_number}: {e}")
-        fees_paid = False
-        payment_status = {'status': 'Pending', 'amount_paid': 0, 'amount_due': 0}
-
-    access_request = ResultAccessRequest.objects.filter(
-        student=student,
-        session=selected_session,
-        term=selected_term
-    ).first()
-    access_approved = access_request and access_request.status == 'Approved'
+    resolver = ResultAccessResolver.for_request(request)
+    term_access = resolver.get(student, selected_session, selected_term)
+    fees_paid = term_access.fees_paid
+    access_request = term_access.access_request
+    access_approved = term_access.access_approved
 
     results = []
     average_score = 0
@@ -260,6 +196,11 @@ def parent_view_child_grades(request, admission_number):
     class_position_marks = None
     total_in_section = None
 
+    summaries = {
+        (summary.session_id, summary.term): summary
+        for summary in StudentTermSummary.objects.filter(student=student)
+    }
+
     if fees_paid or access_approved:
         try:
             results = Result.objects.filter(
@@ -269,27 +210,16 @@ def parent_view_child_grades(request, admission_number):
                 subject_id__in=subject_ids
             ).select_related('subject').order_by('subject__id')
 
-            if results.exists():
-                total_scores = [r.total_score for r in results if r.total_score > 0]
-                average_score = sum(total_scores) / len(total_scores) if total_scores else 0
+            summary = summaries.get((selected_session.id, selected_term))
+            if results.exists() and summary:
+                average_score = summary.average_score
 
                 if student.current_class and student.current_class.section not in ['Nursery', 'Primary']:
-                    grade_points = [r.grade_point for r in results if r.grade_point is not None]
-                    average_grade_point = sum(grade_points) / len(grade_points) if grade_points else 0
-
-                if student.current_section:
-                    section_results = Result.objects.filter(
-                        session=selected_session,
-                        term=selected_term,
-                        student__current_section=student.current_section
-                    ).values('student__admission_number').annotate(total=Sum('total_score')).order_by('-total')
-
-                    total_in_section = section_results.count()
-                    for idx, res in enumerate(section_results, 1):
-                        if res['student__admission_number'] == student.admission_number:
-                            class_position_marks = f"{idx}{get_ordinal_suffix(idx)}"
-                            break
-            else:
+                    average_grade_point = summary.average_grade_point
+
+                class_position_marks = summary.class_position or None
+                total_in_section = summary.section_size
+            elif not results.exists():
                 logger.info(f"No results found for student {student.admission_number} in session {selected_session.name}, term {selected_term}")
         except Exception as e:
             logger.error(f"Error fetching results for student {student.admission_number}: {e}")
@@ -299,81 +229,18 @@ def parent_view_child_grades(request, admission_number):
     result_upload_date = results[0].upload_date if results and results[0].upload_date else None
 
     try:
-        past_results = Result.objects.filter(
-            student=student
-        ).exclude(
-            Q(session=selected_session, term=selected_term) |
-            Q(total_score=0)
-        ).select_related('session', 'subject').order_by('-session__start_year', 'term', 'subject__name')
-
-        past_results_grouped = []
-        for session in Session.objects.filter(
-            result__student=student
-        ).distinct().order_by('-start_year'):
-            for term in ['1', '2', '3']:
-                if session == selected_session and term == selected_term:
-                    continue
-
-                group_results = [r for r in past_results if r.session == session and r.term == term]
-                if not group_results:
-                    continue
-
-                class_history = StudentClassHistory.objects.filter(
-                    student=student,
-                    session=session,
-                    term=term
-                ).select_related('class_level', 'section').first()
-                class_level = class_history.class_level.level if class_history and class_history.class_level else 'N/A'
-                section_suffix = class_history.section.suffix if class_history and class_history.section else 'N/A'
-
-                past_payment_status = parent.get_payment_status_for_term(session, term)
-                past_fees_paid = past_payment_status['status'] == 'Completed' and past_payment_status['amount_due'] <= 0
-
-                past_access_request = ResultAccessRequest.objects.filter(
-                    student=student,
-                    session=session,
-                    term=term,
-                    status='Approved'
-                ).first()
-                has_access = past_fees_paid or past_access_request
-
-                total_scores = [r.total_score for r in group_results if r.total_score > 0]
-                avg_score = sum(total_scores) / len(total_scores) if total_scores else 0
-
-                avg_grade_point = None
-                if student.current_class and student.current_class.section not in ['Nursery', 'Primary']:
-                    grade_points = [r.grade_point for r in group_results if r.grade_point is not None]
-                    avg_grade_point = sum(grade_points) / len(grade_points) if grade_points else 0
-
-                class_pos = None
-                total_in_sec = None
-                if student.current_section:
-                    past_section_results = Result.objects.filter(
-                        session=session,
-                        term=term,
-                        student__current_section=student.current_section
-                    ).values('student__admission_number').annotate(total=Sum('total_score')).order_by('-total')
-                    total_in_sec = past_section_results.count()
-                    for idx, res in enumerate(past_section_results, 1):
-                        if res['student__admission_number'] == student.admission_number:
-                            class_pos = f"{idx}{get_ordinal_suffix(idx)}"
-                            break
-
-                past_results_grouped.append({
-                    'session': session,
-                    'term': term,
-                    'term_display': dict(TERM_CHOICES).get(term, term),
-                    'results': group_results,
-                    'fees_paid': past_fees_paid,
-                    'has_access': has_access,
-                    'access_request': past_access_request,
-                    'average_score': avg_score,
-                    'average_grade_point': avg_grade_point,
-                    'class_position': class_pos,
-                    'total_in_section': total_in_sec,
-                    'class_level': class_level,
-                    'section_suffix': section_suffix
-                })
+        past_results_grouped = load_result_history(
+            student,
+            exclude=(selected_session, selected_term),
+            resolver=resolver
+        )
+        has_gp = student.current_class and student.current_class.section not in ['Nursery', 'Primary']
+        for group in past_results_grouped:
+            group['class_position'] = group['class_position'] or None
+            if not has_gp:
+                group['average_grade_point'] = None
+            if not group['summary']:
+                group['total_in_section'] = None
     except Exception as e:
         logger.error(f"Error fetching past results for student {student.admission_number}: {e}")
         past_results_grouped = []
@@ -441,8 +308,7 @@ def parent_request_result_access(request, admission_number):
         logger.error(f"Invalid term {term} for student {student.admission_number}")
         return JsonResponse({'success': False, 'error': 'Invalid term'}, status=400)
 
-    payment_status = parent.get_payment_status_for_term(session, term)
-    if payment_status['status'] == 'Completed' and payment_status['amount_due'] <= 0:
+    if ResultAccessResolver.for_request(request).get(student, session, term).fees_paid:
         logger.info(f"Fees already paid for student {student.admission_number}, session {session.name}, term {term}")
         return JsonResponse({'success': False, 'error': 'Fees already paid, access is granted'}, status=400)
 
@@ -485,34 +351,15 @@ def parent_export_current_results_pdf(request, admission_number):
         return redirect('parent_view_children')
 
     current_session, current_term = get_current_session_term()
-    is_nursery = student.current_class and student.current_class.section == 'Nursery'
-    is_primary = student.current_class and student.current_class.section == 'Primary'
 
-    student_subjects = StudentSubject.objects.filter(
-        student=student,
-        session=current_session,
-        term=current_term
-    ).select_related('subject')
-    subject_ids = list(student_subjects.values_list('subject__id', flat=True))
+    if not ResultAccessResolver.for_request(request).has_access(student, current_session, current_term):
+        messages.error(request, 'Results for this term are not available until fees are paid or access is approved.')
+        return redirect('parent_view_child_grades', admission_number=admission_number)
 
-    results = Result.objects.filter(
-        student=student,
-        session=current_session,
-        term=current_term,
-        subject__id__in=subject_ids
-    ).select_related('subject').order_by('subject__name')
-
-    pdf_buffer = generate_result_pdf(
-        student,
-        results,
-        current_session,
-        current_term,
-        is_nursery=is_nursery,
-        is_primary=is_primary
-    )
+    pdf = report_card_pdf(student, current_session, current_term)
 
     filename = f"Results_{student.full_name}_{current_session.name}_Term{current_term}.pdf"
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
@@ -535,33 +382,13 @@ def parent_export_past_results_pdf(request, admission_number, session_id, term):
         messages.error(request, 'Session not found')
         return redirect('parent_view_child_grades', admission_number=admission_number)
 
-    is_nursery = student.current_class and student.current_class.section == 'Nursery'
-    is_primary = student.current_class and student.current_class.section == 'Primary'
-
-    student_subjects = StudentSubject.objects.filter(
-        student=student,
-        session=session,
-        term=term
-    ).select_related('subject')
-    subject_ids = list(student_subjects.values_list('subject__id', flat=True))
+    if not ResultAccessResolver.for_request(request).has_access(student, session, term):
+        messages.error(request, 'Results for this term are not available until fees are paid or access is approved.')
+        return redirect('parent_view_child_grades', admission_number=admission_number)
 
-    results = Result.objects.filter(
-        student=student,
-        session=session,
-        term=term,
-        subject__id__in=subject_ids
-    ).select_related('subject').order_by('subject__name')
-
-    pdf_buffer = generate_result_pdf(
-        student,
-        results,
-        session,
-        term,
-        is_nursery=is_nursery,
-        is_primary=is_primary
-    )
+    pdf = report_card_pdf(student, session, term)
 
     filename = f"Results_{student.full_name}_{session.name}_Term{term}.pdf"
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
\ No newline at end of file
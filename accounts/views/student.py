@@ -4,12 +4,13 @@ from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
-from django.db.models import Sum, Q
 
-from accounts.utils.pdf_generator import generate_result_pdf
-from accounts.utils.index import get_next_term_start_date, get_ordinal_suffix
+from accounts.utils.report_card_cache import report_card_pdf
+from accounts.utils.result_access import ResultAccessResolver
+from accounts.utils.result_history import load_result_history
+from accounts.utils.index import get_next_term_start_date
 from accounts.decorators import student_required
-from accounts.models import ResultAccessRequest, Student, Result, Payment, Session, TERM_CHOICES, StudentClassHistory, StudentSubject
+from accounts.models import ResultAccessRequest, Student, Result, Session, TERM_CHOICES, StudentSubject, StudentTermSummary
 
 from .base import get_current_session_term, get_user_context, logger
 
@@ -114,27 +115,12 @@ def student_grades(request):
     is_nursery = student.current_class and student.current_class.section == 'Nursery'
     is_primary = student.current_class and student.current_class.section == 'Primary'
 
-    # Check payment status for the selected session and term
-    fees_paid = False
-    if student.parent:
-        fees_paid = Payment.objects.filter(
-            parent=student.parent,
-            session=selected_session,
-            term=selected_term,
-            status='Completed'
-        ).exists()
-    logger.debug(f"Fees paid for student {student.full_name} by parent {student.parent.phone_number if student.parent else 'None'}: {fees_paid}")
-
-    access_approved = False
-    access_request = None
-    if not fees_paid:
-        access_request = ResultAccessRequest.objects.filter(
-            student=student,
-            session=selected_session,
-            term=selected_term
-        ).first()
-        access_approved = access_request and access_request.status == 'Approved'
-    logger.debug(f"Access request status: {access_request.status if access_request else 'None'}, Approved: {access_approved}")
+    resolver = ResultAccessResolver.for_request(request)
+    term_access = resolver.get(student, selected_session, selected_term)
+    fees_paid = term_access.fees_paid
+    access_request = None if fees_paid else term_access.access_request
+    access_approved = term_access.access_approved
+    logger.debug(f"Fees paid: {fees_paid}, access request status: {access_request.status if access_request else 'None'}, Approved: {access_approved}")
 
     # Get subjects for the selected session and term
     student_subjects = StudentSubject.objects.filter(
@@ -167,6 +153,11 @@ def student_grades(request):
     total_in_section = 0
     overall_remark = None
 
+    summaries = {
+        (summary.session_id, summary.term): summary
+        for summary in StudentTermSummary.objects.filter(student=student)
+    }
+
     if (fees_paid or access_approved) and subject_ids:
         existing_results = Result.objects.filter(
             student=student,
@@ -204,119 +195,24 @@ def student_grades(request):
             if latest_result and latest_result.upload_date:
                 result_upload_date = latest_result.upload_date
 
-            valid_results = [r for r in results if r.total_score > 0]
-            if valid_results:
-                average_score = sum(r.total_score for r in valid_results) / len(valid_results)
-                average_grade_point = (
-                    sum(r.grade_point for r in valid_results if r.grade_point is not None) / len(valid_results)
-                    if any(r.grade_point is not None for r in valid_results)
-                    else 0.0
-                )
-            else:
-                average_score = 0.0
-                average_grade_point = 0.0
-
-            if student.current_section:
-                section_results = Result.objects.filter(
-                    session=selected_session,
-                    term=selected_term,
-                    student__current_section=student.current_section
-                ).values('student__admission_number').annotate(total=Sum('total_score')).order_by('-total')
-
-                total_in_section = section_results.count()
-                for idx, res in enumerate(section_results, 1):
-                    if res['student__admission_number'] == student.admission_number:
-                        class_position_marks = f"{idx}{get_ordinal_suffix(idx)}"
-                        class_position_gp = class_position_marks if not (is_nursery or is_primary) else '-'
-                        break
+            summary = summaries.get((selected_session.id, selected_term))
+            if summary:
+                average_score = summary.average_score
+                average_grade_point = summary.average_grade_point
+                class_position_marks = summary.class_position or '-'
+                if not (is_nursery or is_primary):
+                    class_position_gp = summary.class_position_gp or '-'
+                total_in_section = summary.section_size
 
     # Past results for all sessions/terms except the selected one
-    past_results = Result.objects.filter(
-        student=student
-    ).exclude(
-        Q(session=selected_session, term=selected_term) |
-        Q(total_score=0)
-    ).select_related('subject', 'session').order_by('-session__start_year', 'term', 'subject__name')
-
-    past_results_grouped = []
-    for session in Session.objects.filter(
-        result__student=student
-    ).distinct().order_by('-start_year'):
-        for term in ['1', '2', '3']:
-            if session == selected_session and term == selected_term:
-                continue
-
-            term_results = [r for r in past_results if r.session == session and r.term == term]
-            if not term_results:
-                continue
-
-            class_history = StudentClassHistory.objects.filter(
-                student=student,
-                session=session,
-                term=term
-            ).select_related('class_level', 'section').first()
-            class_level = class_history.class_level.level if class_history and class_history.class_level else 'N/A'
-            section_suffix = class_history.section.suffix if class_history and class_history.section else 'N/A'
-
-            term_fees_paid = False
-            if student.parent:
-                term_fees_paid = Payment.objects.filter(
-                    parent=student.parent,
-                    session=session,
-                    term=term,
-                    status='Completed'
-                ).exists()
-
-            term_access_approved = False
-            term_access_request = None
-            if not term_fees_paid:
-                term_access_request = ResultAccessRequest.objects.filter(
-                    student=student,
-                    session=session,
-                    term=term
-                ).first()
-                term_access_approved = term_access_request and term_access_request.status == 'Approved'
-
-            term_valid_results = [r for r in term_results if r.total_score > 0]
-            term_avg_score = sum(r.total_score for r in term_valid_results) / len(term_valid_results) if term_valid_results else 0
-            term_avg_gp = (
-                sum(r.grade_point for r in term_valid_results if r.grade_point is not None) / len(term_valid_results)
-                if term_valid_results and any(r.grade_point is not None for r in term_valid_results)
-                else 0
-            ) if not (is_nursery or is_primary) else None
-
-            term_total_in_section = 0
-            term_class_position = '-'
-            term_class_position_gp = '-'
-            if student.current_section:
-                past_section_results = Result.objects.filter(
-                    session=session,
-                    term=term,
-                    student__current_section=student.current_section
-                ).values('student__admission_number').annotate(total=Sum('total_score')).order_by('-total')
-                term_total_in_section = past_section_results.count()
-                for idx, res in enumerate(past_section_results, 1):
-                    if res['student__admission_number'] == student.admission_number:
-                        term_class_position = f"{idx}{get_ordinal_suffix(idx)}"
-                        term_class_position_gp = term_class_position if not (is_nursery or is_primary) else '-'
-                        break
-
-            past_results_grouped.append({
-                'session': session,
-                'term': term,
-                'term_display': dict(TERM_CHOICES).get(term),
-                'results': term_results,
-                'has_access': term_fees_paid or term_access_approved,
-                'fees_paid': term_fees_paid,
-                'access_request': term_access_request,
-                'average_score': term_avg_score,
-                'average_grade_point': term_avg_gp,
-                'class_position': term_class_position,
-                'class_position_gp': term_class_position_gp,
-                'total_in_section': term_total_in_section,
-                'class_level': class_level,
-                'section_suffix': section_suffix
-            })
+    past_results_grouped = load_result_history(student, exclude=(selected_session, selected_term), resolver=resolver)
+    for group in past_results_grouped:
+        group['class_position'] = group['class_position'] or '-'
+        if is_nursery or is_primary:
+            group['average_grade_point'] = None
+            group['class_position_gp'] = '-'
+        else:
+            group['class_position_gp'] = group['class_position_gp'] or '-'
 
     context.update({
         'results': results,
@@ -357,35 +253,15 @@ def student_grades(request):
 def export_current_term_results_pdf(request):
     student = request.user.student
     current_session, current_term = get_current_session_term()
+
+    if not ResultAccessResolver.for_request(request).has_access(student, current_session, current_term):
+        messages.error(request, 'Results for this term are not available until fees are paid or access is approved.')
+        return redirect('student_grades')
     
-    is_nursery = student.current_class and student.current_class.section == 'Nursery'
-    is_primary = student.current_class and student.current_class.section == 'Primary'
-    
-    student_subjects = StudentSubject.objects.filter(
-        student=student,
-        session=current_session,
-        term=current_term
-    ).select_related('subject')
-    subject_ids = list(student_subjects.values_list('subject__id', flat=True))
-    
-    results = Result.objects.filter(
-        student=student,
-        session=current_session,
-        term=current_term,
-        subject__id__in=subject_ids
-    ).select_related('subject').order_by('subject__name')
-    
-    pdf_buffer = generate_result_pdf(
-        student, 
-        results, 
-        current_session, 
-        current_term,
-        is_nursery=is_nursery,
-        is_primary=is_primary
-    )
-    
+    pdf = report_card_pdf(student, current_session, current_term)
+
     filename = f"Results_{student.full_name}_{current_session.name}_Term{current_term}.pdf"
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
@@ -398,35 +274,15 @@ def export_past_term_results_pdf(request, session_id, term):
     except Session.DoesNotExist:
         messages.error(request, 'Session not found')
         return redirect('student_grades')
+
+    if not ResultAccessResolver.for_request(request).has_access(student, session, term):
+        messages.error(request, 'Results for this term are not available until fees are paid or access is approved.')
+        return redirect('student_grades')
     
-    is_nursery = student.current_class and student.current_class.section == 'Nursery'
-    is_primary = student.current_class and student.current_class.section == 'Primary'
-    
-    student_subjects = StudentSubject.objects.filter(
-        student=student,
-        session=session,
-        term=term
-    ).select_related('subject')
-    subject_ids = list(student_subjects.values_list('subject__id', flat=True))
-    
-    results = Result.objects.filter(
-        student=student,
-        session=session,
-        term=term,
-        subject__id__in=subject_ids
-    ).select_related('subject').order_by('subject__name')
-    
-    pdf_buffer = generate_result_pdf(
-        student, 
-        results, 
-        session, 
-        term,
-        is_nursery=is_nursery,
-        is_primary=is_primary
-    )
-    
+    pdf = report_card_pdf(student, session, term)
+
     filename = f"Results_{student.full_name}_{session.name}_Term{term}.pdf"
-    response = HttpResponse(pdf_buffer, content_type='application/pdf')
+    response = HttpResponse(pdf, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
@@ -450,16 +306,9 @@ def student_request_result_access(request):
         logger.error(f"Invalid term {term} for student {student.admission_number}")
         return JsonResponse({'success': False, 'error': 'Invalid term'}, status=400)
 
-    if student.parent:
-        payment_status = Payment.objects.filter(
-            parent=student.parent,
-            session=session,
-            term=term,
-            status='Completed'
-        ).exists()
-        if payment_status:
-            logger.info(f"Fees already paid for student {student.admission_number}, session {session.name}, term {term}")
-            return JsonResponse({'success': False, 'error': 'Fees already paid, access is granted'}, status=400)
+    if ResultAccessResolver.for_request(request).get(student, session, term).fees_paid:
+        logger.info(f"Fees already paid for student {student.admission_number}, session {session.name}, term {term}")
+        return JsonResponse({'success': False, 'error': 'Fees already paid, access is granted'}, status=400)
 
     try:
         access_request, created = ResultAccessRequest.objects.get_or_create(
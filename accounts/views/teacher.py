@@ -1,3 +1,5 @@
+import json
+
 from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -12,6 +14,11 @@ from django.core.paginator import Paginator
 from accounts.decorators import teacher_required
 from accounts.models import Student, Result, SchoolClass, Subject, Notification, Session, ClassSection, TERM_CHOICES, StudentSubject
 
+from accounts.utils.broadsheet import build_class_broadsheet
+from accounts.utils.positions import mark_positions_dirty, positions_are_stale
+from accounts.utils.ranking import NON_GP_SECTIONS, rank_class_positions, rank_subject_positions
+from accounts.utils.score_entry import ScoreBatchWriter, score_limits
+
 from .base import get_current_session_term, get_user_context, logger
 
 @login_required
@@ -99,117 +106,9 @@ def teacher_view_class_results(request):
     if term not in [t[0] for t in TERM_CHOICES]:
         term = current_term
     
-    # Update positions before displaying
-    update_class_positions(selected_section, current_session, term)
-    first_student = Student.objects.filter(current_section=selected_section).first()
-    if first_student:
-        update_subject_positions(first_student, current_session, term)
-
-    students = Student.objects.filter(
-        current_section=selected_section,
-        is_active=True
-    ).order_by('surname', 'first_name', 'middle_name')
-
-    all_subjects = Subject.objects.filter(
-        school_class=selected_section.school_class,
-        is_active=True
-    ).order_by('id')
+    broadsheet = build_class_broadsheet(selected_section, current_session, term)
 
-    detailed_student_results = []
-    for student in students:
-        student_subjects = StudentSubject.objects.filter(
-            student=student,
-            session=current_session,
-            term=term,
-            subject__is_active=True
-        ).select_related('subject')
-        student_subject_ids = list(student_subjects.values_list('subject__id', flat=True))
-        
-        if not student_subject_ids:
-            result_subjects = Result.objects.filter(
-                student=student,
-                session=current_session,
-                term=term,
-                subject__is_active=True
-            ).values_list('subject__id', flat=True).distinct()
-            student_subject_ids = list(result_subjects)
-        
-        student_results = Result.objects.filter(
-            student=student,
-            session=current_session,
-            term=term,
-            subject__id__in=student_subject_ids
-        ).select_related('subject')
-
-        results_dict = {}
-        total_score = 0
-        subjects_count = len(student_subject_ids)
-        has_complete_results = True
-
-        for subject in all_subjects:
-            result = student_results.filter(subject=subject).first()
-            is_assigned = subject.id in student_subject_ids
-            is_complete = result and result.total_score > 0
-
-            results_dict[subject.id] = {
-                'result_obj': result,
-                'is_complete': is_complete,
-                'is_assigned': is_assigned
-            }
-
-            if is_assigned and is_complete:
-                total_score += result.total_score
-            elif is_assigned and not is_complete:
-                has_complete_results = False
-        
-        average_score = round(total_score / subjects_count, 2) if subjects_count > 0 and has_complete_results else 0
-        class_position = student_results.first().class_position if student_results.exists() and has_complete_results else None
-
-        student_data = {
-            'student': student,
-            'results': results_dict,
-            'total_score': total_score,
-            'subjects_count': subjects_count,
-            'has_complete_results': has_complete_results,
-            'average_score': average_score,
-            'class_position': class_position,
-            'assigned_subject_ids': student_subject_ids,
-            'remarks': student_results.first().remarks if student_results.exists() else ''
-        }
-        detailed_student_results.append(student_data)
-
-    def get_position_rank(position):
-        if not position:
-            return float('inf')  
-        try:
-            return int(position[:-2]) if position[:-2].isdigit() else float('inf')
-        except:
-            return float('inf')
-
-    detailed_student_results.sort(key=lambda x: (-x['average_score'], get_position_rank(x['class_position'])))
-
-    class_averages = {}
-    for subject in all_subjects:
-        subject_results = Result.objects.filter(
-            student__in=students,
-            session=current_session,
-            term=term,
-            subject=subject,
-            total_score__gt=0
-        )
-        count = subject_results.count()
-        class_averages[subject.id] = {
-            'average': sum(r.total_score for r in subject_results) / count if count > 0 else 0,
-            'count': count
-        }
-
-    complete_students = [s for s in detailed_student_results if s['has_complete_results']]
-    class_average_score = (
-        sum(s['average_score'] for s in complete_students) / len(complete_students)
-        if complete_students else 0
-    )
-    
-    paginator = Paginator(detailed_student_results, 10)
+    paginator = Paginator(broadsheet['rows'], 10)
     page_number = request.GET.get('page', 1)
     try:
         page_obj = paginator.page(page_number)
@@ -222,15 +121,16 @@ def teacher_view_class_results(request):
         'current_session': current_session,
         'current_term': current_term,
         'selected_term': term,
-        'subjects': all_subjects,
+        'subjects': broadsheet['subjects'],
         'student_results': page_obj,
         'page_obj': page_obj,
-        'class_averages': class_averages,
+        'class_averages': broadsheet['class_averages'],
         'is_nursery': selected_section.school_class.section == 'Nursery',
         'is_primary': selected_section.school_class.section == 'Primary',
-        'total_students': students.count(),
-        'students_with_complete_results': len(complete_students),
-        'class_average_score': class_average_score,
+        'total_students': broadsheet['total_students'],
+        'students_with_complete_results': broadsheet['students_with_complete_results'],
+        'class_average_score': broadsheet['class_average_score'],
+        'positions_pending': positions_are_stale(selected_section, current_session, term),
         'terms': TERM_CHOICES,
     })
 
@@ -269,14 +169,12 @@ def assign_student_to_section(request):
                 student.save()
                 
                 
-                update_subject_positions(student, current_session, current_term)
-                update_class_positions(section, current_session, current_term)
-                logger.info(f"Assigned {student.full_name} to {section}. Updated positions.")
+                mark_positions_dirty(section.id, current_session.id, current_term)
+                logger.info(f"Assigned {student.full_name} to {section}. Positions marked for recompute.")
                 
                 
                 if old_section and old_section != section:
-                    update_class_positions(old_section, current_session, current_term)
-                    logger.info(f"Updated positions for old section {old_section} after removing {student.full_name}")
+                    mark_positions_dirty(old_section.id, current_session.id, current_term)
                 
                 return JsonResponse({
                     'success': True,
@@ -333,8 +231,8 @@ def remove_student_from_section(request):
                     student.save()
                     
                     
-                    update_class_positions(old_section, current_session, current_term)
-                    logger.info(f"Removed {student.full_name} from {old_section}. Updated positions.")
+                    mark_positions_dirty(old_section.id, current_session.id, current_term)
+                    logger.info(f"Removed {student.full_name} from {old_section}. Positions marked for recompute.")
                     
                     return JsonResponse({
                         'success': True,
@@ -472,130 +370,31 @@ def teacher_manage_subjects(request):
     return render(request, 'account/teacher/manage_student_subjects.html', context)
 
 def update_subject_positions(student, session, term):
-    """Update subject positions for a student's section in real-time, handling ties."""
-    if not student.current_section:
+    """Update subject positions for a student's section, handling ties."""
+    if not student.current_section_id:
         logger.debug(f"No section assigned for student {student.full_name}")
         return
 
-    with transaction.atomic():
-        section = ClassSection.objects.get(id=student.current_section.id)
-        students = Student.objects.filter(current_section=section)
-        
-        student_subjects = StudentSubject.objects.filter(
-            student__in=students,
-            session=session,
-            term=term,
-            subject__is_active=True
-        ).select_related('subject')
-        subject_ids = list(student_subjects.values_list('subject__id', flat=True).distinct())
-
-        results = Result.objects.filter(
-            student__in=students,
-            session=session,
-            term=term,
-            subject__id__in=subject_ids
-        ).select_related('student', 'subject')
-
-        results_by_subject = {}
-        for result in results:
-            subject_id = result.subject_id
-            if subject_id not in results_by_subject:
-                results_by_subject[subject_id] = []
-            results_by_subject[subject_id].append(result)
-
-        position_updates = []
-        for subject_id, subject_results in results_by_subject.items():
-            sorted_results = sorted(subject_results, key=lambda r: r.total_score, reverse=True)
-            prev_score = None
-            rank = 0
-            for idx, result in enumerate(sorted_results, 1):
-                if round(result.total_score, 2) != prev_score:  
-                    rank = idx
-                    prev_score = round(result.total_score, 2)
-                suffix = 'th' if 10 <= rank % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(rank % 10, 'th')
-                result.subject_position = f"{rank}{suffix}"
-                position_updates.append(result)
-
-        if position_updates:
-            Result.objects.bulk_update(position_updates, ['subject_position'])
-            logger.debug(f"Updated subject positions for section {section}")
+    rank_subject_positions(student.current_section_id, session.pk, term)
+    logger.debug(f"Updated subject positions for section {student.current_section_id}")
 
 def update_class_positions(section, session, term):
-    """Update class positions for a section in real-time, handling ties correctly."""
+    """Update class positions for a section, handling ties."""
     if not section:
         logger.debug("No section provided for class position update")
         return
 
-    with transaction.atomic():
-        students = Student.objects.filter(current_section=section)
-        if not students.exists():
-            logger.debug(f"No students in section {section}")
-            return
-
-        student_subjects = StudentSubject.objects.filter(
-            student__in=students,
-            session=session,
-            term=term,
-            subject__is_active=True
-        ).select_related('subject')
-        subject_ids = list(student_subjects.values_list('subject__id', flat=True).distinct())
-
-        results = Result.objects.filter(
-            student__in=students,
-            session=session,
-            term=term,
-            subject__id__in=subject_ids
-        ).select_related('student', 'subject')
-
-        student_averages = []
-        for student in students:
-            student_results = [r for r in results if r.student_id == student.pk and r.total_score > 0]
-            if student_results:
-                avg_marks = sum(r.total_score for r in student_results) / len(student_results)
-                avg_gp = (
-                    sum(r.grade_point for r in student_results if r.grade_point is not None) / len(student_results)
-                    if any(r.grade_point is not None for r in student_results)
-                    else 0.0
-                )
-                student_averages.append({
-                    'student_id': student.pk,
-                    'avg_marks': round(avg_marks, 2),  
-                    'avg_gp': avg_gp,
-                    'results': student_results
-                })
+    with_gp = section.school_class.section not in NON_GP_SECTIONS
+    rank_class_positions(section.pk, session.pk, term, with_gp=with_gp)
+    logger.debug(f"Updated class positions for section {section}")
 
-        position_updates = []
-        if student_averages:
-            
-            sorted_by_marks = sorted(student_averages, key=lambda x: x['avg_marks'], reverse=True)
-            prev_avg = None
-            rank = 0
-            for idx, s in enumerate(sorted_by_marks, 1):
-                if s['avg_marks'] != prev_avg:
-                    rank = idx
-                    prev_avg = s['avg_marks']
-                suffix = 'th' if 10 <= rank % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(rank % 10, 'th')
-                for result in s['results']:
-                    result.class_position = f"{rank}{suffix}"
-                    position_updates.append(result)
-
-            
-            if section.school_class.section not in ['Nursery', 'Primary']:
-                sorted_by_gp = sorted(student_averages, key=lambda x: x['avg_gp'], reverse=True)
-                prev_avg_gp = None
-                rank_gp = 0
-                for idx, s in enumerate(sorted_by_gp, 1):
-                    if s['avg_gp'] != prev_avg_gp:
-                        rank_gp = idx
-                        prev_avg_gp = s['avg_gp']
-                    suffix = 'th' if 10 <= rank_gp % 100 <= 20 else {1: 'st', 2: 'nd', 3: 'rd'}.get(rank_gp % 10, 'th')
-                    for result in s['results']:
-                        result.class_position_gp = f"{rank_gp}{suffix}"
-                        position_updates.append(result)
-
-        if position_updates:
-            Result.objects.bulk_update(position_updates, ['class_position', 'class_position_gp'])
-            logger.debug(f"Updated class positions for section {section}")
+def get_term_end_date(session, term):
+    return timezone.datetime.strptime(
+        {
+            '1': f"{session.end_year}-12-31",
+            '2': f"{session.end_year}-04-30",
+            '3': f"{session.end_year}-08-31",
+        }.get(term), "%Y-%m-%d").date()
 
 @login_required
 @teacher_required
@@ -618,12 +417,7 @@ def update_result(request, admission_number):
     
     current_session, current_term = get_current_session_term()
     
-    term_end_date = timezone.datetime.strptime(
-        {
-            '1': f"{current_session.end_year}-12-31",
-            '2': f"{current_session.end_year}-04-30",
-            '3': f"{current_session.end_year}-08-31",
-        }.get(current_term), "%Y-%m-%d").date()
+    term_end_date = get_term_end_date(current_session, current_term)
     is_editable = timezone.now().date() <= term_end_date
     
     student_subjects = StudentSubject.objects.filter(
@@ -760,13 +554,10 @@ def update_result(request, admission_number):
                 if result_updated:
                     result.upload_date = timezone.now()
                     result.uploaded_by = teacher
-                    result.save()
+                    result.save(section=student.current_class.section)
                     updates_made = True
             
             if updates_made:
-                update_subject_positions(student, current_session, current_term)
-                update_class_positions(student.current_section, current_session, current_term)
-                
                 messages.success(request, f'Results updated for {student.full_name}.')
                 
                 Notification.objects.create(
@@ -809,6 +600,150 @@ def update_result(request, admission_number):
     
     return render(request, 'account/teacher/update_result.html', context)
 
+def _score_entry_rows(request):
+    """
+    Score rows from a JSON body ({"scores": [{"admission_number": ..., "subject_id": ..., "ca": ...}]})
+    or from grid form fields named cell__<admission_number>__<subject_id>__<field>
+    with one remarks__<admission_number> field per student.
+
+    Returns (rows, errors): grid fields whose names do not have that shape are
+    skipped and reported in `errors`, shaped like ScoreBatchWriter.errors.
+    Raises ValueError for a JSON body that is not a list of score objects.
+    """
+    if request.content_type == 'application/json':
+        payload = json.loads(request.body or b'{}')
+        scores = payload.get('scores', []) if isinstance(payload, dict) else None
+        if not isinstance(scores, list):
+            raise ValueError('scores must be a list')
+        if not all(isinstance(row, dict) for row in scores):
+            raise ValueError('each score must be an object')
+        return scores, []
+
+    rows = {}
+    remarks = {}
+    errors = []
+    for key, value in request.POST.items():
+        if key.startswith('cell__'):
+            parts = key[len('cell__'):].rsplit('__', 2)
+            if len(parts) != 3 or not all(parts):
+                errors.append({
+                    'line': None, 'admission_number': None, 'subject_id': None, 'field': key,
+                    'error': f'Unrecognised score cell {key}',
+                })
+                continue
+            admission_number, subject_id, field = parts
+            row = rows.setdefault((admission_number, subject_id), {
+                'admission_number': admission_number,
+                'subject_id': subject_id,
+            })
+            row[field] = value
+        elif key.startswith('remarks__'):
+            remarks[key[len('remarks__'):]] = value.strip()
+    for (admission_number, _), row in rows.items():
+        if remarks.get(admission_number):
+            row['remarks'] = remarks[admission_number]
+    return list(rows.values()), errors
+
+@login_required
+@teacher_required
+def teacher_section_score_entry(request):
+    context = get_user_context(request)
+    if not context:
+        return redirect('login')
+
+    teacher = context['teacher']
+    current_session, current_term = get_current_session_term()
+    wants_json = request.content_type == 'application/json' or request.headers.get('x-requested-with') == 'XMLHttpRequest'
+
+    teacher_sections = teacher.assigned_sections.filter(
+        session=current_session,
+        is_active=True
+    ).select_related('school_class')
+
+    if not teacher_sections.exists():
+        messages.warning(request, 'You are not currently assigned to any class sections.')
+        return redirect('teacher_view_students')
+
+    section_id = request.GET.get('section') or request.POST.get('section')
+    selected_section = teacher_sections.first()
+    if section_id:
+        try:
+            selected_section = teacher_sections.get(id=section_id)
+        except (ClassSection.DoesNotExist, ValueError):
+            if wants_json:
+                return JsonResponse({'error': 'Invalid class section selected.'}, status=400)
+            messages.error(request, 'Invalid class section selected.')
+            return redirect('teacher_section_score_entry')
+
+    term_end_date = get_term_end_date(current_session, current_term)
+    is_editable = timezone.now().date() <= term_end_date
+    section_url = f"{reverse('teacher_section_score_entry')}?section={selected_section.id}"
+    students = Student.objects.filter(current_section=selected_section, is_active=True)
+
+    if request.method == 'POST':
+        if not is_editable:
+            if wants_json:
+                return JsonResponse({'error': 'Results cannot be edited after the term has ended.'}, status=403)
+            messages.error(request, 'Results cannot be edited after the term has ended.')
+            return redirect(section_url)
+        try:
+            rows, cell_errors = _score_entry_rows(request)
+        except ValueError as e:
+            if wants_json:
+                return JsonResponse({'error': f'Invalid JSON payload: {e}'}, status=400)
+            messages.error(request, 'The scores could not be read; please reload the page and try again.')
+            return redirect(section_url)
+
+        writer = ScoreBatchWriter(current_session, current_term, students, teacher=teacher)
+        writer.errors.extend(cell_errors)
+        with transaction.atomic():
+            writer.write(rows)
+            writer.finish()
+            if writer.changed_students:
+                term_name = dict(TERM_CHOICES).get(current_term)
+                Notification.objects.bulk_create([
+                    Notification(
+                        user_id=writer.students[pk].user_id,
+                        message=f"Your results for {current_session.name} Term {term_name} have been updated."
+                    )
+                    for pk in writer.changed_students
+                    if writer.students[pk].user_id
+                ])
+
+        if wants_json:
+            return JsonResponse({
+                'created': writer.created,
+                'updated': writer.updated,
+                'errors': writer.errors,
+            })
+        saved = writer.created + writer.updated
+        if saved:
+            messages.success(request, f'{saved} result(s) saved for {selected_section}.')
+        elif not writer.errors:
+            messages.info(request, 'No changes made.')
+        for error in writer.errors[:20]:
+            if error['admission_number'] is None:
+                messages.error(request, error['error'])
+            else:
+                messages.error(request, f"{error['admission_number']} / subject {error['subject_id']}: {error['error']}")
+        if len(writer.errors) > 20:
+            messages.error(request, f'{len(writer.errors) - 20} more cell(s) were rejected.')
+        return redirect(section_url)
+
+    broadsheet = build_class_broadsheet(selected_section, current_session, current_term)
+    context.update({
+        'teacher_sections': teacher_sections,
+        'selected_section': selected_section,
+        'current_session': current_session,
+        'current_term': current_term,
+        'subjects': broadsheet['subjects'],
+        'rows': sorted(broadsheet['rows'], key=lambda row: row['student'].full_name),
+        'score_fields': list(score_limits(selected_section.school_class.section).items()),
+        'is_editable': is_editable,
+        'term_end_date': term_end_date,
+    })
+    return render(request, 'account/teacher/section_score_entry.html', context)
+
 @login_required
 @teacher_required
 def teacher_view_student_past_results(request, admission_number):
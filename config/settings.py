@@ -154,8 +154,18 @@ if all([os.environ.get('CLOUDINARY_CLOUD_NAME'),
         os.environ.get('CLOUDINARY_API_KEY'), 
         os.environ.get('CLOUDINARY_API_SECRET')]):
     DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+    # Files produced by background tasks (PDF, ZIP) are not images.
+    TASK_FILE_STORAGE = 'cloudinary_storage.storage.RawMediaCloudinaryStorage'
+    TASK_FILE_STORAGE_SHARED = True
 else:
     DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+    TASK_FILE_STORAGE = DEFAULT_FILE_STORAGE
+    # A worker on another instance cannot hand local files to the web service; set this only when
+    # MEDIA_ROOT is a disk both mount. process_tasks refuses to start without shared task storage.
+    TASK_FILE_STORAGE_SHARED = os.environ.get('TASK_FILE_STORAGE_SHARED', '') == 'true'
+
+# Task output files are deleted this many seconds after their task finishes.
+TASK_FILE_RETENTION = int(os.environ.get('TASK_FILE_RETENTION', 7 * 24 * 60 * 60))
 
 cloudinary.config( 
   cloud_name=os.environ.get('CLOUDINARY_CLOUD_NAME', 'dummy_cloud_name'),
@@ -167,7 +177,21 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Rendered report card PDFs, shared by every worker process on the instance.
+    'report_cards': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('REPORT_CARD_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'report_cards')),
+        'TIMEOUT': 30 * 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    # Rendered payment receipts, keyed on the payment's updated_at. A stored receipt never changes, so they do not expire.
+    'receipts': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('RECEIPT_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'receipts')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
 }
 
 LOGGING = {
@@ -186,6 +210,29 @@ LOGGING = {
 
 NEXT_TERM_START_DATE = "April 26, 2025"
 
+# How stale class positions are recomputed after score changes:
+# 'coalescer' (background thread per process), 'worker' (process_tasks) or 'immediate'.
+POSITION_RECOMPUTE = os.environ.get('POSITION_RECOMPUTE', 'coalescer')
+POSITION_RECOMPUTE_DEBOUNCE = int(os.environ.get('POSITION_RECOMPUTE_DEBOUNCE', 20))
+POSITION_RECOMPUTE_MAX_DELAY = int(os.environ.get('POSITION_RECOMPUTE_MAX_DELAY', 120))
+
+# Where queued background tasks run: 'worker' (python manage.py process_tasks, see Procfile and
+# render.yaml) or 'immediate' (in the web process once the enqueuing transaction commits), the
+# default so that tasks still run on a deployment without a worker.
+BACKGROUND_TASKS = os.environ.get('BACKGROUND_TASKS', 'immediate')
+
+# WeasyPrint reports are rendered in a pool of renderer processes, recycled after
+# PDF_RENDERER_MAX_JOBS jobs and killed after PDF_RENDERER_TIMEOUT seconds.
+# PDF_RENDERER_PROCESSES = 0 renders in the web process instead.
+PDF_RENDERER_PROCESSES = int(os.environ.get('PDF_RENDERER_PROCESSES', 1))
+PDF_RENDERER_MAX_JOBS = int(os.environ.get('PDF_RENDERER_MAX_JOBS', 50))
+PDF_RENDERER_TIMEOUT = int(os.environ.get('PDF_RENDERER_TIMEOUT', 120))
+PDF_RENDERER_MEMORY_MB = int(os.environ.get('PDF_RENDERER_MEMORY_MB', 1024))
+
+# Tabular reports drawn with the native ReportLab table renderer instead of WeasyPrint, comma separated from
+# payment_report, fee_statistics, daily_payments and broadsheet. ?renderer=native|weasyprint overrides per request.
+NATIVE_PDF_REPORTS = [name for name in os.environ.get('NATIVE_PDF_REPORTS', 'payment_report,broadsheet').split(',') if name]
+
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
     SECURE_HSTS_SECONDS = 31536000